@@ -0,0 +1,238 @@
+import click
+
+from aws_deploy.apply.helper import (
+    DEFAULT_MAX_PARALLEL, STATUS_SUCCEEDED, STEP_TYPE_BATCH, STEP_TYPE_CODE_DEPLOY, STEP_TYPE_ECS_CRON,
+    STEP_TYPE_ECS_SERVICE, ManifestError, ReleaseExecutor, ReleasePlan, ReleaseStep, load_manifest
+)
+from aws_deploy.batch.commands.deploy import deploy_job_definition
+from aws_deploy.batch.helper import BatchClient
+from aws_deploy.code_deploy.commands.deploy import deploy_application
+from aws_deploy.code_deploy.helper import CodeDeployClient
+from aws_deploy.common.cache import get_task_definition_cache
+from aws_deploy.common.memoize import RequestCache
+from aws_deploy.common.polling import DEFAULT_MAX_SLEEP_TIME
+from aws_deploy.common.session import DEFAULT_MAX_POOL_CONNECTIONS, get_client_factory
+from aws_deploy.ecs.cli import (
+    create_task_definition, deploy_task_definition, deregister_task_definition, print_diff, rollback_task_definition
+)
+from aws_deploy.ecs.helper import DEFAULT_MAX_TASK_FAILURES, DeployAction, EcsClient, RunAction, TaskPlacementError
+
+
+def get_clients(ctx, request_cache: RequestCache = None) -> dict:
+    options = dict(client_factory=get_client_factory(ctx), request_cache=request_cache)
+    ecs_options = dict(task_definition_cache=get_task_definition_cache(ctx), hedging=ctx.obj.get('HEDGING'), **options)
+
+    return {
+        STEP_TYPE_ECS_SERVICE: lambda: EcsClient(**ecs_options),
+        STEP_TYPE_ECS_CRON: lambda: EcsClient(**ecs_options),
+        STEP_TYPE_CODE_DEPLOY: lambda: CodeDeployClient(**ecs_options),
+        STEP_TYPE_BATCH: lambda: BatchClient(**options),
+    }
+
+
+def modify_task_definition(td, options):
+    td.set_images(options.get('tag'), **(options.get('images') or {}))
+    td.set_commands(**(options.get('commands') or {}))
+    td.set_environment(
+        [
+            (container, name, value)
+            for container, variables in (options.get('env') or {}).items()
+            for name, value in variables.items()
+        ],
+        options.get('exclusive_env', False)
+    )
+    td.set_secrets(
+        [
+            (container, name, value)
+            for container, secrets in (options.get('secrets') or {}).items()
+            for name, value in secrets.items()
+        ],
+        options.get('exclusive_secrets', False)
+    )
+    td.set_role_arn(options.get('role'))
+    td.set_execution_role_arn(options.get('execution_role'))
+
+
+def deploy_ecs_service(ecs_client: EcsClient, options):
+    deploy_action = DeployAction(ecs_client, options['cluster'], options['service'])
+
+    if options.get('task'):
+        td = deploy_action.get_task_definition(options['task'])
+    else:
+        td = deploy_action.get_current_task_definition(deploy_action.service)
+    modify_task_definition(td, options)
+
+    if options.get('diff', True):
+        print_diff(td)
+
+    new_td = create_task_definition(deploy_action, td, reuse=options.get('reuse_revision', True))
+
+    try:
+        deploy_task_definition(
+            deployment=deploy_action,
+            task_definition=new_td,
+            title='Deploying new task definition',
+            success_message=f'Deployment of {options["cluster"]}/{options["service"]} successful',
+            failure_message=f'Deployment of {options["cluster"]}/{options["service"]} failed',
+            timeout=options.get('timeout', 300),
+            deregister=options.get('deregister', True) and not new_td.is_reuse_of(td),
+            previous_task_definition=td,
+            ignore_warnings=options.get('ignore_warnings', False),
+            sleep_time=options.get('sleep_time', 1),
+            max_sleep_time=options.get('max_sleep_time', DEFAULT_MAX_SLEEP_TIME),
+            max_task_failures=options.get('max_task_failures', DEFAULT_MAX_TASK_FAILURES),
+            force_new_deployment=options.get('force_new_deployment', True)
+        )
+    except TaskPlacementError:
+        if options.get('rollback', False):
+            rollback_task_definition(
+                deploy_action, td, new_td,
+                sleep_time=options.get('sleep_time', 1),
+                max_sleep_time=options.get('max_sleep_time', DEFAULT_MAX_SLEEP_TIME)
+            )
+
+        raise
+
+
+def deploy_ecs_cron(ecs_client: EcsClient, options):
+    action = RunAction(ecs_client, options['cluster'])
+
+    td = action.get_task_definition(options['task'])
+    modify_task_definition(td, options)
+
+    if options.get('diff', True):
+        print_diff(td)
+
+    new_td = create_task_definition(action, td, reuse=options.get('reuse_revision', True))
+
+    ecs_client.update_rule(cluster=options['cluster'], rule=options['rule'], task_definition=new_td)
+
+    click.secho(f'Successfully updated scheduled task {options["rule"]}', fg='green')
+
+    if options.get('deregister', True) and not new_td.is_reuse_of(td):
+        deregister_task_definition(action, td)
+
+
+def deploy_code_deploy(code_deploy_client: CodeDeployClient, options):
+    deploy_application(
+        code_deploy_client=code_deploy_client,
+        application_name=options['application'],
+        deployment_group_name=options['deployment_group'],
+        module_version=options.get('module_version'),
+        tag_only=options.get('tag'),
+        timeout=options.get('timeout', 600),
+        sleep_time=options.get('sleep_time', 1),
+        max_sleep_time=options.get('max_sleep_time', DEFAULT_MAX_SLEEP_TIME),
+        deregister=options.get('deregister', False)
+    )
+
+
+def deploy_batch(batch_client: BatchClient, options):
+    deploy_job_definition(
+        batch_client=batch_client,
+        job_definition_name=options['job_definition'],
+        tag=options.get('tag'),
+        deregister=options.get('deregister', False)
+    )
+
+
+STEP_RUNNERS = {
+    STEP_TYPE_ECS_SERVICE: deploy_ecs_service,
+    STEP_TYPE_ECS_CRON: deploy_ecs_cron,
+    STEP_TYPE_CODE_DEPLOY: deploy_code_deploy,
+    STEP_TYPE_BATCH: deploy_batch,
+}
+
+
+class StepRunner:
+    """
+    Runs a single release step with the client of its type. Clients are created on first use and shared by all steps
+    of the same type.
+    """
+
+    def __init__(self, client_factories: dict):
+        self._client_factories = client_factories
+        self._clients = {}
+
+    def client(self, step_type):
+        if step_type not in self._clients:
+            self._clients[step_type] = self._client_factories[step_type]()
+        return self._clients[step_type]
+
+    def __call__(self, step: ReleaseStep):
+        STEP_RUNNERS[step.type](self.client(step.type), step.options)
+
+
+def print_plan(plan: ReleasePlan):
+    click.secho('Release plan')
+    for name in plan.order:
+        step = plan.steps[name]
+        depends_on = f' (after {", ".join(step.depends_on)})' if step.depends_on else ''
+        click.secho(f'  {step}{depends_on}')
+    click.secho('')
+
+
+def print_summary(steps):
+    click.secho('\nRelease summary')
+    for step in steps:
+        color = 'green' if step.status == STATUS_SUCCEEDED else 'red'
+        error = f': {step.error}' if step.error else ''
+        click.secho(f'  {step}: {step.status}{error}', fg=color)
+
+
+@click.command()
+@click.argument('manifest', type=click.Path(exists=True, dir_okay=False))
+@click.option('--aws-access-key-id', envvar='AWS_ACCESS_KEY_ID', required=False, help='AWS access key id')
+@click.option('--aws-secret-access-key', envvar='AWS_SECRET_ACCESS_KEY', required=False, help='AWS secret access key')
+@click.option('--aws-session-token', envvar='AWS_SESSION_TOKEN', required=False, help='AWS session token')
+@click.option('--aws-region', envvar='AWS_REGION', required=False, help='AWS region (e.g. eu-west-1)')
+@click.option('--aws-profile', envvar='AWS_PROFILE', required=False, help='AWS configuration profile name')
+@click.option('--max-parallel', type=int, default=None,
+              help=f'Maximum number of steps running at the same time (default: manifest or {DEFAULT_MAX_PARALLEL})')
+@click.option('--max-pool-connections', envvar='AWS_DEPLOY_MAX_POOL_CONNECTIONS', default=DEFAULT_MAX_POOL_CONNECTIONS,
+              type=int, show_default=True, help='Maximum number of kept-alive HTTPS connections per AWS service')
+@click.option('--dry-run', is_flag=True, default=False, help='Only validate the manifest and print the release plan')
+@click.pass_context
+def apply(ctx, manifest, aws_access_key_id, aws_secret_access_key, aws_session_token, aws_region, aws_profile,
+          max_parallel, max_pool_connections, dry_run):
+    """
+    Rolls out a release described by a manifest file.
+
+    \b
+    MANIFEST is a YAML (or JSON) file listing the steps of the release (ECS services, scheduled tasks, CodeDeploy
+    applications and Batch job definitions) and the steps each of them depends on.
+
+    Every step starts as soon as all its dependencies succeeded. Steps depending on a failed step are skipped.
+    """
+
+    ctx.ensure_object(dict)
+
+    ctx.obj['AWS_ACCESS_KEY_ID'] = aws_access_key_id
+    ctx.obj['AWS_SECRET_ACCESS_KEY'] = aws_secret_access_key
+    ctx.obj['AWS_SESSION_TOKEN'] = aws_session_token
+    ctx.obj['AWS_REGION'] = aws_region
+    ctx.obj['AWS_PROFILE'] = aws_profile
+    ctx.obj['MAX_POOL_CONNECTIONS'] = max_pool_connections
+
+    try:
+        plan = ReleasePlan.from_manifest(load_manifest(manifest))
+        if max_parallel:
+            plan.max_parallel = max_parallel
+
+        print_plan(plan)
+        if dry_run:
+            return
+
+        request_cache = RequestCache()
+        steps = ReleaseExecutor(plan, StepRunner(get_clients(ctx, request_cache))).run()
+        print_summary(steps)
+        click.secho(request_cache.report())
+
+        if any(step.status != STATUS_SUCCEEDED for step in steps):
+            click.secho('Release failed', fg='red', err=True)
+            exit(1)
+
+        click.secho('Release successful', fg='green')
+    except ManifestError as e:
+        click.secho(str(e), fg='red', err=True)
+        exit(1)
@@ -0,0 +1,214 @@
+import json
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List
+
+import click
+
+from aws_deploy.common.tracing import in_current_span
+
+STEP_TYPE_ECS_SERVICE = 'ecs-service'
+STEP_TYPE_ECS_CRON = 'ecs-cron'
+STEP_TYPE_CODE_DEPLOY = 'code-deploy'
+STEP_TYPE_BATCH = 'batch'
+
+STEP_REQUIRED_OPTIONS = {
+    STEP_TYPE_ECS_SERVICE: ('cluster', 'service'),
+    STEP_TYPE_ECS_CRON: ('cluster', 'task', 'rule'),
+    STEP_TYPE_CODE_DEPLOY: ('application', 'deployment_group'),
+    STEP_TYPE_BATCH: ('job_definition',),
+}
+
+STATUS_PENDING = 'pending'
+STATUS_SUCCEEDED = 'succeeded'
+STATUS_FAILED = 'failed'
+STATUS_SKIPPED = 'skipped'
+
+DEFAULT_MAX_PARALLEL = 10
+DEFAULT_MAX_PARALLEL_PER_CLUSTER = 5
+
+
+def load_manifest(file):
+    try:
+        with open(file) as f:
+            if file.endswith('.json'):
+                return json.load(f)
+
+            import yaml
+            return yaml.safe_load(f)
+    except Exception as e:
+        raise ManifestError(f'Unable to read manifest {file}: {e}')
+
+
+class ReleaseStep:
+    def __init__(self, name, type, depends_on=None, **options):
+        if type not in STEP_REQUIRED_OPTIONS:
+            raise ManifestError(f'Unknown type "{type}" of step "{name}"')
+
+        missing = [option for option in STEP_REQUIRED_OPTIONS[type] if not options.get(option)]
+        if missing:
+            raise ManifestError(f'Missing {", ".join(missing)} in step "{name}"')
+
+        self.name = name
+        self.type = type
+        self.depends_on = list(depends_on or [])
+        self.options = options
+        self.status = STATUS_PENDING
+        self.error = None
+
+    @property
+    def cluster(self):
+        return self.options.get('cluster')
+
+    @property
+    def concurrency_key(self):
+        return self.cluster or self.type
+
+    def __repr__(self):
+        return f'{self.type}:{self.name}'
+
+
+class ReleasePlan:
+    """
+    The steps of a release manifest together with their dependencies, validated to form a directed acyclic graph.
+    """
+
+    def __init__(self, steps: List[ReleaseStep], max_parallel=DEFAULT_MAX_PARALLEL,
+                 max_parallel_per_cluster=DEFAULT_MAX_PARALLEL_PER_CLUSTER, cluster_limits: Dict[str, int] = None):
+        self.steps = OrderedDict()
+        for step in steps:
+            if step.name in self.steps:
+                raise ManifestError(f'Duplicate step "{step.name}"')
+            self.steps[step.name] = step
+
+        self.max_parallel = max_parallel
+        self.max_parallel_per_cluster = max_parallel_per_cluster
+        self.cluster_limits = cluster_limits or {}
+
+        for step in steps:
+            for dependency in step.depends_on:
+                if dependency not in self.steps:
+                    raise ManifestError(f'Step "{step.name}" depends on unknown step "{dependency}"')
+
+        self.order = self._topological_order()
+
+    @classmethod
+    def from_manifest(cls, manifest: dict):
+        if not isinstance(manifest, dict) or not manifest.get('steps'):
+            raise ManifestError('The manifest has no steps')
+
+        defaults = manifest.get('defaults') or {}
+        concurrency = manifest.get('concurrency') or {}
+
+        steps = []
+        for position, step in enumerate(manifest['steps']):
+            options = dict(defaults, **step)
+            options.setdefault('name', f'step-{position + 1}')
+            steps.append(ReleaseStep(**options))
+
+        return cls(
+            steps=steps,
+            max_parallel=concurrency.get('max_parallel', DEFAULT_MAX_PARALLEL),
+            max_parallel_per_cluster=concurrency.get('max_parallel_per_cluster', DEFAULT_MAX_PARALLEL_PER_CLUSTER),
+            cluster_limits=concurrency.get('clusters')
+        )
+
+    def limit(self, concurrency_key) -> int:
+        return self.cluster_limits.get(concurrency_key, self.max_parallel_per_cluster)
+
+    def _topological_order(self) -> List[str]:
+        in_degree = {name: len(step.depends_on) for name, step in self.steps.items()}
+        ready = [name for name, degree in in_degree.items() if degree == 0]
+        order = []
+
+        while ready:
+            name = ready.pop(0)
+            order.append(name)
+            for dependent in self.dependents(name):
+                in_degree[dependent] -= 1
+                if in_degree[dependent] == 0:
+                    ready.append(dependent)
+
+        if len(order) != len(self.steps):
+            cycle = sorted(name for name, degree in in_degree.items() if degree > 0)
+            raise ManifestError(f'Dependency cycle between steps: {", ".join(cycle)}')
+
+        return order
+
+    def dependents(self, name) -> List[str]:
+        return [step.name for step in self.steps.values() if name in step.depends_on]
+
+
+class ReleaseExecutor:
+    """
+    Runs the steps of a ReleasePlan, starting every step as soon as all its dependencies succeeded.
+
+    At most plan.max_parallel steps run at the same time, and at most plan.limit(cluster) steps per cluster. Steps
+    depending on a failed step are skipped, independent steps keep running.
+    """
+
+    def __init__(self, plan: ReleasePlan, run_step: Callable[[ReleaseStep], None]):
+        self._plan = plan
+        self._run_step = run_step
+
+    def run(self) -> List[ReleaseStep]:
+        steps = self._plan.steps
+        running = {}
+        running_per_key = {}
+
+        with ThreadPoolExecutor(max_workers=self._plan.max_parallel) as executor:
+            while True:
+                self._skip_blocked()
+
+                for name in self._plan.order:
+                    step = steps[name]
+                    if step.status != STATUS_PENDING or step.name in running.values():
+                        continue
+                    if len(running) >= self._plan.max_parallel:
+                        break
+                    if not all(steps[dependency].status == STATUS_SUCCEEDED for dependency in step.depends_on):
+                        continue
+                    key = step.concurrency_key
+                    if running_per_key.get(key, 0) >= self._plan.limit(key):
+                        continue
+
+                    click.secho(f'Starting {step}')
+                    running[executor.submit(in_current_span(self._run_step), step)] = step.name
+                    running_per_key[key] = running_per_key.get(key, 0) + 1
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    step = steps[running.pop(future)]
+                    running_per_key[step.concurrency_key] -= 1
+
+                    try:
+                        future.result()
+                        step.status = STATUS_SUCCEEDED
+                        click.secho(f'Finished {step}', fg='green')
+                    except Exception as e:
+                        step.status = STATUS_FAILED
+                        step.error = str(e)
+                        click.secho(f'Failed {step}: {e}', fg='red', err=True)
+
+        return list(steps.values())
+
+    def _skip_blocked(self):
+        for name in self._plan.order:
+            step = self._plan.steps[name]
+            if step.status != STATUS_PENDING:
+                continue
+
+            blocking = [
+                dependency for dependency in step.depends_on
+                if self._plan.steps[dependency].status in (STATUS_FAILED, STATUS_SKIPPED)
+            ]
+            if blocking:
+                step.status = STATUS_SKIPPED
+                step.error = f'dependency {", ".join(blocking)} did not succeed'
+
+
+class ManifestError(Exception):
+    pass
@@ -1,8 +1,12 @@
-from typing import List
+from typing import TYPE_CHECKING, List
 
 import click
-from boto3 import Session
-from boto3_type_annotations import batch
+
+from aws_deploy.common.memoize import RequestCache, invalidates, memoized
+from aws_deploy.common.session import ClientFactory
+
+if TYPE_CHECKING:  # pragma: no cover
+    from boto3_type_annotations import batch
 
 
 class Diff:
@@ -99,25 +103,32 @@ class BatchContainerProperties:
 
 class BatchClient:
     def __init__(self, aws_access_key_id=None, aws_secret_access_key=None, aws_session_token=None, region_name=None,
-                 profile_name=None):
-        session = Session(
+                 profile_name=None, request_cache: RequestCache = None, client_factory: ClientFactory = None):
+        self._client_factory = client_factory or ClientFactory(
             aws_access_key_id=aws_access_key_id,
             aws_secret_access_key=aws_secret_access_key,
             aws_session_token=aws_session_token,
             region_name=region_name,
             profile_name=profile_name
         )
+        self.request_cache = request_cache
 
-        self._batch: batch.Client = session.client('batch')
+    @property
+    def _batch(self) -> 'batch.Client':
+        return self._client_factory.client('batch')
 
-    def get_job_definition(self, job_definition_name: str) -> BatchJobDefinition:
+    @memoized('job_definition')
+    def describe_job_definitions(self, job_definition_name: str) -> List[dict]:
         job_definition_payload = self._batch.describe_job_definitions(
             jobDefinitionName=job_definition_name,
             status='ACTIVE'
         )
 
+        return job_definition_payload['jobDefinitions']
+
+    def get_job_definition(self, job_definition_name: str) -> BatchJobDefinition:
         job_definitions = sorted(
-            job_definition_payload['jobDefinitions'],
+            self.describe_job_definitions(job_definition_name),
             key=lambda x: x['revision'],
             reverse=True
         )
@@ -138,14 +149,9 @@ class BatchClient:
 
             return tag != 'latest'
 
-        job_definition_payload = self._batch.describe_job_definitions(
-            jobDefinitionName=job_definition_name,
-            status='ACTIVE'
-        )
-
         job_definitions = filter(
             filter_latest_tag,
-            job_definition_payload['jobDefinitions']
+            self.describe_job_definitions(job_definition_name)
         )
 
         job_definitions = sorted(
@@ -159,6 +165,7 @@ class BatchClient:
 
         raise UnknownJobDefinitionError(f'Job definition not found [Name={job_definition_name}]')
 
+    @invalidates('job_definition')
     def register_job_definition(self, job_definition: BatchJobDefinition):
         if job_definition.tags:
             job_definition.additional_properties['tags'] = job_definition.tags
@@ -174,6 +181,7 @@ class BatchClient:
 
         return BatchJobDefinition(**new_job_definition_payload)
 
+    @invalidates('job_definition')
     def deregister_job_definition(self, job_definition_arn: str):
         return self._batch.deregister_job_definition(
             jobDefinition=job_definition_arn
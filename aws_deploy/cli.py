@@ -3,20 +3,172 @@ import sys
 import click
 
 from aws_deploy import VERSION
-from aws_deploy.code_deploy.cli import code_deploy_cli
-from aws_deploy.ecs.cli import ecs_cli
-from aws_deploy.batch.cli import batch_cli
+from aws_deploy.common.lazy import LazyGroup
 
+# the subcommands are only imported when invoked, so that e.g. `aws-deploy batch deploy` does not load the ECS and
+# CodeDeploy packages and `aws-deploy --help` does not load boto3 at all
+COMMANDS = {
+    'ecs': ('aws_deploy.ecs.cli:ecs_cli', 'Deploy, scale, run and watch ECS services and tasks.'),
+    'code-deploy': ('aws_deploy.code_deploy.cli:code_deploy_cli', 'Deploy ECS services through CodeDeploy.'),
+    'batch': ('aws_deploy.batch.cli:batch_cli', 'Deploy Batch job definitions.'),
+    'apply': ('aws_deploy.apply.cli:apply', 'Roll out a release described by a manifest file.'),
+}
 
-@click.group(context_settings={'terminal_width': 120})
+
+@click.group(cls=LazyGroup, lazy_commands=COMMANDS, context_settings={'terminal_width': 120})
 @click.version_option(version=VERSION, prog_name='aws-deploy')
-def cli():  # pragma: no cover
-    pass
+@click.option('--api-stats', is_flag=True, default=False,
+              help='Print the calls, latencies, retries and throttles of every AWS API operation at exit')
+@click.option('--api-stats-format', type=click.Choice(('table', 'json')), default='table',
+              help='Format of the --api-stats report (default: table)')
+@click.option('--trace-file', type=click.Path(dir_okay=False, writable=True),
+              help='Write a Chrome trace (chrome://tracing, Perfetto) of the deploy phases and AWS API calls to a file')
+@click.option('--profile-cpu', type=click.Path(dir_okay=False, writable=True),
+              help='Profile the command with cProfile, write the statistics to a file (e.g. out.pstats) and the '
+                   'sampled stacks for flame graphs next to it (out.collapsed)')
+@click.option('--profile-mem', is_flag=True, default=False,
+              help='Trace the memory allocations of the command and print the top allocations at exit')
+@click.option('--record', type=click.Path(file_okay=False, writable=True),
+              help='Record all AWS API requests and responses of the command into a cassette directory')
+@click.option('--replay', type=click.Path(exists=True, file_okay=False),
+              help='Answer all AWS API requests of the command from a recorded cassette directory, offline')
+@click.option('--replay-latency-scale', type=float, default=1.0, show_default=True,
+              help='Factor applied to the recorded latencies when replaying (0 answers immediately)')
+@click.option('--replay-loose', is_flag=True, default=False,
+              help='Answer requests with unrecorded parameters with the next recorded response of the operation')
+@click.option('--rate-limit', 'rate_limits', multiple=True, metavar='SERVICE[:OPERATION]=RATE[/BURST]',
+              help='Requests per second (and burst) of an AWS service or operation, e.g. ecs:DescribeServices=10/20. '
+                   'Operations without a limit are sent at up to 20 requests per second with bursts of 40')
+@click.option('--no-rate-limit', is_flag=True, default=False,
+              help='Send the AWS API requests without limiting their rate in the process')
+@click.option('--hedge', 'hedged_operations', multiple=True, metavar='SERVICE:OPERATION',
+              help='Send a second request for an ECS or CodeDeploy read that is slower than its p95 latency, e.g. '
+                   'ecs:DescribeServices, and use the first response')
+@click.option('--hedge-budget', type=float, default=0.1, show_default=True,
+              help='Maximum share of extra requests sent by --hedge')
+@click.pass_context
+def cli(ctx, api_stats, api_stats_format, trace_file, profile_cpu, profile_mem, record, replay, replay_latency_scale,
+        replay_loose, rate_limits, no_rate_limit, hedged_operations, hedge_budget):
+    ctx.ensure_object(dict)
+
+    if record and replay:
+        raise click.UsageError('--record and --replay cannot be used together')
+
+    # the profiles are started first and stopped first, so that they do not include the other reports
+    if profile_cpu or profile_mem:
+        start_profiles(ctx, profile_cpu, profile_mem)
+
+    if not no_rate_limit:
+        start_rate_limiter(ctx, rate_limits)
+
+    if hedged_operations:
+        start_hedging(ctx, hedged_operations, hedge_budget)
+
+    if api_stats:
+        # imported here, the stats hook into botocore, which `aws-deploy --help` must not load
+        from aws_deploy.common.stats import ApiStats
+
+        stats = ApiStats()
+        ctx.obj.setdefault('INSTRUMENTATION', []).append(stats)
+        ctx.call_on_close(lambda: click.secho(stats.report(api_stats_format), err=True))
+
+    if trace_file:
+        start_trace(ctx, trace_file)
+
+    # a cached task definition would be missing from the recording, or not be requested from the replay
+    if record or replay:
+        ctx.obj['NO_TASK_DEFINITION_CACHE'] = True
+
+    # the cassette comes last, so that the statistics and the trace see the replayed calls like real ones
+    if record:
+        from aws_deploy.common.cassette import CassetteRecorder
+
+        ctx.obj.setdefault('INSTRUMENTATION', []).append(CassetteRecorder(record))
+
+    if replay:
+        start_replay(ctx, replay, replay_latency_scale, replay_loose)
+
+
+def start_rate_limiter(ctx, rate_limits):
+    from aws_deploy.common.ratelimit import RateLimiter, parse_rate_limits
+
+    try:
+        limiter = RateLimiter(parse_rate_limits(rate_limits))
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--rate-limit')
+
+    # all clients of the run share the limiter, so that parallel deployments queue instead of being throttled
+    ctx.obj.setdefault('INSTRUMENTATION', []).append(limiter)
+
+
+def start_hedging(ctx, hedged_operations, hedge_budget):
+    from aws_deploy.common.hedging import RequestHedging, parse_hedged_operations
+
+    if not 0 <= hedge_budget <= 1:
+        raise click.BadParameter(f'{hedge_budget} is not between 0 and 1', param_hint='--hedge-budget')
+
+    try:
+        hedging = RequestHedging(parse_hedged_operations(hedged_operations), budget_ratio=hedge_budget)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--hedge')
+
+    ctx.obj['HEDGING'] = hedging
+    ctx.call_on_close(lambda: click.secho(hedging.report(), err=True))
+
+
+def start_profiles(ctx, profile_cpu, profile_mem):
+    from aws_deploy.common.profiling import CpuProfile, MemoryProfile
+
+    profiles = []
+    if profile_mem:
+        profiles.append(MemoryProfile())
+    if profile_cpu:
+        profiles.append(CpuProfile(profile_cpu))
+
+    for profile in profiles:
+        profile.start()
+
+    def stop_profiles():
+        for profile in reversed(profiles):
+            click.secho(profile.stop(), err=True)
+
+    ctx.call_on_close(stop_profiles)
+
+
+def start_replay(ctx, replay, latency_scale, loose):
+    from aws_deploy.common.cassette import CassetteError, CassetteReplayer
+    from aws_deploy.common.session import ClientFactory
+
+    try:
+        replayer = CassetteReplayer.load(replay, latency_scale=latency_scale, loose=loose)
+    except CassetteError as e:
+        click.secho(str(e), fg='red', err=True)
+        exit(1)
+
+    # no request is sent, the clients only need the recorded region and no credentials
+    if ctx.obj.get('CLIENT_FACTORY') is None:
+        ctx.obj['CLIENT_FACTORY'] = ClientFactory(region_name=replayer.region)
+    ctx.obj.setdefault('INSTRUMENTATION', []).append(replayer)
+
+
+def start_trace(ctx, trace_file):
+    from aws_deploy.common.tracing import Tracer, set_tracer
+
+    tracer = Tracer()
+    previous_tracer = set_tracer(tracer)
+    ctx.obj.setdefault('INSTRUMENTATION', []).append(tracer)
+
+    # the whole run is the root span, the phases of the subcommand and their AWS API calls are nested into it
+    run_span = tracer.span(f'aws-deploy {ctx.invoked_subcommand}')
+    run_span.__enter__()
+
+    def finish_trace():
+        run_span.__exit__(None, None, None)
+        set_tracer(previous_tracer)
+        tracer.write(trace_file)
 
+    ctx.call_on_close(finish_trace)
 
-cli.add_command(ecs_cli)
-cli.add_command(code_deploy_cli)
-cli.add_command(batch_cli)
 
 if __name__ == '__main__':  # pragma: no cover
     try:
@@ -1,17 +1,19 @@
 import click
 
 from aws_deploy.code_deploy.helper import CodeDeployClient
+from aws_deploy.common.cache import get_task_definition_cache
+from aws_deploy.common.memoize import RequestCache
+from aws_deploy.common.session import get_client_factory
 from aws_deploy.notification.notification import Notification
 from aws_deploy.notification.slack import SlackNotification
 
 
 def get_code_deploy_client(ctx) -> CodeDeployClient:
     return CodeDeployClient(
-        aws_access_key_id=ctx.obj['AWS_ACCESS_KEY_ID'],
-        aws_secret_access_key=ctx.obj['AWS_SECRET_ACCESS_KEY'],
-        aws_session_token=ctx.obj['AWS_SESSION_TOKEN'],
-        region_name=ctx.obj['AWS_REGION'],
-        profile_name=ctx.obj['AWS_PROFILE']
+        client_factory=get_client_factory(ctx),
+        task_definition_cache=get_task_definition_cache(ctx),
+        request_cache=ctx.obj.get('REQUEST_CACHE'),
+        hedging=ctx.obj.get('HEDGING')
     )
 
 
@@ -43,3 +45,7 @@ def code_deploy_cli(ctx, aws_access_key_id, aws_secret_access_key, aws_session_t
     ctx.obj['AWS_PROFILE'] = aws_profile
 
     ctx.obj['VERBOSE'] = verbose
+
+    ctx.obj['REQUEST_CACHE'] = RequestCache()
+    if verbose:
+        ctx.call_on_close(lambda: click.secho(ctx.obj['REQUEST_CACHE'].report(), err=True))
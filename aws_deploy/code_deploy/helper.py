@@ -1,15 +1,19 @@
 import hashlib
 import json
-from typing import List, Optional
+from functools import partial
+from typing import TYPE_CHECKING, List, Optional
 
 import click
-from boto3 import Session
-from boto3_type_annotations import codedeploy
-from boto3_type_annotations import ecs
-from boto3_type_annotations import resourcegroupstaggingapi
 from botocore.exceptions import ClientError
 
-from aws_deploy.ecs.helper import EcsTaskDefinition, EcsService
+from aws_deploy.common.cache import TaskDefinitionCache
+from aws_deploy.common.hedging import RequestHedging
+from aws_deploy.common.memoize import RequestCache, invalidates, memoized
+from aws_deploy.common.session import ClientFactory
+from aws_deploy.ecs.helper import READ_ONLY_PROPERTIES, EcsTaskDefinition, EcsService
+
+if TYPE_CHECKING:  # pragma: no cover
+    from boto3_type_annotations import codedeploy, ecs, resourcegroupstaggingapi
 
 
 class Diff:
@@ -256,7 +260,7 @@ class CodeDeployApplicationRevision:
 
 class CodeDeployDeployment:
     def __init__(self, deploymentId, applicationName, deploymentGroupName, deploymentConfigName, revision, status,
-                 errorInformation=None, **kwargs):
+                 errorInformation=None, deploymentOverview=None, **kwargs):
         self.deployment_id = deploymentId
         self.application_name = applicationName
         self.deployment_group_name = deploymentGroupName
@@ -264,6 +268,11 @@ class CodeDeployDeployment:
         self.revision = revision
         self.status = status
         self.error_info = errorInformation
+        self.overview = deploymentOverview or {}
+
+    @property
+    def progress(self):
+        return self.status, tuple(sorted(self.overview.items()))
 
     # ['Created', 'Queued', 'InProgress', 'Baking', 'Succeeded', 'Failed', 'Stopped', 'Ready']
 
@@ -279,19 +288,36 @@ class CodeDeployDeployment:
 
 class CodeDeployClient:
     def __init__(self, aws_access_key_id=None, aws_secret_access_key=None, aws_session_token=None, region_name=None,
-                 profile_name=None):
-        session = Session(
+                 profile_name=None, task_definition_cache: TaskDefinitionCache = None,
+                 request_cache: RequestCache = None, client_factory: ClientFactory = None,
+                 hedging: RequestHedging = None):
+        self._client_factory = client_factory or ClientFactory(
             aws_access_key_id=aws_access_key_id,
             aws_secret_access_key=aws_secret_access_key,
             aws_session_token=aws_session_token,
             region_name=region_name,
             profile_name=profile_name
         )
+        self._task_definition_cache = task_definition_cache
+        self.request_cache = request_cache
+        self.hedging = hedging
+
+    def _hedged(self, client):
+        return self.hedging.wrap(client) if self.hedging else client
+
+    @property
+    def _code_deploy(self) -> 'codedeploy.Client':
+        return self._hedged(self._client_factory.client('codedeploy'))
 
-        self._code_deploy: codedeploy.Client = session.client('codedeploy')
-        self._ecs: ecs.Client = session.client('ecs')
-        self._resource_tagging: resourcegroupstaggingapi.Client = session.client('resourcegroupstaggingapi')
+    @property
+    def _ecs(self) -> 'ecs.Client':
+        return self._hedged(self._client_factory.client('ecs'))
 
+    @property
+    def _resource_tagging(self) -> 'resourcegroupstaggingapi.Client':
+        return self._client_factory.client('resourcegroupstaggingapi')
+
+    @memoized('application')
     def get_application(self, application_name: str) -> CodeDeployApplication:
         application_payload = self._code_deploy.get_application(
             applicationName=application_name
@@ -301,6 +327,7 @@ class CodeDeployClient:
             **application_payload['application']
         )
 
+    @memoized('deployment_group')
     def get_deployment_group(self, application_name: str, deployment_group_name: str) -> CodeDeployDeploymentGroup:
         deployment_group_payload = self._code_deploy.get_deployment_group(
             applicationName=application_name,
@@ -311,6 +338,7 @@ class CodeDeployClient:
             **deployment_group_payload['deploymentGroupInfo']
         )
 
+    @memoized('deployment_group')
     def get_application_revision(self, application_name: str, deployment_group: CodeDeployDeploymentGroup) -> Optional[CodeDeployApplicationRevision]:  # noqa E501
         if not deployment_group.target_revision:
             return None
@@ -385,7 +413,16 @@ class CodeDeployClient:
             service_definition=services_payload['services'][0]
         )
 
+    @memoized('task_definition')
     def get_task_definition(self, task_definition_arn: str) -> EcsTaskDefinition:
+        if self._task_definition_cache:
+            task_definition_payload = self._task_definition_cache.get(task_definition_arn)
+            if task_definition_payload:
+                task_definition = EcsTaskDefinition(**task_definition_payload['taskDefinition'])
+                # the tags of a revision can change, they are not cached but listed if they are used
+                task_definition.load_tags_with(partial(self._list_task_definition_tags, task_definition_arn))
+                return task_definition
+
         try:
             task_definition_payload = self._ecs.describe_task_definition(
                 taskDefinition=task_definition_arn,
@@ -393,13 +430,28 @@ class CodeDeployClient:
                     'TAGS',
                 ]
             )
-
-            return EcsTaskDefinition(
-                tags=task_definition_payload.get('tags', None), **task_definition_payload['taskDefinition']
-            )
         except ClientError as e:
             raise UnknownTaskDefinitionError(str(e))
 
+        if self._task_definition_cache:
+            self._task_definition_cache.put(
+                task_definition_payload['taskDefinition']['taskDefinitionArn'],
+                {key: value for key, value in task_definition_payload.items() if key != 'ResponseMetadata'}
+            )
+
+        return EcsTaskDefinition(
+            tags=task_definition_payload.get('tags', None), **task_definition_payload['taskDefinition']
+        )
+
+    def _list_task_definition_tags(self, task_definition_arn: str):
+        try:
+            return self._ecs.list_tags_for_resource(resourceArn=task_definition_arn)['tags']
+        except ClientError:
+            # e.g. without permission to list tags, the description of the revision includes them, too
+            payload = self._ecs.describe_task_definition(taskDefinition=task_definition_arn, include=['TAGS'])
+            return payload.get('tags', [])
+
+    @invalidates('deployment_group')
     def create_deployment(self, application_name: str, deployment_group_name: str,
                           revision: CodeDeployRevision) -> CodeDeployDeployment:  # noqa: E501
         try:
@@ -428,9 +480,14 @@ class CodeDeployClient:
             **deployment_payload['deploymentInfo']
         )
 
+    @invalidates('task_definition')
     def register_task_definition(self, task_definition: EcsTaskDefinition):
+        properties = {
+            key: value for key, value in task_definition.additional_properties.items()
+            if key not in READ_ONLY_PROPERTIES
+        }
         if task_definition.tags:
-            task_definition.additional_properties['tags'] = task_definition.tags
+            properties['tags'] = list(task_definition.tags)
 
         new_task_definition_payload = self._ecs.register_task_definition(
             family=task_definition.family,
@@ -438,12 +495,16 @@ class CodeDeployClient:
             volumes=task_definition.volumes,
             taskRoleArn=task_definition.role_arn,
             executionRoleArn=task_definition.execution_role_arn,
-            **task_definition.additional_properties
+            **properties
         )
 
         return EcsTaskDefinition(**new_task_definition_payload['taskDefinition'])
 
+    @invalidates('task_definition')
     def deregister_task_definition(self, task_definition_arn: str):
+        if self._task_definition_cache:
+            self._task_definition_cache.invalidate(task_definition_arn)
+
         return self._ecs.deregister_task_definition(
             taskDefinition=task_definition_arn
         )
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import re
+import zlib
+from datetime import datetime
+
+# a task definition revision (arn:aws:ecs:<region>:<account>:task-definition/<family>:<revision>) never changes, in
+# contrast to a family name or an ARN without revision, which resolve to the latest ACTIVE revision
+TASK_DEFINITION_REVISION_ARN_REGEX = re.compile(r'^arn:aws[\w-]*:ecs:[\w-]+:\d+:task-definition/[\w-]+:\d+$')
+
+# a revision given as <family>:<revision>, which is a revision of the account and region of the credentials
+TASK_DEFINITION_FAMILY_REVISION_REGEX = re.compile(r'^[\w-]+:\d+$')
+
+# the properties of a task definition that change after its registration, they are never cached
+MUTABLE_PROPERTIES = ('status', 'deregisteredAt')
+
+DEFAULT_CACHE_MAX_SIZE = 64 * 1024 * 1024
+CACHE_FORMAT_VERSION = 2
+CACHE_FILE_SUFFIX = '.json.z'
+
+
+def is_task_definition_revision_arn(task_definition_arn) -> bool:
+    return bool(task_definition_arn and TASK_DEFINITION_REVISION_ARN_REGEX.match(task_definition_arn))
+
+
+def task_definition_revision_arn(task_definition, partition, region, account_id):
+    """
+    Returns the revision ARN of a task definition given as revision ARN or as family:revision of the given account and
+    region, or None for a family name or an ARN without revision.
+    """
+    if is_task_definition_revision_arn(task_definition):
+        return task_definition
+    if task_definition and TASK_DEFINITION_FAMILY_REVISION_REGEX.match(task_definition):
+        return f'arn:{partition}:ecs:{region}:{account_id}:task-definition/{task_definition}'
+
+    return None
+
+
+def get_default_cache_dir():
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+
+    return os.path.join(cache_home, 'aws-deploy', 'task-definitions')
+
+
+def get_task_definition_cache(ctx=None):
+    # e.g. a recorded or replayed run must send or replay every request
+    if os.environ.get('AWS_DEPLOY_NO_CACHE') or (ctx is not None and ctx.obj.get('NO_TASK_DEFINITION_CACHE')):
+        return None
+
+    return TaskDefinitionCache(
+        cache_dir=os.environ.get('AWS_DEPLOY_CACHE_DIR') or get_default_cache_dir(),
+        max_size=int(os.environ.get('AWS_DEPLOY_CACHE_MAX_SIZE') or DEFAULT_CACHE_MAX_SIZE)
+    )
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {'$datetime': value.isoformat()}
+
+    raise TypeError(f'Object of type {type(value).__name__} is not serializable')
+
+
+def _decode(value):
+    if len(value) == 1 and '$datetime' in value:
+        return datetime.fromisoformat(value['$datetime'])
+
+    return value
+
+
+class TaskDefinitionCache:
+    """
+    Local cache of DescribeTaskDefinition responses, keyed by task definition revision ARN (see
+    task_definition_revision_arn for revisions given as family:revision).
+
+    Only the immutable body of a task definition is stored: its status, deregisteredAt and its tags change after the
+    registration, so a cached payload has no status and no tags, the caller fetches the tags itself if it needs them.
+    Every body is stored as zlib compressed, compact JSON in a file named after the SHA-256 of its ARN. Reading an entry
+    refreshes its modification time, and whenever the cache grows beyond max_size bytes the least recently used entries
+    are removed; the size of the cache is summed up once and then kept up to date by put. The cache never fails a
+    deployment: unreadable or corrupt entries count as misses.
+    """
+
+    def __init__(self, cache_dir, max_size=DEFAULT_CACHE_MAX_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+
+    def _path(self, task_definition_arn):
+        key = hashlib.sha256(task_definition_arn.encode()).hexdigest()
+
+        return os.path.join(self.cache_dir, key[:2], key + CACHE_FILE_SUFFIX)
+
+    def get(self, task_definition_arn):
+        if not is_task_definition_revision_arn(task_definition_arn):
+            return None
+
+        path = self._path(task_definition_arn)
+        try:
+            with open(path, 'rb') as f:
+                entry = json.loads(zlib.decompress(f.read()), object_hook=_decode)
+            os.utime(path)
+        except (OSError, ValueError, zlib.error):
+            self.misses += 1
+            return None
+
+        if entry.get('version') != CACHE_FORMAT_VERSION or entry.get('arn') != task_definition_arn:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return {'taskDefinition': entry['taskDefinition']}
+
+    def put(self, task_definition_arn, payload):
+        if not is_task_definition_revision_arn(task_definition_arn):
+            return
+
+        task_definition = {
+            key: value for key, value in payload['taskDefinition'].items() if key not in MUTABLE_PROPERTIES
+        }
+        entry = {'version': CACHE_FORMAT_VERSION, 'arn': task_definition_arn, 'taskDefinition': task_definition}
+        path = self._path(task_definition_arn)
+        if self._size is None:
+            self._size = self.size()
+        try:
+            data = zlib.compress(json.dumps(entry, separators=(',', ':'), default=_encode).encode())
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            temp_path = f'{path}.{os.getpid()}.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            replaced_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(temp_path, path)
+        except (OSError, TypeError, ValueError):
+            return
+
+        self._size += len(data) - replaced_size
+        if self._size > self.max_size:
+            self.evict()
+
+    def invalidate(self, task_definition_arn):
+        if not is_task_definition_revision_arn(task_definition_arn):
+            return
+
+        path = self._path(task_definition_arn)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+
+        if self._size is not None:
+            self._size -= size
+
+    def _entries(self):
+        entries = []
+        for directory, _, files in os.walk(self.cache_dir):
+            for file in files:
+                if not file.endswith(CACHE_FILE_SUFFIX):
+                    continue
+                path = os.path.join(directory, file)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        return entries
+
+    def size(self) -> int:
+        return sum(entry_size for _, entry_size, _ in self._entries())
+
+    def evict(self):
+        entries = self._entries()
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= entry_size
+
+        self._size = size
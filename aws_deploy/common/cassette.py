@@ -0,0 +1,184 @@
+import json
+import os
+import threading
+from collections import deque
+from datetime import datetime
+
+from botocore.awsrequest import AWSResponse
+
+from aws_deploy.common.polling import get_clock
+
+INTERACTIONS_FILE = 'interactions.jsonl'
+META_FILE = 'meta.json'
+
+_CONTEXT_KEY = 'cassette'
+
+
+class CassetteError(Exception):
+    pass
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, bytes):
+        return {'__bytes__': value.decode('latin-1')}
+    raise TypeError(f'Cannot record {type(value).__name__}')
+
+
+def _decode(value):
+    if '__datetime__' in value:
+        return datetime.fromisoformat(value['__datetime__'])
+    if '__bytes__' in value:
+        return value['__bytes__'].encode('latin-1')
+    return value
+
+
+def dumps(value) -> str:
+    return json.dumps(value, sort_keys=True, default=_encode)
+
+
+def loads(value):
+    return json.loads(value, object_hook=_decode)
+
+
+def request_key(service_name, operation_name, params) -> str:
+    return f'{service_name}:{operation_name}:{dumps(params)}'
+
+
+class CassetteRecorder:
+    """
+    Records the AWS API requests and responses of a run into a cassette directory, for CassetteReplayer.
+
+    register() hooks a client (like aws_deploy.common.stats.ApiStats): before-parameter-build captures the parameters
+    of a call as the caller passed them, after-call appends the parsed response, the HTTP status and the latency of the
+    call to interactions.jsonl, so that even the calls of an aborted run are kept. Calls that failed without a response
+    (e.g. connection errors) are not recorded.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._region = None
+        self._lock = threading.Lock()
+
+        os.makedirs(path, exist_ok=True)
+        # a new recording replaces the cassette
+        open(os.path.join(path, INTERACTIONS_FILE), 'w').close()
+
+    def register(self, client):
+        with self._lock:
+            if self._region is None:
+                self._region = client.meta.region_name
+                with open(os.path.join(self.path, META_FILE), 'w') as file:
+                    json.dump({'region': self._region}, file)
+
+        events = client.meta.events
+        events.register_first('before-parameter-build.*.*', self._before_parameter_build)
+        events.register('after-call', self._after_call)
+
+    def _before_parameter_build(self, params, model, context, **kwargs):
+        context[_CONTEXT_KEY] = (loads(dumps(params)), get_clock().now())
+
+    def _after_call(self, http_response, parsed, model, context, **kwargs):
+        params, started_at = context.pop(_CONTEXT_KEY, (None, None))
+        if started_at is None:
+            return
+
+        interaction = {
+            'service': model.service_model.service_name,
+            'operation': model.name,
+            'params': params,
+            'status': http_response.status_code,
+            'latency': get_clock().now() - started_at,
+            'response': parsed,
+        }
+        line = dumps(interaction)
+        with self._lock:
+            with open(os.path.join(self.path, INTERACTIONS_FILE), 'a') as file:
+                file.write(f'{line}\n')
+
+
+class CassetteReplayer:
+    """
+    Answers the AWS API calls of a run from a cassette recorded by CassetteRecorder, without sending any request.
+
+    A call gets the next unused response recorded for the same operation and parameters, in recorded order, so that
+    pollers see the recorded progress of a deployment. Once the responses of a call are used up, the last one is
+    repeated (e.g. while a waiter polls longer than during the recording). Calls with parameters that were not recorded
+    raise CassetteError, unless loose is set: then they get the next unused response of the operation. Each response is
+    delayed by its recorded latency times latency_scale.
+    """
+
+    def __init__(self, interactions, region=None, latency_scale=1.0, loose=False):
+        self.region = region
+        self.latency_scale = latency_scale
+        self.loose = loose
+        self._interactions = list(interactions)
+        self._by_request = {}
+        self._by_operation = {}
+        self._replayed = set()
+        self._last = {}
+        self._lock = threading.Lock()
+
+        for index, interaction in enumerate(self._interactions):
+            self._by_request.setdefault(self._request_key(interaction), deque()).append(index)
+            self._by_operation.setdefault(self._operation_key(interaction), deque()).append(index)
+
+    @classmethod
+    def load(cls, path, latency_scale=1.0, loose=False) -> 'CassetteReplayer':
+        try:
+            with open(os.path.join(path, META_FILE)) as file:
+                meta = json.load(file)
+            with open(os.path.join(path, INTERACTIONS_FILE)) as file:
+                interactions = [loads(line) for line in file if line.strip()]
+        except (OSError, ValueError) as e:
+            raise CassetteError(f'Cannot read cassette {path}: {e}')
+
+        return cls(interactions, region=meta.get('region'), latency_scale=latency_scale, loose=loose)
+
+    @staticmethod
+    def _operation_key(interaction):
+        return interaction['service'], interaction['operation']
+
+    @staticmethod
+    def _request_key(interaction):
+        return request_key(interaction['service'], interaction['operation'], interaction['params'])
+
+    def register(self, client):
+        events = client.meta.events
+        events.register_first('before-parameter-build.*.*', self._before_parameter_build)
+        # the other instrumentation (statistics, tracing) stamps its start times before the response is served
+        events.register_last('before-call.*.*', self._before_call)
+
+    def _before_parameter_build(self, params, model, context, **kwargs):
+        context[_CONTEXT_KEY] = loads(dumps(params))
+
+    def _next(self, queue):
+        while queue:
+            index = queue.popleft()
+            if index not in self._replayed:
+                self._replayed.add(index)
+                return self._interactions[index]
+        return None
+
+    def _take(self, service_name, operation_name, params):
+        key = request_key(service_name, operation_name, params)
+        with self._lock:
+            interaction = self._next(self._by_request.get(key)) or self._last.get(key)
+            if interaction is None and self.loose:
+                # e.g. parameters with timestamps or generated tokens, which differ from run to run
+                interaction = self._next(self._by_operation.get((service_name, operation_name)))
+            if interaction is None:
+                raise CassetteError(f'No recorded response for {operation_name} with {dumps(params)}')
+
+            self._last[key] = interaction
+            return interaction
+
+    def _before_call(self, model, context, **kwargs):
+        interaction = self._take(model.service_model.service_name, model.name, context.pop(_CONTEXT_KEY, {}))
+
+        if self.latency_scale:
+            get_clock().sleep(interaction['latency'] * self.latency_scale)
+
+        http_response = AWSResponse(None, interaction['status'], {}, None)
+        return http_response, loads(dumps(interaction['response']))
@@ -0,0 +1,197 @@
+import math
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from aws_deploy.common.tracing import in_current_span
+from aws_deploy.common.utils import operation_name
+
+# only reads may be sent twice, a duplicated write (e.g. RegisterTaskDefinition) would be applied twice
+READ_OPERATION_PREFIXES = ('Describe', 'Get', 'List')
+
+# a read is duplicated once it took longer than HEDGE_PERCENTILE of the last LATENCY_WINDOW successful calls of its
+# operation, as soon as MIN_SAMPLES calls were observed
+HEDGE_PERCENTILE = 0.95
+LATENCY_WINDOW = 100
+MIN_SAMPLES = 20
+
+# every call earns budget_ratio hedges, up to MAX_BUDGET (so that a long quiet phase cannot be followed by a burst)
+DEFAULT_BUDGET_RATIO = 0.1
+MAX_BUDGET = 10.0
+
+DEFAULT_MAX_WORKERS = 50
+
+
+def parse_hedged_operations(values):
+    """
+    Parses --hedge values like 'ecs:DescribeServices' or 'codedeploy:GetDeployment' into a set of operations. Raises
+    ValueError for invalid values and for operations that are not reads.
+    """
+    operations = set()
+    for value in values:
+        service_name, separator, operation = value.partition(':')
+        if not separator or not service_name or not operation:
+            raise ValueError(f'Invalid operation "{value}", expected SERVICE:OPERATION')
+        if not operation.startswith(READ_OPERATION_PREFIXES):
+            raise ValueError(f'Cannot hedge {value}, only reads ({", ".join(READ_OPERATION_PREFIXES)}) can be hedged')
+
+        operations.add(value)
+
+    return operations
+
+
+class LatencyWindow:
+    """
+    The latencies of the last size successful calls of an operation.
+    """
+
+    def __init__(self, size=LATENCY_WINDOW):
+        self._latencies = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._latencies)
+
+    def add(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def percentile(self, percentile) -> float:
+        with self._lock:
+            latencies = sorted(self._latencies)
+        return latencies[max(math.ceil(percentile * len(latencies)) - 1, 0)]
+
+
+class RequestHedging:
+    """
+    Sends a duplicate of a slow read and returns whichever of both answers first, to cut the tail latency of waiters.
+
+    operations are the reads to hedge ('ecs:DescribeServices'). A call of such a read is sent from a worker thread; if
+    it has not answered after the observed p95 latency of its operation (see HEDGE_PERCENTILE), a second request is
+    sent, and the first successful response is returned. The slower request is not cancelled, its response is dropped.
+    Hedges are paid from a budget that every call adds budget_ratio to, so hedging adds at most budget_ratio to the
+    load of the API. Latencies are measured and waited for in wall time.
+    """
+
+    def __init__(self, operations, budget_ratio=DEFAULT_BUDGET_RATIO, min_samples=MIN_SAMPLES,
+                 max_workers=DEFAULT_MAX_WORKERS):
+        self.operations = set(operations)
+        self.budget_ratio = budget_ratio
+        self.min_samples = min_samples
+        self.calls = Counter()
+        self.hedged_calls = Counter()
+        self.won_hedges = Counter()
+        self._latencies = {}
+        self._budget = 0.0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='aws-deploy-hedge')
+
+    def wrap(self, client) -> 'HedgedClient':
+        return HedgedClient(client, self)
+
+    def is_hedged(self, service_name, operation) -> bool:
+        return f'{service_name}:{operation}' in self.operations
+
+    def latencies(self, key) -> LatencyWindow:
+        with self._lock:
+            if key not in self._latencies:
+                self._latencies[key] = LatencyWindow()
+            return self._latencies[key]
+
+    def hedge_delay(self, key):
+        """
+        Returns the seconds after which a call is hedged, or None while too few calls were observed.
+        """
+        latencies = self.latencies(key)
+        if len(latencies) < self.min_samples:
+            return None
+        return latencies.percentile(HEDGE_PERCENTILE)
+
+    def _deposit(self, key):
+        with self._lock:
+            self.calls[key] += 1
+            self._budget = min(MAX_BUDGET, self._budget + self.budget_ratio)
+
+    def _withdraw(self) -> bool:
+        with self._lock:
+            if self._budget < 1:
+                return False
+            self._budget -= 1
+            return True
+
+    def _submit(self, key, method, kwargs):
+        started_at = time.monotonic()
+        future = self._executor.submit(in_current_span(method), **kwargs)
+
+        def record(done):
+            if not done.cancelled() and done.exception() is None:
+                self.latencies(key).add(time.monotonic() - started_at)
+
+        future.add_done_callback(record)
+        return future
+
+    def call(self, service_name, operation, method, kwargs):
+        key = f'{service_name}:{operation}'
+        self._deposit(key)
+
+        delay = self.hedge_delay(key)
+        if delay is None:
+            started_at = time.monotonic()
+            result = method(**kwargs)
+            self.latencies(key).add(time.monotonic() - started_at)
+            return result
+
+        primary = self._submit(key, method, kwargs)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._withdraw():
+            return primary.result()
+
+        hedge = self._submit(key, method, kwargs)
+        with self._lock:
+            self.hedged_calls[key] += 1
+
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        with self._lock:
+                            self.won_hedges[key] += 1
+                    return future.result()
+
+        # both failed, the error of the original request is raised
+        return primary.result()
+
+    def report(self) -> str:
+        lines = [f'Hedged {sum(self.hedged_calls.values())} of {sum(self.calls.values())} calls']
+        for key in sorted(self.calls):
+            lines.append(
+                f'  {key}: {self.hedged_calls[key]} of {self.calls[key]} calls hedged, {self.won_hedges[key]} won'
+            )
+        return '\n'.join(lines)
+
+
+class HedgedClient:
+    """
+    A boto3 client whose hedged reads (see RequestHedging) are sent through the hedging, everything else is passed
+    through to the client.
+    """
+
+    def __init__(self, client, hedging: RequestHedging):
+        self._client = client
+        self._hedging = hedging
+
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name)
+
+        service_name = self._client.meta.service_model.service_name
+        operation = operation_name(name)
+        if not callable(attribute) or not self._hedging.is_hedged(service_name, operation):
+            return attribute
+
+        def call(**kwargs):
+            return self._hedging.call(service_name, operation, attribute, kwargs)
+
+        return call
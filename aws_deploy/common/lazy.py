@@ -0,0 +1,42 @@
+from importlib import import_module
+
+import click
+
+
+class LazyGroup(click.Group):
+    """
+    A click group whose subcommands are only imported when they are invoked.
+
+    lazy_commands maps every command name to the import path of the command ('package.module:attribute') and the short
+    help shown in the command list, so that neither listing the commands nor running one of them imports the others.
+    """
+
+    def __init__(self, *args, lazy_commands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in self.commands and cmd_name in self.lazy_commands:
+            import_path, _ = self.lazy_commands[cmd_name]
+            module_name, attribute = import_path.split(':')
+            self.add_command(getattr(import_module(module_name), attribute), cmd_name)
+
+        return super().get_command(ctx, cmd_name)
+
+    def format_commands(self, ctx, formatter):
+        rows = []
+        for cmd_name in self.list_commands(ctx):
+            if cmd_name in self.commands:
+                command = self.commands[cmd_name]
+                if getattr(command, 'hidden', False):
+                    continue
+                rows.append((cmd_name, command.short_help or ''))
+            else:
+                rows.append((cmd_name, self.lazy_commands[cmd_name][1]))
+
+        if rows:
+            with formatter.section('Commands'):
+                formatter.write_dl(rows)
@@ -0,0 +1,92 @@
+import functools
+import json
+import threading
+from collections import Counter
+from copy import deepcopy
+
+
+def _make_key(name, args, kwargs):
+    return name, json.dumps([args, kwargs], sort_keys=True, default=lambda value: vars(value))
+
+
+class RequestCache:
+    """
+    Remembers the results of read-only AWS calls during a single run.
+
+    Results are grouped by the resource they describe (e.g. 'task_definition'); every write to a resource drops all
+    remembered results of that resource. Results are copied on the way in and out, so callers may modify them freely.
+    Calls answered from the cache are counted per operation in saved_calls.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.saved_calls = Counter()
+
+    def call(self, resource, name, fn, args, kwargs):
+        key = _make_key(name, args, kwargs)
+
+        with self._lock:
+            entries = self._entries.get(resource, {})
+            if key in entries:
+                self.saved_calls[name] += 1
+                return deepcopy(entries[key])
+
+        result = fn(*args, **kwargs)
+
+        with self._lock:
+            self._entries.setdefault(resource, {})[key] = deepcopy(result)
+
+        return result
+
+    def invalidate(self, *resources):
+        with self._lock:
+            for resource in resources:
+                self._entries.pop(resource, None)
+
+    def report(self) -> str:
+        total = sum(self.saved_calls.values())
+        operations = ', '.join(f'{name}: {count}' for name, count in sorted(self.saved_calls.items()))
+
+        return f'Saved {total} API calls' + (f' ({operations})' if operations else '')
+
+
+def memoized(resource):
+    """
+    Answers repeated calls of a client method with the same arguments from the client's request_cache, if it has one.
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            request_cache = getattr(self, 'request_cache', None)
+            if request_cache is None:
+                return fn(self, *args, **kwargs)
+
+            return request_cache.call(
+                resource, fn.__qualname__, lambda *a, **kw: fn(self, *a, **kw), args, kwargs
+            )
+
+        return wrapper
+
+    return decorator
+
+
+def invalidates(*resources):
+    """
+    Drops the remembered results of the given resources after every call of a writing client method.
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return fn(self, *args, **kwargs)
+            finally:
+                request_cache = getattr(self, 'request_cache', None)
+                if request_cache is not None:
+                    request_cache.invalidate(*resources)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,145 @@
+import asyncio
+import random
+import time
+from datetime import datetime
+
+from dateutil.tz import tzlocal
+
+from botocore.exceptions import ClientError
+
+DEFAULT_SLEEP_TIME = 1
+DEFAULT_MAX_SLEEP_TIME = 10
+DEFAULT_BACKOFF_FACTOR = 1.5
+DEFAULT_JITTER = 0.25
+
+THROTTLING_ERROR_CODES = {
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestThrottled',
+    'RequestThrottledException',
+    'RequestLimitExceeded',
+    'TooManyRequestsException',
+}
+
+
+def is_throttling_error(error) -> bool:
+    if not isinstance(error, ClientError):
+        return False
+
+    return error.response.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES
+
+
+class Clock:
+    def now(self) -> float:
+        return time.monotonic()
+
+    def datetime(self) -> datetime:
+        return datetime.now(tz=tzlocal())
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+    async def sleep_async(self, seconds: float):
+        await asyncio.sleep(seconds)
+
+
+_clock = Clock()
+
+
+def get_clock() -> Clock:
+    return _clock
+
+
+def set_clock(clock: Clock) -> Clock:
+    global _clock
+
+    previous_clock, _clock = _clock, clock
+    return previous_clock
+
+
+class PollScheduler:
+    """
+    Decides how long a waiter sleeps between two polls.
+
+    The delay starts at sleep_time and is reset every time the observed state changes. While the state stays the same
+    it grows by backoff_factor up to max_sleep_time. Every delay is spread by +/- jitter, so that many processes started
+    at the same time do not poll in lockstep.
+    """
+
+    def __init__(self, sleep_time=DEFAULT_SLEEP_TIME, max_sleep_time=DEFAULT_MAX_SLEEP_TIME,
+                 backoff_factor=DEFAULT_BACKOFF_FACTOR, jitter=DEFAULT_JITTER, clock: Clock = None, rng=None):
+        self.sleep_time = sleep_time
+        self.max_sleep_time = max(max_sleep_time, sleep_time)
+        self.backoff_factor = backoff_factor
+        self.jitter = jitter
+        self.clock = clock or get_clock()
+        self._rng = rng or random.Random()
+        self._delay = sleep_time
+        self._state = None
+        self._has_state = False
+
+    def deadline(self, timeout):
+        if timeout is None or timeout < 0:
+            return None
+
+        return self.clock.now() + timeout
+
+    def expired(self, deadline) -> bool:
+        return deadline is not None and self.clock.now() >= deadline
+
+    def next_delay(self, state) -> float:
+        if not self._has_state or state != self._state:
+            self._delay = self.sleep_time
+        else:
+            self._delay = min(self._delay * self.backoff_factor, self.max_sleep_time)
+
+        self._state = state
+        self._has_state = True
+
+        return self._jittered(self._delay)
+
+    def throttled(self) -> float:
+        self._delay = min(max(self._delay, self.sleep_time) * self.backoff_factor * 2, self.max_sleep_time)
+
+        return self._jittered(self._delay)
+
+    def wait(self, state, deadline=None):
+        self._sleep(self.next_delay(state), deadline)
+
+    async def wait_async(self, state, deadline=None):
+        delay = self._capped(self.next_delay(state), deadline)
+        if delay > 0:
+            await self.clock.sleep_async(delay)
+
+    async def wait_throttled_async(self, deadline=None):
+        delay = self._capped(self.throttled(), deadline)
+        if delay > 0:
+            await self.clock.sleep_async(delay)
+
+    def poll(self, fn, *args, deadline=None, **kwargs):
+        while True:
+            try:
+                return fn(*args, **kwargs)
+            except ClientError as e:
+                if not is_throttling_error(e) or self.expired(deadline):
+                    raise
+
+                self._sleep(self.throttled(), deadline)
+
+    def _jittered(self, delay) -> float:
+        if not self.jitter:
+            return delay
+
+        return delay * self._rng.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _capped(self, delay, deadline=None) -> float:
+        if deadline is not None:
+            delay = min(delay, max(deadline - self.clock.now(), 0))
+
+        return delay
+
+    def _sleep(self, delay, deadline=None):
+        delay = self._capped(delay, deadline)
+        if delay > 0:
+            self.clock.sleep(delay)
@@ -0,0 +1,138 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+
+DEFAULT_SAMPLE_INTERVAL = 0.005
+DEFAULT_TOP = 20
+
+
+def collapsed_stacks_path(path) -> str:
+    """
+    Returns the path of the collapsed stacks written next to a profile, e.g. 'out.collapsed' for 'out.pstats'.
+    """
+    return f'{os.path.splitext(path)[0]}.collapsed'
+
+
+def frame_name(code) -> str:
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f'{module}:{code.co_name}:{code.co_firstlineno}'
+
+
+class StackSampler:
+    """
+    Samples the stacks of all other threads every interval seconds and counts them in the collapsed stack format
+    ('root;caller;callee count' per line) of flamegraph.pl, speedscope and inferno.
+
+    cProfile only records caller/callee pairs, which cannot be turned back into complete stacks, hence the sampling.
+    """
+
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == threading.get_ident():
+                continue
+
+            names = []
+            while frame is not None:
+                names.append(frame_name(frame.f_code))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+
+    def write(self, path):
+        with open(path, 'w') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f'{stack} {count}\n')
+
+
+class CpuProfile:
+    """
+    Profiles a run with cProfile and writes the statistics to path (for pstats, snakeviz, gprof2dot) and the sampled
+    stacks to collapsed_stacks_path(path) (for flame graphs). cProfile only sees the main thread, the sampled stacks
+    include the worker threads of parallel deployments and watches, too.
+    """
+
+    def __init__(self, path, top=DEFAULT_TOP, sample_interval=DEFAULT_SAMPLE_INTERVAL):
+        self.path = path
+        self.top = top
+        self._profile = cProfile.Profile()
+        self._sampler = StackSampler(sample_interval)
+
+    def start(self):
+        self._profile.enable()
+        self._sampler.start()
+
+    def stop(self) -> str:
+        self._sampler.stop()
+        self._profile.disable()
+
+        self._profile.dump_stats(self.path)
+        self._sampler.write(collapsed_stacks_path(self.path))
+
+        return self.report()
+
+    def report(self) -> str:
+        output = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=output)
+        stats.sort_stats('cumulative').print_stats(self.top)
+
+        return (
+            f'CPU profile written to {self.path}, collapsed stacks to {collapsed_stacks_path(self.path)}\n'
+            f'{output.getvalue().strip()}'
+        )
+
+
+class MemoryProfile:
+    """
+    Traces the allocations of a run with tracemalloc and reports the lines that allocated most of the memory still held
+    at the end of the run and the peak of the traced memory.
+    """
+
+    def __init__(self, top=DEFAULT_TOP):
+        self.top = top
+        self._snapshot = None
+        self._peak = 0
+
+    def start(self):
+        tracemalloc.start()
+
+    def stop(self) -> str:
+        self._snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        self._peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        return self.report()
+
+    def report(self) -> str:
+        lines = [f'Memory profile: peak {self._peak / 1024 / 1024:.1f} MB, top {self.top} allocations']
+        for statistic in self._snapshot.statistics('lineno')[:self.top]:
+            frame = statistic.traceback[0]
+            lines.append(
+                f'{statistic.size / 1024:10.1f} KB {statistic.count:8} blocks  {frame.filename}:{frame.lineno}'
+            )
+
+        return '\n'.join(lines)
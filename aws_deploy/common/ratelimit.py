@@ -0,0 +1,165 @@
+import threading
+
+from aws_deploy.common.polling import THROTTLING_ERROR_CODES, get_clock
+
+# requests per second and burst of an operation, unless configured otherwise
+DEFAULT_RATE = 20.0
+DEFAULT_BURST = 40.0
+
+# a throttled operation halves its rate, down to MIN_RATE, and regains INCREASE_FACTOR of its configured rate per
+# second of successful calls, like TCP congestion control (additive increase, multiplicative decrease)
+DECREASE_FACTOR = 0.5
+INCREASE_FACTOR = 0.05
+MIN_RATE = 0.5
+# throttles of calls sent before the last decrease do not decrease the rate again
+DECREASE_INTERVAL = 1.0
+
+
+def parse_rate_limits(values):
+    """
+    Parses --rate-limit values like 'ecs=10', 'ecs:DescribeServices=5/10' or 'codedeploy:GetDeployment=2/2' into a
+    dict of (rate, burst) per service or operation. Raises ValueError for invalid values.
+    """
+    rate_limits = {}
+    for value in values:
+        key, separator, limit = value.partition('=')
+        rate, _, burst = limit.partition('/')
+        try:
+            rate = float(rate)
+            burst = float(burst) if burst else max(rate, 1.0)
+        except ValueError:
+            rate = burst = 0
+
+        if not separator or not key or rate <= 0 or burst < 1:
+            raise ValueError(f'Invalid rate limit "{value}", expected SERVICE[:OPERATION]=RATE[/BURST]')
+
+        rate_limits[key] = (rate, burst)
+
+    return rate_limits
+
+
+class AdaptiveTokenBucket:
+    """
+    Lets rate requests per second through, with bursts of up to burst requests. A request that finds the bucket empty
+    reserves the next token and waits for it, so that waiting requests are let through in order.
+    """
+
+    def __init__(self, rate, burst, clock=None):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.throttles = 0
+        self.waited = 0.0
+        self._clock = clock
+        self._tokens = burst
+        self._updated_at = None
+        self._decreased_at = None
+        self._increased_at = None
+        self._lock = threading.Lock()
+
+    def _now(self) -> float:
+        return (self._clock or get_clock()).now()
+
+    def _refill(self, now):
+        if self._updated_at is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def acquire(self) -> float:
+        """
+        Takes a token, waiting for it if necessary. Returns the seconds waited.
+        """
+        with self._lock:
+            self._refill(self._now())
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.waited += wait
+
+        if wait:
+            (self._clock or get_clock()).sleep(wait)
+        return wait
+
+    def throttled(self):
+        with self._lock:
+            self.throttles += 1
+            now = self._now()
+            if self._decreased_at is not None and now - self._decreased_at < DECREASE_INTERVAL:
+                return
+
+            self._refill(now)
+            self.rate = max(MIN_RATE, self.rate * DECREASE_FACTOR)
+            # no burst until the rate recovered
+            self._tokens = min(self._tokens, 0)
+            self._decreased_at = now
+
+    def succeeded(self):
+        with self._lock:
+            now = self._now()
+            if self.rate < self.max_rate:
+                self._refill(now)
+                elapsed = now - max(self._decreased_at, self._increased_at or self._decreased_at)
+                self.rate = min(self.max_rate, self.rate + self.max_rate * INCREASE_FACTOR * elapsed)
+            self._increased_at = now
+
+
+class RateLimiter:
+    """
+    Limits the AWS API requests of all clients of a run with one AdaptiveTokenBucket per service and operation.
+
+    rate_limits maps operations ('ecs:DescribeServices') or services ('ecs') to (rate, burst), other operations get
+    DEFAULT_RATE and DEFAULT_BURST. register() hooks a client (like aws_deploy.common.stats.ApiStats): every attempt of
+    a request, including the retries of botocore, takes a token before it is sent (before-send), throttling errors slow
+    the operation down (needs-retry) and successful calls speed it up again (after-call). Requests over the limit queue
+    in the process instead of failing with a ThrottlingException.
+    """
+
+    def __init__(self, rate_limits=None, clock=None):
+        self.rate_limits = dict(rate_limits or {})
+        self._clock = clock
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, service_name, operation_name) -> AdaptiveTokenBucket:
+        key = f'{service_name}:{operation_name}'
+        with self._lock:
+            if key not in self._buckets:
+                rate, burst = self.rate_limits.get(
+                    key, self.rate_limits.get(service_name, (DEFAULT_RATE, DEFAULT_BURST))
+                )
+                self._buckets[key] = AdaptiveTokenBucket(rate, burst, clock=self._clock)
+            return self._buckets[key]
+
+    @property
+    def buckets(self):
+        with self._lock:
+            return dict(sorted(self._buckets.items()))
+
+    def register(self, client):
+        service_name = client.meta.service_model.service_name
+        events = client.meta.events
+
+        def before_send(event_name, **kwargs):
+            # before-send.<service id>.<operation>
+            self.bucket(service_name, event_name.rsplit('.', 1)[-1]).acquire()
+
+        events.register('before-send', before_send)
+        # the retry handler returns the delay of the next attempt, which stops the event, so this has to run first
+        events.register_first('needs-retry', self._needs_retry)
+        events.register('after-call', self._after_call)
+
+    @staticmethod
+    def _model_key(model):
+        return model.service_model.service_name, model.name
+
+    def _needs_retry(self, response=None, operation=None, **kwargs):
+        if not response or operation is None:
+            return None
+
+        if ((response[1] or {}).get('Error') or {}).get('Code') in THROTTLING_ERROR_CODES:
+            self.bucket(*self._model_key(operation)).throttled()
+
+        return None
+
+    def _after_call(self, http_response, model, **kwargs):
+        if http_response is not None and http_response.status_code < 300:
+            self.bucket(*self._model_key(model)).succeeded()
@@ -0,0 +1,124 @@
+import threading
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # pragma: no cover
+    from boto3.session import Session
+    from botocore.config import Config
+
+# botocore keeps max_pool_connections HTTPS connections per client; parallel deployments, watches and DescribeTasks
+# chunks need more than its default of 10 to reuse connections instead of opening new TLS sessions
+DEFAULT_MAX_POOL_CONNECTIONS = 25
+
+# the adaptive retry mode of botocore retries throttled requests with backoff and slows each client down on throttling,
+# with more attempts than its default of 3, so that requests of large parallel deployments rather wait than fail
+RETRY_MODE = 'adaptive'
+DEFAULT_MAX_ATTEMPTS = 10
+
+
+class ClientFactory:
+    """
+    Creates the boto3 clients of a run from one shared session.
+
+    The session, and with it the credential resolution, is created on first use, and so is every client. Each service
+    gets exactly one client, which is shared by all callers and threads (boto3 clients are thread-safe, sessions are
+    not, hence the lock). All clients use a connection pool of max_pool_connections connections with TCP keep-alive.
+
+    Instrumentation (e.g. aws_deploy.common.stats.ApiStats) is anything with a register(client) method, which is called
+    for every client of the factory, to hook into the client's botocore events.
+    """
+
+    def __init__(self, aws_access_key_id=None, aws_secret_access_key=None, aws_session_token=None, region_name=None,
+                 profile_name=None, max_pool_connections=DEFAULT_MAX_POOL_CONNECTIONS, tcp_keepalive=True):
+        self._session_options = dict(
+            aws_access_key_id=aws_access_key_id,
+            aws_secret_access_key=aws_secret_access_key,
+            aws_session_token=aws_session_token,
+            region_name=region_name,
+            profile_name=profile_name
+        )
+        self.max_pool_connections = max_pool_connections
+        self.tcp_keepalive = tcp_keepalive
+        self._session = None
+        self._caller_identity = None
+        self._clients = {}
+        self._instrumentation = []
+        self._lock = threading.RLock()
+
+    @property
+    def session(self) -> 'Session':
+        # boto3 is imported with the first client, it takes longer to import than the rest of the CLI
+        from boto3.session import Session
+
+        with self._lock:
+            if self._session is None:
+                self._session = Session(**self._session_options)
+            return self._session
+
+    @property
+    def config(self) -> 'Config':
+        from botocore.config import Config
+
+        options = dict(
+            max_pool_connections=self.max_pool_connections,
+            retries={'mode': RETRY_MODE, 'max_attempts': DEFAULT_MAX_ATTEMPTS}
+        )
+        if 'tcp_keepalive' in Config.OPTION_DEFAULTS:
+            options['tcp_keepalive'] = self.tcp_keepalive
+
+        return Config(**options)
+
+    def _create_client(self, service_name):
+        return self.session.client(service_name, config=self.config)
+
+    def client(self, service_name):
+        with self._lock:
+            if service_name not in self._clients:
+                client = self._create_client(service_name)
+                for instrumentation in self._instrumentation:
+                    instrumentation.register(client)
+                self._clients[service_name] = client
+            return self._clients[service_name]
+
+    @property
+    def caller_identity(self):
+        """
+        The GetCallerIdentity response (account and ARN) of the credentials, requested once.
+        """
+        with self._lock:
+            if self._caller_identity is None:
+                self._caller_identity = self.client('sts').get_caller_identity()
+            return self._caller_identity
+
+    def instrument(self, instrumentation):
+        """
+        Registers instrumentation with the clients created so far and with every client created from now on.
+        """
+        with self._lock:
+            if any(registered is instrumentation for registered in self._instrumentation):
+                return
+
+            self._instrumentation.append(instrumentation)
+            for client in self._clients.values():
+                instrumentation.register(client)
+
+    @property
+    def created_clients(self):
+        return list(self._clients)
+
+
+def get_client_factory(ctx) -> ClientFactory:
+    if ctx.obj.get('CLIENT_FACTORY') is None:
+        ctx.obj['CLIENT_FACTORY'] = ClientFactory(
+            aws_access_key_id=ctx.obj['AWS_ACCESS_KEY_ID'],
+            aws_secret_access_key=ctx.obj['AWS_SECRET_ACCESS_KEY'],
+            aws_session_token=ctx.obj['AWS_SESSION_TOKEN'],
+            region_name=ctx.obj['AWS_REGION'],
+            profile_name=ctx.obj['AWS_PROFILE'],
+            max_pool_connections=ctx.obj.get('MAX_POOL_CONNECTIONS') or DEFAULT_MAX_POOL_CONNECTIONS
+        )
+
+    # the root command collects the instrumentation before any subcommand creates (or is given) a client factory
+    for instrumentation in ctx.obj.get('INSTRUMENTATION') or ():
+        ctx.obj['CLIENT_FACTORY'].instrument(instrumentation)
+
+    return ctx.obj['CLIENT_FACTORY']
@@ -0,0 +1,207 @@
+import json
+import threading
+from collections import Counter
+
+from aws_deploy.common.polling import THROTTLING_ERROR_CODES, get_clock
+
+# upper bounds (in milliseconds) of the latency histogram buckets, the last bucket takes everything slower
+LATENCY_BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+STATS_FORMAT_TABLE = 'table'
+STATS_FORMAT_JSON = 'json'
+STATS_FORMATS = (STATS_FORMAT_TABLE, STATS_FORMAT_JSON)
+
+_CONTEXT_KEY = 'api_stats'
+
+
+def operation_key(model):
+    return model.service_model.service_name, model.name
+
+
+class OperationStats:
+    """
+    Counters and the latency histogram of one API operation. A call is counted once, however often it was retried.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.throttles = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.calls_per_second = Counter()
+
+    def record(self, started_at, latency, error=False, retries=0):
+        self.calls += 1
+        self.errors += int(error)
+        self.retries += retries
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        self.calls_per_second[int(started_at)] += 1
+
+        latency_ms = latency * 1000
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if latency_ms <= bound:
+                self.histogram[index] += 1
+                break
+        else:
+            self.histogram[-1] += 1
+
+    @property
+    def mean_latency(self) -> float:
+        return self.total_latency / self.calls if self.calls else 0.0
+
+    @property
+    def peak_rate(self) -> int:
+        """
+        The highest number of calls started within the same second, to compare with the rate limit of the operation.
+        """
+        return max(self.calls_per_second.values(), default=0)
+
+    def percentile(self, percentile) -> float:
+        """
+        Estimates a latency percentile (in seconds) as the upper bound of the histogram bucket it falls into.
+        """
+        if not self.calls:
+            return 0.0
+
+        rank = percentile / 100 * self.calls
+        seen = 0
+        for index, count in enumerate(self.histogram):
+            seen += count
+            if seen >= rank:
+                return LATENCY_BUCKETS[index] / 1000 if index < len(LATENCY_BUCKETS) else self.max_latency
+        return self.max_latency
+
+    def to_dict(self):
+        buckets = [f'<={bound}ms' for bound in LATENCY_BUCKETS] + [f'>{LATENCY_BUCKETS[-1]}ms']
+
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'retries': self.retries,
+            'throttles': self.throttles,
+            'peak_calls_per_second': self.peak_rate,
+            'latency': {
+                'mean': round(self.mean_latency, 4),
+                'p50': round(self.percentile(50), 4),
+                'p95': round(self.percentile(95), 4),
+                'max': round(self.max_latency, 4),
+                'histogram': dict(zip(buckets, self.histogram)),
+            },
+        }
+
+
+class ApiStats:
+    """
+    Records every AWS API call of a run, per service and operation, through botocore's event hooks.
+
+    register() hooks a client: before-call stamps the start time into the request context, after-call (or
+    after-call-error, if the request raised) records the latency, the error and the retries of the call, and needs-retry
+    counts every attempt that was throttled, including the ones a retry later made up for. Latencies are measured with
+    the polling clock (see aws_deploy.common.polling.get_clock), so that they follow the simulator's virtual time.
+    """
+
+    def __init__(self, clock=None):
+        self._clock = clock
+        self._operations = {}
+        self._lock = threading.Lock()
+
+    def register(self, client):
+        events = client.meta.events
+        # before-call stops at the first handler with a response (e.g. a Stubber), the start has to be stamped before
+        events.register_first('before-call.*.*', self._before_call)
+        events.register('after-call', self._after_call)
+        events.register('after-call-error', self._after_call_error)
+        # the retry handler returns the delay of the next attempt, which stops the event, so this has to run first
+        events.register_first('needs-retry', self._needs_retry)
+
+    def operation(self, service_name, operation_name) -> OperationStats:
+        with self._lock:
+            key = (service_name, operation_name)
+            if key not in self._operations:
+                self._operations[key] = OperationStats()
+            return self._operations[key]
+
+    @property
+    def operations(self):
+        with self._lock:
+            return dict(sorted(self._operations.items()))
+
+    @property
+    def total_calls(self) -> int:
+        return sum(stats.calls for stats in self.operations.values())
+
+    def _now(self) -> float:
+        return (self._clock or get_clock()).now()
+
+    def _before_call(self, model, context, **kwargs):
+        context[_CONTEXT_KEY] = (model, self._now())
+        # the operation is created before the call, so that it is listed even if the call never finishes
+        self.operation(*operation_key(model))
+
+    def _finish(self, context, error, retries):
+        model, started_at = context.pop(_CONTEXT_KEY, (None, None))
+        if model is None:
+            return
+
+        stats = self.operation(*operation_key(model))
+        with self._lock:
+            stats.record(started_at, self._now() - started_at, error=error, retries=retries)
+
+    def _after_call(self, http_response, parsed, context, **kwargs):
+        parsed = parsed or {}
+        if http_response is not None:
+            error = http_response.status_code >= 300
+        else:
+            error = bool(parsed.get('Error'))
+
+        self._finish(context, error, (parsed.get('ResponseMetadata') or {}).get('RetryAttempts') or 0)
+
+    def _after_call_error(self, context, **kwargs):
+        self._finish(context, True, 0)
+
+    def _needs_retry(self, response=None, operation=None, attempts=None, **kwargs):
+        if not response or operation is None:
+            return None
+
+        error_code = ((response[1] or {}).get('Error') or {}).get('Code')
+        if error_code in THROTTLING_ERROR_CODES:
+            stats = self.operation(*operation_key(operation))
+            with self._lock:
+                stats.throttles += 1
+
+        return None
+
+    def to_dict(self):
+        return {
+            f'{service_name}:{operation_name}': stats.to_dict()
+            for (service_name, operation_name), stats in self.operations.items()
+        }
+
+    def report(self, output_format=STATS_FORMAT_TABLE) -> str:
+        if output_format == STATS_FORMAT_JSON:
+            return json.dumps(self.to_dict(), indent=2)
+
+        header = ('operation', 'calls', 'errors', 'retries', 'throttles', 'peak/s', 'mean', 'p50', 'p95', 'max')
+        rows = [
+            (
+                f'{service_name}:{operation_name}', str(stats.calls), str(stats.errors), str(stats.retries),
+                str(stats.throttles), str(stats.peak_rate), f'{stats.mean_latency * 1000:.0f}ms',
+                f'{stats.percentile(50) * 1000:.0f}ms', f'{stats.percentile(95) * 1000:.0f}ms',
+                f'{stats.max_latency * 1000:.0f}ms'
+            )
+            for (service_name, operation_name), stats in self.operations.items()
+        ]
+        rows.append(('total', str(self.total_calls), '', '', '', '', '', '', '', ''))
+
+        widths = [max(len(row[column]) for row in [header] + rows) for column in range(len(header))]
+        lines = [
+            '  '.join(value.ljust(width) if column == 0 else value.rjust(width)
+                      for column, (value, width) in enumerate(zip(row, widths)))
+            for row in [header] + rows
+        ]
+
+        return 'API calls\n' + '\n'.join(lines)
@@ -0,0 +1,200 @@
+import contextvars
+import json
+import os
+import threading
+from contextlib import nullcontext
+
+from aws_deploy.common.polling import get_clock
+
+CATEGORY_PHASE = 'phase'
+CATEGORY_API = 'aws'
+CATEGORY_FLOW = 'flow'
+
+_CONTEXT_KEY = 'trace_span'
+
+# the innermost open span of the current thread, or of the thread that handed its work to the current one
+_current_span = contextvars.ContextVar('trace_span', default=None)
+
+
+class Span:
+    """
+    A timed step of a run, used as a context manager. Spans opened within a span become its children, also in the worker
+    threads of functions wrapped with in_current_span.
+    """
+
+    def __init__(self, tracer: 'Tracer', name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.started_at = None
+        self.parent = None
+        self.thread = None
+        self._token = None
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        self.thread = threading.current_thread()
+        self._token = _current_span.set(self)
+        self.started_at = self.tracer.now()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.tracer.record(
+            self.name, self.category, self.started_at, self.tracer.now(), self.args, parent=self.parent
+        )
+        return False
+
+
+class NullTracer:
+    """
+    The tracer of runs without --trace-file: its spans record nothing.
+    """
+
+    enabled = False
+
+    def span(self, name, category=CATEGORY_PHASE, **args):
+        return nullcontext()
+
+
+class Tracer:
+    """
+    Records the spans of a run and the AWS API calls made within them as a Chrome trace, which can be opened with
+    chrome://tracing or https://ui.perfetto.dev.
+
+    Every span becomes a complete event of the thread it ran in, the viewers nest the events of a thread by their
+    timestamps. A span whose parent ran in another thread (see in_current_span) is linked to it by a flow event, drawn
+    as an arrow from the parent. register() hooks a client (like aws_deploy.common.stats.ApiStats), so that each API
+    call becomes a span, too. Timestamps are taken from the polling clock, so that traces of simulated runs show virtual
+    time.
+    """
+
+    enabled = True
+
+    def __init__(self, clock=None):
+        self._clock = clock
+        self._started_at = self.now()
+        self._events = []
+        self._threads = {}
+        self._flows = 0
+        self._lock = threading.Lock()
+
+    def now(self) -> float:
+        return (self._clock or get_clock()).now()
+
+    def span(self, name, category=CATEGORY_PHASE, **args) -> Span:
+        return Span(self, name, category, args)
+
+    def _thread_id(self, thread=None) -> int:
+        thread = thread or threading.current_thread()
+        if thread.ident not in self._threads:
+            self._threads[thread.ident] = (len(self._threads) + 1, thread.name)
+        return self._threads[thread.ident][0]
+
+    def _timestamp(self, value) -> float:
+        return round((value - self._started_at) * 1e6, 3)
+
+    def record(self, name, category, started_at, finished_at, args=None, parent: Span = None):
+        with self._lock:
+            tid = self._thread_id()
+            self._events.append({
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': self._timestamp(started_at),
+                'dur': round((finished_at - started_at) * 1e6, 3),
+                'pid': os.getpid(),
+                'tid': tid,
+                'args': args or {},
+            })
+
+            if parent is not None and parent.thread is not threading.current_thread():
+                self._flows += 1
+                flow = {'name': name, 'cat': CATEGORY_FLOW, 'id': self._flows, 'ts': self._timestamp(started_at),
+                        'pid': os.getpid()}
+                self._events.append(dict(flow, ph='s', tid=self._thread_id(parent.thread)))
+                self._events.append(dict(flow, ph='f', bp='e', tid=tid))
+
+    @property
+    def events(self):
+        with self._lock:
+            return list(self._events)
+
+    def register(self, client):
+        events = client.meta.events
+        events.register_first('before-call.*.*', self._before_call)
+        events.register('after-call', self._after_call)
+        events.register('after-call-error', self._after_call_error)
+
+    def _before_call(self, model, context, **kwargs):
+        context[_CONTEXT_KEY] = (f'{model.service_model.service_name}:{model.name}', self.now(), _current_span.get())
+
+    def _finish(self, context, args):
+        name, started_at, parent = context.pop(_CONTEXT_KEY, (None, None, None))
+        if name is not None:
+            self.record(name, CATEGORY_API, started_at, self.now(), args, parent=parent)
+
+    def _after_call(self, http_response, parsed, context, **kwargs):
+        metadata = (parsed or {}).get('ResponseMetadata') or {}
+        args = {'retries': metadata.get('RetryAttempts') or 0}
+        if http_response is not None:
+            args['status'] = http_response.status_code
+        if (parsed or {}).get('Error'):
+            args['error'] = parsed['Error'].get('Code')
+
+        self._finish(context, args)
+
+    def _after_call_error(self, context, exception=None, **kwargs):
+        self._finish(context, {'error': type(exception).__name__})
+
+    def to_dict(self):
+        with self._lock:
+            threads = [
+                {'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': name}}
+                for tid, name in self._threads.values()
+            ]
+            events = sorted(self._events, key=lambda event: (event['ts'], -event.get('dur', 0)))
+
+        return {'traceEvents': threads + events, 'displayTimeUnit': 'ms'}
+
+    def write(self, path):
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file)
+
+
+_tracer = NullTracer()
+
+
+def get_tracer():
+    return _tracer
+
+
+def set_tracer(tracer):
+    global _tracer
+
+    previous_tracer, _tracer = _tracer, tracer
+    return previous_tracer
+
+
+def span(name, category=CATEGORY_PHASE, **args):
+    """
+    Opens a span of the current tracer, e.g. `with span('update service', service=name):`.
+    """
+    return get_tracer().span(name, category, **args)
+
+
+def in_current_span(fn):
+    """
+    Wraps fn to run in a copy of the current context, so that the spans and API calls of fn become children of the
+    current span even when it runs in a worker thread, e.g. `executor.map(in_current_span(deploy), services)`.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # a context can only be entered by one thread at a time
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
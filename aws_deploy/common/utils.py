@@ -0,0 +1,24 @@
+import re
+
+FIRST_CAP_REGEX = re.compile(r'(?:^|_)([a-z])')
+
+
+def strtobool(value) -> bool:
+    """
+    Converts a string representation of truth to True or False, like the former distutils.util.strtobool.
+    """
+
+    value = value.lower()
+    if value in ('y', 'yes', 't', 'true', 'on', '1'):
+        return True
+    if value in ('n', 'no', 'f', 'false', 'off', '0'):
+        return False
+
+    raise ValueError(f'invalid truth value {value!r}')
+
+
+def operation_name(method_name) -> str:
+    """
+    Turns a boto3 method name into the name of its API operation, e.g. 'describe_services' into 'DescribeServices'.
+    """
+    return FIRST_CAP_REGEX.sub(lambda match: match.group(1).upper(), method_name)
@@ -1,20 +1,32 @@
-from datetime import datetime, timedelta
-from time import sleep
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatchcase
+from glob import has_magic
+from typing import Callable, List
 
 import click
 
+from aws_deploy.common.cache import get_task_definition_cache
+from aws_deploy.common.memoize import RequestCache
+from aws_deploy.common.polling import DEFAULT_MAX_SLEEP_TIME, PollScheduler
+from aws_deploy.common.session import DEFAULT_MAX_POOL_CONNECTIONS, get_client_factory
+from aws_deploy.common.tracing import in_current_span, span
 from aws_deploy.notification.slack import SlackNotification
-from .helper import EcsClient, TaskPlacementError
+from .helper import (
+    DEFAULT_MAX_TASK_FAILURES, DESCRIBE_SERVICES_MAX_SERVICES, DeployAction, EcsClient, EcsConnectionError,
+    EcsEventCursor, EcsService, EcsStoppedTaskMonitor, EcsTaskDefinition, TaskPlacementError, chunked
+)
+from .watcher import EcsDeploymentWatcher, WatchResult
 from ..notification.notification import Notification
 
+DEFAULT_MAX_PARALLEL = 10
+
 
 def get_ecs_client(ctx) -> EcsClient:
     return EcsClient(
-        aws_access_key_id=ctx.obj['AWS_ACCESS_KEY_ID'],
-        aws_secret_access_key=ctx.obj['AWS_SECRET_ACCESS_KEY'],
-        aws_session_token=ctx.obj['AWS_SESSION_TOKEN'],
-        region_name=ctx.obj['AWS_REGION'],
-        profile_name=ctx.obj['AWS_PROFILE']
+        client_factory=get_client_factory(ctx),
+        task_definition_cache=get_task_definition_cache(ctx),
+        request_cache=ctx.obj.get('REQUEST_CACHE'),
+        hedging=ctx.obj.get('HEDGING')
     )
 
 
@@ -38,10 +50,12 @@ def get_notification(ctx) -> Notification:
 @click.option('--slack-service-match', default='.*', required=False, envvar='SLACK_SERVICE_MATCH',
               help='A regular expression for defining, which services should be notified. (default: .* =all).')
 @click.option('--slack-username', required=False, envvar='SLACK_USERNAME', default='ECS Deploy', help='Slack username.')
+@click.option('--max-pool-connections', envvar='AWS_DEPLOY_MAX_POOL_CONNECTIONS', default=DEFAULT_MAX_POOL_CONNECTIONS,
+              type=int, show_default=True, help='Maximum number of kept-alive HTTPS connections per AWS service')
 @click.option('--debug/--no-debug', default=False)
 @click.pass_context
 def ecs_cli(ctx, aws_access_key_id, aws_secret_access_key, aws_session_token, aws_region, aws_profile, slack_url,
-            slack_service_match, slack_username, debug):
+            slack_service_match, slack_username, max_pool_connections, debug):
     ctx.ensure_object(dict)
 
     ctx.obj['AWS_ACCESS_KEY_ID'] = aws_access_key_id
@@ -49,6 +63,7 @@ def ecs_cli(ctx, aws_access_key_id, aws_secret_access_key, aws_session_token, aw
     ctx.obj['AWS_SESSION_TOKEN'] = aws_session_token
     ctx.obj['AWS_REGION'] = aws_region
     ctx.obj['AWS_PROFILE'] = aws_profile
+    ctx.obj['MAX_POOL_CONNECTIONS'] = max_pool_connections
 
     ctx.obj['SLACK_URL'] = slack_url
     ctx.obj['SLACK_SERVICE_MATCH'] = slack_service_match
@@ -56,33 +71,50 @@ def ecs_cli(ctx, aws_access_key_id, aws_secret_access_key, aws_session_token, aw
 
     ctx.obj['DEBUG'] = debug
 
+    ctx.obj['REQUEST_CACHE'] = RequestCache()
+    if debug:
+        ctx.call_on_close(lambda: click.secho(ctx.obj['REQUEST_CACHE'].report(), err=True))
+
 
-def wait_for_finish(action, timeout, title, success_message, failure_message, ignore_warnings, sleep_time=1):
+def wait_for_finish(action, timeout, title, success_message, failure_message, ignore_warnings, sleep_time=1,
+                    max_sleep_time=DEFAULT_MAX_SLEEP_TIME, max_task_failures=DEFAULT_MAX_TASK_FAILURES):
     click.secho(title, nl=False)
-    waiting_timeout = datetime.now() + timedelta(seconds=timeout)
+    scheduler = PollScheduler(sleep_time=sleep_time, max_sleep_time=max_sleep_time)
+    waiting_timeout = scheduler.deadline(timeout)
     service = action.get_service()
     inspected_until = None
+    event_cursor = EcsEventCursor(since=service.deployment_created_at)
+    task_definition_arn = action.service.task_definition if action.service else None
+    task_monitor = None
+    if max_task_failures and task_definition_arn:
+        task_monitor = EcsStoppedTaskMonitor(action.client, action.cluster_name, task_definition_arn, max_task_failures)
 
     if timeout == -1:
         waiting = False
     else:
         waiting = True
 
-    while waiting and datetime.now() < waiting_timeout:
+    while waiting and not scheduler.expired(waiting_timeout):
         click.secho('.', nl=False)
-        service = action.get_service()
-        inspected_until = inspect_errors(
-            service=service,
-            failure_message=failure_message,
-            ignore_warnings=ignore_warnings,
-            since=inspected_until,
-            timeout=False
-        )
-        waiting = not action.is_deployed(service)
+        with span('poll', service=action.service_name):
+            service = scheduler.poll(action.get_service, deadline=waiting_timeout)
+            inspected_until = inspect_errors(
+                service=service,
+                failure_message=failure_message,
+                ignore_warnings=ignore_warnings,
+                since=inspected_until,
+                timeout=False,
+                events=event_cursor.new_events(service)
+            )
+            inspect_rollout(service, task_definition_arn, failure_message)
+            if task_monitor:
+                inspect_stopped_tasks(service, task_monitor, failure_message)
+            waiting = not action.is_deployed(service)
 
         if waiting:
-            sleep(sleep_time)
+            scheduler.wait(service.progress, deadline=waiting_timeout)
 
+    # the final report lists all errors of the deployment, including the older ones seen by earlier polls
     inspect_errors(
         service=service,
         failure_message=failure_message,
@@ -95,42 +127,62 @@ def wait_for_finish(action, timeout, title, success_message, failure_message, ig
 
 
 def deploy_task_definition(deployment, task_definition, title, success_message, failure_message, timeout, deregister,
-                           previous_task_definition, ignore_warnings, sleep_time):
+                           previous_task_definition, ignore_warnings, sleep_time,
+                           max_sleep_time=DEFAULT_MAX_SLEEP_TIME, max_task_failures=DEFAULT_MAX_TASK_FAILURES,
+                           force_new_deployment=False):
     click.secho('Updating service')
 
-    deployment.deploy(task_definition)
+    # a service already running the task definition is only redeployed, if a new deployment is forced
+    force_new_deployment = force_new_deployment and deployment.service.task_definition == task_definition.arn
+    with span('update service', service=deployment.service_name, task_definition=task_definition.family_revision):
+        deployment.deploy(task_definition, force_new_deployment=force_new_deployment)
 
-    click.secho(
-        f'Successfully changed task definition to: {task_definition.family}:{task_definition.revision}', fg='green'
-    )
+    if force_new_deployment:
+        click.secho(f'Successfully forced a new deployment of: {task_definition.family_revision}', fg='green')
+    else:
+        click.secho(
+            f'Successfully changed task definition to: {task_definition.family}:{task_definition.revision}', fg='green'
+        )
 
-    wait_for_finish(
-        action=deployment,
-        timeout=timeout,
-        title=title,
-        success_message=success_message,
-        failure_message=failure_message,
-        ignore_warnings=ignore_warnings,
-        sleep_time=sleep_time
-    )
+    with span('wait for deployment', service=deployment.service_name):
+        wait_for_finish(
+            action=deployment,
+            timeout=timeout,
+            title=title,
+            success_message=success_message,
+            failure_message=failure_message,
+            ignore_warnings=ignore_warnings,
+            sleep_time=sleep_time,
+            max_sleep_time=max_sleep_time,
+            max_task_failures=max_task_failures
+        )
 
     if deregister:
         deregister_task_definition(deployment, previous_task_definition)
 
 
 def get_task_definition(action, task):
-    if task:
-        task_definition = action.get_task_definition(task)
-    else:
-        task_definition = action.get_current_task_definition(action.service)
+    with span('fetch task definition', task_definition=task or action.service.task_definition):
+        if task:
+            task_definition = action.get_task_definition(task)
+        else:
+            task_definition = action.get_current_task_definition(action.service)
 
     return task_definition
 
 
-def create_task_definition(action, task_definition):
+def create_task_definition(action, task_definition, reuse=True):
+    if reuse:
+        with span('find task definition revision', family=task_definition.family):
+            revision = action.find_task_definition_revision(task_definition)
+        if revision:
+            click.secho(f'Reusing revision with the same content: {revision.revision}', fg='green')
+            return revision
+
     click.secho('Creating new task definition revision')
 
-    new_task_definition = action.update_task_definition(task_definition)
+    with span('register task definition', family=task_definition.family):
+        new_task_definition = action.update_task_definition(task_definition, tag_content_hash=reuse)
 
     click.secho(f'Successfully created revision: {new_task_definition.revision}', fg='green')
 
@@ -140,26 +192,30 @@ def create_task_definition(action, task_definition):
 def deregister_task_definition(action, task_definition):
     click.secho('Deregister task definition revision')
 
-    action.deregister_task_definition(task_definition)
+    with span('deregister task definition', task_definition=task_definition.family_revision):
+        action.deregister_task_definition(task_definition)
 
     click.secho(f'Successfully deregistered revision: {task_definition.revision}', fg='green')
 
 
-def rollback_task_definition(deployment, old_td, new_td, timeout=600, sleep_time=1):
+def rollback_task_definition(deployment, old_td, new_td, timeout=600, sleep_time=1,
+                             max_sleep_time=DEFAULT_MAX_SLEEP_TIME):
     click.secho(f'Rolling back to task definition: {old_td.family_revision}', fg='yellow')
 
-    deploy_task_definition(
-        deployment=deployment,
-        task_definition=old_td,
-        title='Deploying previous task definition',
-        success_message='Rollback successful',
-        failure_message='Rollback failed. Please check ECS Console',
-        timeout=timeout,
-        deregister=True,
-        previous_task_definition=new_td,
-        ignore_warnings=False,
-        sleep_time=sleep_time
-    )
+    with span('rollback', service=deployment.service_name, task_definition=old_td.family_revision):
+        deploy_task_definition(
+            deployment=deployment,
+            task_definition=old_td,
+            title='Deploying previous task definition',
+            success_message='Rollback successful',
+            failure_message='Rollback failed. Please check ECS Console',
+            timeout=timeout,
+            deregister=not new_td.is_reuse_of(old_td),
+            previous_task_definition=new_td,
+            ignore_warnings=False,
+            sleep_time=sleep_time,
+            max_sleep_time=max_sleep_time
+        )
 
     click.secho(
         f'Deployment failed, but service has been rolled back to previous task definition: {old_td.family_revision}',
@@ -168,18 +224,21 @@ def rollback_task_definition(deployment, old_td, new_td, timeout=600, sleep_time
 
 
 def print_diff(task_definition, title='Updating task definition'):
-    if task_definition.diff:
+    with span('diff', task_definition=task_definition.family_revision):
+        diff = task_definition.diff
+
+    if diff:
         click.secho(title)
-        for diff in task_definition.diff:
-            click.secho(str(diff), fg='blue')
+        for change in diff:
+            click.secho(str(change), fg='blue')
         click.secho('')
 
 
-def inspect_errors(service, failure_message, ignore_warnings, since, timeout):
+def inspect_errors(service, failure_message, ignore_warnings, since, timeout, events=None):
     error = False
     last_error_timestamp = since
 
-    warnings = service.get_warnings(since)
+    warnings = service.get_warnings(since, events=events)
     for timestamp in warnings:
         message = warnings[timestamp]
         click.secho('')
@@ -191,11 +250,14 @@ def inspect_errors(service, failure_message, ignore_warnings, since, timeout):
             click.secho(f'{timestamp}\nERROR: {message}', fg='red', err=True)
             error = True
 
-    if service.older_errors:
+    older_errors = service.get_warnings(
+        since=service.deployment_created_at, until=service.deployment_updated_at, events=events
+    )
+    if older_errors:
         click.secho('')
         click.secho('Older errors', fg='yellow', err=True)
-        for timestamp in service.older_errors:
-            click.secho(f'{timestamp}\n{service.older_errors[timestamp]}', fg='yellow', err=True)
+        for timestamp in older_errors:
+            click.secho(f'{timestamp}\n{older_errors[timestamp]}', fg='yellow', err=True)
 
     if timeout:
         error = True
@@ -206,3 +268,182 @@ def inspect_errors(service, failure_message, ignore_warnings, since, timeout):
         raise TaskPlacementError(failure_message)
 
     return last_error_timestamp
+
+
+def inspect_rollout(service, task_definition_arn, failure_message):
+    failed_deployment = service.get_failed_deployment(task_definition_arn)
+    if failed_deployment:
+        click.secho('')
+        click.secho(f'Deployment {failed_deployment.id} failed: {failed_deployment.failure_reason}', fg='red', err=True)
+        raise TaskPlacementError(failure_message)
+
+
+def inspect_stopped_tasks(service, task_monitor: EcsStoppedTaskMonitor, failure_message):
+    failures = task_monitor.new_failures(service)
+    for task in failures:
+        click.secho('')
+        click.secho(task.failure_message, fg='red' if task_monitor.failed else 'yellow', err=True)
+
+    if task_monitor.failed:
+        click.secho(f'{len(task_monitor.failures)} tasks of the new task definition failed', fg='red', err=True)
+        raise TaskPlacementError(failure_message)
+
+
+def load_services(ecs_client: EcsClient, cluster, patterns, max_parallel=DEFAULT_MAX_PARALLEL) -> List[EcsService]:
+    service_names = []
+    existing_service_names = None
+
+    for pattern in patterns:
+        if has_magic(pattern):
+            if existing_service_names is None:
+                existing_service_names = list(ecs_client.list_services(cluster))
+            matches = [name for name in existing_service_names if fnmatchcase(name, pattern)]
+        else:
+            matches = [pattern]
+
+        service_names.extend(name for name in matches if name not in service_names)
+
+    if not service_names:
+        raise EcsConnectionError(f'No services found matching: {" ".join(patterns)}')
+
+    with span('fetch services', cluster=cluster, services=len(service_names)):
+        with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+            responses = executor.map(
+                in_current_span(lambda names: ecs_client.describe_services_batch(cluster, names)),
+                chunked(service_names, DESCRIBE_SERVICES_MAX_SERVICES)
+            )
+            services = {
+                service[u'serviceName']: EcsService(cluster=cluster, service_definition=service)
+                for response in responses for service in response[u'services']
+            }
+
+    missing = [name for name in service_names if name not in services]
+    if missing:
+        raise EcsConnectionError(
+            f'An error occurred when calling the DescribeServices operation: Service not found: {", ".join(missing)}'
+        )
+
+    return [services[name] for name in service_names]
+
+
+def print_watch_result(result: WatchResult):
+    if result.deployed:
+        click.secho(f'{result}: deployed', fg='green')
+    else:
+        click.secho(f'{result}: {result.error}', fg='red', err=True)
+
+
+def watch_services(ecs_client, cluster, services, timeout, ignore_warnings, sleep_time, max_sleep_time, title,
+                   max_task_failures=DEFAULT_MAX_TASK_FAILURES):
+    click.secho(title)
+
+    if timeout == -1:
+        return []
+
+    watcher = EcsDeploymentWatcher(
+        client=ecs_client,
+        targets=[(cluster, service.name, service.task_definition) for service in services],
+        ignore_warnings=ignore_warnings,
+        sleep_time=sleep_time,
+        max_sleep_time=max_sleep_time,
+        max_task_failures=max_task_failures,
+        on_finished=print_watch_result
+    )
+    with span('wait for deployment', cluster=cluster, services=len(services)):
+        results = watcher.watch(timeout)
+
+    for result in results:
+        if not result.finished:
+            click.secho(f'{result}: timeout', fg='red', err=True)
+
+    return [result.service_name for result in results if not result.deployed]
+
+
+def deploy_services(ecs_client: EcsClient, cluster, services: List[EcsService],
+                    modify_task_definition: Callable[[EcsTaskDefinition], None], timeout, ignore_warnings, sleep_time,
+                    max_sleep_time, deregister, rollback, diff, max_parallel=DEFAULT_MAX_PARALLEL,
+                    max_task_failures=DEFAULT_MAX_TASK_FAILURES, reuse=True, force_new_deployment=False):
+    actions = {service.name: DeployAction(ecs_client, cluster, service.name, service=service) for service in services}
+    action = next(iter(actions.values()))
+
+    # services sharing a task definition get a single new revision
+    previous_arns = {service.name: service.task_definition for service in services}
+    current_arns = list(dict.fromkeys(previous_arns.values()))
+
+    def services_of(arn, names):
+        return [name for name in names if previous_arns[name] == arn]
+
+    with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+        with span('fetch task definitions', task_definitions=len(current_arns)):
+            current_tds = dict(zip(
+                current_arns, executor.map(in_current_span(action.get_task_definition), current_arns)
+            ))
+
+        for td in current_tds.values():
+            with span('modify task definition', task_definition=td.family_revision):
+                modify_task_definition(td)
+            if diff:
+                print_diff(td, f'Updating task definition {td.family_revision}')
+
+        def register(td):
+            revision = reuse and action.find_task_definition_revision(td)
+            return revision or action.update_task_definition(td, tag_content_hash=reuse)
+
+        click.secho(f'Creating {len(current_tds)} new task definition revisions')
+        with span('register task definitions', task_definitions=len(current_tds)):
+            new_tds = dict(zip(current_arns, executor.map(in_current_span(register), current_tds.values())))
+        for new_td in new_tds.values():
+            if new_td.reused:
+                click.secho(f'Reusing revision with the same content: {new_td.family_revision}', fg='green')
+            else:
+                click.secho(f'Successfully created revision: {new_td.family_revision}', fg='green')
+
+        def deploy(name):
+            new_td = new_tds[previous_arns[name]]
+            force = force_new_deployment and new_td.arn == previous_arns[name]
+            actions[name].deploy(new_td, force_new_deployment=force)
+
+        click.secho(f'Updating {len(services)} services')
+        with span('update services', services=len(actions)):
+            list(executor.map(in_current_span(deploy), actions))
+
+    failed = watch_services(
+        ecs_client, cluster, services, timeout, ignore_warnings, sleep_time, max_sleep_time,
+        title='Deploying new task definitions', max_task_failures=max_task_failures
+    )
+
+    if deregister:
+        for arn, td in current_tds.items():
+            if not new_tds[arn].is_reuse_of(td) and not services_of(arn, failed):
+                deregister_task_definition(action, td)
+
+    if failed and rollback:
+        click.secho(f'Rolling back {len(failed)} services to their previous task definitions', fg='yellow')
+
+        with span('rollback', services=len(failed)), ThreadPoolExecutor(max_workers=max_parallel) as executor:
+            list(executor.map(
+                in_current_span(lambda name: actions[name].deploy(current_tds[previous_arns[name]])), failed
+            ))
+
+        rollback_failed = watch_services(
+            ecs_client, cluster, [actions[name].service for name in failed], 600, False, sleep_time, max_sleep_time,
+            title='Deploying previous task definitions'
+        )
+
+        succeeded = [name for name in actions if name not in failed]
+        for arn, new_td in new_tds.items():
+            if not new_td.is_reuse_of(current_tds[arn]) and not services_of(arn, succeeded):
+                deregister_task_definition(action, new_td)
+
+        if rollback_failed:
+            raise TaskPlacementError(f'Rollback failed for: {", ".join(rollback_failed)}. Please check ECS Console')
+
+        click.secho(
+            f'Deployment failed, but services have been rolled back to previous task definitions: {", ".join(failed)}',
+            fg='yellow', err=True
+        )
+
+    if failed:
+        raise TaskPlacementError(f'Deployment failed for: {", ".join(failed)}')
+
+    click.secho(f'Deployment of {len(services)} services successful', fg='green')
@@ -4,3 +4,4 @@ from .diff import diff as ecs_diff
 from .run import run as ecs_run
 from .scale import scale as ecs_scale
 from .update import update as ecs_update
+from .watch import watch as ecs_watch
@@ -28,11 +28,13 @@ from aws_deploy.ecs.helper import RunAction, EcsError
 @click.option('-r', '--role', type=str, help='Sets the task\'s role ARN: <task role ARN>')
 @click.option('--deregister/--no-deregister', default=True, show_default=True,
               help='Deregister or keep the old task definition.')
+@click.option('--reuse-revision/--no-reuse-revision', default=True, show_default=True,
+              help='Reuse the current or a recent revision with the same content instead of registering a new one.')
 @click.option('--diff/--no-diff', default=True, show_default=True,
               help='Print which values were changed in the task definition')
 @click.pass_context
 def cron(ctx, cluster, task, rule, image, tag, command, env, env_file, secret, exclusive_env, exclusive_secrets, role,
-         deregister, diff):
+         deregister, reuse_revision, diff):
     """
     Update a scheduled task.
 
@@ -58,7 +60,7 @@ def cron(ctx, cluster, task, rule, image, tag, command, env, env_file, secret, e
         if diff:
             print_diff(td)
 
-        new_td = create_task_definition(action, td)
+        new_td = create_task_definition(action, td, reuse=reuse_revision)
 
         click.secho('Updating scheduled task')
 
@@ -66,7 +68,7 @@ def cron(ctx, cluster, task, rule, image, tag, command, env, env_file, secret, e
 
         click.secho(f'Successfully updated scheduled task {rule}', fg='green')
 
-        if deregister:
+        if deregister and not new_td.is_reuse_of(td):
             deregister_task_definition(action, td)
     except EcsError as e:
         click.secho(str(e), fg='red', err=True)
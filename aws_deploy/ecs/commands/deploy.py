@@ -1,15 +1,19 @@
+from glob import has_magic
+
 import click
 
+from aws_deploy.common.polling import DEFAULT_MAX_SLEEP_TIME
+from aws_deploy.common.tracing import span
 from aws_deploy.ecs.cli import (
-    ecs_cli, get_ecs_client, get_task_definition, print_diff, create_task_definition, deploy_task_definition,
-    rollback_task_definition
+    DEFAULT_MAX_PARALLEL, ecs_cli, get_ecs_client, get_task_definition, print_diff, create_task_definition,
+    deploy_task_definition, rollback_task_definition, load_services, deploy_services
 )
-from aws_deploy.ecs.helper import DeployAction, TaskPlacementError, EcsError
+from aws_deploy.ecs.helper import DEFAULT_MAX_TASK_FAILURES, DeployAction, TaskPlacementError, EcsError
 
 
 @ecs_cli.command()
 @click.argument('cluster')
-@click.argument('service')
+@click.argument('services', nargs=-1, required=True)
 @click.option('--task', type=str,
               help='Task definition to be deployed. Can be a task ARN or a task family with optional revision')
 @click.option('-i', '--image', type=(str, str), multiple=True,
@@ -38,33 +42,41 @@ from aws_deploy.ecs.helper import DeployAction, TaskPlacementError, EcsError
                    'To disable timeout (fire and forget) set to -1.')
 @click.option('--sleep-time', default=1, type=int, show_default=True,
               help='Amount of seconds to wait between each check of the service.')
+@click.option('--max-sleep-time', default=DEFAULT_MAX_SLEEP_TIME, type=int, show_default=True,
+              help='Upper bound for the wait between two checks while the service does not change.')
+@click.option('--max-task-failures', default=DEFAULT_MAX_TASK_FAILURES, type=int, show_default=True,
+              help='Fail after this many tasks of the new task definition stopped with an error. Set to 0 to disable.')
 @click.option('--deregister/--no-deregister', default=True, show_default=True,
               help='Deregister or keep the old task definition.')
+@click.option('--reuse-revision/--no-reuse-revision', default=True, show_default=True,
+              help='Reuse the current or a recent revision with the same content instead of registering a new one.')
+@click.option('--force-new-deployment/--no-force-new-deployment', default=True, show_default=True,
+              help='Force a new deployment, if the service already runs the resulting revision (e.g. a redeploy '
+                   'without modifications), so that all tasks are replaced and their images pulled again.')
 @click.option('--rollback/--no-rollback', default=False, show_default=True,
               help='Rollback to previous revision, if deployment failed.')
 @click.option('--diff/--no-diff', default=True, show_default=True,
               help='Print which values were changed in the task definition')
+@click.option('--max-parallel', default=DEFAULT_MAX_PARALLEL, type=int, show_default=True,
+              help='Maximum number of services updated at the same time, when deploying several services.')
 @click.pass_context
-def deploy(ctx, cluster, service, task, image, tag, command, env, env_file, secret, exclusive_env, exclusive_secrets,
-           role, execution_role, ignore_warnings, timeout, sleep_time, deregister, rollback, diff):
+def deploy(ctx, cluster, services, task, image, tag, command, env, env_file, secret, exclusive_env, exclusive_secrets,
+           role, execution_role, ignore_warnings, timeout, sleep_time, max_sleep_time, max_task_failures, deregister,
+           reuse_revision, force_new_deployment, rollback, diff, max_parallel):
     """
-    Redeploy or modify a service.
+    Redeploy or modify one or several services.
 
     \b
     CLUSTER is the name of your cluster (e.g. 'my-cluster') within ECS.
-    SERVICE is the name of your service (e.g. 'my-app') within ECS.
+    SERVICES are the names of your services (e.g. 'my-app') within ECS. Glob patterns (e.g. 'my-*') are expanded
+    against the services of the cluster.
 
     When not giving any other options, the task definition will not be changed.
-    It will just be duplicated, so that all container images will be pulled and redeployed.
+    The current revision is reused and a new deployment is forced (--force-new-deployment), so that all container
+    images will be pulled and redeployed without registering a new revision.
     """
 
-    try:
-        click.secho(f'Deploy [cluster={cluster}, service={service}]')
-
-        ecs_client = get_ecs_client(ctx)
-        deploy_action = DeployAction(ecs_client, cluster, service)
-
-        td = get_task_definition(deploy_action, task)
+    def modify_task_definition(td):
         td.set_images(tag, **{key: value for (key, value) in image})
         td.set_commands(**{key: value for (key, value) in command})
         td.set_environment(env, exclusive_env, env_file)
@@ -72,10 +84,48 @@ def deploy(ctx, cluster, service, task, image, tag, command, env, env_file, secr
         td.set_role_arn(role)
         td.set_execution_role_arn(execution_role)
 
+    try:
+        if len(services) > 1 or has_magic(services[0]):
+            if task:
+                raise EcsError('The option --task can only be used when deploying a single service')
+
+            click.secho(f'Deploy [cluster={cluster}, services={" ".join(services)}]')
+
+            ecs_client = get_ecs_client(ctx)
+            deploy_services(
+                ecs_client=ecs_client,
+                cluster=cluster,
+                services=load_services(ecs_client, cluster, services, max_parallel),
+                modify_task_definition=modify_task_definition,
+                timeout=timeout,
+                ignore_warnings=ignore_warnings,
+                sleep_time=sleep_time,
+                max_sleep_time=max_sleep_time,
+                deregister=deregister,
+                rollback=rollback,
+                diff=diff,
+                max_parallel=max_parallel,
+                max_task_failures=max_task_failures,
+                reuse=reuse_revision,
+                force_new_deployment=force_new_deployment
+            )
+            return
+
+        service = services[0]
+        click.secho(f'Deploy [cluster={cluster}, service={service}]')
+
+        ecs_client = get_ecs_client(ctx)
+        with span('fetch service', cluster=cluster, service=service):
+            deploy_action = DeployAction(ecs_client, cluster, service)
+
+        td = get_task_definition(deploy_action, task)
+        with span('modify task definition', task_definition=td.family_revision):
+            modify_task_definition(td)
+
         if diff:
             print_diff(td)
 
-        new_td = create_task_definition(deploy_action, td)
+        new_td = create_task_definition(deploy_action, td, reuse=reuse_revision)
 
         try:
             deploy_task_definition(
@@ -85,14 +135,19 @@ def deploy(ctx, cluster, service, task, image, tag, command, env, env_file, secr
                 success_message='Deployment successful',
                 failure_message='Deployment failed',
                 timeout=timeout,
-                deregister=deregister,
+                deregister=deregister and not new_td.is_reuse_of(td),
                 previous_task_definition=td,
                 ignore_warnings=ignore_warnings,
-                sleep_time=sleep_time
+                sleep_time=sleep_time,
+                max_sleep_time=max_sleep_time,
+                max_task_failures=max_task_failures,
+                force_new_deployment=force_new_deployment
             )
         except TaskPlacementError:
             if rollback:
-                rollback_task_definition(deploy_action, td, new_td, sleep_time=sleep_time)
+                rollback_task_definition(
+                    deploy_action, td, new_td, sleep_time=sleep_time, max_sleep_time=max_sleep_time
+                )
 
             raise
     except EcsError as e:
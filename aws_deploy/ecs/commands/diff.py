@@ -1,48 +1,140 @@
 import json
+from itertools import groupby
 
 import click
 
 from aws_deploy.ecs.cli import ecs_cli, get_ecs_client
-from aws_deploy.ecs.helper import DiffAction, EcsError
+from aws_deploy.ecs.differ import ADD, REMOVE, to_json_patch
+from aws_deploy.ecs.helper import DIFF_MAX_PARALLEL, DiffAction, EcsError
+
+
+def print_changes(changes):
+    # additions and removals are listed by key under their parent, like the changes of dictdiffer used to be
+    for (op, parent), group in groupby(changes, key=lambda change: (change.op, change.path[:-1])):
+        if op == ADD:
+            click.secho(f'{op}: {format_path(parent)}', fg='green')
+            for change in group:
+                click.secho(f'    + {change.path[-1]}: {json.dumps(change.value)}', fg='green')
+        elif op == REMOVE:
+            click.secho(f'{op}: {format_path(parent)}', fg='red')
+            for change in group:
+                click.secho(f'    - {change.path[-1]}: {change.old_value}', fg='red')
+        else:
+            for change in group:
+                click.secho(f'{op}: {format_path(change.path)}', fg='yellow')
+                click.secho(f'    - {json.dumps(change.old_value)}', fg='red')
+                click.secho(f'    + {json.dumps(change.value)}', fg='green')
+
+
+def format_path(path):
+    return '.'.join(str(key) for key in path)
+
+
+def print_pair(td_a, td_b, json_patch):
+    changes = td_a.diff_raw(td_b)
+    if json_patch:
+        # one JSON document per line, so that the changes of a range can be processed while they are printed
+        patch = to_json_patch(changes)
+        click.secho(json.dumps({'from': td_a.family_revision, 'to': td_b.family_revision, 'patch': patch}))
+        return
+
+    click.secho(f'{td_a.family_revision} -> {td_b.family_revision}', bold=True)
+    if changes:
+        print_changes(changes)
+    else:
+        click.secho('    no changes')
+
+
+def diff_range(action, task, first_revision, last_revision, json_patch, max_parallel):
+    previous_td = None
+    revisions = range(first_revision, last_revision + 1)
+    for revision, td in action.iter_task_definitions(task, revisions, max_parallel):
+        if td is None:
+            click.secho(f'Revision {task}:{revision} not found, skipped', fg='yellow', err=True)
+            continue
+
+        if previous_td is not None:
+            print_pair(previous_td, td, json_patch)
+        previous_td = td
+
+
+def bisect_field(action, task, first_revision, last_revision, field, json_patch):
+    click.secho(f'Bisecting {field} in {task}:{first_revision}..{last_revision}', err=json_patch)
+
+    def print_step(td, value):
+        click.secho(f'    {td.family_revision}: {json.dumps(value)}', err=json_patch)
+
+    result = action.bisect(task, first_revision, last_revision, field, on_step=print_step)
+    if result is None:
+        click.secho(f'{field} is the same in revisions {first_revision} and {last_revision}', fg='yellow', err=True)
+        return
+
+    td_before, td_after = result
+    click.secho(f'{field} changed in {td_after.family_revision}', fg='green', err=json_patch)
+    print_pair(td_before, td_after, json_patch)
+
+
+def parse_revision_range(ctx, param, value):
+    if value is None:
+        return None
+
+    first_revision, separator, last_revision = value.partition('..')
+    if not separator or not first_revision.isdigit() or not last_revision.isdigit():
+        raise click.BadParameter(f'{value} is not a range of revisions like 100..250')
+    if int(first_revision) >= int(last_revision):
+        raise click.BadParameter(f'{value} does not start before it ends')
+
+    return int(first_revision), int(last_revision)
 
 
 @ecs_cli.command()
 @click.argument('task')
-@click.argument('revision_a')
-@click.argument('revision_b')
+@click.argument('revision_a', required=False)
+@click.argument('revision_b', required=False)
+@click.option('--range', 'revision_range', callback=parse_revision_range, metavar='FIRST..LAST',
+              help='Compare every revision of a range (e.g. 100..250) with the one before it, instead of two revisions')
+@click.option('--bisect', metavar='FIELD',
+              help='Find the revision of the --range in which a field changed, e.g. env.DEBUG, image, '
+                   'containers.web.secrets.TOKEN or role_arn')
+@click.option('--json-patch', is_flag=True, default=False,
+              help='Print the changes as JSON patch (RFC 6902) of the normalized task definition, with containers, '
+                   'environment variables, secrets, port mappings, mount points and volumes keyed by name')
+@click.option('--max-parallel', default=DIFF_MAX_PARALLEL, type=int, show_default=True,
+              help='Maximum number of revisions fetched at the same time with --range')
 @click.pass_context
-def diff(ctx, task, revision_a, revision_b):
+def diff(ctx, task, revision_a, revision_b, revision_range, bisect, json_patch, max_parallel):
     """
-    Compare two task definition revisions.
+    Compare task definition revisions.
 
     \b
     TASK is the name of your task definition (e.g. 'my-task') within ECS.
-    COUNT is the number of tasks your service should run.
+    REVISION_A and REVISION_B are the revisions to compare, unless --range is given.
     """
 
+    if revision_range and (revision_a or revision_b):
+        raise click.UsageError('Pass either REVISION_A and REVISION_B or --range')
+    if not revision_range and not (revision_a and revision_b):
+        raise click.UsageError('Pass REVISION_A and REVISION_B or --range')
+    if bisect and not revision_range:
+        raise click.UsageError('--bisect searches the revisions of a --range')
+
     try:
         ecs_client = get_ecs_client(ctx)
         action = DiffAction(ecs_client)
 
-        td_a = action.get_task_definition(f'{task}:{revision_a}')
-        td_b = action.get_task_definition(f'{task}:{revision_b}')
-
-        result = td_a.diff_raw(td_b)
-        for difference in result:
-            if difference[0] == 'add':
-                click.secho(f'{difference[0]}: {difference[1]}', fg='green')
-                for added in difference[2]:
-                    click.secho(f'    + {added[0]}: {json.dumps(added[1])}', fg='green')
-
-            if difference[0] == 'change':
-                click.secho(f'{difference[0]}: {difference[1]}', fg='yellow')
-                click.secho(f'    - {json.dumps(difference[2][0])}', fg='red')
-                click.secho(f'    + {json.dumps(difference[2][1])}', fg='green')
-
-            if difference[0] == 'remove':
-                click.secho(f'{difference[0]}: {difference[1]}', fg='red')
-                for removed in difference[2]:
-                    click.secho(f'    - {removed[0]}: {removed[1]}', fg='red')
+        if bisect:
+            bisect_field(action, task, *revision_range, bisect, json_patch)
+        elif revision_range:
+            diff_range(action, task, *revision_range, json_patch, max_parallel)
+        else:
+            td_a = action.get_task_definition(f'{task}:{revision_a}')
+            td_b = action.get_task_definition(f'{task}:{revision_b}')
+
+            changes = td_a.diff_raw(td_b)
+            if json_patch:
+                click.secho(json.dumps(to_json_patch(changes), indent=2))
+            else:
+                print_changes(changes)
     except EcsError as e:
         click.secho(str(e), fg='red', err=True)
         exit(1)
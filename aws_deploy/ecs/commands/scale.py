@@ -1,7 +1,8 @@
 import click
 
+from aws_deploy.common.polling import DEFAULT_MAX_SLEEP_TIME
 from aws_deploy.ecs.cli import ecs_cli, get_ecs_client, wait_for_finish
-from aws_deploy.ecs.helper import ScaleAction, EcsError
+from aws_deploy.ecs.helper import DEFAULT_MAX_TASK_FAILURES, ScaleAction, EcsError
 
 
 @ecs_cli.command()
@@ -15,8 +16,13 @@ from aws_deploy.ecs.helper import ScaleAction, EcsError
                    'To disable timeout (fire and forget) set to -1.')
 @click.option('--sleep-time', default=1, type=int, show_default=True,
               help='Amount of seconds to wait between each check of the service.')
+@click.option('--max-sleep-time', default=DEFAULT_MAX_SLEEP_TIME, type=int, show_default=True,
+              help='Upper bound for the wait between two checks while the service does not change.')
+@click.option('--max-task-failures', default=DEFAULT_MAX_TASK_FAILURES, type=int, show_default=True,
+              help='Fail after this many tasks of the service stopped with an error. Set to 0 to disable.')
 @click.pass_context
-def scale(ctx, cluster, service, desired_count, ignore_warnings, timeout, sleep_time):
+def scale(ctx, cluster, service, desired_count, ignore_warnings, timeout, sleep_time, max_sleep_time,
+          max_task_failures):
     """
     Scale a service up or down.
 
@@ -43,7 +49,9 @@ def scale(ctx, cluster, service, desired_count, ignore_warnings, timeout, sleep_
             success_message='Scaling successful',
             failure_message='Scaling failed',
             ignore_warnings=ignore_warnings,
-            sleep_time=sleep_time
+            sleep_time=sleep_time,
+            max_sleep_time=max_sleep_time,
+            max_task_failures=max_task_failures
         )
     except EcsError as e:
         click.secho(str(e), fg='red', err=True)
@@ -26,11 +26,13 @@ from aws_deploy.ecs.helper import UpdateAction, EcsError
 @click.option('-r', '--role', type=str, help='Sets the task\'s role ARN: <task role ARN>')
 @click.option('--deregister/--no-deregister', default=True, show_default=True,
               help='Deregister or keep the old task definition.')
+@click.option('--reuse-revision/--no-reuse-revision', default=True, show_default=True,
+              help='Reuse the current or a recent revision with the same content instead of registering a new one.')
 @click.option('--diff/--no-diff', default=True, show_default=True,
               help='Print which values were changed in the task definition')
 @click.pass_context
 def update(ctx, task, image, tag, command, env, env_file, secret, exclusive_env, exclusive_secrets, role, deregister,
-           diff):
+           reuse_revision, diff):
     """
     Update a task definition.
 
@@ -54,9 +56,9 @@ def update(ctx, task, image, tag, command, env, env_file, secret, exclusive_env,
         if diff:
             print_diff(td)
 
-        create_task_definition(update_action, td)
+        new_td = create_task_definition(update_action, td, reuse=reuse_revision)
 
-        if deregister:
+        if deregister and not new_td.is_reuse_of(td):
             deregister_task_definition(update_action, td)
     except EcsError as e:
         click.secho(str(e), fg='red', err=True)
@@ -0,0 +1,49 @@
+import click
+
+from aws_deploy.common.polling import DEFAULT_MAX_SLEEP_TIME
+from aws_deploy.ecs.cli import ecs_cli, get_ecs_client, print_watch_result
+from aws_deploy.ecs.watcher import EcsDeploymentWatcher
+
+
+@ecs_cli.command()
+@click.argument('cluster')
+@click.argument('services', nargs=-1, required=True)
+@click.option('--ignore-warnings', is_flag=True,
+              help='Do not fail on warnings (port already in use or insufficient memory/CPU)')
+@click.option('--timeout', default=300, type=int, show_default=True,
+              help='Amount of seconds to wait for all services before command fails.')
+@click.option('--sleep-time', default=1, type=int, show_default=True,
+              help='Amount of seconds to wait between each check of the services.')
+@click.option('--max-sleep-time', default=DEFAULT_MAX_SLEEP_TIME, type=int, show_default=True,
+              help='Upper bound for the wait between two checks while no service changes.')
+@click.pass_context
+def watch(ctx, cluster, services, ignore_warnings, timeout, sleep_time, max_sleep_time):
+    """
+    Wait until running deployments of several services finished.
+
+    \b
+    CLUSTER is the name of your cluster (e.g. 'my-cluster') within ECS.
+    SERVICES are the names of your services (e.g. 'my-app my-worker') within ECS.
+    """
+
+    click.secho(f'Watch [cluster={cluster}, services={len(services)}]')
+
+    watcher = EcsDeploymentWatcher(
+        client=get_ecs_client(ctx),
+        targets=[(cluster, service) for service in services],
+        ignore_warnings=ignore_warnings,
+        sleep_time=sleep_time,
+        max_sleep_time=max_sleep_time,
+        on_finished=print_watch_result
+    )
+    results = watcher.watch(timeout)
+
+    unfinished = [result for result in results if not result.finished]
+    for result in unfinished:
+        click.secho(f'{result}: timeout', fg='red', err=True)
+
+    if unfinished or any(result.error for result in results):
+        click.secho('Watch failed', fg='red', err=True)
+        exit(1)
+
+    click.secho('All services deployed', fg='green')
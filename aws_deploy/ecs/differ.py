@@ -0,0 +1,159 @@
+from typing import Iterator, List
+
+from aws_deploy.ecs.helper import CONTENT_HASH_IGNORED_PROPERTIES
+
+ADD = 'add'
+REMOVE = 'remove'
+CHANGE = 'change'
+
+# the lists of a container definition whose items are compared by key instead of by position; environment variables
+# and secrets are reduced to their value, the other items are compared field by field
+CONTAINER_KEYED_LISTS = {
+    'environment': (lambda item: item['name'], lambda item: item.get('value')),
+    'secrets': (lambda item: item['name'], lambda item: item.get('valueFrom')),
+    'portMappings': (
+        lambda item: item.get('name') or f"{item.get('containerPort')}/{item.get('protocol', 'tcp')}",
+        lambda item: item
+    ),
+    'mountPoints': (lambda item: item['containerPath'], lambda item: item),
+}
+
+# short names of the container fields in field expressions, e.g. 'env.DEBUG'
+FIELD_ALIASES = {
+    'env': 'environment',
+    'secret': 'secrets',
+    'port': 'portMappings',
+    'mount': 'mountPoints',
+}
+
+
+class Change(object):
+    """
+    A difference between two task definitions: op is ADD, REMOVE or CHANGE, path the keys leading to the value in the
+    normalized task definition (see normalize), e.g. ('containers', 'web', 'environment', 'DEBUG').
+    """
+
+    def __init__(self, op, path, value=None, old_value=None):
+        self.op = op
+        self.path = tuple(path)
+        self.value = value
+        self.old_value = old_value
+
+    @property
+    def pointer(self) -> str:
+        """
+        The JSON pointer (RFC 6901) of the path.
+        """
+        return ''.join('/' + str(key).replace('~', '~0').replace('/', '~1') for key in self.path)
+
+    def to_json_patch(self) -> dict:
+        if self.op == ADD:
+            return {'op': 'add', 'path': self.pointer, 'value': self.value}
+        if self.op == REMOVE:
+            return {'op': 'remove', 'path': self.pointer}
+        return {'op': 'replace', 'path': self.pointer, 'value': self.value}
+
+    def __eq__(self, other):
+        if not isinstance(other, Change):
+            return NotImplemented
+        return (self.op, self.path, self.value, self.old_value) == (other.op, other.path, other.value, other.old_value)
+
+    def __repr__(self):
+        return f'Change({self.op!r}, {self.path!r}, value={self.value!r}, old_value={self.old_value!r})'
+
+
+def _keyed(items, key, value) -> dict:
+    return {key(item): value(item) for item in items or ()}
+
+
+def _normalize_container(container) -> dict:
+    normalized = dict(container)
+    # a missing list is the same as an empty one
+    for field, (key, value) in CONTAINER_KEYED_LISTS.items():
+        normalized[field] = _keyed(container.get(field), key, value)
+    return normalized
+
+
+def normalize(task_definition) -> dict:
+    """
+    Returns the comparable document of an EcsTaskDefinition, without modifying it: containers, their environment
+    variables, secrets, port mappings and mount points as well as volumes are keyed by name, the names of the required
+    attributes are sorted. The read-only metadata (e.g. registeredAt) differs between any two revisions and is left out.
+    The JSON patches of diff are relative to this document.
+    """
+    return {
+        'containers': {
+            container['name']: _normalize_container(container) for container in task_definition.containers
+        },
+        'volumes': _keyed(task_definition.volumes, lambda volume: volume['name'], lambda volume: volume),
+        'requires_attributes': sorted(attribute['name'] for attribute in task_definition.requires_attributes),
+        'role_arn': task_definition.role_arn,
+        'execution_role_arn': task_definition.execution_role_arn,
+        'compatibilities': task_definition.compatibilities,
+        'additional_properties': {
+            key: value for key, value in task_definition.additional_properties.items()
+            if key not in CONTENT_HASH_IGNORED_PROPERTIES
+        },
+    }
+
+
+def diff_documents(document_a, document_b, path=()) -> Iterator[Change]:
+    """
+    Yields the changes from document_a to document_b. Dicts are compared key by key, every other value (including
+    lists) as a whole, so every value is visited once.
+    """
+    if not isinstance(document_a, dict) or not isinstance(document_b, dict):
+        if document_a != document_b:
+            yield Change(CHANGE, path, value=document_b, old_value=document_a)
+        return
+
+    for key, value_a in document_a.items():
+        if key not in document_b:
+            yield Change(REMOVE, path + (key,), old_value=value_a)
+        else:
+            yield from diff_documents(value_a, document_b[key], path + (key,))
+
+    for key, value_b in document_b.items():
+        if key not in document_a:
+            yield Change(ADD, path + (key,), value=value_b)
+
+
+def diff(task_definition_a, task_definition_b) -> List[Change]:
+    """
+    Compares two EcsTaskDefinitions in time linear to their size, see normalize.
+    """
+    return list(diff_documents(normalize(task_definition_a), normalize(task_definition_b)))
+
+
+def to_json_patch(changes) -> List[dict]:
+    """
+    Turns changes into a JSON patch (RFC 6902) that transforms the normalized first task definition into the second.
+    """
+    return [change.to_json_patch() for change in changes]
+
+
+def _lookup(document, keys):
+    for index, key in enumerate(keys):
+        if not isinstance(document, dict):
+            return None
+        # keys like environment variable names may contain dots themselves
+        rest = '.'.join(keys[index:])
+        if rest in document:
+            return document[rest]
+        document = document.get(key, document.get(FIELD_ALIASES.get(key)))
+    return document
+
+
+def field_value(document, field):
+    """
+    Returns the value of a field of a normalized task definition. The field is a path of keys separated by dots, e.g.
+    'role_arn' or 'containers.web.environment.DEBUG'. Paths that do not start with a key of the document are looked up
+    in every container and return the values per container, e.g. 'env.DEBUG' returns {'web': 'true'}. Missing values
+    are None.
+    """
+    keys = field.split('.')
+    if keys[0] in document:
+        return _lookup(document, keys)
+
+    values = {name: _lookup(container, keys) for name, container in document['containers'].items()}
+    return {name: value for name, value in values.items() if value is not None}
@@ -1,20 +1,73 @@
+import hashlib
 import json
 import re
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
+from functools import partial
+from itertools import chain, islice
 from json.decoder import JSONDecodeError
+from typing import TYPE_CHECKING
 
 import click
-from boto3.session import Session
-from boto3_type_annotations.ecs import Client
-from botocore.exceptions import ClientError, NoCredentialsError
-from dateutil.tz.tz import tzlocal
-from dictdiffer import diff
+from botocore.exceptions import BotoCoreError, ClientError, NoCredentialsError
+
+from aws_deploy.common.cache import (
+    TASK_DEFINITION_FAMILY_REVISION_REGEX, TaskDefinitionCache, is_task_definition_revision_arn,
+    task_definition_revision_arn
+)
+from aws_deploy.common.hedging import RequestHedging
+from aws_deploy.common.memoize import RequestCache, invalidates, memoized
+from aws_deploy.common.polling import get_clock
+from aws_deploy.common.session import ClientFactory
+from aws_deploy.common.tracing import in_current_span
+
+if TYPE_CHECKING:  # pragma: no cover
+    from boto3_type_annotations.ecs import Client
 
 JSON_LIST_REGEX = re.compile(r'^\[.*\]$')
 
 LAUNCH_TYPE_EC2 = 'EC2'
 LAUNCH_TYPE_FARGATE = 'FARGATE'
 
+# DescribeServices accepts at most 10 services and DescribeTasks at most 100 task ARNs per request
+DESCRIBE_SERVICES_MAX_SERVICES = 10
+DESCRIBE_TASKS_MAX_ARNS = 100
+DESCRIBE_TASKS_MAX_WORKERS = 4
+
+# task definition revisions fetched at the same time when diffing a range of revisions
+DIFF_MAX_PARALLEL = 10
+
+# tag holding the content hash of a task definition revision, and the number of recent revisions searched for a
+# revision with the same content before registering a new one
+CONTENT_HASH_TAG = 'ContentHash'
+DEFAULT_REUSE_REVISIONS = 5
+
+# read-only metadata returned by DescribeTaskDefinition, which RegisterTaskDefinition does not accept
+READ_ONLY_PROPERTIES = ('registeredAt', 'registeredBy', 'deregisteredAt')
+
+# properties returned by DescribeTaskDefinition that are not part of the registered content
+CONTENT_HASH_IGNORED_PROPERTIES = READ_ONLY_PROPERTIES + ('tags',)
+
+# number of failed tasks of the deployed task definition after which a deployment fails
+DEFAULT_MAX_TASK_FAILURES = 3
+
+# stoppedReason prefixes of tasks the scheduler or a user stopped on purpose, these tasks did not fail
+INTENDED_STOPPED_REASONS = (
+    u'Scaling activity initiated by',
+    u'Task stopped by user',
+    u'ECS is performing maintenance',
+)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
 
 def read_env_file(container_name, file):
     env_vars = []
@@ -32,17 +85,31 @@ def read_env_file(container_name, file):
 
 class EcsClient(object):
     def __init__(self, aws_access_key_id=None, aws_secret_access_key=None, aws_session_token=None, region_name=None,
-                 profile_name=None):
-        session = Session(
+                 profile_name=None, task_definition_cache: TaskDefinitionCache = None,
+                 request_cache: RequestCache = None, client_factory: ClientFactory = None,
+                 hedging: RequestHedging = None):
+        self._client_factory = client_factory or ClientFactory(
             aws_access_key_id=aws_access_key_id,
             aws_secret_access_key=aws_secret_access_key,
             aws_session_token=aws_session_token,
             region_name=region_name,
             profile_name=profile_name
         )
+        self.task_definition_cache = task_definition_cache
+        self.request_cache = request_cache
+        self.hedging = hedging
 
-        self.boto: Client = session.client('ecs')
-        self.events = session.client('events')
+    def _hedged(self, client):
+        # the reads configured in the hedging are duplicated when they are slow, see RequestHedging
+        return self.hedging.wrap(client) if self.hedging else client
+
+    @property
+    def boto(self) -> 'Client':
+        return self._hedged(self._client_factory.client('ecs'))
+
+    @property
+    def events(self):
+        return self._client_factory.client('events')
 
     def describe_services(self, cluster_name, service_name):
         return self.boto.describe_services(
@@ -50,9 +117,52 @@ class EcsClient(object):
             services=[service_name]
         )
 
+    def describe_services_batch(self, cluster_name, service_names):
+        return self.boto.describe_services(
+            cluster=cluster_name,
+            services=list(service_names)
+        )
+
+    def list_services(self, cluster_name):
+        paginator = self.boto.get_paginator('list_services')
+        for page in paginator.paginate(cluster=cluster_name):
+            for service_arn in page[u'serviceArns']:
+                yield service_arn.rsplit('/', 1)[-1]
+
+    def _task_definition_revision_arn(self, task_definition):
+        # a family:revision is resolved with the account of the credentials, so that it is not cached across accounts
+        if is_task_definition_revision_arn(task_definition):
+            return task_definition
+        if not TASK_DEFINITION_FAMILY_REVISION_REGEX.match(task_definition):
+            return None
+
+        try:
+            identity = self._client_factory.caller_identity
+        except (BotoCoreError, ClientError):
+            return None
+
+        return task_definition_revision_arn(
+            task_definition,
+            partition=identity[u'Arn'].split(u':')[1],
+            region=self._client_factory.client('ecs').meta.region_name,
+            account_id=identity[u'Account']
+        )
+
+    @memoized('task_definition')
     def describe_task_definition(self, task_definition_arn):
+        """
+        Describes a task definition with its tags. Revisions given as revision ARN or family:revision are read from the
+        task definition cache, if there is one; a cached payload has no status and no tags (see
+        EcsAction.get_task_definition).
+        """
+        if self.task_definition_cache:
+            revision_arn = self._task_definition_revision_arn(task_definition_arn)
+            cached_payload = revision_arn and self.task_definition_cache.get(revision_arn)
+            if cached_payload:
+                return cached_payload
+
         try:
-            return self.boto.describe_task_definition(
+            payload = self.boto.describe_task_definition(
                 taskDefinition=task_definition_arn,
                 include=[
                     'TAGS',
@@ -63,6 +173,22 @@ class EcsClient(object):
                 u'Unknown task definition arn: %s' % task_definition_arn
             )
 
+        if self.task_definition_cache:
+            self.task_definition_cache.put(
+                payload[u'taskDefinition'][u'taskDefinitionArn'],
+                {key: value for key, value in payload.items() if key != 'ResponseMetadata'}
+            )
+
+        return payload
+
+    def list_task_definition_tags(self, task_definition_arn):
+        try:
+            return self.boto.list_tags_for_resource(resourceArn=task_definition_arn)[u'tags']
+        except ClientError:
+            # e.g. without permission to list tags, the description of the revision includes them, too
+            payload = self.boto.describe_task_definition(taskDefinition=task_definition_arn, include=['TAGS'])
+            return payload.get(u'tags', [])
+
     def list_tasks(self, cluster_name, service_name):
         return self.boto.list_tasks(
             cluster=cluster_name,
@@ -72,10 +198,54 @@ class EcsClient(object):
     def describe_tasks(self, cluster_name, task_arns):
         return self.boto.describe_tasks(cluster=cluster_name, tasks=task_arns)
 
+    def iter_task_arns(self, cluster_name, service_name=None, desired_status=None, family=None, started_by=None):
+        filters = {
+            'serviceName': service_name,
+            'desiredStatus': desired_status,
+            'family': family,
+            'startedBy': started_by,
+        }
+
+        paginator = self.boto.get_paginator('list_tasks')
+        for page in paginator.paginate(cluster=cluster_name, **{k: v for k, v in filters.items() if v}):
+            yield from page[u'taskArns']
+
+    def iter_tasks(self, cluster_name, task_arns, max_workers=DESCRIBE_TASKS_MAX_WORKERS):
+        """
+        Describes the given tasks in chunks of DESCRIBE_TASKS_MAX_ARNS, yielding the task documents as every chunk
+        completes. At most max_workers chunks are in flight, so only their documents are held in memory.
+        """
+        chunks = chunked(task_arns, DESCRIBE_TASKS_MAX_ARNS)
+
+        first_chunk = next(chunks, None)
+        if first_chunk is None:
+            return
+
+        second_chunk = next(chunks, None)
+        if second_chunk is None:
+            yield from self.describe_tasks(cluster_name, first_chunk)[u'tasks']
+            return
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = set()
+            for chunk in chain((first_chunk, second_chunk), chunks):
+                pending.add(executor.submit(in_current_span(self.describe_tasks), cluster_name, chunk))
+                if len(pending) >= max_workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from future.result()[u'tasks']
+
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()[u'tasks']
+
+    @invalidates('task_definition')
     def register_task_definition(self, family, containers, volumes, role_arn,
                                  execution_role_arn, tags, additional_properties):
+        properties = {key: value for key, value in additional_properties.items() if key not in READ_ONLY_PROPERTIES}
         if tags:
-            additional_properties['tags'] = tags
+            properties['tags'] = tags
 
         return self.boto.register_task_definition(
             family=family,
@@ -83,26 +253,52 @@ class EcsClient(object):
             volumes=volumes,
             taskRoleArn=role_arn,
             executionRoleArn=execution_role_arn,
-            **additional_properties
+            **properties
+        )
+
+    @memoized('task_definition')
+    def list_task_definition_revisions(self, family, max_results=DEFAULT_REUSE_REVISIONS):
+        response = self.boto.list_task_definitions(
+            familyPrefix=family,
+            status='ACTIVE',
+            sort='DESC',
+            maxResults=max_results
+        )
+
+        # familyPrefix also matches other families starting with the same name
+        return [
+            arn for arn in response[u'taskDefinitionArns'] if arn.rsplit(u'/', 1)[-1].rsplit(u':', 1)[0] == family
+        ]
+
+    def list_task_definition_arns_with_tag(self, key, value):
+        response = self._client_factory.client('resourcegroupstaggingapi').get_resources(
+            ResourceTypeFilters=['ecs:task-definition'],
+            TagFilters=[{'Key': key, 'Values': [value]}]
         )
 
+        return [item[u'ResourceARN'] for item in response[u'ResourceTagMappingList']]
+
+    @invalidates('task_definition')
     def deregister_task_definition(self, task_definition_arn):
+        if self.task_definition_cache:
+            self.task_definition_cache.invalidate(task_definition_arn)
+
         return self.boto.deregister_task_definition(
             taskDefinition=task_definition_arn
         )
 
-    def update_service(self, cluster, service, desired_count, task_definition):
-        if desired_count is None:
-            return self.boto.update_service(
-                cluster=cluster,
-                service=service,
-                taskDefinition=task_definition
-            )
+    def update_service(self, cluster, service, desired_count, task_definition, force_new_deployment=False):
+        options = {}
+        if desired_count is not None:
+            options['desiredCount'] = desired_count
+        if force_new_deployment:
+            options['forceNewDeployment'] = True
+
         return self.boto.update_service(
             cluster=cluster,
             service=service,
-            desiredCount=desired_count,
-            taskDefinition=task_definition
+            taskDefinition=task_definition,
+            **options
         )
 
     def run_task(self, cluster, task_definition, count, started_by, overrides,
@@ -154,9 +350,70 @@ class EcsClient(object):
         return target['Id']
 
 
+class EcsDeployment(dict):
+    @property
+    def id(self):
+        return self.get(u'id')
+
+    @property
+    def status(self):
+        return self.get(u'status')
+
+    @property
+    def task_definition(self):
+        return self.get(u'taskDefinition')
+
+    @property
+    def desired_count(self):
+        return self.get(u'desiredCount')
+
+    @property
+    def running_count(self):
+        return self.get(u'runningCount')
+
+    @property
+    def pending_count(self):
+        return self.get(u'pendingCount')
+
+    @property
+    def failed_tasks(self):
+        return self.get(u'failedTasks', 0)
+
+    @property
+    def rollout_state(self):
+        return self.get(u'rolloutState')
+
+    @property
+    def rollout_state_reason(self):
+        return self.get(u'rolloutStateReason')
+
+    @property
+    def created_at(self):
+        return self.get(u'createdAt')
+
+    @property
+    def updated_at(self):
+        return self.get(u'updatedAt')
+
+    @property
+    def is_primary(self) -> bool:
+        return self.status == u'PRIMARY'
+
+    @property
+    def is_failed(self) -> bool:
+        return self.rollout_state == u'FAILED'
+
+    @property
+    def failure_reason(self):
+        reason = self.rollout_state_reason or u'rollout failed'
+
+        return f'{reason} [rolloutState={self.rollout_state}, failedTasks={self.failed_tasks}]'
+
+
 class EcsService(dict):
     def __init__(self, cluster, service_definition=None, **kwargs):
         self._cluster = cluster
+        self._primary_deployment_timestamps = None
         super(EcsService, self).__init__(service_definition, **kwargs)
 
     def set_task_definition(self, task_definition):
@@ -178,19 +435,93 @@ class EcsService(dict):
     def desired_count(self):
         return self.get(u'desiredCount')
 
+    @property
+    def deployments(self):
+        return [EcsDeployment(deployment) for deployment in self.get(u'deployments') or []]
+
+    @property
+    def primary_deployment(self):
+        for deployment in self.deployments:
+            if deployment.is_primary:
+                return deployment
+        return None
+
+    def get_deployment(self, task_definition_arn):
+        for deployment in self.deployments:
+            if deployment.task_definition == task_definition_arn:
+                return deployment
+        return None
+
+    def get_failed_deployment(self, task_definition_arn=None):
+        """
+        Returns the deployment of the given (default: the service's) task definition or the PRIMARY deployment, if its
+        rollout failed, e.g. because the deployment circuit breaker stopped it.
+
+        When the circuit breaker also rolls back, ECS starts a new PRIMARY deployment of the previous task definition
+        and the failed deployment stays listed as ACTIVE until it is drained, hence the lookup by task definition.
+        """
+        task_definition_arn = task_definition_arn or self.task_definition
+
+        for deployment in self.deployments:
+            if deployment.is_failed and (deployment.is_primary or deployment.task_definition == task_definition_arn):
+                return deployment
+        return None
+
+    @property
+    def rollout_completed(self):
+        """
+        Decides whether the service is deployed using only the deployments block of DescribeServices.
+
+        Returns None when the block is not conclusive (e.g. counts are missing or refer to another task
+        definition), in which case the caller has to inspect the running tasks.
+        """
+        deployments = self.deployments
+        if len(deployments) != 1:
+            return False
+
+        deployment = deployments[0]
+        if deployment.rollout_state == u'FAILED':
+            return False
+        if deployment.running_count is None or deployment.pending_count is None:
+            return None
+        if deployment.task_definition and deployment.task_definition != self.task_definition:
+            return None
+
+        return deployment.pending_count == 0 and deployment.running_count == self.desired_count
+
+    @property
+    def progress(self):
+        """
+        A comparable snapshot of the rollout, used by waiters to detect whether anything changed between two polls.
+        """
+        events = self.get(u'events') or []
+
+        return (
+            tuple(
+                (d.id, d.rollout_state, d.running_count, d.pending_count, d.failed_tasks) for d in self.deployments
+            ),
+            events[0].get(u'id') if events else None,
+        )
+
+    def _get_primary_deployment_timestamps(self):
+        # a service is a snapshot of DescribeServices, so the timestamps are looked up once and not on every read
+        if self._primary_deployment_timestamps is None:
+            for deployment in self.get(u'deployments') or []:
+                if deployment.get(u'status') == u'PRIMARY':
+                    self._primary_deployment_timestamps = (deployment.get(u'createdAt'), deployment.get(u'updatedAt'))
+                    break
+            else:
+                self._primary_deployment_timestamps = (datetime.now(), datetime.now())
+
+        return self._primary_deployment_timestamps
+
     @property
     def deployment_created_at(self):
-        for deployment in self.get(u'deployments'):
-            if deployment.get(u'status') == u'PRIMARY':
-                return deployment.get(u'createdAt')
-        return datetime.now()
+        return self._get_primary_deployment_timestamps()[0]
 
     @property
     def deployment_updated_at(self):
-        for deployment in self.get(u'deployments'):
-            if deployment.get(u'status') == u'PRIMARY':
-                return deployment.get(u'updatedAt')
-        return datetime.now()
+        return self._get_primary_deployment_timestamps()[1]
 
     @property
     def errors(self):
@@ -205,11 +536,11 @@ class EcsService(dict):
             until=self.deployment_updated_at
         )
 
-    def get_warnings(self, since=None, until=None):
+    def get_warnings(self, since=None, until=None, events=None):
         since = since or self.deployment_created_at
-        until = until or datetime.now(tz=tzlocal())
+        until = until or get_clock().datetime()
         errors = {}
-        for event in self.get(u'events'):
+        for event in (self.get(u'events') or []) if events is None else events:
             if u'unable' not in event[u'message']:
                 continue
             if since < event[u'createdAt'] < until:
@@ -217,8 +548,156 @@ class EcsService(dict):
         return errors
 
 
+class EcsEventCursor(object):
+    """
+    Remembers the newest service event a waiter has seen, so that every poll only processes the events added since.
+
+    DescribeServices returns the events newest first, so the new events are the ones in front of the last seen event.
+    Given since (e.g. the creation of the deployment being waited for), the first poll starts with the events created
+    after it instead of the whole event history.
+    """
+
+    def __init__(self, since=None):
+        self.last_event_id = None
+        self.since = since
+
+    def new_events(self, service: EcsService):
+        events = service.get(u'events') or []
+
+        new_events = []
+        for event in events:
+            if self.last_event_id is not None and event.get(u'id') == self.last_event_id:
+                break
+            if self.since is not None and event.get(u'createdAt') is not None and event[u'createdAt'] < self.since:
+                break
+            new_events.append(event)
+
+        if events and events[0].get(u'id') is not None:
+            self.last_event_id = events[0][u'id']
+
+        return new_events
+
+
+class EcsStoppedTask(dict):
+    @property
+    def arn(self):
+        return self.get(u'taskArn')
+
+    @property
+    def id(self):
+        return (self.arn or u'').rsplit(u'/', 1)[-1]
+
+    @property
+    def task_definition(self):
+        return self.get(u'taskDefinitionArn')
+
+    @property
+    def stop_code(self):
+        return self.get(u'stopCode')
+
+    @property
+    def stopped_reason(self):
+        return self.get(u'stoppedReason') or u''
+
+    @property
+    def stopped_at(self):
+        return self.get(u'stoppedAt')
+
+    @property
+    def containers(self):
+        return self.get(u'containers') or []
+
+    @property
+    def failure(self):
+        """
+        Classifies why the task stopped, e.g. 'exit code 1' or 'image pull failed'. Returns None for tasks that were
+        stopped on purpose (scale-in, replaced by a deployment, stopped by a user) or by an infrastructure event.
+        """
+        if self.stop_code == u'UserInitiated' or self.stopped_reason.startswith(INTENDED_STOPPED_REASONS):
+            return None
+
+        reasons = u' '.join([self.stopped_reason] + [container.get(u'reason') or u'' for container in self.containers])
+
+        if u'CannotPullContainerError' in reasons:
+            return u'image pull failed'
+        if u'ResourceInitializationError' in reasons:
+            return u'resource initialization failed'
+        if u'OutOfMemoryError' in reasons:
+            return u'out of memory'
+        if u'health checks' in self.stopped_reason:
+            return u'health check failed'
+
+        exit_codes = [container.get(u'exitCode') for container in self.containers]
+        failed_exit_codes = [code for code in exit_codes if code not in (None, 0)]
+        if failed_exit_codes:
+            return u'exit code %s' % failed_exit_codes[0]
+
+        if self.stop_code == u'TaskFailedToStart':
+            return u'failed to start'
+        if self.stop_code == u'EssentialContainerExited':
+            return u'essential container exited'
+
+        return None
+
+    @property
+    def failure_message(self):
+        return f'Task {self.id} failed ({self.failure}): {self.stopped_reason}'
+
+
+class EcsStoppedTaskMonitor(object):
+    """
+    Collects the tasks of a deployment that stopped because they failed, so that a crash-looping deployment fails after
+    a few failed tasks instead of running into the timeout.
+
+    Every poll lists the STOPPED tasks started by the deployment of the given task definition (or, until the deployment
+    shows up, of its family) and only describes the tasks it has not seen before. Tasks of other task definitions and
+    tasks that stopped before the monitor was created are ignored.
+    """
+
+    def __init__(self, client: EcsClient, cluster_name, task_definition_arn, max_failures=DEFAULT_MAX_TASK_FAILURES,
+                 since=None):
+        self._client = client
+        self.cluster_name = cluster_name
+        self.task_definition_arn = task_definition_arn
+        self.max_failures = max_failures
+        self.since = since or get_clock().datetime()
+        self.seen_task_arns = set()
+        self.failures = []
+
+    def new_failures(self, service: EcsService):
+        deployment = service.get_deployment(self.task_definition_arn)
+        if deployment and deployment.id:
+            filters = dict(started_by=deployment.id)
+        else:
+            filters = dict(family=self.task_definition_arn.rsplit(u'/', 1)[-1].rsplit(u':', 1)[0])
+
+        task_arns = [
+            task_arn
+            for task_arn in self._client.iter_task_arns(self.cluster_name, desired_status=u'STOPPED', **filters)
+            if task_arn not in self.seen_task_arns
+        ]
+        self.seen_task_arns.update(task_arns)
+
+        new_failures = []
+        for task in self._client.iter_tasks(self.cluster_name, task_arns):
+            task = EcsStoppedTask(task)
+            if task.task_definition != self.task_definition_arn or not task.failure:
+                continue
+            if task.stopped_at and task.stopped_at < self.since:
+                continue
+            new_failures.append(task)
+
+        self.failures.extend(new_failures)
+
+        return new_failures
+
+    @property
+    def failed(self) -> bool:
+        return bool(self.max_failures) and len(self.failures) >= self.max_failures
+
+
 class EcsTaskDefinition(object):
-    def __init__(self, containerDefinitions, volumes, family, revision, status, taskDefinitionArn,
+    def __init__(self, containerDefinitions, volumes, family, revision, taskDefinitionArn, status=None,
                  requiresAttributes=None, taskRoleArn=None, executionRoleArn=None, compatibilities=None, tags=None,
                  **kwargs):
         self.containers = containerDefinitions
@@ -232,6 +711,7 @@ class EcsTaskDefinition(object):
         self.execution_role_arn = executionRoleArn or ''
         self.tags = tags
         self.additional_properties = kwargs
+        self.reused = False
         self._diff = []
 
         # the compatibilities parameter is returned from the ECS API, when
@@ -239,6 +719,22 @@ class EcsTaskDefinition(object):
         # task definition. Just storing it for now.
         self.compatibilities = compatibilities
 
+    @property
+    def tags(self):
+        if self._load_tags is not None:
+            self._tags, self._load_tags = self._load_tags(), None
+        return self._tags
+
+    @tags.setter
+    def tags(self, tags):
+        self._tags, self._load_tags = tags, None
+
+    def load_tags_with(self, load_tags):
+        """
+        Defers fetching the tags to load_tags, which is called the first time they are used.
+        """
+        self._load_tags = load_tags
+
     @property
     def container_names(self):
         for container in self.containers:
@@ -257,6 +753,13 @@ class EcsTaskDefinition(object):
     def updated(self) -> bool:
         return self._diff != []
 
+    def is_reuse_of(self, task_definition) -> bool:
+        """
+        Whether this is the revision of the given task definition, reused instead of registering a new one; it must not
+        be deregistered as the previous revision then.
+        """
+        return self.reused and self.arn == task_definition.arn
+
     @property
     def diff(self):
         return self._diff
@@ -269,49 +772,13 @@ class EcsTaskDefinition(object):
             click.secho('')
 
     def diff_raw(self, task_b):
-        containers_a = {c['name']: c for c in self.containers}
-        containers_b = {c['name']: c for c in task_b.containers}
-
-        requirements_a = sorted([r['name'] for r in self.requires_attributes])
-        requirements_b = sorted([r['name'] for r in task_b.requires_attributes])
-
-        for container in containers_a:
-            containers_a[container]['environment'] = {e['name']: e['value'] for e in
-                                                      containers_a[container].get('environment', {})}
-
-        for container in containers_b:
-            containers_b[container]['environment'] = {e['name']: e['value'] for e in
-                                                      containers_b[container].get('environment', {})}
-
-        for container in containers_a:
-            containers_a[container]['secrets'] = {e['name']: e['valueFrom'] for e in
-                                                  containers_a[container].get('secrets', {})}
-
-        for container in containers_b:
-            containers_b[container]['secrets'] = {e['name']: e['valueFrom'] for e in
-                                                  containers_b[container].get('secrets', {})}
-
-        composite_a = {
-            'containers': containers_a,
-            'volumes': self.volumes,
-            'requires_attributes': requirements_a,
-            'role_arn': self.role_arn,
-            'execution_role_arn': self.execution_role_arn,
-            'compatibilities': self.compatibilities,
-            'additional_properties': self.additional_properties,
-        }
-
-        composite_b = {
-            'containers': containers_b,
-            'volumes': task_b.volumes,
-            'requires_attributes': requirements_b,
-            'role_arn': task_b.role_arn,
-            'execution_role_arn': task_b.execution_role_arn,
-            'compatibilities': task_b.compatibilities,
-            'additional_properties': task_b.additional_properties,
-        }
+        """
+        Returns the changes from this task definition to task_b (see aws_deploy.ecs.differ), neither is modified.
+        """
+        # imported here, the differ uses the constants of this module
+        from aws_deploy.ecs import differ
 
-        return list(diff(composite_a, composite_b))
+        return differ.diff(self, task_b)
 
     def get_overrides(self):
         override = dict()
@@ -352,8 +819,47 @@ class EcsTaskDefinition(object):
     def get_overrides_secrets(secrets):
         return [{"name": s, "valueFrom": secrets[s]} for s in secrets]
 
+    @property
+    def content_hash(self):
+        """
+        SHA-256 over the canonical JSON of everything a registration sends (containers, volumes, roles, tags and the
+        additional properties), so that revisions with the same content have the same hash.
+        """
+
+        def sorted_by_name(values):
+            if isinstance(values, (list, tuple)):
+                return sorted(values, key=lambda value: value['name'])
+            return values or []
+
+        containers = [
+            dict(
+                container,
+                environment=sorted_by_name(container.get('environment')),
+                secrets=sorted_by_name(container.get('secrets'))
+            )
+            for container in self.containers
+        ]
+        content = {
+            key: value
+            for key, value in self.additional_properties.items() if key not in CONTENT_HASH_IGNORED_PROPERTIES
+        }
+        content.update(
+            family=self.family,
+            containerDefinitions=containers,
+            volumes=self.volumes,
+            taskRoleArn=self.role_arn,
+            executionRoleArn=self.execution_role_arn,
+            tags=sorted(
+                (tag for tag in self.tags or [] if tag['key'] != CONTENT_HASH_TAG), key=lambda tag: tag['key']
+            ),
+        )
+
+        return hashlib.sha256(
+            json.dumps(content, sort_keys=True, separators=(',', ':'), default=str).encode()
+        ).hexdigest()
+
     def get_tag(self, key):
-        for tag in self.tags:
+        for tag in self.tags or []:
             if tag['key'] == key:
                 return tag['value']
 
@@ -603,13 +1109,14 @@ class EcsTaskDefinitionDiff(object):
 
 
 class EcsAction(object):
-    def __init__(self, client: EcsClient, cluster_name: str, service_name: str):
+    def __init__(self, client: EcsClient, cluster_name: str, service_name: str, service: EcsService = None):
         self._client = client
         self._cluster_name = cluster_name
         self._service_name = service_name
+        self._service = service
 
         try:
-            if service_name:
+            if service_name and not service:
                 self._service = self.get_service()
         except IndexError:
             raise EcsConnectionError(
@@ -646,56 +1153,118 @@ class EcsAction(object):
             tags=task_definition_payload.get('tags', None),
             **task_definition_payload[u'taskDefinition']
         )
+        if u'tags' not in task_definition_payload:
+            # read from the task definition cache, its tags are only listed if they are used (e.g. to register)
+            task_definition.load_tags_with(partial(self._client.list_task_definition_tags, task_definition.arn))
         return task_definition
 
-    def update_task_definition(self, task_definition):
+    def update_task_definition(self, task_definition, tag_content_hash=True):
+        """
+        Registers the task definition as a new revision. With tag_content_hash, the revision is tagged with its content
+        hash for find_task_definition_revision, unless tagging is not allowed (ecs:TagResource): then it is registered
+        without the tag.
+        """
+        tags = [tag for tag in task_definition.tags or [] if tag['key'] != CONTENT_HASH_TAG]
+        if tag_content_hash:
+            try:
+                return self._register_task_definition(
+                    task_definition, tags + [{'key': CONTENT_HASH_TAG, 'value': task_definition.content_hash}]
+                )
+            except ClientError as e:
+                if e.response.get(u'Error', {}).get(u'Code') != u'AccessDeniedException':
+                    raise
+
+        return self._register_task_definition(task_definition, tags)
+
+    def _register_task_definition(self, task_definition, tags):
         response = self._client.register_task_definition(
             family=task_definition.family,
             containers=task_definition.containers,
             volumes=task_definition.volumes,
             role_arn=task_definition.role_arn,
             execution_role_arn=task_definition.execution_role_arn,
-            tags=task_definition.tags,
+            tags=tags,
             additional_properties=task_definition.additional_properties
         )
         new_task_definition = EcsTaskDefinition(**response[u'taskDefinition'])
         return new_task_definition
 
+    def find_task_definition_revision(self, task_definition, max_revisions=DEFAULT_REUSE_REVISIONS):
+        """
+        Returns an ACTIVE revision with the same content as the given task definition: the given revision itself, if it
+        was not modified, or one of the max_revisions latest revisions of its family whose ContentHash tag matches
+        (found with one tag-filtered GetResources call, no revision is described for the lookup). Returns None if there
+        is none, or if the tagged revisions cannot be looked up. Revisions read from the task definition cache have no
+        status, they are only found among the latest revisions.
+        """
+        if not task_definition.diff and (task_definition.status or u'').upper() == u'ACTIVE':
+            task_definition.reused = True
+            return task_definition
+
+        if not max_revisions:
+            return None
+
+        revision_arns = self._client.list_task_definition_revisions(task_definition.family, max_revisions)
+        if not revision_arns:
+            return None
+        if not task_definition.diff and task_definition.status is None and task_definition.arn in revision_arns:
+            task_definition.reused = True
+            return task_definition
+
+        try:
+            tagged_arns = self._client.list_task_definition_arns_with_tag(
+                CONTENT_HASH_TAG, task_definition.content_hash
+            )
+        except ClientError:
+            # e.g. without the tag:GetResources permission a new revision is registered
+            return None
+
+        for arn in revision_arns:
+            if arn in tagged_arns:
+                revision = self.get_task_definition(arn)
+                revision.reused = True
+                return revision
+
+        return None
+
     def deregister_task_definition(self, task_definition):
         self._client.deregister_task_definition(task_definition.arn)
 
-    def update_service(self, service, desired_count=None):
+    def update_service(self, service, desired_count=None, force_new_deployment=False):
+        options = dict(force_new_deployment=True) if force_new_deployment else {}
+
         response = self._client.update_service(
             cluster=service.cluster,
             service=service.name,
             desired_count=desired_count,
-            task_definition=service.task_definition
+            task_definition=service.task_definition,
+            **options
         )
 
         return EcsService(self._cluster_name, response[u'service'])
 
     def is_deployed(self, service):
-        if len(service[u'deployments']) != 1:
-            return False
-        running_tasks = self._client.list_tasks(
+        rollout_completed = service.rollout_completed
+        if rollout_completed is not None:
+            return rollout_completed
+
+        task_arns = self._client.iter_task_arns(
             cluster_name=service.cluster,
             service_name=service.name
         )
-        if not running_tasks[u'taskArns']:
-            return service.desired_count == 0
         running_count = self.get_running_tasks_count(
             service=service,
-            task_arns=running_tasks[u'taskArns']
+            task_arns=task_arns
         )
         return service.desired_count == running_count
 
     def get_running_tasks_count(self, service, task_arns):
         running_count = 0
-        tasks_details = self._client.describe_tasks(
+        tasks = self._client.iter_tasks(
             cluster_name=self._cluster_name,
             task_arns=task_arns
         )
-        for task in tasks_details[u'tasks']:
+        for task in tasks:
             arn = task[u'taskDefinitionArn']
             status = task[u'lastStatus']
             if arn == service.task_definition and status == u'RUNNING':
@@ -720,10 +1289,14 @@ class EcsAction(object):
 
 
 class DeployAction(EcsAction):
-    def deploy(self, task_definition):
+    def deploy(self, task_definition, force_new_deployment=False):
+        """
+        Updates the service to the given task definition. With force_new_deployment, ECS starts a new deployment even if
+        the service already runs that task definition, which replaces all tasks and pulls their images again.
+        """
         try:
             self._service.set_task_definition(task_definition)
-            return self.update_service(self._service)
+            return self.update_service(self._service, force_new_deployment=force_new_deployment)
         except ClientError as e:
             raise EcsError(str(e))
 
@@ -773,6 +1346,79 @@ class DiffAction(EcsAction):
     def __init__(self, client):
         super(DiffAction, self).__init__(client, None, None)
 
+    def find_task_definition(self, family, revision):
+        try:
+            return self.get_task_definition(f'{family}:{revision}')
+        except UnknownTaskDefinitionError:
+            return None
+
+    def iter_task_definitions(self, family, revisions, max_parallel=DIFF_MAX_PARALLEL):
+        """
+        Fetches the given revisions of a family, max_parallel at a time, and yields (revision, task definition) in order
+        as soon as a revision and the ones before it were fetched. Revisions that do not exist (any more) yield None.
+        At most max_parallel revisions are fetched or waiting to be yielded at a time, so that a long range is not held
+        in memory.
+        """
+        fetch = in_current_span(lambda revision: self.find_task_definition(family, revision))
+        revisions = iter(revisions)
+
+        with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+            pending = deque(
+                (revision, executor.submit(fetch, revision)) for revision in islice(revisions, max_parallel)
+            )
+            while pending:
+                revision, future = pending.popleft()
+                task_definition = future.result()
+                for next_revision in islice(revisions, 1):
+                    pending.append((next_revision, executor.submit(fetch, next_revision)))
+                yield revision, task_definition
+
+    def bisect(self, family, first_revision, last_revision, field, on_step=None):
+        """
+        Finds the first revision after first_revision in which the value of field (see differ.field_value) differs from
+        its value in first_revision, with a binary search that fetches about log2(revisions) revisions. Assumes that the
+        field changed once within the range. Returns the task definitions before and after the change, or None if the
+        field has the same value in both revisions. on_step is called with every fetched task definition and its value.
+        """
+        from aws_deploy.ecs import differ
+
+        def fetch(revision):
+            task_definition = self.find_task_definition(family, revision)
+            if task_definition is None:
+                return None, None
+            value = differ.field_value(differ.normalize(task_definition), field)
+            if on_step:
+                on_step(task_definition, value)
+            return task_definition, value
+
+        before, value = fetch(first_revision)
+        after, last_value = fetch(last_revision)
+        if before is None or after is None:
+            raise UnknownTaskDefinitionError(
+                f'Unknown task definition arn: {family}:{first_revision if before is None else last_revision}'
+            )
+        if value == last_value:
+            return None
+
+        low, high = first_revision, last_revision
+        while high - low > 1:
+            # revisions that do not exist any more are skipped, the nearest existing one is used instead
+            middle = (low + high) // 2
+            candidates = sorted(range(low + 1, high), key=lambda revision: abs(revision - middle))
+            for candidate in candidates:
+                task_definition, candidate_value = fetch(candidate)
+                if task_definition is not None:
+                    break
+            else:
+                break
+
+            if candidate_value == value:
+                low, before = candidate, task_definition
+            else:
+                high, after = candidate, task_definition
+
+        return before, after
+
 
 class EcsError(Exception):
     pass
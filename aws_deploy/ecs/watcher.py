@@ -0,0 +1,196 @@
+import asyncio
+from collections import OrderedDict
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+from aws_deploy.common.polling import DEFAULT_MAX_SLEEP_TIME, PollScheduler, is_throttling_error
+from aws_deploy.common.tracing import in_current_span
+from .helper import (
+    DESCRIBE_SERVICES_MAX_SERVICES, EcsAction, EcsClient, EcsEventCursor, EcsService, EcsStoppedTaskMonitor, chunked
+)
+
+DEFAULT_MAX_CONCURRENT_REQUESTS = 10
+
+
+class WatchResult:
+    def __init__(self, cluster_name: str, service_name: str, task_definition_arn: str = None):
+        self.cluster_name = cluster_name
+        self.service_name = service_name
+        self.task_definition_arn = task_definition_arn
+        self.service: Optional[EcsService] = None
+        self.event_cursor = EcsEventCursor()
+        self.task_monitor: Optional[EcsStoppedTaskMonitor] = None
+        self.deployed = False
+        self.error = None
+
+    @property
+    def finished(self) -> bool:
+        return self.deployed or self.error is not None
+
+    @property
+    def progress(self):
+        return self.service.progress if self.service else None
+
+    def __repr__(self):
+        return f'{self.cluster_name}/{self.service_name}'
+
+
+class EcsDeploymentWatcher:
+    """
+    Waits for many services at once in a single event loop.
+
+    Every poll groups the unfinished services by cluster and describes them with one DescribeServices request per
+    DESCRIBE_SERVICES_MAX_SERVICES services. The blocking boto3 calls run in the default executor, limited to
+    max_concurrent_requests at a time.
+
+    Targets are (cluster, service) or (cluster, service, task definition ARN) tuples. Given the task definition being
+    deployed, a service also fails when the deployment circuit breaker rolled it back to another task definition, or
+    once max_task_failures of its tasks stopped with an error. A request that fails (other than by throttling) only
+    fails the services it was sent for, the others are still watched.
+    """
+
+    def __init__(self, client: EcsClient, targets: Iterable[Tuple[str, ...]], ignore_warnings=False, sleep_time=1,
+                 max_sleep_time=DEFAULT_MAX_SLEEP_TIME, max_concurrent_requests=DEFAULT_MAX_CONCURRENT_REQUESTS,
+                 max_task_failures=None, on_finished: Callable[[WatchResult], None] = None):
+        self._client = client
+        self._results = OrderedDict(
+            ((target[0], target[1]), WatchResult(*target)) for target in targets
+        )
+        for result in self._results.values():
+            if max_task_failures and result.task_definition_arn:
+                result.task_monitor = EcsStoppedTaskMonitor(
+                    client, result.cluster_name, result.task_definition_arn, max_task_failures
+                )
+        self._actions = {}
+        self._ignore_warnings = ignore_warnings
+        self._sleep_time = sleep_time
+        self._max_sleep_time = max_sleep_time
+        self._max_concurrent_requests = max_concurrent_requests
+        self._on_finished = on_finished
+        self._throttled = False
+
+    @property
+    def results(self) -> List[WatchResult]:
+        return list(self._results.values())
+
+    def watch(self, timeout) -> List[WatchResult]:
+        return asyncio.run(self.watch_async(timeout))
+
+    async def watch_async(self, timeout) -> List[WatchResult]:
+        scheduler = PollScheduler(sleep_time=self._sleep_time, max_sleep_time=self._max_sleep_time)
+        deadline = scheduler.deadline(timeout)
+        semaphore = asyncio.Semaphore(self._max_concurrent_requests)
+
+        while True:
+            pending = [result for result in self._results.values() if not result.finished]
+            if not pending:
+                break
+
+            batches = [
+                (cluster_name, batch)
+                for cluster_name, results in self._group_by_cluster(pending).items()
+                for batch in chunked(results, DESCRIBE_SERVICES_MAX_SERVICES)
+            ]
+            self._throttled = False
+            outcomes = await asyncio.gather(
+                *(self._poll_batch(semaphore, cluster_name, batch) for cluster_name, batch in batches),
+                return_exceptions=True
+            )
+            for (_, batch), outcome in zip(batches, outcomes):
+                if isinstance(outcome, Exception):
+                    self._fail(batch, outcome)
+
+            pending = [result for result in pending if not result.finished]
+            if not pending or timeout == -1 or scheduler.expired(deadline):
+                break
+
+            if self._throttled:
+                await scheduler.wait_throttled_async(deadline=deadline)
+            else:
+                await scheduler.wait_async(tuple(result.progress for result in pending), deadline=deadline)
+
+        return self.results
+
+    @staticmethod
+    def _group_by_cluster(results):
+        clusters = OrderedDict()
+        for result in results:
+            clusters.setdefault(result.cluster_name, []).append(result)
+        return clusters
+
+    async def _run(self, semaphore, fn, *args):
+        async with semaphore:
+            return await asyncio.get_running_loop().run_in_executor(None, in_current_span(fn), *args)
+
+    async def _poll_batch(self, semaphore, cluster_name, results: List[WatchResult]):
+        response = await self._run(
+            semaphore, self._client.describe_services_batch, cluster_name, [r.service_name for r in results]
+        )
+
+        services = {service[u'serviceName']: service for service in response.get(u'services', [])}
+        failures = {
+            failure[u'arn'].rsplit('/', 1)[-1]: failure.get(u'reason') for failure in response.get(u'failures', [])
+        }
+
+        for result in results:
+            if result.service_name not in services:
+                reason = failures.get(result.service_name, 'Service not found')
+                self._finish(result, error=str(reason))
+                continue
+
+            result.service = EcsService(cluster=cluster_name, service_definition=services[result.service_name])
+            if result.event_cursor.since is None:
+                # like wait_for_finish, the first poll skips the events from before the deployment
+                result.event_cursor.since = result.service.deployment_created_at
+            try:
+                await self._inspect(semaphore, result)
+            except Exception as e:
+                self._fail([result], e)
+
+    async def _inspect(self, semaphore, result: WatchResult):
+        service = result.service
+
+        warnings = service.get_warnings(events=result.event_cursor.new_events(service))
+        if warnings and not self._ignore_warnings:
+            self._finish(result, error=warnings[max(warnings)])
+            return
+
+        failed_deployment = service.get_failed_deployment(result.task_definition_arn)
+        if failed_deployment:
+            self._finish(result, error=failed_deployment.failure_reason)
+            return
+
+        if result.task_monitor:
+            await self._run(semaphore, result.task_monitor.new_failures, service)
+            if result.task_monitor.failed:
+                failures = result.task_monitor.failures
+                self._finish(result, error=f'{len(failures)} tasks failed, last: {failures[-1].failure_message}')
+                return
+
+        deployed = service.rollout_completed
+        if deployed is None:
+            deployed = await self._run(semaphore, self._get_action(result.cluster_name).is_deployed, service)
+
+        if deployed:
+            result.deployed = True
+            self._finish(result)
+
+    def _get_action(self, cluster_name) -> EcsAction:
+        if cluster_name not in self._actions:
+            self._actions[cluster_name] = EcsAction(self._client, cluster_name, None)
+        return self._actions[cluster_name]
+
+    def _fail(self, results: List[WatchResult], error: Exception):
+        # a throttled request is repeated by the next poll, after backing off
+        if isinstance(error, ClientError) and is_throttling_error(error):
+            self._throttled = True
+            return
+        for result in results:
+            if not result.finished:
+                self._finish(result, error=str(error))
+
+    def _finish(self, result: WatchResult, error=None):
+        result.error = error
+        if self._on_finished:
+            self._on_finished(result)
@@ -1,8 +1,6 @@
 import re
 from datetime import datetime
 
-import requests
-
 from aws_deploy.notification.notification import Notification
 
 
@@ -17,6 +15,12 @@ class SlackNotification(Notification):
         self.__username = username
         self.__timestamp_start = datetime.utcnow()
 
+    def _post(self, payload):
+        # requests is imported on first use only, as it takes longer to import than the whole CLI
+        import requests
+
+        return requests.post(self.__url, json=payload)
+
     def _get_payload(self, title, messages, color=None):
         fields = []
         for message in messages:
@@ -75,7 +79,7 @@ class SlackNotification(Notification):
 
         payload = self._get_payload('Deployment has started', messages)
 
-        response = requests.post(self.__url, json=payload)
+        response = self._post(payload)
 
         if response.status_code != 200:
             raise SlackException('Notifying deployment failed')
@@ -103,7 +107,7 @@ class SlackNotification(Notification):
 
         payload = self._get_payload('Deployment finished successfully', messages, 'good')
 
-        response = requests.post(self.__url, json=payload)
+        response = self._post(payload)
 
         if response.status_code != 200:
             raise SlackException('Notifying deployment failed')
@@ -129,7 +133,7 @@ class SlackNotification(Notification):
 
         payload = self._get_payload('Deployment failed', messages, 'danger')
 
-        response = requests.post(self.__url, json=payload)
+        response = self._post(payload)
 
         if response.status_code != 200:
             raise SlackException('Notifying deployment failed')
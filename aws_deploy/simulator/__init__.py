@@ -0,0 +1,2 @@
+from aws_deploy.simulator.backend import Simulator, SimulatorClientFactory
+from aws_deploy.simulator.clock import VirtualClock
@@ -0,0 +1,286 @@
+import random
+import threading
+from collections import Counter
+from functools import lru_cache
+from types import SimpleNamespace
+
+from botocore.exceptions import ClientError
+from botocore.hooks import HierarchicalEmitter
+from botocore.session import get_session
+from botocore.validate import validate_parameters
+
+from aws_deploy.common.session import ClientFactory
+from aws_deploy.common.utils import operation_name
+from aws_deploy.simulator.batch import BatchSimulator
+from aws_deploy.simulator.clock import VirtualClock
+from aws_deploy.simulator.code_deploy import CodeDeploySimulator, ResourceTaggingSimulator
+from aws_deploy.simulator.ecs import EcsSimulator, EventsSimulator
+from aws_deploy.simulator.sts import StsSimulator
+from aws_deploy.simulator.utils import client_error
+
+# like the legacy retry mode of botocore, a throttled call is attempted up to 5 times with exponential backoff
+DEFAULT_MAX_ATTEMPTS = 5
+
+# botocore names its events after the hyphenized service id, which is not always the client's service name
+SERVICE_IDS = {
+    'ecs': 'ecs',
+    'events': 'cloudwatch-events',
+    'codedeploy': 'codedeploy',
+    'resourcegroupstaggingapi': 'resource-groups-tagging-api',
+    'batch': 'batch',
+    'sts': 'sts',
+}
+
+
+@lru_cache(maxsize=None)
+def service_model(service_name):
+    # the botocore model of a service, to validate the parameters of the simulated calls
+    return get_session().get_service_model(service_name)
+
+
+class SimulatedHttpResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class TokenBucket:
+    """
+    Allows rate calls per second of virtual time with bursts of up to burst calls, like the AWS API rate limits.
+    """
+
+    def __init__(self, clock: VirtualClock, rate, burst=None):
+        self.clock = clock
+        self.rate = rate
+        self.burst = burst or rate
+        self._tokens = self.burst
+        self._updated_at = clock.now()
+
+    def take(self) -> bool:
+        now = self.clock.now()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+        if self._tokens < 1:
+            return False
+
+        self._tokens -= 1
+        return True
+
+
+class SimulatedPaginator:
+    def __init__(self, client, method_name):
+        self._client = client
+        self._method_name = method_name
+
+    def paginate(self, **kwargs):
+        next_token = None
+        while True:
+            # like a botocore paginator without PageSize, the requests leave the page size to the service
+            options = dict(kwargs)
+            if next_token:
+                options['nextToken'] = next_token
+
+            page = getattr(self._client, self._method_name)(**options)
+            yield page
+
+            next_token = page.get('nextToken')
+            if not next_token:
+                return
+
+
+class SimulatedClient:
+    """
+    Stands in for the boto3 client of one AWS service: every operation is forwarded to the method of the same name of
+    the service's simulator, after the simulator accounted, delayed and possibly throttled the call. Like a boto3
+    client, it emits the before-parameter-build, before-call, before-send (per attempt), needs-retry and after-call
+    events of every call on meta.events, and it validates the parameters against the botocore model of the service.
+    """
+
+    def __init__(self, simulator: 'Simulator', service_name, backend):
+        self._simulator = simulator
+        self._service_name = service_name
+        self._backend = backend
+        self.meta = SimpleNamespace(
+            events=HierarchicalEmitter(),
+            region_name=simulator.region,
+            service_model=SimpleNamespace(service_name=service_name, service_id=SERVICE_IDS[service_name]),
+        )
+
+    def get_paginator(self, method_name):
+        if method_name not in self._backend.PAGINATORS:
+            raise AttributeError(f"'{self._service_name}' client has no paginator '{method_name}'")
+
+        return SimulatedPaginator(self, method_name)
+
+    def __getattr__(self, method_name):
+        if method_name not in self._backend.OPERATIONS:
+            raise AttributeError(f"'{self._service_name}' client has no attribute '{method_name}'")
+
+        method = getattr(self._backend, method_name)
+
+        def call(**kwargs):
+            return self._simulator.call(self, operation_name(method_name), method, kwargs)
+
+        return call
+
+
+class Simulator:
+    """
+    In-memory stand-in for the ECS, CloudWatch Events, CodeDeploy, Resource Groups Tagging, Batch and STS APIs.
+
+    The simulated services keep their state in memory and move it forward along a VirtualClock: ECS rolls out
+    deployments wave by wave, as far as minimumHealthyPercent and maximumPercent allow, and every task takes
+    task_start_latency seconds to start (or to fail, if its image is in failing_images). CodeDeploy deployments take
+    deployment_duration seconds.
+
+    Every API call takes api_latency seconds of virtual time and is counted in calls. rate_limits maps operations
+    ('ecs:DescribeServices' or just 'ecs') to (rate, burst) token buckets. Like botocore, the clients retry throttled
+    calls with exponential backoff (in virtual time) and raise a ThrottlingException after max_attempts throttled
+    attempts; every attempt counts as a call. Set the clock as the polling clock (see
+    aws_deploy.common.polling.set_clock), so that the waiters sleep in virtual time, too.
+    """
+
+    def __init__(self, clock: VirtualClock = None, region='eu-west-1', account_id='123456789012', api_latency=0.0,
+                 task_start_latency=5.0, deployment_duration=30.0, rate_limits=None, failing_images=(),
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, seed=None):
+        if task_start_latency <= 0:
+            raise ValueError('task_start_latency must be positive')
+
+        self.clock = clock or VirtualClock()
+        self.region = region
+        self.account_id = account_id
+        self.api_latency = api_latency
+        self.task_start_latency = task_start_latency
+        self.deployment_duration = deployment_duration
+        self.failing_images = set(failing_images)
+        self.max_attempts = max_attempts
+        self.calls = Counter()
+        self.throttled_calls = Counter()
+
+        self._rate_limits = dict(rate_limits or {})
+        self._buckets = {}
+        self._lock = threading.RLock()
+        self._rng = random.Random(seed)
+
+        self.ecs = EcsSimulator(self)
+        self.events = EventsSimulator(self)
+        self.code_deploy = CodeDeploySimulator(self)
+        self.resource_tagging = ResourceTaggingSimulator(self)
+        self.batch = BatchSimulator(self)
+        self.sts = StsSimulator(self)
+
+        self._backends = {
+            'ecs': self.ecs,
+            'events': self.events,
+            'codedeploy': self.code_deploy,
+            'resourcegroupstaggingapi': self.resource_tagging,
+            'batch': self.batch,
+            'sts': self.sts,
+        }
+
+    def arn(self, service, resource) -> str:
+        return f'arn:aws:{service}:{self.region}:{self.account_id}:{resource}'
+
+    def client(self, service_name) -> SimulatedClient:
+        if service_name not in self._backends:
+            raise ValueError(f'Service {service_name} is not simulated')
+
+        return SimulatedClient(self, service_name, self._backends[service_name])
+
+    def _bucket(self, service_name, operation):
+        for key in (f'{service_name}:{operation}', service_name):
+            if key in self._rate_limits:
+                if key not in self._buckets:
+                    self._buckets[key] = TokenBucket(self.clock, *self._rate_limits[key])
+                return self._buckets[key]
+        return None
+
+    def _attempt(self, service_name, operation) -> bool:
+        with self._lock:
+            self.calls[f'{service_name}:{operation}'] += 1
+
+            bucket = self._bucket(service_name, operation)
+            if bucket and not bucket.take():
+                self.throttled_calls[f'{service_name}:{operation}'] += 1
+                return False
+
+            return True
+
+    def _invoke(self, client: SimulatedClient, model, context, method, kwargs):
+        service_name = client.meta.service_model.service_name
+        event_name = f'{client.meta.service_model.service_id}.{model.name}'
+
+        attempt = 1
+        while True:
+            client.meta.events.emit(f'before-send.{event_name}', request=kwargs)
+            if self._attempt(service_name, model.name):
+                break
+
+            throttled = client_error('ThrottlingException', 'Rate exceeded', model.name)
+            client.meta.events.emit(
+                f'needs-retry.{event_name}', response=(SimulatedHttpResponse(400), throttled.response), endpoint=None,
+                operation=model, attempts=attempt, caught_exception=None, request_dict=kwargs
+            )
+            if attempt >= self.max_attempts:
+                return SimulatedHttpResponse(400), dict(throttled.response, ResponseMetadata={
+                    'HTTPStatusCode': 400, 'RetryAttempts': attempt - 1
+                })
+
+            with self._lock:
+                backoff = self._rng.random() * 2 ** attempt
+            self.clock.sleep(backoff)
+            attempt += 1
+
+        if self.api_latency:
+            self.clock.sleep(self.api_latency)
+
+        try:
+            with self._lock:
+                parsed, status_code = method(**kwargs), 200
+        except ClientError as error:
+            parsed, status_code = error.response, 400
+
+        return SimulatedHttpResponse(status_code), dict(parsed, ResponseMetadata={
+            'HTTPStatusCode': status_code, 'RetryAttempts': attempt - 1
+        })
+
+    def call(self, client: SimulatedClient, operation, method, kwargs):
+        model = SimpleNamespace(name=operation, service_model=client.meta.service_model)
+        event_name = f'{client.meta.service_model.service_id}.{operation}'
+        context = {'client_region': self.region}
+
+        client.meta.events.emit(f'before-parameter-build.{event_name}', params=kwargs, model=model, context=context)
+        # like a boto3 client, unknown, missing or mistyped parameters are rejected before the call is sent
+        operation_model = service_model(client.meta.service_model.service_name).operation_model(operation)
+        validate_parameters(kwargs, operation_model.input_shape)
+        _, response = client.meta.events.emit_until_response(
+            f'before-call.{event_name}', model=model, params=kwargs, request_signer=None, context=context
+        )
+        if response is None:
+            response = self._invoke(client, model, context, method, kwargs)
+
+        http_response, parsed = response
+        client.meta.events.emit(
+            f'after-call.{event_name}', http_response=http_response, parsed=parsed, model=model, context=context
+        )
+        if http_response.status_code >= 300:
+            raise ClientError(parsed, operation)
+
+        return parsed
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+
+class SimulatorClientFactory(ClientFactory):
+    """
+    Hands out the simulated clients of a Simulator instead of boto3 clients, e.g. as ctx.obj['CLIENT_FACTORY'].
+    """
+
+    def __init__(self, simulator: Simulator):
+        super().__init__()
+        self.simulator = simulator
+
+    def _create_client(self, service_name):
+        return self.simulator.client(service_name)
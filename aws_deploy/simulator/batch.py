@@ -0,0 +1,84 @@
+from copy import deepcopy
+
+from aws_deploy.simulator.utils import client_error
+
+
+class BatchSimulator:
+    """
+    Simulates the job definition operations of the Batch API.
+    """
+
+    OPERATIONS = ('describe_job_definitions', 'register_job_definition', 'deregister_job_definition')
+    PAGINATORS = {}
+
+    def __init__(self, simulator):
+        self._simulator = simulator
+        self._job_definitions = {}
+        self._revisions = {}
+
+    # setup
+
+    def add_job_definition(self, name, image='busybox:1.0.0', tags=None, **container_properties):
+        """
+        Registers a container job definition without going through the API. Returns its ARN.
+        """
+        return self._register(
+            name, 'container', dict(container_properties, image=image), dict(tags or {}), {}
+        )['jobDefinitionArn']
+
+    # internals
+
+    def _register(self, name, job_definition_type, container_properties, tags, properties):
+        revision = self._revisions.get(name, 0) + 1
+        self._revisions[name] = revision
+
+        arn = self._simulator.arn('batch', f'job-definition/{name}:{revision}')
+        self._job_definitions[arn] = dict(
+            deepcopy(properties),
+            jobDefinitionName=name,
+            jobDefinitionArn=arn,
+            revision=revision,
+            status='ACTIVE',
+            type=job_definition_type,
+            containerProperties=deepcopy(container_properties),
+            tags=deepcopy(tags),
+        )
+
+        return self._job_definitions[arn]
+
+    # API
+
+    def describe_job_definitions(self, jobDefinitionName=None, jobDefinitions=(), status=None, **kwargs):
+        def matches(arn, job_definition):
+            if jobDefinitionName and job_definition['jobDefinitionName'] != jobDefinitionName:
+                return False
+            if jobDefinitions and arn not in jobDefinitions:
+                return False
+            return not status or job_definition['status'] == status
+
+        job_definitions = [
+            deepcopy(job_definition) for arn, job_definition in self._job_definitions.items()
+            if matches(arn, job_definition)
+        ]
+
+        return {'jobDefinitions': job_definitions}
+
+    def register_job_definition(self, jobDefinitionName=None, type='container', containerProperties=None, tags=None,
+                                **properties):
+        job_definition = self._register(jobDefinitionName, type, containerProperties or {}, tags or {}, properties)
+
+        return {
+            'jobDefinitionName': job_definition['jobDefinitionName'],
+            'jobDefinitionArn': job_definition['jobDefinitionArn'],
+            'revision': job_definition['revision'],
+        }
+
+    def deregister_job_definition(self, jobDefinition=None):
+        if jobDefinition not in self._job_definitions:
+            raise client_error(
+                'ClientException', f'Job definition {jobDefinition} not found', 'DeregisterJobDefinition'
+            )
+
+        self._job_definitions[jobDefinition]['status'] = 'INACTIVE'
+
+        return {}
@@ -0,0 +1,260 @@
+import json
+import multiprocessing
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+import click
+from click.testing import CliRunner
+
+from aws_deploy.common.polling import set_clock
+from aws_deploy.simulator.backend import Simulator, SimulatorClientFactory
+from aws_deploy.simulator.clock import VirtualClock
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+CLUSTER = 'benchmark'
+FLOW_ECS_DEPLOY = 'ecs-deploy'
+FLOW_ECS_SCALE = 'ecs-scale'
+FLOW_CODE_DEPLOY_DEPLOY = 'code-deploy-deploy'
+FLOW_BATCH_DEPLOY = 'batch-deploy'
+FLOWS = (FLOW_ECS_DEPLOY, FLOW_ECS_SCALE, FLOW_CODE_DEPLOY_DEPLOY, FLOW_BATCH_DEPLOY)
+
+DEFAULT_SERVICE_COUNTS = (1, 10, 100, 500)
+DEFAULT_TASKS_PER_SERVICE = (2, 10)
+DEFAULT_API_LATENCIES = (0.0, 0.05)
+
+
+def peak_rss_mb():
+    """
+    Returns the peak resident set size of the process in MB, or None where it is not available. The peak is the one of
+    the whole process, run_benchmark therefore runs every scenario in a process of its own.
+    """
+    # on Linux, ru_maxrss survives the exec of a new process and would include the peak of its parent, the high water
+    # mark of /proc/self/status does not
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    if resource is None:  # pragma: no cover
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes everywhere else
+    return peak_rss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+class BenchmarkResult:
+    def __init__(self, flow, services, tasks_per_service, api_latency, wall_time, virtual_time, calls: Counter,
+                 throttled_calls: Counter, failed_runs, peak_rss):
+        self.flow = flow
+        self.services = services
+        self.tasks_per_service = tasks_per_service
+        self.api_latency = api_latency
+        self.wall_time = wall_time
+        self.virtual_time = virtual_time
+        self.calls = calls
+        self.throttled_calls = throttled_calls
+        self.failed_runs = failed_runs
+        self.peak_rss = peak_rss
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    @property
+    def calls_per_service(self) -> float:
+        return self.total_calls / self.services
+
+    def to_dict(self):
+        return {
+            'flow': self.flow,
+            'services': self.services,
+            'tasks_per_service': self.tasks_per_service,
+            'api_latency': self.api_latency,
+            'wall_time': round(self.wall_time, 4),
+            'virtual_time': round(self.virtual_time, 2),
+            'api_calls': self.total_calls,
+            'api_calls_per_service': round(self.calls_per_service, 2),
+            'calls': dict(sorted(self.calls.items())),
+            'throttled_calls': dict(sorted(self.throttled_calls.items())),
+            'failed_runs': self.failed_runs,
+            'peak_rss_mb': round(self.peak_rss, 1) if self.peak_rss is not None else None,
+        }
+
+    def __repr__(self):
+        return f'{self.flow} [services={self.services}, tasks={self.tasks_per_service}, latency={self.api_latency}]'
+
+
+def setup_ecs_services(simulator: Simulator, services, tasks_per_service):
+    names = []
+    for index in range(services):
+        name = f'service-{index}'
+        simulator.ecs.add_task_definition(name, image='nginx:1.0.0')
+        simulator.ecs.add_service(
+            CLUSTER, name, name, desired_count=tasks_per_service, minimum_healthy_percent=50, maximum_percent=200
+        )
+        names.append(name)
+    return names
+
+
+def setup_code_deploy(simulator: Simulator, services, tasks_per_service):
+    names = []
+    for index in range(services):
+        name = f'service-{index}'
+        simulator.ecs.add_task_definition(name, image='nginx:1.0.0')
+        simulator.ecs.add_task_definition(name, image='nginx:1.1.0')
+        simulator.ecs.add_service(CLUSTER, name, f'{name}:1', desired_count=tasks_per_service)
+        simulator.code_deploy.add_deployment_group(name, f'{name}-group', CLUSTER, name)
+        names.append(name)
+    return names
+
+
+def setup_batch(simulator: Simulator, services, tasks_per_service):
+    names = []
+    for index in range(services):
+        name = f'job-{index}'
+        simulator.batch.add_job_definition(name, image='busybox:1.0.0')
+        names.append(name)
+    return names
+
+
+def commands_ecs_deploy(names, tasks_per_service):
+    yield ['ecs', 'deploy', CLUSTER, *names, '--tag', '2.0.0', '--timeout', '3600']
+
+
+def commands_ecs_scale(names, tasks_per_service):
+    for name in names:
+        yield ['ecs', 'scale', CLUSTER, name, str(tasks_per_service * 2), '--timeout', '3600']
+
+
+def commands_code_deploy_deploy(names, tasks_per_service):
+    for name in names:
+        yield ['code-deploy', 'deploy', name, f'{name}-group', '--timeout', '3600']
+
+
+def commands_batch_deploy(names, tasks_per_service):
+    for name in names:
+        yield ['batch', 'deploy', name, '--tag', '2.0.0']
+
+
+SCENARIOS = {
+    FLOW_ECS_DEPLOY: (setup_ecs_services, commands_ecs_deploy),
+    FLOW_ECS_SCALE: (setup_ecs_services, commands_ecs_scale),
+    FLOW_CODE_DEPLOY_DEPLOY: (setup_code_deploy, commands_code_deploy_deploy),
+    FLOW_BATCH_DEPLOY: (setup_batch, commands_batch_deploy),
+}
+
+
+def run_benchmark(flow, services=1, tasks_per_service=2, api_latency=0.0, cli_options=(),
+                  **simulator_options) -> BenchmarkResult:
+    """
+    Runs one flow against a fresh simulator: ecs-deploy deploys all services with one command, the other flows run one
+    command per service, like a pipeline would. cli_options are passed to every command (e.g. ['--no-rate-limit']).
+    Only the commands are timed, not the setup of the simulator.
+
+    Every run starts a new process, so that its peak RSS is not the one of an earlier, larger run.
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(
+            _run_benchmark, flow, services, tasks_per_service, api_latency, cli_options, **simulator_options
+        ).result()
+
+
+def _run_benchmark(flow, services, tasks_per_service, api_latency, cli_options, **simulator_options):
+    from aws_deploy.cli import cli
+
+    setup, commands = SCENARIOS[flow]
+    clock = VirtualClock()
+    previous_clock = set_clock(clock)
+    try:
+        simulator = Simulator(clock=clock, api_latency=api_latency, **simulator_options)
+        names = setup(simulator, services, tasks_per_service)
+        # the simulated task definitions must not end up in the local task definition cache
+        runner = CliRunner(env={'AWS_DEPLOY_NO_CACHE': '1'})
+
+        failed_runs = 0
+        started_at = time.perf_counter()
+        for args in commands(names, tasks_per_service):
+            result = runner.invoke(
+                cli, [*cli_options, *args], obj={'CLIENT_FACTORY': SimulatorClientFactory(simulator)}
+            )
+            if result.exit_code != 0:
+                failed_runs += 1
+        wall_time = time.perf_counter() - started_at
+    finally:
+        set_clock(previous_clock)
+
+    return BenchmarkResult(
+        flow=flow,
+        services=services,
+        tasks_per_service=tasks_per_service,
+        api_latency=api_latency,
+        wall_time=wall_time,
+        virtual_time=clock.now(),
+        calls=Counter(simulator.calls),
+        throttled_calls=Counter(simulator.throttled_calls),
+        failed_runs=failed_runs,
+        peak_rss=peak_rss_mb()
+    )
+
+
+def format_report(results: List[BenchmarkResult]) -> str:
+    header = ('flow', 'services', 'tasks', 'latency', 'wall [s]', 'virtual [s]', 'calls', 'calls/service',
+              'failed', 'peak RSS [MB]')
+    rows = [
+        (
+            result.flow, str(result.services), str(result.tasks_per_service), f'{result.api_latency:g}',
+            f'{result.wall_time:.3f}', f'{result.virtual_time:.1f}', str(result.total_calls),
+            f'{result.calls_per_service:.1f}', str(result.failed_runs),
+            f'{result.peak_rss:.1f}' if result.peak_rss is not None else '-'
+        )
+        for result in results
+    ]
+    widths = [max(len(row[column]) for row in [header] + rows) for column in range(len(header))]
+
+    lines = ['  '.join(value.rjust(width) for value, width in zip(row, widths)) for row in [header] + rows]
+    for result in results:
+        calls = ', '.join(f'{operation}={count}' for operation, count in sorted(result.calls.items()))
+        lines.append(f'{result!r}: {calls}')
+
+    return '\n'.join(lines)
+
+
+@click.command()
+@click.option('--flow', 'flows', type=click.Choice(FLOWS), multiple=True, help='Flow to run (default: all)')
+@click.option('--services', 'service_counts', type=int, multiple=True,
+              help=f'Number of services (default: {", ".join(map(str, DEFAULT_SERVICE_COUNTS))})')
+@click.option('--tasks', 'task_counts', type=int, multiple=True,
+              help=f'Tasks per service (default: {", ".join(map(str, DEFAULT_TASKS_PER_SERVICE))})')
+@click.option('--api-latency', 'api_latencies', type=float, multiple=True,
+              help=f'Simulated seconds per API call (default: {", ".join(map(str, DEFAULT_API_LATENCIES))})')
+@click.option('--json', 'as_json', is_flag=True, default=False, help='Print the results as JSON')
+def benchmark(flows, service_counts, task_counts, api_latencies, as_json):
+    """
+    Benchmarks the deploy and scale flows against the simulator and reports wall time, API calls and peak RSS.
+    """
+    results = []
+    for flow in flows or FLOWS:
+        for services in service_counts or DEFAULT_SERVICE_COUNTS:
+            for tasks_per_service in task_counts or DEFAULT_TASKS_PER_SERVICE:
+                for api_latency in api_latencies or DEFAULT_API_LATENCIES:
+                    results.append(run_benchmark(flow, services, tasks_per_service, api_latency))
+
+    if as_json:
+        click.echo(json.dumps([result.to_dict() for result in results], indent=2))
+    else:
+        click.echo(format_report(results))
+
+
+if __name__ == '__main__':  # pragma: no cover
+    benchmark()
@@ -0,0 +1,108 @@
+import asyncio
+import heapq
+import threading
+from datetime import datetime, timedelta
+
+from dateutil.tz import tzutc
+
+from aws_deploy.common.polling import Clock
+
+# virtual time starts at a fixed point, so that simulated timestamps are reproducible
+DEFAULT_EPOCH = datetime(2020, 1, 1, tzinfo=tzutc())
+
+# wall time a sleeping thread waits for other threads to go to sleep, before it moves the time to its wake-up time
+DEFAULT_SETTLE_TIME = 0.005
+
+
+def _running_event_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class VirtualClock(Clock):
+    """
+    A clock whose time only moves when somebody sleeps, so that waiting for a simulated deployment takes no wall time.
+
+    Every sleeper is given its wake-up time, and the time moves to the earliest wake-up time of all pending sleepers,
+    so that concurrent sleeps overlap like in real time instead of adding up. A thread, which would move the time,
+    first waits settle_time seconds of wall time for other threads to go to sleep (only if there are other threads); a
+    coroutine first lets the other coroutines of its event loop run.
+    """
+
+    def __init__(self, epoch: datetime = DEFAULT_EPOCH, settle_time: float = DEFAULT_SETTLE_TIME):
+        self.epoch = epoch
+        self.settle_time = settle_time
+        self._now = 0.0
+        self._wake_up_times = []
+        self._condition = threading.Condition()
+
+    def now(self) -> float:
+        return self._now
+
+    def datetime(self) -> datetime:
+        return self.to_datetime(self._now)
+
+    def to_datetime(self, seconds: float) -> datetime:
+        return self.epoch + timedelta(seconds=seconds)
+
+    def advance(self, seconds: float):
+        with self._condition:
+            self._now += max(seconds, 0)
+            self._condition.notify_all()
+
+    def _schedule(self, seconds: float) -> float:
+        wake_up_time = self._now + max(seconds, 0)
+        heapq.heappush(self._wake_up_times, wake_up_time)
+        self._condition.notify_all()
+
+        return wake_up_time
+
+    def _wake_up(self, wake_up_time: float):
+        self._wake_up_times.remove(wake_up_time)
+        heapq.heapify(self._wake_up_times)
+        self._condition.notify_all()
+
+    def _move_to(self, wake_up_time: float) -> bool:
+        # moves the time to wake_up_time if it is the earliest one, returns whether the sleeper can wake up
+        if self._now < wake_up_time and self._wake_up_times[0] >= wake_up_time:
+            self._now = wake_up_time
+            self._condition.notify_all()
+
+        return self._now >= wake_up_time
+
+    def sleep(self, seconds: float):
+        # the coroutines of an event loop, which is blocked by this sleep, cannot move the time themselves
+        blocks_event_loop = _running_event_loop() is not None
+
+        with self._condition:
+            wake_up_time = self._schedule(seconds)
+            try:
+                while self._now < wake_up_time:
+                    if blocks_event_loop:
+                        self._now = wake_up_time
+                        self._condition.notify_all()
+                    elif self._wake_up_times[0] < wake_up_time:
+                        # an earlier sleeper moves the time first
+                        self._condition.wait()
+                    elif threading.active_count() > 1 and self._condition.wait(self.settle_time):
+                        # another thread went to sleep or woke up meanwhile
+                        continue
+                    else:
+                        self._move_to(wake_up_time)
+            finally:
+                self._wake_up(wake_up_time)
+
+    async def sleep_async(self, seconds: float):
+        with self._condition:
+            wake_up_time = self._schedule(seconds)
+        try:
+            while True:
+                await asyncio.sleep(0)
+                with self._condition:
+                    if self._move_to(wake_up_time):
+                        return
+        finally:
+            with self._condition:
+                self._wake_up(wake_up_time)
@@ -0,0 +1,254 @@
+import itertools
+import json
+from copy import deepcopy
+
+from aws_deploy.simulator.utils import client_error
+
+DEFAULT_DEPLOYMENT_CONFIG_NAME = 'CodeDeployDefault.ECSAllAtOnce'
+
+
+def app_spec_revision(task_definition_arn, container_name, container_port=80):
+    content = {
+        'Resources': [
+            {
+                'TargetService': {
+                    'Type': 'AWS::ECS::Service',
+                    'Properties': {
+                        'TaskDefinition': task_definition_arn,
+                        'LoadBalancerInfo': {'ContainerName': container_name, 'ContainerPort': container_port},
+                        'PlatformVersion': None,
+                    }
+                }
+            }
+        ]
+    }
+
+    return {'revisionType': 'AppSpecContent', 'appSpecContent': {'content': json.dumps(content)}}
+
+
+def task_definition_of(revision):
+    content = (revision.get('appSpecContent') or revision.get('string') or {}).get('content') or '{}'
+    for resource in json.loads(content).get('Resources', []):
+        return resource['TargetService']['Properties']['TaskDefinition']
+    return None
+
+
+class SimulatedCodeDeployment:
+    def __init__(self, deployment_id, application_name, deployment_group_name, revision, created_at):
+        self.id = deployment_id
+        self.application_name = application_name
+        self.deployment_group_name = deployment_group_name
+        self.revision = revision
+        self.created_at = created_at
+        self.status = 'Created'
+        self.error_information = None
+        self.completed = False
+
+
+class CodeDeploySimulator:
+    """
+    Simulates the CodeDeploy API for blue/green deployments of ECS services.
+
+    A deployment is Created, then InProgress, and Succeeded after the simulator's deployment_duration, when the ECS
+    service is switched to the task definition of the revision. If that task definition uses one of the simulator's
+    failing images, the deployment fails after task_start_latency instead. Every deployment group runs one deployment
+    at a time.
+    """
+
+    OPERATIONS = ('get_application', 'get_deployment_group', 'get_application_revision', 'create_deployment',
+                  'get_deployment')
+    PAGINATORS = {}
+
+    def __init__(self, simulator):
+        self._simulator = simulator
+        self._applications = {}
+        self._deployment_groups = {}
+        self._deployments = {}
+        self._ids = itertools.count(1)
+
+    @property
+    def clock(self):
+        return self._simulator.clock
+
+    # setup
+
+    def add_deployment_group(self, application_name, deployment_group_name, cluster, service):
+        """
+        Creates the application (if needed) and a deployment group of the given ECS service, whose target revision is
+        the service's current task definition.
+        """
+        self._applications.setdefault(application_name, {
+            'applicationId': '%08x-0000-0000-0000-%012x' % (next(self._ids), 0),
+            'applicationName': application_name,
+            'computePlatform': 'ECS',
+        })
+
+        task_definition_arn = self._simulator.ecs.describe_services(
+            cluster=cluster, services=[service]
+        )['services'][0]['taskDefinition']
+        task_definition = self._simulator.ecs.describe_task_definition(taskDefinition=task_definition_arn)
+        container = task_definition['taskDefinition']['containerDefinitions'][0]
+
+        self._deployment_groups[(application_name, deployment_group_name)] = {
+            'applicationName': application_name,
+            'deploymentGroupId': '%08x-0000-0000-0000-%012x' % (next(self._ids), 0),
+            'deploymentGroupName': deployment_group_name,
+            'deploymentConfigName': DEFAULT_DEPLOYMENT_CONFIG_NAME,
+            'computePlatform': 'ECS',
+            'ecsServices': [{'serviceName': service, 'clusterName': cluster}],
+            'targetRevision': app_spec_revision(
+                task_definition_arn, container['name'], container['portMappings'][0]['containerPort']
+            ),
+        }
+
+    # internals
+
+    def _application(self, application_name, operation):
+        if application_name not in self._applications:
+            raise client_error(
+                'ApplicationDoesNotExistException', f'No application found for name: {application_name}', operation
+            )
+
+        return self._applications[application_name]
+
+    def _deployment_group(self, application_name, deployment_group_name, operation):
+        self._application(application_name, operation)
+        if (application_name, deployment_group_name) not in self._deployment_groups:
+            raise client_error(
+                'DeploymentGroupDoesNotExistException', f'No Deployment Group found for name: {deployment_group_name}',
+                operation
+            )
+
+        return self._deployment_groups[(application_name, deployment_group_name)]
+
+    def _advance(self, deployment: SimulatedCodeDeployment):
+        if deployment.completed:
+            return
+
+        elapsed = self.clock.now() - deployment.created_at
+        task_definition_arn = task_definition_of(deployment.revision)
+
+        if elapsed >= self._simulator.task_start_latency and self._simulator.ecs.fails(task_definition_arn):
+            deployment.status = 'Failed'
+            deployment.error_information = {
+                'code': 'ECS_UPDATE_ERROR',
+                'message': 'The ECS service cannot reach a steady state: tasks of the replacement task set failed.',
+            }
+            deployment.completed = True
+        elif elapsed >= self._simulator.deployment_duration:
+            deployment_group = self._deployment_groups[(deployment.application_name, deployment.deployment_group_name)]
+            ecs_service = deployment_group['ecsServices'][0]
+            self._simulator.ecs.update_service(
+                cluster=ecs_service['clusterName'], service=ecs_service['serviceName'],
+                taskDefinition=task_definition_arn
+            )
+            deployment.status = 'Succeeded'
+            deployment.completed = True
+        elif elapsed > 0:
+            deployment.status = 'InProgress'
+
+    def _overview(self, deployment: SimulatedCodeDeployment):
+        overview = dict(Pending=0, InProgress=0, Succeeded=0, Failed=0, Skipped=0, Ready=0)
+        key = {'Created': 'Pending', 'InProgress': 'InProgress'}.get(deployment.status, deployment.status)
+        overview[key] = 1
+
+        return overview
+
+    # API
+
+    def get_application(self, applicationName=None):
+        return {'application': deepcopy(self._application(applicationName, 'GetApplication'))}
+
+    def get_deployment_group(self, applicationName=None, deploymentGroupName=None):
+        return {
+            'deploymentGroupInfo': deepcopy(
+                self._deployment_group(applicationName, deploymentGroupName, 'GetDeploymentGroup')
+            )
+        }
+
+    def get_application_revision(self, applicationName=None, revision=None):
+        self._application(applicationName, 'GetApplicationRevision')
+
+        return {
+            'applicationName': applicationName,
+            'revision': deepcopy(revision),
+            'revisionInfo': {'registerTime': self.clock.datetime()},
+        }
+
+    def create_deployment(self, applicationName=None, deploymentGroupName=None, revision=None, **kwargs):
+        deployment_group = self._deployment_group(applicationName, deploymentGroupName, 'CreateDeployment')
+
+        group_key = (applicationName, deploymentGroupName)
+        for deployment in self._deployments.values():
+            if (deployment.application_name, deployment.deployment_group_name) != group_key:
+                continue
+
+            self._advance(deployment)
+            if not deployment.completed:
+                raise client_error(
+                    'DeploymentLimitExceededException',
+                    f'The Deployment Group {deploymentGroupName} already has an active Deployment {deployment.id}',
+                    'CreateDeployment'
+                )
+
+        deployment_id = 'd-%09d' % next(self._ids)
+        self._deployments[deployment_id] = SimulatedCodeDeployment(
+            deployment_id, applicationName, deploymentGroupName, deepcopy(revision), self.clock.now()
+        )
+        deployment_group['targetRevision'] = deepcopy(revision)
+
+        return {'deploymentId': deployment_id}
+
+    def get_deployment(self, deploymentId=None):
+        if deploymentId not in self._deployments:
+            raise client_error(
+                'DeploymentDoesNotExistException', f'The deployment {deploymentId} could not be found', 'GetDeployment'
+            )
+
+        deployment = self._deployments[deploymentId]
+        self._advance(deployment)
+
+        deployment_info = {
+            'deploymentId': deployment.id,
+            'applicationName': deployment.application_name,
+            'deploymentGroupName': deployment.deployment_group_name,
+            'deploymentConfigName': DEFAULT_DEPLOYMENT_CONFIG_NAME,
+            'revision': deepcopy(deployment.revision),
+            'status': deployment.status,
+            'createTime': self.clock.to_datetime(deployment.created_at),
+            'deploymentOverview': self._overview(deployment),
+        }
+        if deployment.error_information:
+            deployment_info['errorInformation'] = dict(deployment.error_information)
+
+        return {'deploymentInfo': deployment_info}
+
+
+class ResourceTaggingSimulator:
+    """
+    Simulates the Resource Groups Tagging API for ECS task definitions.
+    """
+
+    OPERATIONS = ('get_resources',)
+    PAGINATORS = {}
+
+    def __init__(self, simulator):
+        self._simulator = simulator
+
+    def get_resources(self, ResourceTypeFilters=(), TagFilters=(), **kwargs):
+        if ResourceTypeFilters and 'ecs:task-definition' not in ResourceTypeFilters:
+            return {'ResourceTagMappingList': [], 'PaginationToken': ''}
+
+        resources = []
+        for task_definition, tags in self._simulator.ecs.task_definitions():
+            if task_definition['status'] != 'ACTIVE':
+                continue
+
+            tag_values = {tag['key']: tag['value'] for tag in tags}
+            if all(tag_values.get(tag_filter['Key']) in tag_filter.get('Values', ()) for tag_filter in TagFilters):
+                resources.append({
+                    'ResourceARN': task_definition['taskDefinitionArn'],
+                    'Tags': [{'Key': key, 'Value': value} for key, value in tag_values.items()],
+                })
+
+        return {'ResourceTagMappingList': resources, 'PaginationToken': ''}
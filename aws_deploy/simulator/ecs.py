@@ -0,0 +1,714 @@
+import itertools
+from copy import deepcopy
+from math import ceil, floor
+
+from aws_deploy.simulator.utils import client_error, paginate
+
+DESCRIBE_SERVICES_MAX_SERVICES = 10
+DESCRIBE_TASKS_MAX_TASKS = 100
+MAX_SERVICE_EVENTS = 100
+
+# the ECS circuit breaker fails a deployment after half its desired count of failed tasks, bounded by 3 and 200
+CIRCUIT_BREAKER_MIN_THRESHOLD = 3
+CIRCUIT_BREAKER_MAX_THRESHOLD = 200
+
+TASK_DEFINITION_PROPERTIES = (
+    'taskRoleArn', 'executionRoleArn', 'networkMode', 'placementConstraints', 'requiresCompatibilities', 'cpu',
+    'memory', 'pidMode', 'ipcMode', 'proxyConfiguration', 'inferenceAccelerators', 'ephemeralStorage',
+    'runtimePlatform', 'enableFaultInjection',
+)
+
+
+def task_ids(tasks):
+    return ' '.join('(task %s)' % task.arn.rsplit('/', 1)[-1] for task in tasks)
+
+
+def family_of(task_definition_arn):
+    return task_definition_arn.rsplit('/', 1)[-1].rsplit(':', 1)[0]
+
+
+class SimulatedTask:
+    """
+    A task that is PENDING for task_start_latency seconds and then RUNNING, or STOPPED right away if it fails to start.
+    """
+
+    def __init__(self, arn, cluster_arn, task_definition_arn, containers, started_by, group, created_at, ready_at,
+                 fails=False):
+        self.arn = arn
+        self.cluster_arn = cluster_arn
+        self.task_definition_arn = task_definition_arn
+        self.containers = containers
+        self.started_by = started_by
+        self.group = group
+        self.created_at = created_at
+        self.ready_at = ready_at
+        self.stopped_at = None
+        self.stop_code = None
+        self.stopped_reason = None
+        self.exit_code = None
+
+        if fails:
+            self.stop(ready_at, 'EssentialContainerExited', 'Essential container in task exited', exit_code=1)
+
+    def stop(self, at, stop_code, reason, exit_code=0):
+        if self.stopped_at is None:
+            self.stopped_at = at
+            self.stop_code = stop_code
+            self.stopped_reason = reason
+            self.exit_code = exit_code
+
+    def status(self, now):
+        if self.stopped_at is not None and now >= self.stopped_at:
+            return 'STOPPED'
+        if now < self.ready_at:
+            return 'PENDING'
+        return 'RUNNING'
+
+    def is_active(self, now):
+        return self.status(now) != 'STOPPED'
+
+    def describe(self, clock, now):
+        status = self.status(now)
+        task = {
+            'taskArn': self.arn,
+            'clusterArn': self.cluster_arn,
+            'taskDefinitionArn': self.task_definition_arn,
+            'lastStatus': status,
+            'desiredStatus': 'STOPPED' if self.stopped_at is not None and now >= self.stopped_at else 'RUNNING',
+            'startedBy': self.started_by,
+            'group': self.group,
+            'createdAt': clock.to_datetime(self.created_at),
+            'containers': [
+                dict(
+                    {'name': name, 'lastStatus': status},
+                    **({'exitCode': self.exit_code} if status == 'STOPPED' else {})
+                )
+                for name in self.containers
+            ],
+        }
+        if status == 'STOPPED':
+            task.update(
+                stoppedAt=clock.to_datetime(self.stopped_at),
+                stopCode=self.stop_code,
+                stoppedReason=self.stopped_reason
+            )
+        elif status == 'RUNNING':
+            task['startedAt'] = clock.to_datetime(self.ready_at)
+
+        return task
+
+
+class SimulatedDeployment:
+    def __init__(self, deployment_id, task_definition_arn, created_at):
+        self.id = deployment_id
+        self.task_definition_arn = task_definition_arn
+        self.status = 'PRIMARY'
+        self.rollout_state = 'IN_PROGRESS'
+        self.rollout_state_reason = 'ECS deployment %s in progress.' % deployment_id
+        self.failed_tasks = 0
+        self.counted_failures = set()
+        self.tasks = []
+        self.created_at = created_at
+        self.updated_at = created_at
+
+    def active_tasks(self, now):
+        return [task for task in self.tasks if task.is_active(now)]
+
+    def count(self, status, now):
+        return sum(1 for task in self.tasks if task.status(now) == status)
+
+    def describe(self, clock, now, desired_count):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'taskDefinition': self.task_definition_arn,
+            'desiredCount': desired_count if self.status == 'PRIMARY' else 0,
+            'pendingCount': self.count('PENDING', now),
+            'runningCount': self.count('RUNNING', now),
+            'failedTasks': self.failed_tasks,
+            'createdAt': clock.to_datetime(self.created_at),
+            'updatedAt': clock.to_datetime(self.updated_at),
+            'rolloutState': self.rollout_state,
+            'rolloutStateReason': self.rollout_state_reason,
+        }
+
+
+class SimulatedService:
+    def __init__(self, arn, name, cluster, task_definition_arn, desired_count, minimum_healthy_percent,
+                 maximum_percent, circuit_breaker, rollback):
+        self.arn = arn
+        self.name = name
+        self.cluster = cluster
+        self.task_definition_arn = task_definition_arn
+        self.desired_count = desired_count
+        self.minimum_healthy_percent = minimum_healthy_percent
+        self.maximum_percent = maximum_percent
+        self.circuit_breaker = circuit_breaker
+        self.rollback = rollback
+        self.deployments = []
+        self.events = []
+        self.retired_tasks = []
+        self.next_step_at = None
+
+    @property
+    def tasks(self):
+        """
+        The tasks of all deployments, including the (stopped) tasks of deployments that were replaced, which ECS keeps
+        listing for a while.
+        """
+        return [task for deployment in self.deployments for task in deployment.tasks] + self.retired_tasks
+
+    @property
+    def primary(self) -> SimulatedDeployment:
+        return self.deployments[0]
+
+    @property
+    def group(self):
+        return 'service:%s' % self.name
+
+    @property
+    def failure_threshold(self):
+        return min(max(ceil(self.desired_count / 2), CIRCUIT_BREAKER_MIN_THRESHOLD), CIRCUIT_BREAKER_MAX_THRESHOLD)
+
+
+class EcsSimulator:
+    """
+    Simulates the ECS API: task definitions, services with rolling deployments, and tasks.
+
+    A deployment replaces the tasks of a service in waves, one every task_start_latency seconds. Every wave stops as
+    many old tasks as minimumHealthyPercent allows and starts as many new tasks as maximumPercent allows; the new tasks
+    run after task_start_latency seconds, or stop with exit code 1 if their image is one of the simulator's failing
+    images. With the deployment circuit breaker enabled, a deployment fails (and optionally rolls back) once half of its
+    desired count of tasks failed. Services only move forward when they are read or updated, so idle services cost
+    nothing.
+    """
+
+    OPERATIONS = (
+        'describe_services', 'list_services', 'update_service', 'describe_task_definition', 'register_task_definition',
+        'list_task_definitions', 'deregister_task_definition', 'list_tags_for_resource', 'list_tasks', 'describe_tasks',
+        'run_task',
+    )
+    # default page size of every paginated operation
+    PAGINATORS = {
+        'list_services': 10,
+        'list_tasks': 100,
+        'list_task_definitions': 100,
+    }
+
+    def __init__(self, simulator):
+        self._simulator = simulator
+        self._task_definitions = {}
+        self._revisions = {}
+        self._clusters = {}
+        self._standalone_tasks = {}
+        self._ids = itertools.count(1)
+
+    @property
+    def clock(self):
+        return self._simulator.clock
+
+    def _next_id(self):
+        return next(self._ids)
+
+    # setup
+
+    def add_task_definition(self, family, image='nginx:1.0.0', containers=None, tags=None, **properties):
+        """
+        Registers a task definition without going through the API. Returns its ARN.
+        """
+        containers = containers or [
+            {
+                'name': family,
+                'image': image,
+                'essential': True,
+                'portMappings': [{'containerPort': 80, 'protocol': 'tcp'}],
+                'environment': [],
+                'secrets': [],
+            }
+        ]
+
+        return self._register(family, containers, tags or [], properties)['taskDefinitionArn']
+
+    def add_service(self, cluster, name, task_definition, desired_count=2, minimum_healthy_percent=100,
+                    maximum_percent=200, circuit_breaker=False, rollback=False):
+        """
+        Creates a service whose tasks already run the given task definition. Returns its ARN.
+        """
+        services = self._clusters.setdefault(cluster, {})
+        arn = self._simulator.arn('ecs', f'service/{cluster}/{name}')
+        task_definition_arn = self._task_definition(task_definition)['taskDefinitionArn']
+
+        service = SimulatedService(
+            arn, name, cluster, task_definition_arn, desired_count, minimum_healthy_percent, maximum_percent,
+            circuit_breaker, rollback
+        )
+        services[name] = service
+
+        now = self.clock.now()
+        deployment = self._start_deployment(service, now)
+        self._start_tasks(service, deployment, desired_count, now, ready_at=now)
+        self._complete(service, now)
+
+        return arn
+
+    def task_definitions(self):
+        """
+        Returns the (task definition, tags) pairs of all registered task definitions.
+        """
+        return list(self._task_definitions.values())
+
+    # internals
+
+    def _register(self, family, containers, tags, properties):
+        revision = self._revisions.get(family, 0) + 1
+        self._revisions[family] = revision
+
+        arn = self._simulator.arn('ecs', f'task-definition/{family}:{revision}')
+        task_definition = {
+            'taskDefinitionArn': arn,
+            'family': family,
+            'revision': revision,
+            'containerDefinitions': deepcopy(containers),
+            'volumes': deepcopy(properties.pop('volumes', None) or []),
+            'status': 'ACTIVE',
+            'compatibilities': ['EC2', 'FARGATE'],
+            # read-only metadata, like the one of the real API
+            'registeredAt': self.clock.datetime(),
+            'registeredBy': self._simulator.arn('iam', 'root'),
+        }
+        for key in TASK_DEFINITION_PROPERTIES:
+            if properties.get(key):
+                task_definition[key] = deepcopy(properties[key])
+
+        self._task_definitions[arn] = (task_definition, deepcopy(tags))
+
+        return task_definition
+
+    def _task_definition(self, identifier):
+        """
+        Looks up a task definition by ARN, family:revision or family (the latest ACTIVE revision).
+        """
+        name = identifier.rsplit('/', 1)[-1]
+        family, _, revision = name.partition(':')
+        if not revision:
+            revisions = [
+                task_definition['revision']
+                for task_definition, _ in self._task_definitions.values()
+                if task_definition['family'] == family and task_definition['status'] == 'ACTIVE'
+            ]
+            revision = max(revisions) if revisions else None
+
+        arn = self._simulator.arn('ecs', f'task-definition/{family}:{revision}')
+        if arn not in self._task_definitions:
+            raise client_error('ClientException', 'Unable to describe task definition.', 'DescribeTaskDefinition')
+
+        return self._task_definitions[arn][0]
+
+    def _cluster(self, cluster, operation):
+        name = (cluster or 'default').rsplit('/', 1)[-1]
+        if name not in self._clusters:
+            raise client_error('ClusterNotFoundException', 'Cluster not found.', operation)
+
+        return name, self._clusters[name]
+
+    def _add_event(self, service, message, at):
+        service.events.insert(0, {
+            'id': str(self._next_id()),
+            'createdAt': self.clock.to_datetime(at),
+            'message': f'(service {service.name}) {message}',
+        })
+        del service.events[MAX_SERVICE_EVENTS:]
+
+    def fails(self, task_definition_arn):
+        task_definition = self._task_definitions[task_definition_arn][0]
+
+        return any(
+            container.get('image') in self._simulator.failing_images
+            for container in task_definition['containerDefinitions']
+        )
+
+    def _start_tasks(self, service, deployment, count, now, ready_at=None):
+        if count <= 0:
+            return []
+
+        task_definition = self._task_definitions[deployment.task_definition_arn][0]
+        containers = [container['name'] for container in task_definition['containerDefinitions']]
+        fails = self.fails(deployment.task_definition_arn)
+        ready_at = now + self._simulator.task_start_latency if ready_at is None else ready_at
+
+        tasks = [
+            SimulatedTask(
+                self._simulator.arn('ecs', f'task/{service.cluster}/{self._next_id():032x}'),
+                self._simulator.arn('ecs', f'cluster/{service.cluster}'),
+                deployment.task_definition_arn, containers, deployment.id, service.group, now, ready_at, fails
+            )
+            for _ in range(count)
+        ]
+        deployment.tasks.extend(tasks)
+        deployment.updated_at = now
+
+        self._add_event(service, 'has started %d tasks: %s.' % (count, task_ids(tasks)), now)
+
+        return tasks
+
+    def _stop_tasks(self, service, tasks, reason, now):
+        for task in tasks:
+            task.stop(now, 'ServiceSchedulerInitiated', reason)
+
+        if tasks:
+            self._add_event(service, 'has stopped %d running tasks: %s.' % (len(tasks), task_ids(tasks)), now)
+
+    def _start_deployment(self, service, now, task_definition_arn=None):
+        for deployment in service.deployments:
+            deployment.status = 'ACTIVE'
+
+        deployment = SimulatedDeployment(
+            'ecs-svc/%019d' % self._next_id(), task_definition_arn or service.task_definition_arn, now
+        )
+        service.deployments.insert(0, deployment)
+
+        return deployment
+
+    def _complete(self, service, now):
+        primary = service.primary
+        primary.rollout_state = 'COMPLETED'
+        primary.rollout_state_reason = 'ECS deployment %s completed.' % primary.id
+        primary.updated_at = now
+        for deployment in service.deployments[1:]:
+            service.retired_tasks.extend(deployment.tasks)
+        service.deployments = [primary]
+        service.next_step_at = None
+
+        self._add_event(service, 'has reached a steady state.', now)
+
+    def _fail(self, service, now):
+        primary = service.primary
+        primary.rollout_state = 'FAILED'
+        primary.rollout_state_reason = 'ECS deployment circuit breaker: tasks failed to start.'
+        primary.updated_at = now
+
+        self._add_event(service, 'deployment %s deployment failed: tasks failed to start.' % primary.id, now)
+
+        if service.rollback:
+            previous = next(
+                (d for d in service.deployments[1:] if d.task_definition_arn != primary.task_definition_arn), None
+            )
+            if previous:
+                service.task_definition_arn = previous.task_definition_arn
+                self._start_deployment(service, now)
+                self._add_event(service, 'rolling back to deployment %s.' % previous.id, now)
+                return
+
+        service.next_step_at = None
+
+    def _step(self, service, now):
+        """
+        Runs one wave of the rolling replacement at the given (virtual) time. Returns whether there is more to do.
+        """
+        primary = service.primary
+        desired_count = service.desired_count
+
+        failed_tasks = [task for task in primary.tasks if task.stop_code == 'EssentialContainerExited']
+        new_failures = [
+            task for task in failed_tasks if task.status(now) == 'STOPPED' and task.arn not in primary.counted_failures
+        ]
+        primary.counted_failures.update(task.arn for task in new_failures)
+        primary.failed_tasks += len(new_failures)
+
+        if primary.rollout_state == 'IN_PROGRESS' and service.circuit_breaker \
+                and primary.failed_tasks >= service.failure_threshold:
+            self._fail(service, now)
+            return service.next_step_at is not None
+
+        new_tasks = primary.active_tasks(now)
+        new_running = [task for task in new_tasks if task.status(now) == 'RUNNING']
+        old_running = [
+            task for deployment in service.deployments[1:] for task in deployment.active_tasks(now)
+            if task.status(now) == 'RUNNING'
+        ]
+        old_pending = [
+            task for deployment in service.deployments[1:] for task in deployment.active_tasks(now)
+            if task.status(now) == 'PENDING'
+        ]
+        self._stop_tasks(service, old_pending, 'Scaling activity initiated by (deployment %s)' % primary.id, now)
+
+        if not old_running and len(new_tasks) == desired_count and len(new_running) == desired_count:
+            self._complete(service, now)
+            return False
+
+        if len(new_tasks) > desired_count:
+            # scale in: pending tasks go first
+            excess = sorted(new_tasks, key=lambda task: task.status(now) == 'RUNNING')[:len(new_tasks) - desired_count]
+            self._stop_tasks(service, excess, 'Scaling activity initiated by (deployment %s)' % primary.id, now)
+            return True
+
+        healthy = len(new_running) + len(old_running)
+        minimum_healthy = ceil(desired_count * service.minimum_healthy_percent / 100)
+        maximum = floor(desired_count * service.maximum_percent / 100)
+
+        stop_count = min(len(old_running), max(healthy - minimum_healthy, 0))
+        new_pending = len(new_tasks) - len(new_running)
+        start_count = min(desired_count - len(new_tasks), maximum - (healthy - stop_count) - new_pending)
+        if stop_count <= 0 and start_count <= 0 and old_running and not new_pending:
+            # neither percent leaves any room: replace one task at a time
+            stop_count = 1
+            start_count = min(1, desired_count - len(new_tasks))
+
+        self._stop_tasks(
+            service, old_running[:stop_count], 'Scaling activity initiated by (deployment %s)' % primary.id, now
+        )
+        self._start_tasks(service, primary, start_count, now)
+
+        return True
+
+    def _advance(self, service):
+        now = self.clock.now()
+        latency = self._simulator.task_start_latency
+
+        while service.next_step_at is not None and service.next_step_at <= now:
+            at = service.next_step_at
+            if not self._step(service, at):
+                service.next_step_at = None
+                break
+            service.next_step_at = at + latency
+
+    def _describe_service(self, service):
+        self._advance(service)
+
+        now = self.clock.now()
+        deployments = [
+            deployment.describe(self.clock, now, service.desired_count) for deployment in service.deployments
+        ]
+
+        return {
+            'serviceArn': service.arn,
+            'serviceName': service.name,
+            'clusterArn': self._simulator.arn('ecs', f'cluster/{service.cluster}'),
+            'status': 'ACTIVE',
+            'desiredCount': service.desired_count,
+            'runningCount': sum(deployment['runningCount'] for deployment in deployments),
+            'pendingCount': sum(deployment['pendingCount'] for deployment in deployments),
+            'taskDefinition': service.task_definition_arn,
+            'deploymentConfiguration': {
+                'maximumPercent': service.maximum_percent,
+                'minimumHealthyPercent': service.minimum_healthy_percent,
+                'deploymentCircuitBreaker': {'enable': service.circuit_breaker, 'rollback': service.rollback},
+            },
+            'deployments': deployments,
+            'events': deepcopy(service.events),
+        }
+
+    # API
+
+    def describe_services(self, cluster=None, services=(), include=None):
+        if len(services) > DESCRIBE_SERVICES_MAX_SERVICES:
+            raise client_error(
+                'InvalidParameterException', 'services can have at most 10 items.', 'DescribeServices'
+            )
+
+        _, cluster_services = self._cluster(cluster, 'DescribeServices')
+
+        found, failures = [], []
+        for name in services:
+            service = cluster_services.get(name.rsplit('/', 1)[-1])
+            if service:
+                found.append(self._describe_service(service))
+            else:
+                failures.append({'arn': name, 'reason': 'MISSING'})
+
+        return {'services': found, 'failures': failures}
+
+    def list_services(self, cluster=None, maxResults=None, nextToken=None, **kwargs):
+        _, cluster_services = self._cluster(cluster, 'ListServices')
+
+        arns, token = paginate([service.arn for service in cluster_services.values()], maxResults, nextToken, 10)
+
+        return dict({'serviceArns': arns}, **({'nextToken': token} if token else {}))
+
+    def update_service(self, cluster=None, service=None, desiredCount=None, taskDefinition=None,
+                       forceNewDeployment=False, deploymentConfiguration=None, **kwargs):
+        _, cluster_services = self._cluster(cluster, 'UpdateService')
+        simulated_service = cluster_services.get(service.rsplit('/', 1)[-1])
+        if not simulated_service:
+            raise client_error('ServiceNotFoundException', 'Service not found.', 'UpdateService')
+
+        self._advance(simulated_service)
+        now = self.clock.now()
+
+        if deploymentConfiguration:
+            simulated_service.maximum_percent = deploymentConfiguration.get(
+                'maximumPercent', simulated_service.maximum_percent
+            )
+            simulated_service.minimum_healthy_percent = deploymentConfiguration.get(
+                'minimumHealthyPercent', simulated_service.minimum_healthy_percent
+            )
+
+        if desiredCount is not None:
+            simulated_service.desired_count = desiredCount
+
+        task_definition_arn = self._task_definition(taskDefinition)['taskDefinitionArn'] if taskDefinition else None
+        if (task_definition_arn and task_definition_arn != simulated_service.task_definition_arn) or forceNewDeployment:
+            simulated_service.task_definition_arn = task_definition_arn or simulated_service.task_definition_arn
+            self._start_deployment(simulated_service, now)
+
+        simulated_service.next_step_at = now
+        self._advance(simulated_service)
+
+        return {'service': self._describe_service(simulated_service)}
+
+    def describe_task_definition(self, taskDefinition=None, include=None):
+        task_definition = self._task_definition(taskDefinition)
+        tags = self._task_definitions[task_definition['taskDefinitionArn']][1]
+
+        response = {'taskDefinition': deepcopy(task_definition)}
+        if include and 'TAGS' in include:
+            response['tags'] = deepcopy(tags)
+
+        return response
+
+    def list_tags_for_resource(self, resourceArn=None):
+        task_definition = self._task_definition(resourceArn)
+
+        return {'tags': deepcopy(self._task_definitions[task_definition['taskDefinitionArn']][1])}
+
+    def register_task_definition(self, family=None, containerDefinitions=None, tags=None, **properties):
+        task_definition = self._register(family, containerDefinitions, tags or [], properties)
+
+        return {'taskDefinition': deepcopy(task_definition), 'tags': deepcopy(tags or [])}
+
+    def list_task_definitions(self, familyPrefix=None, status='ACTIVE', sort='ASC', maxResults=None,
+                              nextToken=None):
+        task_definitions = sorted(
+            (
+                task_definition for task_definition, _ in self._task_definitions.values()
+                if task_definition['family'].startswith(familyPrefix or '') and task_definition['status'] == status
+            ),
+            key=lambda task_definition: (task_definition['family'], task_definition['revision']),
+            reverse=sort == 'DESC'
+        )
+
+        arns, token = paginate(
+            [task_definition['taskDefinitionArn'] for task_definition in task_definitions], maxResults, nextToken, 100
+        )
+
+        return dict({'taskDefinitionArns': arns}, **({'nextToken': token} if token else {}))
+
+    def deregister_task_definition(self, taskDefinition=None):
+        task_definition = self._task_definition(taskDefinition)
+        task_definition['status'] = 'INACTIVE'
+        task_definition['deregisteredAt'] = self.clock.datetime()
+
+        return {'taskDefinition': deepcopy(task_definition)}
+
+    def list_tasks(self, cluster=None, serviceName=None, desiredStatus='RUNNING', family=None, startedBy=None,
+                   maxResults=None, nextToken=None, **kwargs):
+        name, cluster_services = self._cluster(cluster, 'ListTasks')
+        now = self.clock.now()
+
+        if serviceName:
+            service = cluster_services.get(serviceName.rsplit('/', 1)[-1])
+            if not service:
+                raise client_error('ServiceNotFoundException', 'Service not found.', 'ListTasks')
+            self._advance(service)
+            tasks = service.tasks
+        else:
+            tasks = self._cluster_tasks(name)
+
+        def matches(task):
+            if (task.status(now) == 'STOPPED') != (desiredStatus == 'STOPPED'):
+                return False
+            if family and family_of(task.task_definition_arn) != family:
+                return False
+            return not startedBy or task.started_by == startedBy
+
+        arns = [task.arn for task in tasks if matches(task)]
+        arns, token = paginate(arns, maxResults, nextToken, 100)
+
+        return dict({'taskArns': arns}, **({'nextToken': token} if token else {}))
+
+    def describe_tasks(self, cluster=None, tasks=(), include=None):
+        if len(tasks) > DESCRIBE_TASKS_MAX_TASKS:
+            raise client_error('InvalidParameterException', 'tasks can have at most 100 items.', 'DescribeTasks')
+
+        name, _ = self._cluster(cluster, 'DescribeTasks')
+        now = self.clock.now()
+        known_tasks = {task.arn: task for task in self._cluster_tasks(name)}
+
+        found, failures = [], []
+        for arn in tasks:
+            if arn in known_tasks:
+                found.append(known_tasks[arn].describe(self.clock, now))
+            else:
+                failures.append({'arn': arn, 'reason': 'MISSING'})
+
+        return {'tasks': found, 'failures': failures}
+
+    def run_task(self, cluster=None, taskDefinition=None, count=1, startedBy=None, overrides=None, **kwargs):
+        name, _ = self._cluster(cluster, 'RunTask')
+        task_definition = self._task_definition(taskDefinition)
+        now = self.clock.now()
+
+        tasks = [
+            SimulatedTask(
+                self._simulator.arn('ecs', f'task/{name}/{self._next_id():032x}'),
+                self._simulator.arn('ecs', f'cluster/{name}'),
+                task_definition['taskDefinitionArn'],
+                [container['name'] for container in task_definition['containerDefinitions']],
+                startedBy, f'family:{task_definition["family"]}', now, now + self._simulator.task_start_latency,
+                self.fails(task_definition['taskDefinitionArn'])
+            )
+            for _ in range(count)
+        ]
+        self._standalone_tasks.setdefault(name, []).extend(tasks)
+
+        return {'tasks': [task.describe(self.clock, now) for task in tasks], 'failures': []}
+
+    def _cluster_tasks(self, name):
+        tasks = []
+        for service in self._clusters[name].values():
+            self._advance(service)
+            tasks.extend(service.tasks)
+        tasks.extend(self._standalone_tasks.get(name, []))
+
+        return tasks
+
+
+class EventsSimulator:
+    """
+    Simulates the targets of CloudWatch Events rules, as used by scheduled ECS tasks.
+    """
+
+    OPERATIONS = ('list_targets_by_rule', 'put_targets')
+    PAGINATORS = {}
+
+    def __init__(self, simulator):
+        self._simulator = simulator
+        self._rules = {}
+
+    def add_rule(self, name, cluster, task_definition_arn, target_id='target-1'):
+        self._rules[name] = {
+            target_id: {
+                'Id': target_id,
+                'Arn': self._simulator.arn('ecs', f'cluster/{cluster}'),
+                'RoleArn': f'arn:aws:iam::{self._simulator.account_id}:role/ecsEventsRole',
+                'EcsParameters': {'TaskDefinitionArn': task_definition_arn, 'TaskCount': 1},
+            }
+        }
+
+    def target(self, rule, target_id='target-1'):
+        return deepcopy(self._rules[rule][target_id])
+
+    def list_targets_by_rule(self, Rule=None, **kwargs):
+        if Rule not in self._rules:
+            raise client_error('ResourceNotFoundException', f'Rule {Rule} does not exist.', 'ListTargetsByRule')
+
+        return {'Targets': deepcopy(list(self._rules[Rule].values()))}
+
+    def put_targets(self, Rule=None, Targets=()):
+        if Rule not in self._rules:
+            raise client_error('ResourceNotFoundException', f'Rule {Rule} does not exist.', 'PutTargets')
+
+        for target in Targets:
+            self._rules[Rule][target['Id']] = deepcopy(target)
+
+        return {'FailedEntryCount': 0, 'FailedEntries': []}
@@ -0,0 +1,17 @@
+class StsSimulator:
+    """
+    Simulates the caller identity of the Security Token Service, the simulator's account.
+    """
+
+    OPERATIONS = ('get_caller_identity',)
+    PAGINATORS = {}
+
+    def __init__(self, simulator):
+        self._simulator = simulator
+
+    def get_caller_identity(self):
+        return {
+            'UserId': 'AIDASIMULATOR',
+            'Account': self._simulator.account_id,
+            'Arn': f'arn:aws:iam::{self._simulator.account_id}:user/simulator',
+        }
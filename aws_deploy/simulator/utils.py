@@ -0,0 +1,17 @@
+from botocore.exceptions import ClientError
+
+
+def client_error(code, message, operation) -> ClientError:
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+
+def paginate(items, max_results, next_token, default_max_results):
+    """
+    Returns the page of items starting at next_token (an offset) and the token of the next page, if there is one.
+    """
+    offset = int(next_token or 0)
+    limit = max_results or default_max_results
+    page = items[offset:offset + limit]
+    token = str(offset + limit) if offset + limit < len(items) else None
+
+    return page, token
@@ -0,0 +1,118 @@
+import threading
+import time
+
+import pytest
+
+from aws_deploy.apply.helper import (
+    STATUS_FAILED, STATUS_SKIPPED, STATUS_SUCCEEDED, ManifestError, ReleaseExecutor, ReleasePlan, ReleaseStep
+)
+
+
+def ecs_step(name, cluster='cluster', depends_on=None):
+    return ReleaseStep(name=name, type='ecs-service', cluster=cluster, service=name, depends_on=depends_on)
+
+
+def test_step_with_unknown_type():
+    with pytest.raises(ManifestError, match='Unknown type "lambda"'):
+        ReleaseStep(name='fn', type='lambda')
+
+
+def test_step_with_missing_options():
+    with pytest.raises(ManifestError, match='Missing service in step "web"'):
+        ReleaseStep(name='web', type='ecs-service', cluster='cluster')
+
+
+def test_plan_from_manifest():
+    plan = ReleasePlan.from_manifest({
+        'defaults': {'cluster': 'cluster'},
+        'concurrency': {'max_parallel': 3, 'clusters': {'cluster': 1}},
+        'steps': [
+            {'name': 'web', 'type': 'ecs-service', 'service': 'web', 'depends_on': ['migrations']},
+            {'name': 'migrations', 'type': 'batch', 'job_definition': 'migrations'},
+        ]
+    })
+
+    assert plan.order == ['migrations', 'web']
+    assert plan.steps['web'].cluster == 'cluster'
+    assert plan.max_parallel == 3
+    assert plan.limit('cluster') == 1
+
+
+def test_plan_without_steps():
+    with pytest.raises(ManifestError, match='no steps'):
+        ReleasePlan.from_manifest({'steps': []})
+
+
+def test_plan_with_duplicate_step():
+    with pytest.raises(ManifestError, match='Duplicate step "web"'):
+        ReleasePlan([ecs_step('web'), ecs_step('web')])
+
+
+def test_plan_with_unknown_dependency():
+    with pytest.raises(ManifestError, match='depends on unknown step "db"'):
+        ReleasePlan([ecs_step('web', depends_on=['db'])])
+
+
+def test_plan_with_cycle():
+    with pytest.raises(ManifestError, match='Dependency cycle between steps: a, b'):
+        ReleasePlan([ecs_step('a', depends_on=['b']), ecs_step('b', depends_on=['a']), ecs_step('c')])
+
+
+def test_executor_runs_dependencies_first():
+    plan = ReleasePlan([
+        ecs_step('web', depends_on=['api']),
+        ecs_step('api', depends_on=['db']),
+        ecs_step('db'),
+    ])
+    started = []
+
+    steps = ReleaseExecutor(plan, lambda step: started.append(step.name)).run()
+
+    assert started == ['db', 'api', 'web']
+    assert all(step.status == STATUS_SUCCEEDED for step in steps)
+
+
+def test_executor_skips_dependents_of_failed_step():
+    plan = ReleasePlan([
+        ecs_step('db'),
+        ecs_step('api', depends_on=['db']),
+        ecs_step('web', depends_on=['api']),
+        ecs_step('worker'),
+    ])
+
+    def run_step(step):
+        if step.name == 'db':
+            raise Exception('Deployment failed')
+
+    steps = {step.name: step for step in ReleaseExecutor(plan, run_step).run()}
+
+    assert steps['db'].status == STATUS_FAILED
+    assert steps['db'].error == 'Deployment failed'
+    assert steps['api'].status == STATUS_SKIPPED
+    assert steps['web'].status == STATUS_SKIPPED
+    assert steps['worker'].status == STATUS_SUCCEEDED
+
+
+def test_executor_limits_concurrency_per_cluster():
+    plan = ReleasePlan(
+        [ecs_step(f'a-{i}', cluster='a') for i in range(4)] + [ecs_step(f'b-{i}', cluster='b') for i in range(4)],
+        max_parallel=8,
+        max_parallel_per_cluster=2,
+        cluster_limits={'b': 1}
+    )
+    lock = threading.Lock()
+    running = {'a': 0, 'b': 0}
+    peak = {'a': 0, 'b': 0}
+
+    def run_step(step):
+        with lock:
+            running[step.cluster] += 1
+            peak[step.cluster] = max(peak[step.cluster], running[step.cluster])
+        time.sleep(0.01)
+        with lock:
+            running[step.cluster] -= 1
+
+    steps = ReleaseExecutor(plan, run_step).run()
+
+    assert all(step.status == STATUS_SUCCEEDED for step in steps)
+    assert peak == {'a': 2, 'b': 1}
@@ -0,0 +1,94 @@
+import json
+
+import pytest
+from click.testing import CliRunner
+from mock import patch
+
+from aws_deploy.apply import cli
+
+
+@pytest.fixture
+def runner():
+    return CliRunner()
+
+
+@pytest.fixture
+def manifest(tmpdir):
+    file = tmpdir.join('release.yaml')
+    file.write(
+        'defaults:\n'
+        '  cluster: test-cluster\n'
+        'steps:\n'
+        '  - name: migrations\n'
+        '    type: batch\n'
+        '    job_definition: migrations\n'
+        '  - name: api\n'
+        '    type: ecs-service\n'
+        '    service: api\n'
+        '    depends_on: [migrations]\n'
+        '  - name: deployer\n'
+        '    type: code-deploy\n'
+        '    application: app\n'
+        '    deployment_group: group\n'
+    )
+    return str(file)
+
+
+@patch.dict(cli.STEP_RUNNERS)
+@patch('aws_deploy.apply.cli.get_clients')
+def test_apply(get_clients, runner, manifest):
+    deployed = []
+    get_clients.return_value = {key: lambda: None for key in cli.STEP_RUNNERS}
+    for key in cli.STEP_RUNNERS:
+        cli.STEP_RUNNERS[key] = lambda client, options: deployed.append(options.get('service'))
+
+    result = runner.invoke(cli.apply, (manifest,))
+
+    assert result.exit_code == 0
+    assert not result.exception
+    assert 'Release plan' in result.output
+    assert '  ecs-service:api (after migrations)' in result.output
+    assert 'Release successful' in result.output
+    assert len(deployed) == 3
+
+
+@patch.dict(cli.STEP_RUNNERS)
+@patch('aws_deploy.apply.cli.get_clients')
+def test_apply_with_failed_step(get_clients, runner, manifest):
+    def fail(client, options):
+        raise Exception('Cannot find valid tag')
+
+    get_clients.return_value = {key: lambda: None for key in cli.STEP_RUNNERS}
+    for key in cli.STEP_RUNNERS:
+        cli.STEP_RUNNERS[key] = lambda client, options: None
+    cli.STEP_RUNNERS['batch'] = fail
+
+    result = runner.invoke(cli.apply, (manifest,))
+
+    assert result.exit_code == 1
+    assert 'batch:migrations: failed: Cannot find valid tag' in result.output
+    assert 'ecs-service:api: skipped: dependency migrations did not succeed' in result.output
+    assert 'code-deploy:deployer: succeeded' in result.output
+    assert 'Release failed' in result.output
+
+
+@patch('aws_deploy.apply.cli.ReleaseExecutor')
+def test_apply_dry_run(executor, runner, tmpdir):
+    file = tmpdir.join('release.json')
+    file.write(json.dumps({'steps': [{'name': 'jobs', 'type': 'batch', 'job_definition': 'jobs'}]}))
+
+    result = runner.invoke(cli.apply, (str(file), '--dry-run'))
+
+    assert result.exit_code == 0
+    assert '  batch:jobs' in result.output
+    executor.assert_not_called()
+
+
+def test_apply_with_invalid_manifest(runner, tmpdir):
+    file = tmpdir.join('release.yaml')
+    file.write('steps:\n  - name: web\n    type: ecs-service\n')
+
+    result = runner.invoke(cli.apply, (str(file),))
+
+    assert result.exit_code == 1
+    assert 'Missing cluster, service in step "web"' in result.output
@@ -0,0 +1,18 @@
+import pytest
+
+from aws_deploy.simulator.benchmark import format_report
+
+_results = []
+
+
+@pytest.fixture(scope='session')
+def benchmark_results():
+    return _results
+
+
+def pytest_terminal_summary(terminalreporter):
+    if _results:
+        terminalreporter.write_sep('=', 'benchmark results')
+        terminalreporter.write_line(format_report(sorted(
+            _results, key=lambda result: (result.flow, result.services, result.tasks_per_service, result.api_latency)
+        )))
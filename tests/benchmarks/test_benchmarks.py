@@ -0,0 +1,53 @@
+import pytest
+
+from aws_deploy.simulator.benchmark import (
+    FLOW_BATCH_DEPLOY, FLOW_CODE_DEPLOY_DEPLOY, FLOW_ECS_DEPLOY, FLOW_ECS_SCALE, FLOWS, run_benchmark
+)
+
+pytestmark = pytest.mark.benchmark
+
+# API calls a flow may make: a fixed amount plus an amount per service. They catch waiters that poll more often and
+# requests that are no longer batched or cached.
+API_CALL_BUDGETS = {
+    FLOW_ECS_DEPLOY: (20, 16),
+    FLOW_ECS_SCALE: (5, 15),
+    FLOW_CODE_DEPLOY_DEPLOY: (5, 18),
+    FLOW_BATCH_DEPLOY: (0, 2),
+}
+
+
+@pytest.mark.parametrize('flow', FLOWS)
+@pytest.mark.parametrize('services', (1, 10, 100, 500))
+@pytest.mark.parametrize('tasks_per_service, api_latency', ((2, 0.0), (10, 0.05)))
+def test_benchmark(benchmark_results, flow, services, tasks_per_service, api_latency):
+    result = run_benchmark(flow, services=services, tasks_per_service=tasks_per_service, api_latency=api_latency)
+    benchmark_results.append(result)
+
+    fixed_calls, calls_per_service = API_CALL_BUDGETS[flow]
+    assert result.failed_runs == 0
+    assert result.total_calls <= fixed_calls + calls_per_service * services, result.calls
+    assert not result.throttled_calls
+
+
+def test_benchmark_with_throttling(benchmark_results):
+    result = run_benchmark(
+        FLOW_ECS_DEPLOY, services=100, tasks_per_service=2, api_latency=0.05,
+        rate_limits={'ecs:DescribeTaskDefinition': (20, 40), 'ecs:RegisterTaskDefinition': (5, 5)}, seed=1
+    )
+    benchmark_results.append(result)
+
+    assert result.failed_runs == 0
+    assert result.throttled_calls
+
+
+def test_benchmark_rate_limiter_reduces_throttling(benchmark_results):
+    options = dict(
+        services=100, tasks_per_service=2, api_latency=0.05, seed=1,
+        rate_limits={'ecs:RegisterTaskDefinition': (5, 5), 'ecs:UpdateService': (5, 5)}
+    )
+    unlimited = run_benchmark(FLOW_ECS_DEPLOY, cli_options=['--no-rate-limit'], **options)
+    limited = run_benchmark(FLOW_ECS_DEPLOY, **options)
+    benchmark_results.extend([unlimited, limited])
+
+    assert limited.failed_runs == unlimited.failed_runs == 0
+    assert sum(limited.throttled_calls.values()) < sum(unlimited.throttled_calls.values())
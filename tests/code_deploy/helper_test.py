@@ -1,11 +1,14 @@
 import pytest
 from boto3 import Session
 from botocore.exceptions import ClientError
-from mock import patch
+from mock import ANY, patch
 
 from aws_deploy.code_deploy.helper import (
     CodeDeployClient, UnknownTaskDefinitionError, CodeDeployDeploymentGroup, CodeDeployRevision
 )
+from aws_deploy.common.cache import TaskDefinitionCache
+from aws_deploy.common.memoize import RequestCache
+from aws_deploy.ecs.helper import EcsTaskDefinition
 from tests.code_deploy.utils import (
     DEPLOYMENT_ID, APPLICATION_PAYLOAD, DEPLOYMENT_GROUP_PAYLOAD, DEPLOYMENT_GROUP_PAYLOAD_2,
     APPLICATION_REVISION_PAYLOAD, TASK_DEFINITION_PAYLOAD, DEPLOYMENT_PAYLOAD
@@ -17,7 +20,13 @@ from tests.code_deploy.utils import (
 def test_client_init(mocked_init, mocked_client):
     mocked_init.return_value = None
 
-    CodeDeployClient('access_key_id', 'secret_access_key', 'session_token', 'region_name', 'profile_name')
+    client = CodeDeployClient('access_key_id', 'secret_access_key', 'session_token', 'region_name', 'profile_name')
+
+    mocked_init.assert_not_called()
+    mocked_client.assert_not_called()
+
+    client._code_deploy
+    client._ecs
 
     mocked_init.assert_called_once_with(
         aws_access_key_id='access_key_id',
@@ -27,17 +36,15 @@ def test_client_init(mocked_init, mocked_client):
         profile_name='profile_name'
     )
 
-    mocked_client.assert_any_call('codedeploy')
-    mocked_client.assert_any_call('ecs')
+    mocked_client.assert_any_call('codedeploy', config=ANY)
+    mocked_client.assert_any_call('ecs', config=ANY)
+    assert mocked_client.call_count == 2
 
 
 @pytest.fixture
-@patch.object(Session, 'client')
-@patch.object(Session, '__init__')
-def client(mocked_init, mocked_client) -> CodeDeployClient:
-    mocked_init.return_value = None
-
-    return CodeDeployClient('access_key_id', 'secret_access_key', 'session_token', 'region_name', 'profile_name')
+def client() -> CodeDeployClient:
+    with patch.object(Session, '__init__', return_value=None), patch.object(Session, 'client'):
+        yield CodeDeployClient('access_key_id', 'secret_access_key', 'session_token', 'region_name', 'profile_name')
 
 
 def test_client_get_application(client: CodeDeployClient):
@@ -102,6 +109,54 @@ def test_client_get_task_definition(client: CodeDeployClient):
     )
 
 
+def test_client_get_task_definition_filtered_describes_once(client: CodeDeployClient):
+    client.request_cache = RequestCache()
+    client._resource_tagging.get_resources.return_value = {
+        'ResourceTagMappingList': [{'ResourceARN': TASK_DEFINITION_PAYLOAD['taskDefinition']['taskDefinitionArn']}]
+    }
+    client._ecs.describe_task_definition.return_value = TASK_DEFINITION_PAYLOAD
+
+    client.get_task_definition_filtered(family='test-task', module_version='1.0.0')
+
+    client._ecs.describe_task_definition.assert_called_once()
+    assert client.request_cache.saved_calls == {'CodeDeployClient.get_task_definition': 1}
+
+
+def test_client_get_task_definition_from_cache(client: CodeDeployClient, tmpdir):
+    task_definition_arn = TASK_DEFINITION_PAYLOAD['taskDefinition']['taskDefinitionArn']
+    client._task_definition_cache = TaskDefinitionCache(cache_dir=str(tmpdir))
+    client._ecs.describe_task_definition.return_value = TASK_DEFINITION_PAYLOAD
+    client._ecs.list_tags_for_resource.return_value = {'tags': [{'key': 'ModuleVersion', 'value': '1.0.1'}]}
+
+    client.get_task_definition(task_definition_arn)
+    task_definition = client.get_task_definition(task_definition_arn)
+
+    client._ecs.describe_task_definition.assert_called_once()
+    client._ecs.list_tags_for_resource.assert_not_called()
+    assert task_definition.get_tag('ModuleVersion') == '1.0.1'
+    client._ecs.list_tags_for_resource.assert_called_once_with(resourceArn=task_definition_arn)
+
+
+def test_client_register_task_definition_leaves_out_read_only_properties(client: CodeDeployClient):
+    task_definition = EcsTaskDefinition(
+        tags=[{'key': 'Team', 'value': 'web'}],
+        **dict(
+            TASK_DEFINITION_PAYLOAD['taskDefinition'],
+            registeredAt='2020-01-01T00:00:00Z',
+            registeredBy='arn:aws:iam::123456789012:root'
+        )
+    )
+    client._ecs.register_task_definition.return_value = TASK_DEFINITION_PAYLOAD
+
+    client.register_task_definition(task_definition)
+
+    kwargs = client._ecs.register_task_definition.call_args[1]
+    assert 'registeredAt' not in kwargs and 'registeredBy' not in kwargs
+    assert kwargs['networkMode'] == TASK_DEFINITION_PAYLOAD['taskDefinition']['networkMode']
+    assert kwargs['tags'] == [{'key': 'Team', 'value': 'web'}]
+    assert 'tags' not in task_definition.additional_properties
+
+
 def test_client_get_unknown_task_definition(client: CodeDeployClient):
     error_response = {'Error': {'Code': 'ClientException', 'Message': 'Unable to describe task definition.'}}
     client._ecs.describe_task_definition.side_effect = ClientError(error_response, 'DescribeServices')
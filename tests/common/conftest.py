@@ -0,0 +1,12 @@
+import pytest
+
+from aws_deploy.common.polling import set_clock
+from aws_deploy.simulator import VirtualClock
+
+
+@pytest.fixture
+def clock():
+    clock = VirtualClock()
+    previous_clock = set_clock(clock)
+    yield clock
+    set_clock(previous_clock)
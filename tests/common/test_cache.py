@@ -0,0 +1,135 @@
+import os
+from datetime import datetime
+
+import pytest
+from dateutil.tz import tzutc
+
+from aws_deploy.common.cache import (
+    TaskDefinitionCache, get_task_definition_cache, is_task_definition_revision_arn, task_definition_revision_arn
+)
+
+TASK_DEFINITION_ARN = 'arn:aws:ecs:eu-central-1:123456789012:task-definition/test-task:1'
+
+PAYLOAD = {
+    'taskDefinition': {
+        'taskDefinitionArn': TASK_DEFINITION_ARN,
+        'family': 'test-task',
+        'revision': 1,
+        'registeredAt': datetime(2020, 1, 1, 12, 0, tzinfo=tzutc()),
+    },
+}
+
+PAYLOAD_WITH_MUTABLE_PROPERTIES = {
+    'taskDefinition': dict(
+        PAYLOAD['taskDefinition'], status='INACTIVE', deregisteredAt=datetime(2020, 1, 2, 12, 0, tzinfo=tzutc())
+    ),
+    'tags': [{'key': 'ModuleVersion', 'value': '1.0.0'}],
+}
+
+
+@pytest.fixture
+def cache(tmpdir):
+    return TaskDefinitionCache(cache_dir=str(tmpdir))
+
+
+def cache_files(cache_dir):
+    return [os.path.join(directory, file) for directory, _, files in os.walk(cache_dir) for file in files]
+
+
+def test_is_task_definition_revision_arn():
+    assert is_task_definition_revision_arn(TASK_DEFINITION_ARN)
+    assert not is_task_definition_revision_arn('test-task')
+    assert not is_task_definition_revision_arn('test-task:1')
+    assert not is_task_definition_revision_arn('arn:aws:ecs:eu-central-1:123456789012:task-definition/test-task')
+    assert not is_task_definition_revision_arn(None)
+
+
+def test_task_definition_revision_arn():
+    assert task_definition_revision_arn(TASK_DEFINITION_ARN, 'aws', 'eu-west-1', '210987654321') == TASK_DEFINITION_ARN
+    assert task_definition_revision_arn('test-task:1', 'aws', 'eu-central-1', '123456789012') == TASK_DEFINITION_ARN
+    assert task_definition_revision_arn('test-task', 'aws', 'eu-central-1', '123456789012') is None
+
+
+def test_cache_roundtrip(cache):
+    assert cache.get(TASK_DEFINITION_ARN) is None
+
+    cache.put(TASK_DEFINITION_ARN, PAYLOAD)
+
+    assert cache.get(TASK_DEFINITION_ARN) == PAYLOAD
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_cache_leaves_out_mutable_properties(cache):
+    cache.put(TASK_DEFINITION_ARN, PAYLOAD_WITH_MUTABLE_PROPERTIES)
+
+    assert cache.get(TASK_DEFINITION_ARN) == PAYLOAD
+
+
+def test_cache_ignores_family_names(cache, tmpdir):
+    cache.put('test-task', PAYLOAD)
+
+    assert cache.get('test-task') is None
+    assert cache_files(str(tmpdir)) == []
+
+
+def test_cache_invalidate(cache):
+    cache.put(TASK_DEFINITION_ARN, PAYLOAD)
+    cache.invalidate(TASK_DEFINITION_ARN)
+
+    assert cache.get(TASK_DEFINITION_ARN) is None
+
+
+def test_cache_treats_corrupt_entries_as_miss(cache, tmpdir):
+    cache.put(TASK_DEFINITION_ARN, PAYLOAD)
+    for path in cache_files(str(tmpdir)):
+        with open(path, 'wb') as f:
+            f.write(b'corrupt')
+
+    assert cache.get(TASK_DEFINITION_ARN) is None
+
+
+def test_cache_evicts_least_recently_used(tmpdir):
+    cache = TaskDefinitionCache(cache_dir=str(tmpdir), max_size=10 ** 6)
+    arns = [TASK_DEFINITION_ARN[:-1] + str(revision) for revision in range(1, 4)]
+    for timestamp, arn in enumerate(arns):
+        cache.put(arn, PAYLOAD)
+        os.utime(cache._path(arn), (timestamp, timestamp))
+
+    cache.get(arns[0])
+    cache.max_size = sum(os.path.getsize(path) for path in cache_files(str(tmpdir))) - 1
+    cache.evict()
+
+    assert cache.get(arns[0]) == PAYLOAD
+    assert cache.get(arns[1]) is None
+    assert cache.get(arns[2]) == PAYLOAD
+
+
+def test_cache_evicts_when_growing_beyond_max_size(tmpdir, monkeypatch):
+    cache = TaskDefinitionCache(cache_dir=str(tmpdir))
+    cache.put(TASK_DEFINITION_ARN, PAYLOAD)
+    entry_size = cache.size()
+    cache.max_size = 2 * entry_size + entry_size // 2
+    evict = cache.evict
+    evictions = []
+    monkeypatch.setattr(cache, 'evict', lambda: evictions.append(evict()))
+
+    cache.put(TASK_DEFINITION_ARN, PAYLOAD)
+    cache.put(TASK_DEFINITION_ARN[:-1] + '2', PAYLOAD)
+
+    assert evictions == []
+
+    cache.put(TASK_DEFINITION_ARN[:-1] + '3', PAYLOAD)
+
+    assert len(evictions) == 1
+    assert len(cache_files(str(tmpdir))) == 2
+
+
+def test_get_task_definition_cache(tmpdir, monkeypatch):
+    monkeypatch.setenv('AWS_DEPLOY_CACHE_DIR', str(tmpdir))
+    monkeypatch.delenv('AWS_DEPLOY_NO_CACHE', raising=False)
+
+    assert get_task_definition_cache().cache_dir == str(tmpdir)
+
+    monkeypatch.setenv('AWS_DEPLOY_NO_CACHE', '1')
+
+    assert get_task_definition_cache() is None
@@ -0,0 +1,146 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+from click.testing import CliRunner
+
+from aws_deploy.cli import cli
+from aws_deploy.common.cassette import (
+    INTERACTIONS_FILE, CassetteError, CassetteRecorder, CassetteReplayer, dumps, loads
+)
+from aws_deploy.common.session import ClientFactory
+from aws_deploy.simulator import Simulator, SimulatorClientFactory
+
+
+@pytest.fixture
+def runner():
+    return CliRunner(env={'AWS_DEPLOY_NO_CACHE': '1'})
+
+
+def interaction(operation, params, response, latency=0.5, status=200):
+    return {
+        'service': 'ecs', 'operation': operation, 'params': params, 'status': status, 'latency': latency,
+        'response': response
+    }
+
+
+def replay_client(replayer):
+    factory = ClientFactory(region_name='eu-west-1')
+    factory.instrument(replayer)
+    return factory.client('ecs')
+
+
+def test_datetimes_survive_recording():
+    value = {'createdAt': datetime(2020, 1, 1, 12, tzinfo=timezone.utc), 'count': 1}
+
+    assert loads(dumps(value)) == value
+
+
+def test_recorder(clock, tmp_path):
+    simulator = Simulator(clock=clock, api_latency=0.25)
+    simulator.ecs.add_task_definition('web')
+    factory = SimulatorClientFactory(simulator)
+    factory.instrument(CassetteRecorder(str(tmp_path)))
+
+    factory.client('ecs').describe_task_definition(taskDefinition='web')
+    with pytest.raises(Exception):
+        factory.client('ecs').describe_task_definition(taskDefinition='api')
+
+    first, second = [loads(line) for line in (tmp_path / INTERACTIONS_FILE).read_text().splitlines()]
+    assert (first['operation'], first['params'], first['status'], first['latency']) == (
+        'DescribeTaskDefinition', {'taskDefinition': 'web'}, 200, 0.25
+    )
+    assert first['response']['taskDefinition']['family'] == 'web'
+    assert (second['status'], second['response']['Error']['Code']) == (400, 'ClientException')
+    assert json.loads((tmp_path / 'meta.json').read_text()) == {'region': 'eu-west-1'}
+
+
+def test_replayer_serves_responses_in_recorded_order(clock):
+    replayer = CassetteReplayer([
+        interaction('DescribeServices', {'cluster': 'prod', 'services': ['web']}, {'services': [{'runningCount': 1}]}),
+        interaction('DescribeServices', {'cluster': 'prod', 'services': ['api']}, {'services': [{'runningCount': 5}]}),
+        interaction('DescribeServices', {'cluster': 'prod', 'services': ['web']}, {'services': [{'runningCount': 2}]}),
+    ])
+    ecs = replay_client(replayer)
+
+    def running_count(service):
+        return ecs.describe_services(cluster='prod', services=[service])['services'][0]['runningCount']
+
+    assert [running_count('web'), running_count('web'), running_count('web'), running_count('api')] == [1, 2, 2, 5]
+    assert clock.now() == 2
+
+
+def test_replayer_rejects_unrecorded_parameters(clock):
+    replayer = CassetteReplayer([
+        interaction('RunTask', {'cluster': 'prod', 'startedBy': 'recorded'}, {'tasks': [], 'failures': []}),
+    ], latency_scale=0)
+    ecs = replay_client(replayer)
+
+    with pytest.raises(CassetteError):
+        ecs.run_task(cluster='prod', taskDefinition='web', startedBy='replayed')
+
+
+def test_loose_replayer_falls_back_to_the_operation(clock):
+    replayer = CassetteReplayer([
+        interaction('RunTask', {'cluster': 'prod', 'startedBy': 'recorded'}, {'tasks': [], 'failures': []}),
+    ], latency_scale=0, loose=True)
+    ecs = replay_client(replayer)
+
+    assert ecs.run_task(cluster='prod', taskDefinition='web', startedBy='replayed')['tasks'] == []
+    assert clock.now() == 0
+    with pytest.raises(CassetteError):
+        ecs.list_services(cluster='prod')
+
+
+def test_replayer_replays_errors(clock):
+    error = {'Error': {'Code': 'ServiceNotFoundException', 'Message': 'Service not found'}}
+    ecs = replay_client(CassetteReplayer([interaction('UpdateService', {'service': 'web'}, error, status=400)]))
+
+    with pytest.raises(ecs.exceptions.ServiceNotFoundException):
+        ecs.update_service(service='web')
+
+
+def test_record_and_replay_a_deployment(clock, runner, tmp_path):
+    cassette = str(tmp_path / 'cassette')
+    simulator = Simulator(clock=clock, api_latency=0.1)
+    simulator.ecs.add_task_definition('web', image='nginx:1.0.0')
+    simulator.ecs.add_service('prod', 'web', 'web', desired_count=2)
+    args = ['ecs', 'deploy', 'prod', 'web', '--tag', '2.0.0']
+
+    recorded = runner.invoke(
+        cli, ['--record', cassette] + args, obj={'CLIENT_FACTORY': SimulatorClientFactory(simulator)}
+    )
+    recorded_duration = clock.now()
+    replayed = runner.invoke(cli, ['--replay', cassette, '--api-stats'] + args, obj={})
+
+    assert recorded.exit_code == 0, recorded.output
+    assert replayed.exit_code == 0, replayed.output
+    assert 'Deployment successful' in replayed.output
+    assert replayed.output.splitlines()[-1].split() == ['total', str(simulator.total_calls)]
+    # every replayed call takes its recorded latency
+    assert clock.now() - recorded_duration >= simulator.total_calls * 0.1 - 1e-6
+
+
+def test_record_and_replay_bypass_the_task_definition_cache(clock, tmp_path):
+    runner = CliRunner(env={'AWS_DEPLOY_CACHE_DIR': str(tmp_path / 'cache')})
+    cassette = str(tmp_path / 'cassette')
+    simulator = Simulator(clock=clock)
+    simulator.ecs.add_task_definition('web', image='nginx:1.0.0')
+    simulator.ecs.add_service('prod', 'web', 'web')
+    args = ['ecs', 'deploy', 'prod', 'web', '--tag', '2.0.0']
+
+    recorded = runner.invoke(
+        cli, ['--record', cassette] + args, obj={'CLIENT_FACTORY': SimulatorClientFactory(simulator)}
+    )
+    replayed = runner.invoke(cli, ['--replay', cassette, '--replay-latency-scale', '0'] + args, obj={})
+
+    assert recorded.exit_code == 0, recorded.output
+    assert replayed.exit_code == 0, replayed.output
+    assert not (tmp_path / 'cache').exists()
+
+
+def test_record_and_replay_are_exclusive(runner, tmp_path):
+    result = runner.invoke(cli, ['--record', str(tmp_path), '--replay', str(tmp_path), 'ecs', 'scale', 'a', 'b', '1'])
+
+    assert result.exit_code == 2
+    assert '--record and --replay cannot be used together' in result.output
@@ -0,0 +1,117 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from click.testing import CliRunner
+
+from aws_deploy.cli import cli
+from aws_deploy.common.hedging import RequestHedging, parse_hedged_operations
+from aws_deploy.ecs.helper import EcsClient
+from aws_deploy.simulator import Simulator, SimulatorClientFactory
+
+
+class SlowClient:
+    """
+    Answers describe_services after the next of the given latencies, with the number of the request.
+    """
+
+    def __init__(self, latencies):
+        self.meta = SimpleNamespace(service_model=SimpleNamespace(service_name='ecs'))
+        self.requests = 0
+        self._latencies = iter(latencies)
+        self._lock = threading.Lock()
+
+    def describe_services(self, **kwargs):
+        with self._lock:
+            self.requests += 1
+            request, latency = self.requests, next(self._latencies)
+        time.sleep(latency)
+        return {'request': request}
+
+    def update_service(self, **kwargs):
+        return {}
+
+
+def test_parse_hedged_operations():
+    assert parse_hedged_operations(['ecs:DescribeServices', 'codedeploy:GetDeployment']) == {
+        'ecs:DescribeServices', 'codedeploy:GetDeployment'
+    }
+
+
+@pytest.mark.parametrize('value', ('ecs', 'DescribeServices', 'ecs:', 'ecs:UpdateService', 'ecs:RunTask'))
+def test_parse_invalid_hedged_operations(value):
+    with pytest.raises(ValueError):
+        parse_hedged_operations([value])
+
+
+def test_slow_reads_are_hedged():
+    client = SlowClient([0.01] * 20 + [1, 0.01])
+    hedging = RequestHedging({'ecs:DescribeServices'}, budget_ratio=0.5, min_samples=20)
+    hedged_client = hedging.wrap(client)
+
+    assert [hedged_client.describe_services()['request'] for _ in range(20)] == list(range(1, 21))
+    started_at = time.monotonic()
+    assert hedged_client.describe_services() == {'request': 22}
+
+    assert time.monotonic() - started_at < 0.5
+    assert (hedging.calls['ecs:DescribeServices'], hedging.hedged_calls['ecs:DescribeServices']) == (21, 1)
+    assert hedging.won_hedges['ecs:DescribeServices'] == 1
+    assert hedging.report().splitlines()[0] == 'Hedged 1 of 21 calls'
+
+
+def test_hedges_are_limited_by_the_budget():
+    client = SlowClient([0.01] * 20 + [0.05] * 20)
+    hedging = RequestHedging({'ecs:DescribeServices'}, budget_ratio=0.1, min_samples=20)
+    hedged_client = hedging.wrap(client)
+
+    for _ in range(30):
+        hedged_client.describe_services()
+
+    assert hedging.hedged_calls['ecs:DescribeServices'] <= 30 * 0.1
+    assert client.requests <= 33
+
+
+def test_other_operations_are_not_hedged():
+    client = SlowClient([])
+    hedged_client = RequestHedging({'ecs:DescribeServices'}).wrap(client)
+
+    assert hedged_client.update_service == client.update_service
+    assert hedged_client.meta is client.meta
+
+
+def test_ecs_client_hedges_its_reads():
+    simulator = Simulator()
+    simulator.ecs.add_task_definition('web')
+    simulator.ecs.add_service('prod', 'web', 'web')
+    hedging = RequestHedging({'ecs:DescribeServices'})
+    client = EcsClient(client_factory=SimulatorClientFactory(simulator), hedging=hedging)
+
+    assert client.describe_services('prod', 'web')['services'][0]['serviceName'] == 'web'
+    assert client.describe_task_definition('web')['taskDefinition']['family'] == 'web'
+    assert dict(hedging.calls) == {'ecs:DescribeServices': 1}
+
+
+@pytest.mark.parametrize('args, message', (
+    (['--hedge', 'ecs:UpdateService'], 'Cannot hedge ecs:UpdateService'),
+    (['--hedge', 'ecs:DescribeServices', '--hedge-budget', '2'], '2.0 is not between 0 and 1'),
+))
+def test_invalid_hedge_options(args, message):
+    result = CliRunner().invoke(cli, args + ['ecs', 'scale', 'prod', 'web', '2'])
+
+    assert result.exit_code == 2
+    assert message in result.output
+
+
+def test_hedge_option():
+    simulator = Simulator()
+    simulator.ecs.add_task_definition('web')
+    simulator.ecs.add_service('prod', 'web', 'web')
+
+    result = CliRunner(env={'AWS_DEPLOY_NO_CACHE': '1'}).invoke(
+        cli, ['--hedge', 'ecs:DescribeServices', 'ecs', 'scale', 'prod', 'web', '2'],
+        obj={'CLIENT_FACTORY': SimulatorClientFactory(simulator)}
+    )
+
+    assert result.exit_code == 0, result.output
+    assert 'ecs:DescribeServices: 0 of' in result.output
@@ -0,0 +1,30 @@
+import click
+from click.testing import CliRunner
+
+from aws_deploy.common.lazy import LazyGroup
+
+
+@click.command()
+def eager():
+    """Eagerly registered command."""
+
+
+def test_lazy_group_lists_commands_without_importing():
+    group = LazyGroup(name='cli', lazy_commands={'lazy': ('missing.module:command', 'Loaded on demand.')})
+    group.add_command(eager)
+
+    result = CliRunner().invoke(group, ['--help'])
+
+    assert result.exit_code == 0
+    assert 'eager  Eagerly registered command.' in result.output
+    assert 'lazy   Loaded on demand.' in result.output
+    assert 'lazy' not in group.commands
+
+
+def test_lazy_group_imports_invoked_command():
+    group = LazyGroup(name='cli', lazy_commands={'greet': ('tests.common.test_lazy:eager', 'Greets.')})
+
+    result = CliRunner().invoke(group, ['greet'])
+
+    assert result.exit_code == 0
+    assert group.commands['greet'] is eager
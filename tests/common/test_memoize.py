@@ -0,0 +1,80 @@
+from mock import Mock
+
+from aws_deploy.common.memoize import RequestCache, invalidates, memoized
+
+
+class Client:
+    def __init__(self, request_cache=None):
+        self.request_cache = request_cache
+        self.api = Mock()
+        self.api.describe.side_effect = lambda name: {'name': name, 'containers': []}
+
+    @memoized('task_definition')
+    def describe(self, name):
+        return self.api.describe(name)
+
+    @invalidates('task_definition')
+    def register(self, name):
+        return self.api.register(name)
+
+
+def test_memoized_without_request_cache():
+    client = Client()
+
+    client.describe('task')
+    client.describe('task')
+
+    assert client.api.describe.call_count == 2
+
+
+def test_memoized_answers_repeated_calls():
+    request_cache = RequestCache()
+    client = Client(request_cache)
+
+    assert client.describe('task') == client.describe(name='task') == client.describe('task')
+    client.describe('other')
+
+    assert client.api.describe.call_count == 3
+    assert request_cache.saved_calls == {'Client.describe': 1}
+
+
+def test_memoized_results_are_copies():
+    client = Client(RequestCache())
+
+    client.describe('task')['containers'].append('modified')
+
+    assert client.describe('task')['containers'] == []
+
+
+def test_invalidates_on_write():
+    request_cache = RequestCache()
+    client = Client(request_cache)
+
+    client.describe('task')
+    client.register('task')
+    client.describe('task')
+
+    assert client.api.describe.call_count == 2
+
+
+def test_memoized_does_not_cache_errors():
+    client = Client(RequestCache())
+    client.api.describe.side_effect = [Exception('Throttled'), {'name': 'task'}]
+
+    try:
+        client.describe('task')
+    except Exception:
+        pass
+
+    assert client.describe('task') == {'name': 'task'}
+
+
+def test_report():
+    request_cache = RequestCache()
+    request_cache.saved_calls['EcsClient.describe_task_definition'] += 2
+    request_cache.saved_calls['CodeDeployClient.get_application'] += 1
+
+    assert request_cache.report() == (
+        'Saved 3 API calls (CodeDeployClient.get_application: 1, EcsClient.describe_task_definition: 2)'
+    )
+    assert RequestCache().report() == 'Saved 0 API calls'
@@ -0,0 +1,110 @@
+import pytest
+from botocore.exceptions import ClientError
+
+from aws_deploy.common.polling import Clock, PollScheduler, is_throttling_error
+
+
+class FakeClock(Clock):
+    def __init__(self):
+        self.time = 0.0
+        self.sleeps = []
+
+    def now(self):
+        return self.time
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.time += seconds
+
+
+def throttling_error():
+    return ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, 'DescribeServices')
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_scheduler_backs_off_while_state_is_unchanged(clock):
+    scheduler = PollScheduler(sleep_time=1, max_sleep_time=4, backoff_factor=2, jitter=0, clock=clock)
+
+    delays = [scheduler.next_delay('same') for _ in range(5)]
+
+    assert delays == [1, 2, 4, 4, 4]
+
+
+def test_scheduler_resets_on_state_change(clock):
+    scheduler = PollScheduler(sleep_time=1, max_sleep_time=8, backoff_factor=2, jitter=0, clock=clock)
+
+    scheduler.next_delay('a')
+    scheduler.next_delay('a')
+    scheduler.next_delay('a')
+
+    assert scheduler.next_delay('b') == 1
+
+
+def test_scheduler_jitter_is_bounded(clock):
+    scheduler = PollScheduler(sleep_time=2, max_sleep_time=2, jitter=0.25, clock=clock)
+
+    for _ in range(100):
+        assert 1.5 <= scheduler.next_delay('same') <= 2.5
+
+
+def test_scheduler_wait_does_not_pass_deadline(clock):
+    scheduler = PollScheduler(sleep_time=5, jitter=0, clock=clock)
+    deadline = scheduler.deadline(2)
+
+    scheduler.wait('state', deadline=deadline)
+
+    assert clock.sleeps == [2]
+    assert scheduler.expired(deadline)
+
+
+def test_scheduler_without_timeout_never_expires(clock):
+    scheduler = PollScheduler(clock=clock)
+
+    assert scheduler.deadline(-1) is None
+    assert not scheduler.expired(None)
+
+
+def test_scheduler_poll_retries_on_throttling(clock):
+    scheduler = PollScheduler(sleep_time=1, jitter=0, clock=clock)
+    responses = [throttling_error(), throttling_error(), 'service']
+
+    def describe_services():
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    assert scheduler.poll(describe_services) == 'service'
+    assert len(clock.sleeps) == 2
+    assert clock.sleeps[1] > clock.sleeps[0]
+
+
+def test_scheduler_poll_raises_other_errors(clock):
+    scheduler = PollScheduler(clock=clock)
+    error = ClientError({'Error': {'Code': 'ClusterNotFoundException', 'Message': 'Not found'}}, 'DescribeServices')
+
+    def describe_services():
+        raise error
+
+    with pytest.raises(ClientError):
+        scheduler.poll(describe_services)
+    assert clock.sleeps == []
+
+
+def test_scheduler_poll_gives_up_after_deadline(clock):
+    scheduler = PollScheduler(sleep_time=1, jitter=0, clock=clock)
+
+    def describe_services():
+        raise throttling_error()
+
+    with pytest.raises(ClientError):
+        scheduler.poll(describe_services, deadline=scheduler.deadline(3))
+
+
+def test_is_throttling_error():
+    assert is_throttling_error(throttling_error())
+    assert not is_throttling_error(ValueError())
@@ -0,0 +1,85 @@
+import pstats
+import threading
+import time
+import tracemalloc
+
+from click.testing import CliRunner
+
+from aws_deploy.cli import cli
+from aws_deploy.common.polling import set_clock
+from aws_deploy.common.profiling import CpuProfile, MemoryProfile, StackSampler, collapsed_stacks_path
+from aws_deploy.simulator import Simulator, SimulatorClientFactory, VirtualClock
+
+
+def busy(seconds):
+    finished_at = time.perf_counter() + seconds
+    while time.perf_counter() < finished_at:
+        pass
+
+
+def test_collapsed_stacks_path():
+    assert collapsed_stacks_path('/tmp/out.pstats') == '/tmp/out.collapsed'
+    assert collapsed_stacks_path('out') == 'out.collapsed'
+
+
+def test_stack_sampler_samples_other_threads():
+    sampler = StackSampler(interval=0.001)
+    thread = threading.Thread(target=busy, args=(0.1,))
+
+    sampler.start()
+    thread.start()
+    thread.join()
+    sampler.stop()
+
+    stacks = [stack for stack in sampler.stacks if stack.split(';')[-1].startswith('test_profiling:busy:')]
+    assert stacks
+    assert all(stack.split(';')[0].startswith('threading:_bootstrap:') for stack in stacks)
+
+
+def test_cpu_profile(tmp_path):
+    profile = CpuProfile(str(tmp_path / 'out.pstats'), top=5, sample_interval=0.001)
+
+    profile.start()
+    busy(0.05)
+    report = profile.stop()
+
+    assert 'busy' in report
+    stats = pstats.Stats(str(tmp_path / 'out.pstats'))
+    assert any(function == 'busy' for _, _, function in stats.stats)
+    assert (tmp_path / 'out.collapsed').exists()
+
+
+def test_memory_profile():
+    profile = MemoryProfile(top=3)
+
+    profile.start()
+    allocations = [bytearray(1024 * 1024) for _ in range(4)]
+    report = profile.stop().splitlines()
+
+    assert report[0].startswith('Memory profile: peak 4.')
+    assert 'test_profiling.py' in report[1]
+    assert len(report) <= 4
+    assert allocations
+    assert not tracemalloc.is_tracing()
+
+
+def test_profile_options(tmp_path):
+    clock = VirtualClock()
+    previous_clock = set_clock(clock)
+    try:
+        simulator = Simulator(clock=clock)
+        simulator.ecs.add_task_definition('web')
+        simulator.ecs.add_service('prod', 'web', 'web', desired_count=2)
+
+        result = CliRunner(env={'AWS_DEPLOY_NO_CACHE': '1'}).invoke(
+            cli, ['--profile-cpu', str(tmp_path / 'scale.pstats'), '--profile-mem', 'ecs', 'scale', 'prod', 'web', '4'],
+            obj={'CLIENT_FACTORY': SimulatorClientFactory(simulator)}
+        )
+    finally:
+        set_clock(previous_clock)
+
+    assert result.exit_code == 0, result.output
+    assert 'Memory profile: peak' in result.output
+    assert f'CPU profile written to {tmp_path / "scale.pstats"}' in result.output
+    assert pstats.Stats(str(tmp_path / 'scale.pstats')).total_calls > 0
+    assert (tmp_path / 'scale.collapsed').exists()
@@ -0,0 +1,86 @@
+import pytest
+from click.testing import CliRunner
+
+from aws_deploy.cli import cli
+from aws_deploy.common.ratelimit import AdaptiveTokenBucket, RateLimiter, parse_rate_limits
+from aws_deploy.simulator import Simulator, SimulatorClientFactory
+
+
+def test_parse_rate_limits():
+    assert parse_rate_limits(['ecs=10', 'ecs:DescribeServices=5/10', 'batch=0.5']) == {
+        'ecs': (10, 10), 'ecs:DescribeServices': (5, 10), 'batch': (0.5, 1)
+    }
+
+
+@pytest.mark.parametrize('value', ('ecs', '=10', 'ecs=0', 'ecs=fast', 'ecs=10/0'))
+def test_parse_invalid_rate_limits(value):
+    with pytest.raises(ValueError):
+        parse_rate_limits([value])
+
+
+def test_bucket_queues_requests_over_the_burst(clock):
+    bucket = AdaptiveTokenBucket(rate=2, burst=2)
+
+    waits = [bucket.acquire() for _ in range(4)]
+
+    assert waits == [0, 0, 0.5, 0.5]
+    assert clock.now() == 1
+    assert bucket.waited == 1
+
+
+def test_bucket_adapts_to_throttling(clock):
+    bucket = AdaptiveTokenBucket(rate=20, burst=40)
+
+    bucket.throttled()
+    bucket.throttled()
+    assert bucket.rate == 10
+
+    clock.sleep(1)
+    bucket.throttled()
+    assert (bucket.rate, bucket.throttles) == (5, 3)
+
+    clock.sleep(5)
+    bucket.succeeded()
+    assert bucket.rate == 10
+
+    clock.sleep(60)
+    bucket.succeeded()
+    assert bucket.rate == 20
+
+
+def test_rate_limiter_keeps_requests_within_the_limit(clock):
+    simulator = Simulator(clock=clock, rate_limits={'ecs:DescribeTaskDefinition': (2, 2)})
+    simulator.ecs.add_task_definition('web')
+    factory = SimulatorClientFactory(simulator)
+    limiter = RateLimiter({'ecs:DescribeTaskDefinition': (2, 2), 'ecs': (100, 100)})
+    factory.instrument(limiter)
+
+    for _ in range(6):
+        factory.client('ecs').describe_task_definition(taskDefinition='web')
+    factory.client('ecs').list_task_definitions()
+
+    assert not simulator.throttled_calls
+    assert clock.now() == 2
+    assert limiter.buckets['ecs:ListTaskDefinitions'].rate == 100
+
+
+def test_rate_limiter_slows_down_on_throttling(clock):
+    simulator = Simulator(clock=clock, rate_limits={'ecs': (1, 1)}, seed=1)
+    simulator.ecs.add_task_definition('web')
+    factory = SimulatorClientFactory(simulator)
+    limiter = RateLimiter({'ecs': (10, 10)})
+    factory.instrument(limiter)
+
+    for _ in range(10):
+        factory.client('ecs').describe_task_definition(taskDefinition='web')
+
+    bucket = limiter.buckets['ecs:DescribeTaskDefinition']
+    assert bucket.throttles == simulator.throttled_calls['ecs:DescribeTaskDefinition'] > 0
+    assert bucket.rate < 10
+
+
+def test_invalid_rate_limit_option():
+    result = CliRunner().invoke(cli, ['--rate-limit', 'ecs', 'ecs', 'scale', 'prod', 'web', '2'])
+
+    assert result.exit_code == 2
+    assert 'Invalid rate limit "ecs"' in result.output
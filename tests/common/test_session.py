@@ -0,0 +1,89 @@
+import threading
+
+from boto3.session import Session
+from mock import Mock, patch
+
+from aws_deploy.common.session import ClientFactory, get_client_factory
+
+
+@patch.object(Session, 'client')
+@patch.object(Session, '__init__', return_value=None)
+def test_client_factory_creates_clients_lazily(session_init, session_client):
+    factory = ClientFactory(region_name='eu-west-1', max_pool_connections=50)
+
+    session_init.assert_not_called()
+
+    assert factory.client('ecs') is factory.client('ecs')
+    factory.client('events')
+
+    session_init.assert_called_once_with(
+        aws_access_key_id=None, aws_secret_access_key=None, aws_session_token=None, region_name='eu-west-1',
+        profile_name=None
+    )
+    assert [call[0][0] for call in session_client.call_args_list] == ['ecs', 'events']
+    assert factory.created_clients == ['ecs', 'events']
+
+
+def test_client_factory_config():
+    config = ClientFactory(max_pool_connections=50, tcp_keepalive=True).config
+
+    assert config.max_pool_connections == 50
+    assert config.tcp_keepalive is True
+    assert config.retries == {'mode': 'adaptive', 'max_attempts': 10}
+
+
+@patch.object(Session, 'client', side_effect=lambda service_name, config: object())
+@patch.object(Session, '__init__', return_value=None)
+def test_client_factory_is_thread_safe(session_init, session_client):
+    factory = ClientFactory()
+    clients = []
+
+    threads = [threading.Thread(target=lambda: clients.append(factory.client('ecs'))) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert session_client.call_count == 1
+    assert all(client is clients[0] for client in clients)
+
+
+def test_get_client_factory_is_shared_per_run():
+    ctx = Mock()
+    ctx.obj = {
+        'AWS_ACCESS_KEY_ID': None,
+        'AWS_SECRET_ACCESS_KEY': None,
+        'AWS_SESSION_TOKEN': None,
+        'AWS_REGION': 'eu-west-1',
+        'AWS_PROFILE': None,
+        'MAX_POOL_CONNECTIONS': 40,
+    }
+
+    factory = get_client_factory(ctx)
+
+    assert get_client_factory(ctx) is factory
+    assert factory.max_pool_connections == 40
+
+
+@patch.object(Session, 'client', side_effect=lambda service_name, config: Mock())
+@patch.object(Session, '__init__', return_value=None)
+def test_client_factory_instrumentation(session_init, session_client):
+    factory = ClientFactory()
+    instrumentation = Mock()
+    ecs = factory.client('ecs')
+
+    factory.instrument(instrumentation)
+    factory.instrument(instrumentation)
+    events = factory.client('events')
+
+    assert instrumentation.register.call_args_list == [((ecs,),), ((events,),)]
+
+
+def test_get_client_factory_applies_instrumentation():
+    factory = ClientFactory()
+    instrumentation = Mock()
+    ctx = Mock()
+    ctx.obj = {'CLIENT_FACTORY': factory, 'INSTRUMENTATION': [instrumentation]}
+
+    assert get_client_factory(ctx) is factory
+    assert factory._instrumentation == [instrumentation]
@@ -0,0 +1,101 @@
+import json
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+from botocore.stub import Stubber
+from click.testing import CliRunner
+
+from aws_deploy.cli import cli
+from aws_deploy.common.stats import ApiStats, OperationStats
+from aws_deploy.simulator import Simulator, SimulatorClientFactory
+
+
+def test_operation_stats_histogram():
+    stats = OperationStats()
+    for latency in (0.005, 0.02, 0.02, 0.2, 12):
+        stats.record(started_at=1.5, latency=latency)
+
+    assert stats.calls == 5
+    assert stats.histogram == [1, 2, 0, 0, 1, 0, 0, 0, 0, 0, 1]
+    assert stats.percentile(50) == 0.025
+    assert stats.percentile(95) == 12
+    assert stats.peak_rate == 5
+    assert stats.mean_latency == pytest.approx(2.449)
+
+
+def test_botocore_client_calls_are_recorded(clock):
+    client = boto3.client('ecs', region_name='eu-west-1', aws_access_key_id='key', aws_secret_access_key='secret')
+    stats = ApiStats()
+    stats.register(client)
+
+    with Stubber(client) as stubber:
+        stubber.add_response('describe_services', {'services': []}, {'cluster': 'prod', 'services': ['web']})
+        stubber.add_response('describe_services', {'services': []}, {'cluster': 'prod', 'services': ['web']})
+        stubber.add_client_error('describe_services', service_error_code='ClusterNotFoundException')
+
+        client.describe_services(cluster='prod', services=['web'])
+        client.describe_services(cluster='prod', services=['web'])
+        with pytest.raises(ClientError):
+            client.describe_services(cluster='prod', services=['web'])
+
+    describe_services = stats.operations[('ecs', 'DescribeServices')]
+    assert describe_services.calls == 3
+    assert describe_services.errors == 1
+    assert stats.total_calls == 3
+
+
+def test_throttles_and_retries_are_recorded(clock):
+    simulator = Simulator(clock=clock, rate_limits={'ecs:DescribeTaskDefinition': (1, 1)}, api_latency=0.05, seed=1)
+    simulator.ecs.add_task_definition('web')
+    client = simulator.client('ecs')
+    stats = ApiStats()
+    stats.register(client)
+
+    for _ in range(3):
+        client.describe_task_definition(taskDefinition='web')
+
+    describe_task_definition = stats.operations[('ecs', 'DescribeTaskDefinition')]
+    assert describe_task_definition.calls == 3
+    assert describe_task_definition.errors == 0
+    assert describe_task_definition.throttles == simulator.throttled_calls['ecs:DescribeTaskDefinition'] > 0
+    assert describe_task_definition.retries == describe_task_definition.throttles
+    assert describe_task_definition.max_latency > 0.05
+
+
+def test_report(clock):
+    simulator = Simulator(clock=clock, api_latency=0.1)
+    simulator.ecs.add_task_definition('web')
+    stats = ApiStats()
+    factory = SimulatorClientFactory(simulator)
+    factory.instrument(stats)
+
+    factory.client('ecs').describe_task_definition(taskDefinition='web')
+
+    table = stats.report('table').splitlines()
+    assert table[0] == 'API calls'
+    assert table[2].split() == [
+        'ecs:DescribeTaskDefinition', '1', '0', '0', '0', '1', '100ms', '100ms', '100ms', '100ms'
+    ]
+    assert table[3].split() == ['total', '1']
+
+    report = json.loads(stats.report('json'))
+    assert report['ecs:DescribeTaskDefinition']['calls'] == 1
+    assert report['ecs:DescribeTaskDefinition']['latency']['histogram']['<=100ms'] == 1
+
+
+def test_api_stats_option(clock):
+    simulator = Simulator(clock=clock)
+    simulator.ecs.add_task_definition('web')
+    simulator.ecs.add_service('prod', 'web', 'web', desired_count=2)
+    runner = CliRunner(env={'AWS_DEPLOY_NO_CACHE': '1'})
+
+    result = runner.invoke(
+        cli, ['--api-stats', '--api-stats-format', 'json', 'ecs', 'scale', 'prod', 'web', '4'],
+        obj={'CLIENT_FACTORY': SimulatorClientFactory(simulator)}
+    )
+
+    assert result.exit_code == 0, result.output
+    report = json.loads(result.output[result.output.index('\n{') + 1:])
+    assert report['ecs:UpdateService']['calls'] == 1
+    assert sum(operation['calls'] for operation in report.values()) == simulator.total_calls
@@ -0,0 +1,124 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from click.testing import CliRunner
+
+from aws_deploy.cli import cli
+from aws_deploy.common.tracing import NullTracer, Tracer, get_tracer, in_current_span, set_tracer, span
+from aws_deploy.simulator import Simulator, SimulatorClientFactory
+
+
+def complete_events(trace):
+    return [event for event in trace['traceEvents'] if event['ph'] == 'X']
+
+
+def contains(parent, child):
+    return parent['ts'] <= child['ts'] and child['ts'] + child['dur'] <= parent['ts'] + parent['dur']
+
+
+def test_spans_are_not_recorded_by_default():
+    assert isinstance(get_tracer(), NullTracer)
+
+    with span('update service', service='web'):
+        pass
+
+
+def test_nested_spans(clock):
+    tracer = Tracer()
+    previous_tracer = set_tracer(tracer)
+    try:
+        with span('deploy'):
+            clock.sleep(1)
+            with span('update service', service='web'):
+                clock.sleep(2)
+            with pytest.raises(ValueError):
+                with span('poll'):
+                    raise ValueError()
+    finally:
+        set_tracer(previous_tracer)
+
+    deploy, update_service, poll = complete_events(tracer.to_dict())
+
+    assert (deploy['name'], deploy['ts'], deploy['dur']) == ('deploy', 0, 3e6)
+    assert (update_service['ts'], update_service['dur'], update_service['args']) == (1e6, 2e6, {'service': 'web'})
+    assert poll['args'] == {'error': 'ValueError'}
+    assert contains(deploy, update_service) and contains(deploy, poll)
+
+
+def test_spans_of_threads(clock):
+    tracer = Tracer()
+
+    def work():
+        with tracer.span('worker'):
+            pass
+
+    thread = threading.Thread(target=work)
+    with tracer.span('main'):
+        thread.start()
+        thread.join()
+
+    trace = tracer.to_dict()
+    threads = {event['tid'] for event in complete_events(trace)}
+    assert len(threads) == 2
+    assert len([event for event in trace['traceEvents'] if event['ph'] == 'M']) == 2
+
+
+def test_spans_of_worker_threads_are_linked_to_their_parent(clock):
+    simulator = Simulator(clock=clock)
+    simulator.ecs.add_task_definition('web')
+    tracer = Tracer()
+    factory = SimulatorClientFactory(simulator)
+    factory.instrument(tracer)
+
+    def describe(task_definition):
+        return factory.client('ecs').describe_task_definition(taskDefinition=task_definition)
+
+    with tracer.span('fetch task definitions') as parent, ThreadPoolExecutor(max_workers=2) as executor:
+        list(executor.map(in_current_span(describe), ['web', 'web:1']))
+
+    trace = tracer.to_dict()
+    api_calls = [event for event in complete_events(trace) if event['cat'] == 'aws']
+    flows = [event for event in trace['traceEvents'] if event.get('cat') == 'flow']
+    assert len(api_calls) == 2
+    assert sorted(event['ph'] for event in flows) == ['f', 'f', 's', 's']
+    assert {event['tid'] for event in flows if event['ph'] == 's'} == {tracer._thread_id(parent.thread)}
+    assert {event['tid'] for event in flows if event['ph'] == 'f'} == {event['tid'] for event in api_calls}
+
+
+def test_api_calls_are_child_spans(clock):
+    simulator = Simulator(clock=clock, api_latency=0.5)
+    simulator.ecs.add_task_definition('web')
+    tracer = Tracer()
+    factory = SimulatorClientFactory(simulator)
+    factory.instrument(tracer)
+
+    with tracer.span('fetch task definition'):
+        factory.client('ecs').describe_task_definition(taskDefinition='web')
+
+    api_call, phase = sorted(complete_events(tracer.to_dict()), key=lambda event: event['cat'])
+    assert (api_call['name'], api_call['cat'], api_call['dur']) == ('ecs:DescribeTaskDefinition', 'aws', 5e5)
+    assert api_call['args'] == {'retries': 0, 'status': 200}
+    assert contains(phase, api_call)
+
+
+def test_trace_file_option(clock, tmp_path):
+    simulator = Simulator(clock=clock)
+    simulator.ecs.add_task_definition('web', image='nginx:1.0.0')
+    simulator.ecs.add_service('prod', 'web', 'web', desired_count=2)
+    trace_file = tmp_path / 'trace.json'
+
+    result = CliRunner(env={'AWS_DEPLOY_NO_CACHE': '1'}).invoke(
+        cli, ['--trace-file', str(trace_file), 'ecs', 'deploy', 'prod', 'web', '--tag', '2.0.0'],
+        obj={'CLIENT_FACTORY': SimulatorClientFactory(simulator)}
+    )
+
+    assert result.exit_code == 0, result.output
+    assert isinstance(get_tracer(), NullTracer)
+    events = {event['name']: event for event in complete_events(json.loads(trace_file.read_text()))}
+    for name in ('fetch service', 'fetch task definition', 'modify task definition', 'diff',
+                 'register task definition', 'update service', 'wait for deployment', 'poll',
+                 'deregister task definition', 'ecs:UpdateService'):
+        assert contains(events['aws-deploy ecs'], events[name]), name
+    assert contains(events['update service'], events['ecs:UpdateService'])
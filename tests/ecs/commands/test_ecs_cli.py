@@ -1,3 +1,4 @@
+import json
 from datetime import datetime
 
 import pytest
@@ -6,7 +7,7 @@ from mock import patch, Mock
 
 from aws_deploy.ecs import cli
 from aws_deploy.ecs.cli import get_ecs_client
-from aws_deploy.ecs.commands import diff, cron, update, run, scale, deploy
+from aws_deploy.ecs.commands import diff, cron, update, run, scale, deploy, watch
 from aws_deploy.ecs.helper import EcsClient
 from tests.ecs.utils import EcsTestClient
 from tests.ecs.constants import (
@@ -20,8 +21,9 @@ def runner():
     return CliRunner()
 
 
+@patch('aws_deploy.ecs.cli.get_task_definition_cache')
 @patch.object(EcsClient, '__init__')
-def test_get_client(ecs_client):
+def test_get_client(ecs_client, get_task_definition_cache):
     ecs_client.return_value = None
     ctx = Mock()
     ctx.obj = {
@@ -33,13 +35,21 @@ def test_get_client(ecs_client):
     }
     client = get_ecs_client(ctx)
     ecs_client.assert_called_once_with(
+        client_factory=ctx.obj['CLIENT_FACTORY'],
+        task_definition_cache=get_task_definition_cache.return_value,
+        request_cache=None,
+        hedging=None
+    )
+    assert isinstance(client, EcsClient)
+    assert ctx.obj['CLIENT_FACTORY']._session_options == dict(
         aws_access_key_id='access_key_id',
         aws_secret_access_key='secret_access_key',
         aws_session_token='aws_session_token',
         region_name='region',
         profile_name='profile'
     )
-    assert isinstance(client, EcsClient)
+    assert get_ecs_client(ctx) is not client
+    assert ecs_client.call_args[1]['client_factory'] is ctx.obj['CLIENT_FACTORY']
 
 
 def test_ecs(runner):
@@ -85,7 +95,7 @@ def test_deploy_with_invalid_service(get_ecs_client, runner):
 @patch('aws_deploy.ecs.commands.deploy.get_ecs_client')
 def test_deploy(get_ecs_client, runner):
     get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key')
-    result = runner.invoke(deploy.deploy, (CLUSTER_NAME, SERVICE_NAME))
+    result = runner.invoke(deploy.deploy, (CLUSTER_NAME, SERVICE_NAME, '--no-reuse-revision'))
 
     assert result.exit_code == 0
     assert not result.exception
@@ -98,6 +108,41 @@ def test_deploy(get_ecs_client, runner):
     assert u"Updating task definition" not in result.output
 
 
+@patch('aws_deploy.ecs.commands.deploy.get_ecs_client')
+def test_deploy_reuses_unchanged_revision(get_ecs_client, runner):
+    get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key')
+    result = runner.invoke(deploy.deploy, (CLUSTER_NAME, SERVICE_NAME))
+
+    assert result.exit_code == 0
+    assert not result.exception
+    assert u'Reusing revision with the same content: 1' in result.output
+    assert u'Creating new task definition revision' not in result.output
+    assert u'Successfully forced a new deployment of: test-task:1' in result.output
+    assert u'deregistered' not in result.output
+    assert u'Deployment successful' in result.output
+    assert get_ecs_client.return_value.force_new_deployment
+
+
+@patch('aws_deploy.ecs.commands.deploy.get_ecs_client')
+def test_deploy_unchanged_revision_without_forcing_new_deployment(get_ecs_client, runner):
+    get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key')
+    result = runner.invoke(deploy.deploy, (CLUSTER_NAME, SERVICE_NAME, '--no-force-new-deployment'))
+
+    assert result.exit_code == 0
+    assert u'Successfully changed task definition to: test-task:1' in result.output
+    assert not get_ecs_client.return_value.force_new_deployment
+
+
+@patch('aws_deploy.ecs.commands.deploy.get_ecs_client')
+def test_deploy_changed_revision_does_not_force_new_deployment(get_ecs_client, runner):
+    get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key')
+    result = runner.invoke(deploy.deploy, (CLUSTER_NAME, SERVICE_NAME, '-t', 'latest'))
+
+    assert result.exit_code == 0
+    assert u'Successfully changed task definition to: test-task:2' in result.output
+    assert not get_ecs_client.return_value.force_new_deployment
+
+
 @patch('aws_deploy.ecs.commands.deploy.get_ecs_client')
 def test_deploy_with_rollback(get_ecs_client, runner):
     get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key', wait=2)
@@ -117,10 +162,55 @@ def test_deploy_with_rollback(get_ecs_client, runner):
            u'previous task definition: test-task:1' in result.output
 
 
+@patch('aws_deploy.ecs.commands.deploy.get_ecs_client')
+def test_deploy_with_failed_rollout(get_ecs_client, runner):
+    get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key', wait=2, rollout_failed=True)
+    result = runner.invoke(deploy.deploy, (CLUSTER_NAME, SERVICE_NAME, '--timeout=60'))
+
+    assert result.exit_code == 1
+    assert u'Deployment ecs-svc/0000000000000000002 failed: ECS deployment circuit breaker' in result.output
+    assert u'Deployment failed' in result.output
+    assert u'Rolling back' not in result.output
+
+
+@patch('aws_deploy.ecs.commands.deploy.get_ecs_client')
+def test_deploy_with_failed_rollout_and_rollback(get_ecs_client, runner):
+    get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key', rollout_failed=True)
+    result = runner.invoke(deploy.deploy, (CLUSTER_NAME, SERVICE_NAME, '--timeout=60', '--rollback'))
+
+    assert result.exit_code == 1
+    assert u'ECS deployment circuit breaker: tasks failed to start.' in result.output
+    assert u'Rolling back to task definition: test-task:1' in result.output
+
+
+@patch('aws_deploy.ecs.commands.deploy.get_ecs_client')
+def test_deploy_with_task_failures(get_ecs_client, runner):
+    get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key', wait=2, task_failures=3)
+    result = runner.invoke(
+        deploy.deploy, (CLUSTER_NAME, SERVICE_NAME, '--timeout=60', '--rollback', '--no-reuse-revision')
+    )
+
+    assert result.exit_code == 1
+    assert u'failed (exit code 1): Essential container in task exited' in result.output
+    assert u'3 tasks of the new task definition failed' in result.output
+    assert u'Rolling back to task definition: test-task:1' in result.output
+    assert u'Rollback successful' in result.output
+
+
+@patch('aws_deploy.ecs.commands.deploy.get_ecs_client')
+def test_deploy_with_fewer_task_failures_than_allowed(get_ecs_client, runner):
+    get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key', task_failures=2)
+    result = runner.invoke(deploy.deploy, (CLUSTER_NAME, SERVICE_NAME, '--max-task-failures=3'))
+
+    assert result.exit_code == 0
+    assert u'failed (exit code 1): Essential container in task exited' in result.output
+    assert u'Deployment successful' in result.output
+
+
 @patch('aws_deploy.ecs.commands.deploy.get_ecs_client')
 def test_deploy_without_deregister(get_ecs_client, runner):
     get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key')
-    result = runner.invoke(deploy.deploy, (CLUSTER_NAME, SERVICE_NAME, '--no-deregister'))
+    result = runner.invoke(deploy.deploy, (CLUSTER_NAME, SERVICE_NAME, '--no-deregister', '--no-reuse-revision'))
 
     assert result.exit_code == 0
     assert not result.exception
@@ -297,7 +387,9 @@ def test_deploy_new_empty_environment_variable(get_ecs_client, runner):
 @patch('aws_deploy.ecs.commands.deploy.get_ecs_client')
 def test_deploy_empty_environment_variable_again(get_ecs_client, runner):
     get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key')
-    result = runner.invoke(deploy.deploy, (CLUSTER_NAME, SERVICE_NAME, '-e', 'webserver', 'empty', ''))
+    result = runner.invoke(
+        deploy.deploy, (CLUSTER_NAME, SERVICE_NAME, '-e', 'webserver', 'empty', '', '--no-reuse-revision')
+    )
 
     assert result.exit_code == 0
     assert not result.exception
@@ -402,7 +494,9 @@ def test_deploy_one_new_secret_variable(get_ecs_client, runner):
 @patch('aws_deploy.ecs.commands.deploy.get_ecs_client')
 def test_deploy_without_changing_environment_value(get_ecs_client, runner):
     get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key')
-    result = runner.invoke(deploy.deploy, (CLUSTER_NAME, SERVICE_NAME, '-e', 'webserver', 'foo', 'bar'))
+    result = runner.invoke(
+        deploy.deploy, (CLUSTER_NAME, SERVICE_NAME, '-e', 'webserver', 'foo', 'bar', '--no-reuse-revision')
+    )
 
     assert result.exit_code == 0
     assert not result.exception
@@ -419,7 +513,9 @@ def test_deploy_without_changing_environment_value(get_ecs_client, runner):
 @patch('aws_deploy.ecs.commands.deploy.get_ecs_client')
 def test_deploy_without_changing_secrets_value(get_ecs_client, runner):
     get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key')
-    result = runner.invoke(deploy.deploy, (CLUSTER_NAME, SERVICE_NAME, '-s', 'webserver', 'baz', 'qux'))
+    result = runner.invoke(
+        deploy.deploy, (CLUSTER_NAME, SERVICE_NAME, '-s', 'webserver', 'baz', 'qux', '--no-reuse-revision')
+    )
 
     assert result.exit_code == 0
     assert not result.exception
@@ -476,7 +572,7 @@ def test_deploy_with_client_errors(get_ecs_client, runner):
 @patch('aws_deploy.ecs.commands.deploy.get_ecs_client')
 def test_deploy_ignore_warnings(get_ecs_client, runner):
     get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key', deployment_errors=True)
-    result = runner.invoke(deploy.deploy, (CLUSTER_NAME, SERVICE_NAME, '--ignore-warnings'))
+    result = runner.invoke(deploy.deploy, (CLUSTER_NAME, SERVICE_NAME, '--ignore-warnings', '--no-reuse-revision'))
 
     assert result.exit_code == 0
     assert not result.exception
@@ -490,10 +586,23 @@ def test_deploy_ignore_warnings(get_ecs_client, runner):
     assert u'Deployment successful' in result.output
 
 
+@patch('aws_deploy.ecs.commands.deploy.get_ecs_client')
+def test_deploy_reports_older_errors_in_the_final_report(get_ecs_client, runner):
+    get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key', deployment_errors=True)
+    result = runner.invoke(deploy.deploy, (CLUSTER_NAME, SERVICE_NAME, '--ignore-warnings', '--no-reuse-revision'))
+
+    assert result.exit_code == 0
+    # once by the first poll, which sees all events of the deployment, and once by the final report
+    assert result.output.count(u'Older errors') == 2
+    assert result.output.rindex(u'Older errors') > result.output.rindex(u'Continuing.')
+
+
 @patch('aws_deploy.ecs.commands.deploy.get_ecs_client')
 def test_deploy_task_definition_arn(get_ecs_client, runner):
     get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key')
-    result = runner.invoke(deploy.deploy, (CLUSTER_NAME, SERVICE_NAME, '--task', TASK_DEFINITION_ARN_2))
+    result = runner.invoke(
+        deploy.deploy, (CLUSTER_NAME, SERVICE_NAME, '--task', TASK_DEFINITION_ARN_2, '--no-reuse-revision')
+    )
 
     assert result.exit_code == 0
     assert not result.exception
@@ -551,6 +660,16 @@ def test_deploy_unknown_task_definition_arn(get_ecs_client, runner):
            in result.output
 
 
+@patch('aws_deploy.ecs.commands.scale.get_ecs_client')
+def test_scale_with_task_failures(get_ecs_client, runner):
+    get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key', wait=10, task_failures=2)
+    result = runner.invoke(scale.scale, (CLUSTER_NAME, SERVICE_NAME, '2', '--max-task-failures', '2'))
+
+    assert result.exit_code == 1
+    assert u'2 tasks of the new task definition failed' in result.output
+    assert u'Scaling failed' in result.output
+
+
 @patch('aws_deploy.ecs.commands.scale.get_ecs_client')
 def test_scale_without_credentials(get_ecs_client, runner):
     get_ecs_client.return_value = EcsTestClient()
@@ -743,7 +862,7 @@ def test_update_without_credentials(get_ecs_client, runner):
 @patch('aws_deploy.ecs.commands.update.get_ecs_client')
 def test_update_task_creates_new_revision(get_ecs_client, runner):
     get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key')
-    result = runner.invoke(update.update, (TASK_DEFINITION_ARN_1,))
+    result = runner.invoke(update.update, (TASK_DEFINITION_ARN_1, '--no-reuse-revision'))
 
     assert result.exit_code == 0
 
@@ -752,10 +871,21 @@ def test_update_task_creates_new_revision(get_ecs_client, runner):
 
 
 @patch('aws_deploy.ecs.commands.update.get_ecs_client')
-def test_update_task(get_ecs_client, runner):
+def test_update_task_reuses_unchanged_revision(get_ecs_client, runner):
     get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key')
     result = runner.invoke(update.update, (TASK_DEFINITION_ARN_1,))
 
+    assert result.exit_code == 0
+    assert u'Reusing revision with the same content: 1' in result.output
+    assert u'Creating new task definition revision' not in result.output
+    assert u'deregistered' not in result.output
+
+
+@patch('aws_deploy.ecs.commands.update.get_ecs_client')
+def test_update_task(get_ecs_client, runner):
+    get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key')
+    result = runner.invoke(update.update, (TASK_DEFINITION_ARN_1, '--no-reuse-revision'))
+
     assert result.exit_code == 0
     assert not result.exception
 
@@ -887,7 +1017,9 @@ def test_update_task_new_empty_environment_variable(get_ecs_client, runner):
 @patch('aws_deploy.ecs.commands.update.get_ecs_client')
 def test_update_task_empty_environment_variable_again(get_ecs_client, runner):
     get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key')
-    result = runner.invoke(update.update, (TASK_DEFINITION_ARN_1, '-e', 'webserver', 'empty', ''))
+    result = runner.invoke(
+        update.update, (TASK_DEFINITION_ARN_1, '-e', 'webserver', 'empty', '', '--no-reuse-revision')
+    )
 
     assert result.exit_code == 0
     assert not result.exception
@@ -977,7 +1109,9 @@ def test_update_task_one_new_secret_variable(get_ecs_client, runner):
 @patch('aws_deploy.ecs.commands.update.get_ecs_client')
 def test_update_task_without_changing_environment_value(get_ecs_client, runner):
     get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key')
-    result = runner.invoke(update.update, (TASK_DEFINITION_ARN_1, '-e', 'webserver', 'foo', 'bar'))
+    result = runner.invoke(
+        update.update, (TASK_DEFINITION_ARN_1, '-e', 'webserver', 'foo', 'bar', '--no-reuse-revision')
+    )
 
     assert result.exit_code == 0
     assert not result.exception
@@ -991,7 +1125,9 @@ def test_update_task_without_changing_environment_value(get_ecs_client, runner):
 @patch('aws_deploy.ecs.commands.update.get_ecs_client')
 def test_update_task_without_changing_secrets_value(get_ecs_client, runner):
     get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key')
-    result = runner.invoke(update.update, (TASK_DEFINITION_ARN_1, '-s', 'webserver', 'baz', 'qux'))
+    result = runner.invoke(
+        update.update, (TASK_DEFINITION_ARN_1, '-s', 'webserver', 'baz', 'qux', '--no-reuse-revision')
+    )
 
     assert result.exit_code == 0
     assert not result.exception
@@ -1031,7 +1167,7 @@ def test_cron_without_credentials(get_ecs_client, runner):
 @patch('aws_deploy.ecs.commands.cron.get_ecs_client')
 def test_cron(get_ecs_client, runner):
     get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key')
-    result = runner.invoke(cron.cron, (CLUSTER_NAME, TASK_DEFINITION_FAMILY_1, 'rule'))
+    result = runner.invoke(cron.cron, (CLUSTER_NAME, TASK_DEFINITION_FAMILY_1, 'rule', '--no-reuse-revision'))
 
     assert not result.exception
     assert result.exit_code == 0
@@ -1082,6 +1218,20 @@ def test_diff(get_ecs_client, runner):
     assert '+ newvar: "new value"' in result.output
 
 
+@patch('aws_deploy.ecs.commands.diff.get_ecs_client')
+def test_diff_json_patch(get_ecs_client, runner):
+    get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key')
+    result = runner.invoke(
+        diff.diff,
+        (TASK_DEFINITION_FAMILY_1, str(TASK_DEFINITION_REVISION_1), str(TASK_DEFINITION_REVISION_3), '--json-patch')
+    )
+
+    assert result.exit_code == 0
+    patch = json.loads(result.output)
+    assert {'op': 'replace', 'path': '/containers/webserver/image', 'value': 'webserver:456'} in patch
+    assert {'op': 'add', 'path': '/containers/webserver/environment/newvar', 'value': 'new value'} in patch
+
+
 @patch('aws_deploy.ecs.commands.diff.get_ecs_client')
 def test_diff_without_credentials(get_ecs_client, runner):
     get_ecs_client.return_value = EcsTestClient()
@@ -1092,3 +1242,100 @@ def test_diff_without_credentials(get_ecs_client, runner):
     assert result.exit_code == 1
 
     assert u'Unable to locate credentials. Configure credentials by running "aws configure".\n' in result.output
+
+
+@patch('aws_deploy.ecs.commands.watch.get_ecs_client')
+def test_watch(get_ecs_client, runner):
+    get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key')
+    result = runner.invoke(watch.watch, (CLUSTER_NAME, SERVICE_NAME))
+
+    assert not result.exception
+    assert result.exit_code == 0
+
+    assert u'test-cluster/test-service: deployed' in result.output
+    assert u'All services deployed' in result.output
+
+
+@patch('aws_deploy.ecs.commands.watch.get_ecs_client')
+def test_watch_with_timeout(get_ecs_client, runner):
+    get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key', wait=2)
+    result = runner.invoke(watch.watch, (CLUSTER_NAME, SERVICE_NAME, '--timeout', '1'))
+
+    assert result.exit_code == 1
+
+    assert u'test-cluster/test-service: timeout' in result.output
+    assert u'Watch failed' in result.output
+
+
+@patch('aws_deploy.ecs.commands.deploy.get_ecs_client')
+def test_deploy_several_services(get_ecs_client, runner):
+    get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key')
+    result = runner.invoke(deploy.deploy, (CLUSTER_NAME, SERVICE_NAME, SERVICE_NAME + '-2', '-t', 'latest'))
+
+    assert not result.exception
+    assert result.exit_code == 0
+
+    assert u'Deploy [cluster=test-cluster, services=test-service test-service-2]' in result.output
+    assert u'Changed image of container "webserver" to: "webserver:latest" (was: "webserver:123")' in result.output
+    assert u'Creating 1 new task definition revisions' in result.output
+    assert u'Updating 2 services' in result.output
+    assert u'test-cluster/test-service: deployed' in result.output
+    assert u'test-cluster/test-service-2: deployed' in result.output
+    assert u'Successfully deregistered revision: 1' in result.output
+    assert u'Deployment of 2 services successful' in result.output
+
+
+@patch('aws_deploy.ecs.commands.deploy.get_ecs_client')
+def test_deploy_services_matching_pattern(get_ecs_client, runner):
+    get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key')
+    result = runner.invoke(deploy.deploy, (CLUSTER_NAME, 'test-*', '--max-parallel', '1'))
+
+    assert not result.exception
+    assert result.exit_code == 0
+
+    assert u'Deploy [cluster=test-cluster, services=test-*]' in result.output
+    assert u'Deployment of 2 services successful' in result.output
+
+
+@patch('aws_deploy.ecs.commands.deploy.get_ecs_client')
+def test_deploy_services_without_matches(get_ecs_client, runner):
+    get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key')
+    result = runner.invoke(deploy.deploy, (CLUSTER_NAME, 'foo-*'))
+
+    assert result.exit_code == 1
+    assert u'No services found matching: foo-*' in result.output
+
+
+@patch('aws_deploy.ecs.commands.deploy.get_ecs_client')
+def test_deploy_several_services_with_unknown_service(get_ecs_client, runner):
+    get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key')
+    result = runner.invoke(deploy.deploy, (CLUSTER_NAME, SERVICE_NAME, 'unknown-service'))
+
+    assert result.exit_code == 1
+    assert u'Service not found: unknown-service' in result.output
+
+
+@patch('aws_deploy.ecs.commands.deploy.get_ecs_client')
+def test_deploy_several_services_with_task(get_ecs_client, runner):
+    get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key')
+    result = runner.invoke(deploy.deploy, (CLUSTER_NAME, SERVICE_NAME, 'test-service-2', '--task', 'test-task:2'))
+
+    assert result.exit_code == 1
+    assert u'The option --task can only be used when deploying a single service' in result.output
+
+
+@patch('aws_deploy.ecs.commands.deploy.get_ecs_client')
+def test_deploy_several_services_with_rollback(get_ecs_client, runner):
+    get_ecs_client.return_value = EcsTestClient('access_key', 'secret_key', wait=2)
+    result = runner.invoke(
+        deploy.deploy,
+        (CLUSTER_NAME, SERVICE_NAME, SERVICE_NAME + '-2', '--timeout', '1', '--rollback', '--no-reuse-revision')
+    )
+
+    assert result.exit_code == 1
+
+    assert u'test-cluster/test-service: timeout' in result.output
+    assert u'Rolling back 2 services to their previous task definitions' in result.output
+    assert u'Successfully deregistered revision: 2' in result.output
+    assert u'Deployment failed, but services have been rolled back to previous task definitions: ' \
+           u'test-service, test-service-2' in result.output
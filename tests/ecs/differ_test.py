@@ -0,0 +1,113 @@
+import json
+from copy import deepcopy
+from datetime import datetime, timezone
+
+from aws_deploy.ecs.differ import ADD, CHANGE, REMOVE, Change, diff, field_value, normalize, to_json_patch
+from aws_deploy.ecs.helper import EcsTaskDefinition
+from tests.ecs.constants import PAYLOAD_TASK_DEFINITION_1, PAYLOAD_TASK_DEFINITION_3
+
+
+def task_definition(**container):
+    container = dict(
+        {
+            'name': 'web',
+            'image': 'nginx:1.0.0',
+            'environment': [{'name': 'FOO', 'value': 'foo'}, {'name': 'BAR', 'value': 'bar'}],
+            'secrets': [{'name': 'TOKEN', 'valueFrom': 'arn:aws:ssm:token'}],
+            'portMappings': [{'containerPort': 80, 'protocol': 'tcp'}],
+            'mountPoints': [{'sourceVolume': 'data', 'containerPath': '/data'}],
+        },
+        **container
+    )
+    return EcsTaskDefinition(
+        containerDefinitions=[container], volumes=[{'name': 'data'}], family='web', revision=1, status='ACTIVE',
+        taskDefinitionArn='arn:aws:ecs:eu-west-1:123456789012:task-definition/web:1'
+    )
+
+
+def test_diff_keys_lists_by_name():
+    task_definition_a = task_definition()
+    task_definition_b = task_definition(
+        environment=[{'name': 'BAR', 'value': 'baz'}, {'name': 'QUX', 'value': 'qux'}],
+        portMappings=[{'containerPort': 80, 'protocol': 'tcp', 'hostPort': 8080}],
+        mountPoints=[
+            {'sourceVolume': 'data', 'containerPath': '/data'}, {'sourceVolume': 'tmp', 'containerPath': '/tmp'}
+        ],
+    )
+    tmp_mount_point = {'sourceVolume': 'tmp', 'containerPath': '/tmp'}
+
+    assert diff(task_definition_a, task_definition_b) == [
+        Change(REMOVE, ('containers', 'web', 'environment', 'FOO'), old_value='foo'),
+        Change(CHANGE, ('containers', 'web', 'environment', 'BAR'), value='baz', old_value='bar'),
+        Change(ADD, ('containers', 'web', 'environment', 'QUX'), value='qux'),
+        Change(ADD, ('containers', 'web', 'portMappings', '80/tcp', 'hostPort'), value=8080),
+        Change(ADD, ('containers', 'web', 'mountPoints', '/tmp'), value=tmp_mount_point),
+    ]
+
+
+def test_diff_ignores_the_order_of_keyed_lists():
+    task_definition_a = task_definition()
+    task_definition_b = task_definition(
+        environment=[{'name': 'BAR', 'value': 'bar'}, {'name': 'FOO', 'value': 'foo'}]
+    )
+
+    assert diff(task_definition_a, task_definition_b) == []
+
+
+def test_diff_does_not_modify_the_task_definitions():
+    task_definition_a = EcsTaskDefinition(**deepcopy(PAYLOAD_TASK_DEFINITION_1))
+    task_definition_b = EcsTaskDefinition(**deepcopy(PAYLOAD_TASK_DEFINITION_3))
+
+    changes = task_definition_a.diff_raw(task_definition_b)
+
+    assert changes
+    assert task_definition_a.diff_raw(task_definition_b) == changes
+    assert task_definition_a.containers == PAYLOAD_TASK_DEFINITION_1['containerDefinitions']
+    assert task_definition_b.containers == PAYLOAD_TASK_DEFINITION_3['containerDefinitions']
+
+
+def test_json_patch():
+    task_definition_a = task_definition()
+    task_definition_b = task_definition(
+        image='nginx:2.0.0', secrets=[], mountPoints=[{'sourceVolume': 'data', 'containerPath': '/var/data'}]
+    )
+
+    patch = to_json_patch(diff(task_definition_a, task_definition_b))
+
+    assert patch == [
+        {'op': 'replace', 'path': '/containers/web/image', 'value': 'nginx:2.0.0'},
+        {'op': 'remove', 'path': '/containers/web/secrets/TOKEN'},
+        {'op': 'remove', 'path': '/containers/web/mountPoints/~1data'},
+        {
+            'op': 'add', 'path': '/containers/web/mountPoints/~1var~1data',
+            'value': {'sourceVolume': 'data', 'containerPath': '/var/data'}
+        },
+    ]
+    assert normalize(task_definition_a)['containers']['web']['mountPoints'] == {
+        '/data': {'sourceVolume': 'data', 'containerPath': '/data'}
+    }
+
+
+def test_field_value():
+    document = normalize(task_definition(environment=[{'name': 'LOG.LEVEL', 'value': 'debug'}]))
+
+    assert field_value(document, 'env.LOG.LEVEL') == {'web': 'debug'}
+    assert field_value(document, 'image') == {'web': 'nginx:1.0.0'}
+    assert field_value(document, 'containers.web.secrets.TOKEN') == 'arn:aws:ssm:token'
+    assert field_value(document, 'role_arn') == ''
+    assert field_value(document, 'env.MISSING') == {}
+
+
+def test_diff_ignores_read_only_metadata():
+    payload_a = deepcopy(PAYLOAD_TASK_DEFINITION_1)
+    payload_a.update(registeredAt=datetime(2020, 1, 1, tzinfo=timezone.utc), registeredBy='arn:aws:iam::1:user/a')
+    payload_b = deepcopy(payload_a)
+    payload_b['containerDefinitions'][0]['image'] = 'webserver:456'
+    payload_b.update(registeredAt=datetime(2020, 1, 2, tzinfo=timezone.utc), registeredBy='arn:aws:iam::1:user/b')
+
+    changes = diff(EcsTaskDefinition(**payload_a), EcsTaskDefinition(**payload_b))
+
+    assert changes == [
+        Change(CHANGE, ('containers', 'webserver', 'image'), value='webserver:456', old_value='webserver:123')
+    ]
+    assert json.loads(json.dumps(to_json_patch(changes)))
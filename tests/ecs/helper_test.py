@@ -1,5 +1,6 @@
 import os
 import tempfile
+import time
 from copy import deepcopy
 from datetime import datetime, timedelta
 
@@ -7,19 +8,23 @@ import pytest
 from boto3.session import Session
 from botocore.exceptions import ClientError
 from dateutil.tz import tzlocal
-from mock import patch
+from mock import ANY, Mock, patch
 
+from aws_deploy.common.cache import TaskDefinitionCache
 from aws_deploy.ecs.helper import (
     EcsTaskDefinition, EcsService, UnknownContainerError, EcsTaskDefinitionCommandError,
     EcsTaskDefinitionDiff, EcsClient, UnknownTaskDefinitionError, EcsAction, EcsConnectionError, DeployAction,
-    ScaleAction, RunAction, LAUNCH_TYPE_EC2, read_env_file
+    ScaleAction, RunAction, LAUNCH_TYPE_EC2, DESCRIBE_TASKS_MAX_ARNS, EcsEventCursor, EcsStoppedTask,
+    EcsStoppedTaskMonitor, DiffAction, read_env_file
 )
+from aws_deploy.simulator import Simulator, SimulatorClientFactory
 from tests.ecs.utils import EcsTestClient
 from tests.ecs.constants import (
     PAYLOAD_TASK_DEFINITION_1, PAYLOAD_TASK_DEFINITION_2, CLUSTER_NAME, PAYLOAD_SERVICE, PAYLOAD_SERVICE_WITH_ERRORS,
     PAYLOAD_SERVICE_WITHOUT_DEPLOYMENTS, DESIRED_COUNT, TASK_DEFINITION_ARN_1, SERVICE_NAME, TASK_DEFINITION_FAMILY_1,
     TASK_DEFINITION_CONTAINERS_2, TASK_DEFINITION_VOLUMES_2, TASK_DEFINITION_REVISION_1, RESPONSE_TASK_DEFINITION,
-    RESPONSE_SERVICE, RESPONSE_LIST_TASKS_1, RESPONSE_DESCRIBE_TASKS, RESPONSE_LIST_TASKS_0, TASK_ARN_1, TASK_ARN_2
+    RESPONSE_SERVICE, RESPONSE_LIST_TASKS_1, RESPONSE_DESCRIBE_TASKS, RESPONSE_LIST_TASKS_0, TASK_ARN_1, TASK_ARN_2,
+    TASK_DEFINITION_ARN_2
 )
 
 
@@ -73,6 +78,17 @@ def test_service_deployment_updated_at(service):
     assert service.deployment_updated_at == datetime(2016, 3, 11, 12, 5, 00, 000000, tzinfo=tzlocal())
 
 
+def test_service_primary_deployment(service):
+    assert service.primary_deployment.id == u'ecs-svc/0000000000000000002'
+    assert service.primary_deployment.running_count == DESIRED_COUNT
+    assert service.primary_deployment.pending_count == 0
+
+
+def test_service_primary_deployment_without_deployments(service_without_deployments):
+    assert service_without_deployments.primary_deployment is None
+    assert service_without_deployments.rollout_completed is False
+
+
 def test_service_deployment_created_at_without_deployments(service_without_deployments):
     now = datetime.now()
     assert service_without_deployments.deployment_created_at >= now
@@ -374,7 +390,12 @@ def test_task_definition_diff():
 def test_client_init(mocked_init, mocked_client):
     mocked_init.return_value = None
 
-    EcsClient(u'access_key_id', u'secret_access_key', u'session_token', u'region', u'profile')
+    client = EcsClient(u'access_key_id', u'secret_access_key', u'session_token', u'region', u'profile')
+
+    mocked_init.assert_not_called()
+    mocked_client.assert_not_called()
+
+    client.boto
 
     mocked_init.assert_called_once_with(
         aws_access_key_id=u'access_key_id',
@@ -383,16 +404,14 @@ def test_client_init(mocked_init, mocked_client):
         region_name=u'region',
         aws_session_token=u'session_token'
     )
-    mocked_client.assert_any_call(u'ecs')
-    mocked_client.assert_any_call(u'events')
+    mocked_client.assert_called_once_with(u'ecs', config=ANY)
+    assert client.boto is client.boto
 
 
 @pytest.fixture
-@patch.object(Session, 'client')
-@patch.object(Session, '__init__')
-def client(mocked_init, mocked_client):
-    mocked_init.return_value = None
-    return EcsClient(u'access_key_id', u'secret_access_key', u'region', u'profile', u'session_token')
+def client():
+    with patch.object(Session, '__init__', return_value=None), patch.object(Session, 'client'):
+        yield EcsClient(u'access_key_id', u'secret_access_key', u'region', u'profile', u'session_token')
 
 
 def test_client_describe_services(client):
@@ -406,6 +425,90 @@ def test_client_describe_task_definition(client):
                                                                  taskDefinition=u'task_definition_arn')
 
 
+def test_client_describe_task_definition_from_cache(client, tmpdir):
+    client.task_definition_cache = TaskDefinitionCache(cache_dir=str(tmpdir))
+    client.boto.describe_task_definition.return_value = {u'taskDefinition': deepcopy(PAYLOAD_TASK_DEFINITION_1)}
+
+    first = client.describe_task_definition(TASK_DEFINITION_ARN_1)
+    second = client.describe_task_definition(TASK_DEFINITION_ARN_1)
+
+    assert second[u'taskDefinition'][u'taskDefinitionArn'] == first[u'taskDefinition'][u'taskDefinitionArn']
+    assert u'status' not in second[u'taskDefinition']
+    assert u'tags' not in second
+    assert list(EcsTaskDefinition(**second[u'taskDefinition']).images) == [(u'webserver', u'webserver:123'),
+                                                                           (u'application', u'application:123')]
+    client.boto.describe_task_definition.assert_called_once()
+    client.boto.list_tags_for_resource.assert_not_called()
+
+    client.deregister_task_definition(TASK_DEFINITION_ARN_1)
+    client.describe_task_definition(TASK_DEFINITION_ARN_1)
+
+    assert client.boto.describe_task_definition.call_count == 2
+
+
+def test_client_describe_task_definition_revision_of_family_from_cache(tmpdir):
+    simulator = Simulator()
+    arn = simulator.ecs.add_task_definition(u'web')
+    cache = TaskDefinitionCache(cache_dir=str(tmpdir))
+
+    EcsClient(client_factory=SimulatorClientFactory(simulator), task_definition_cache=cache).describe_task_definition(
+        u'web:1'
+    )
+    payload = EcsClient(
+        client_factory=SimulatorClientFactory(simulator), task_definition_cache=cache
+    ).describe_task_definition(arn)
+
+    assert payload[u'taskDefinition'][u'taskDefinitionArn'] == arn
+    assert cache.hits == 1
+    assert simulator.calls[u'ecs:DescribeTaskDefinition'] == 1
+
+    client = EcsClient(client_factory=SimulatorClientFactory(simulator), task_definition_cache=cache)
+    client.describe_task_definition(u'web:1')
+    client.describe_task_definition(u'web:1')
+
+    assert cache.hits == 3
+    assert simulator.calls[u'ecs:DescribeTaskDefinition'] == 1
+    assert simulator.calls[u'sts:GetCallerIdentity'] == 2
+
+
+def test_client_describe_task_definition_revision_of_family_of_other_account(tmpdir):
+    cache = TaskDefinitionCache(cache_dir=str(tmpdir))
+    staging = Simulator(account_id=u'111111111111')
+    staging.ecs.add_task_definition(u'web', image=u'web:staging')
+    production = Simulator(account_id=u'222222222222')
+    production.ecs.add_task_definition(u'web', image=u'web:production')
+
+    for simulator in (staging, production):
+        client = EcsClient(client_factory=SimulatorClientFactory(simulator), task_definition_cache=cache)
+        payload = client.describe_task_definition(u'web:1')
+
+        assert payload[u'taskDefinition'][u'containerDefinitions'][0][u'image'] == u'web:%s' % (
+            u'staging' if simulator is staging else u'production'
+        )
+        assert simulator.calls[u'ecs:DescribeTaskDefinition'] == 1
+
+
+def test_get_task_definition_from_cache_lists_tags_when_used(tmpdir):
+    simulator = Simulator()
+    arn = simulator.ecs.add_task_definition(u'web', tags=[{u'key': u'Team', u'value': u'web'}])
+    cache = TaskDefinitionCache(cache_dir=str(tmpdir))
+    EcsClient(client_factory=SimulatorClientFactory(simulator), task_definition_cache=cache).describe_task_definition(
+        arn
+    )
+
+    action = EcsAction(
+        EcsClient(client_factory=SimulatorClientFactory(simulator), task_definition_cache=cache), None, None
+    )
+    task_definition = action.get_task_definition(arn)
+
+    assert cache.hits == 1
+    assert simulator.calls[u'ecs:ListTagsForResource'] == 0
+
+    assert task_definition.tags == [{u'key': u'Team', u'value': u'web'}]
+    assert task_definition.get_tag(u'Team') == u'web'
+    assert simulator.calls[u'ecs:ListTagsForResource'] == 1
+
+
 def test_client_describe_unknown_task_definition(client):
     error_response = {u'Error': {u'Code': u'ClientException', u'Message': u'Unable to describe task definition.'}}
     client.boto.describe_task_definition.side_effect = ClientError(error_response, u'DescribeServices')
@@ -423,6 +526,56 @@ def test_client_describe_tasks(client):
     client.boto.describe_tasks.assert_called_once_with(cluster=u'test-cluster', tasks=u'task-arns')
 
 
+def test_client_iter_task_arns(client):
+    client.boto.get_paginator.return_value.paginate.return_value = [
+        {u'taskArns': [TASK_ARN_1]},
+        {u'taskArns': [TASK_ARN_2]},
+    ]
+
+    task_arns = list(client.iter_task_arns(u'test-cluster', u'test-service', desired_status=u'STOPPED'))
+
+    assert task_arns == [TASK_ARN_1, TASK_ARN_2]
+    client.boto.get_paginator.assert_called_once_with(u'list_tasks')
+    client.boto.get_paginator.return_value.paginate.assert_called_once_with(
+        cluster=u'test-cluster', serviceName=u'test-service', desiredStatus=u'STOPPED'
+    )
+
+
+def test_client_iter_tasks_in_chunks(client):
+    client.boto.describe_tasks.side_effect = lambda cluster, tasks: {u'tasks': [{u'taskArn': arn} for arn in tasks]}
+    task_arns = [u'task-%d' % i for i in range(250)]
+
+    tasks = list(client.iter_tasks(u'test-cluster', iter(task_arns)))
+
+    assert sorted(task[u'taskArn'] for task in tasks) == sorted(task_arns)
+    assert client.boto.describe_tasks.call_count == 3
+    for call in client.boto.describe_tasks.call_args_list:
+        assert len(call[1][u'tasks']) <= DESCRIBE_TASKS_MAX_ARNS
+
+
+def test_client_iter_tasks_without_tasks(client):
+    assert list(client.iter_tasks(u'test-cluster', [])) == []
+    client.boto.describe_tasks.assert_not_called()
+
+
+def test_client_list_task_definition_revisions(client):
+    client.boto.list_task_definitions.return_value = {u'taskDefinitionArns': [
+        u'arn:aws:ecs:eu-central-1:123456789012:task-definition/test-task-worker:3',
+        u'arn:aws:ecs:eu-central-1:123456789012:task-definition/test-task:2',
+        u'arn:aws:ecs:eu-central-1:123456789012:task-definition/test-task:1',
+    ]}
+
+    revisions = client.list_task_definition_revisions(u'test-task', 3)
+
+    assert revisions == [
+        u'arn:aws:ecs:eu-central-1:123456789012:task-definition/test-task:2',
+        u'arn:aws:ecs:eu-central-1:123456789012:task-definition/test-task:1',
+    ]
+    client.boto.list_task_definitions.assert_called_once_with(
+        familyPrefix=u'test-task', status=u'ACTIVE', sort=u'DESC', maxResults=3
+    )
+
+
 def test_client_register_task_definition(client):
     containers = [{u'name': u'foo'}]
     volumes = [{u'foo': u'bar'}]
@@ -504,6 +657,29 @@ def test_client_register_task_definition_without_tags(client):
     )
 
 
+def test_client_register_task_definition_without_read_only_properties(client):
+    task_definition = EcsTaskDefinition(**deepcopy(PAYLOAD_TASK_DEFINITION_1))
+    task_definition.additional_properties.update(
+        registeredAt=datetime(2020, 1, 1, tzinfo=tzlocal()), registeredBy='arn:aws:iam::123456789012:root'
+    )
+
+    client.register_task_definition(
+        family=task_definition.family,
+        containers=task_definition.containers,
+        volumes=task_definition.volumes,
+        role_arn=task_definition.role_arn,
+        execution_role_arn=task_definition.execution_role_arn,
+        tags=[{'key': 'Team', 'value': 'foo'}],
+        additional_properties=task_definition.additional_properties
+    )
+
+    properties = client.boto.register_task_definition.call_args[1]
+    assert 'registeredAt' not in properties
+    assert 'registeredBy' not in properties
+    assert properties['tags'] == [{'key': 'Team', 'value': 'foo'}]
+    assert 'tags' not in task_definition.additional_properties
+
+
 def test_client_deregister_task_definition(client):
     client.deregister_task_definition(u'task_definition_arn')
     client.boto.deregister_task_definition.assert_called_once_with(taskDefinition=u'task_definition_arn')
@@ -528,6 +704,16 @@ def test_client_update_service_without_desired_count(client):
     )
 
 
+def test_client_update_service_with_force_new_deployment(client):
+    client.update_service(u'test-cluster', u'test-service', None, u'task-definition', force_new_deployment=True)
+    client.boto.update_service.assert_called_once_with(
+        cluster=u'test-cluster',
+        service=u'test-service',
+        taskDefinition=u'task-definition',
+        forceNewDeployment=True
+    )
+
+
 def test_client_run_task(client):
     client.run_task(
         cluster=u'test-cluster',
@@ -615,7 +801,7 @@ def test_update_task_definition(client, task_definition):
         volumes=task_definition.volumes,
         role_arn=task_definition.role_arn,
         execution_role_arn=task_definition.execution_role_arn,
-        tags=task_definition.tags,
+        tags=(task_definition.tags or []) + [{'key': 'ContentHash', 'value': task_definition.content_hash}],
         additional_properties={
             u'networkMode': u'host',
             u'placementConstraints': {},
@@ -652,14 +838,48 @@ def test_update_service(client, service):
 
 @patch.object(EcsClient, '__init__')
 def test_is_deployed(client, service):
-    client.list_tasks.return_value = RESPONSE_LIST_TASKS_1
-    client.describe_tasks.return_value = RESPONSE_DESCRIBE_TASKS
+    action = EcsAction(client, CLUSTER_NAME, SERVICE_NAME)
+    is_deployed = action.is_deployed(service)
+
+    assert is_deployed is True
+    client.iter_task_arns.assert_not_called()
+    client.iter_tasks.assert_not_called()
+
+
+@patch.object(EcsClient, '__init__')
+def test_is_not_deployed_with_pending_tasks(client, service):
+    service[u'deployments'][0][u'runningCount'] = 1
+    service[u'deployments'][0][u'pendingCount'] = 1
+
+    action = EcsAction(client, CLUSTER_NAME, SERVICE_NAME)
+    is_deployed = action.is_deployed(service)
+
+    assert is_deployed is False
+    client.iter_task_arns.assert_not_called()
+
+
+@patch.object(EcsClient, '__init__')
+def test_is_not_deployed_with_failed_rollout(client, service):
+    service[u'deployments'][0][u'rolloutState'] = u'FAILED'
+
+    action = EcsAction(client, CLUSTER_NAME, SERVICE_NAME)
+    is_deployed = action.is_deployed(service)
+
+    assert is_deployed is False
+    client.iter_task_arns.assert_not_called()
+
+
+@patch.object(EcsClient, '__init__')
+def test_is_deployed_falls_back_to_tasks(client, service):
+    del service[u'deployments'][0][u'runningCount']
+    client.iter_task_arns.return_value = iter(RESPONSE_LIST_TASKS_1[u'taskArns'])
+    client.iter_tasks.return_value = iter(RESPONSE_DESCRIBE_TASKS[u'tasks'])
 
     action = EcsAction(client, CLUSTER_NAME, SERVICE_NAME)
     is_deployed = action.is_deployed(service)
 
     assert is_deployed is True
-    client.list_tasks.assert_called_once_with(
+    client.iter_task_arns.assert_called_once_with(
         cluster_name=service.cluster,
         service_name=service.name
     )
@@ -669,8 +889,8 @@ def test_is_deployed(client, service):
 def test_is_not_deployed_with_more_than_one_deployment(client, service):
     service['deployments'].append(service['deployments'][0])
 
-    client.list_tasks.return_value = RESPONSE_LIST_TASKS_1
-    client.describe_tasks.return_value = RESPONSE_DESCRIBE_TASKS
+    client.iter_task_arns.return_value = iter(RESPONSE_LIST_TASKS_1[u'taskArns'])
+    client.iter_tasks.return_value = iter(RESPONSE_DESCRIBE_TASKS[u'tasks'])
 
     action = EcsAction(client, CLUSTER_NAME, SERVICE_NAME)
     is_deployed = action.is_deployed(service)
@@ -680,7 +900,8 @@ def test_is_not_deployed_with_more_than_one_deployment(client, service):
 
 @patch.object(EcsClient, '__init__')
 def test_is_deployed_if_no_tasks_should_be_running(client, service):
-    client.list_tasks.return_value = RESPONSE_LIST_TASKS_0
+    del service[u'deployments'][0][u'runningCount']
+    client.iter_task_arns.return_value = iter(RESPONSE_LIST_TASKS_0[u'taskArns'])
     action = EcsAction(client, CLUSTER_NAME, SERVICE_NAME)
     service[u'desiredCount'] = 0
     is_deployed = action.is_deployed(service)
@@ -689,7 +910,8 @@ def test_is_deployed_if_no_tasks_should_be_running(client, service):
 
 @patch.object(EcsClient, '__init__')
 def test_is_not_deployed_if_no_tasks_running(client, service):
-    client.list_tasks.return_value = RESPONSE_LIST_TASKS_0
+    del service[u'deployments'][0][u'runningCount']
+    client.iter_task_arns.return_value = iter(RESPONSE_LIST_TASKS_0[u'taskArns'])
     action = EcsAction(client, CLUSTER_NAME, SERVICE_NAME)
     is_deployed = action.is_deployed(service)
     assert is_deployed is False
@@ -697,7 +919,7 @@ def test_is_not_deployed_if_no_tasks_running(client, service):
 
 @patch.object(EcsClient, '__init__')
 def test_get_running_tasks_count(client, service):
-    client.describe_tasks.return_value = RESPONSE_DESCRIBE_TASKS
+    client.iter_tasks.return_value = iter(RESPONSE_DESCRIBE_TASKS[u'tasks'])
     action = EcsAction(client, CLUSTER_NAME, SERVICE_NAME)
     running_count = action.get_running_tasks_count(service, [TASK_ARN_1, TASK_ARN_2])
     assert running_count == 2
@@ -705,7 +927,7 @@ def test_get_running_tasks_count(client, service):
 
 @patch.object(EcsClient, '__init__')
 def test_get_running_tasks_count_new_revision(client, service, task_definition_revision_2):
-    client.describe_tasks.return_value = RESPONSE_DESCRIBE_TASKS
+    client.iter_tasks.return_value = iter(RESPONSE_DESCRIBE_TASKS[u'tasks'])
     action = EcsAction(client, CLUSTER_NAME, SERVICE_NAME)
     service.set_task_definition(task_definition_revision_2)
     running_count = action.get_running_tasks_count(service, [TASK_ARN_1, TASK_ARN_2])
@@ -799,3 +1021,361 @@ def test_ecs_server_get_warnings():
     })
 
     assert len(service.get_warnings(since, until)) == 1
+
+
+def test_ecs_service_get_warnings_of_given_events():
+    since = datetime.now() - timedelta(hours=1)
+    until = datetime.now() + timedelta(hours=1)
+    event_unable = {u'id': u'2', u'createdAt': datetime.now(), u'message': u'unable to foo'}
+    event_older = {u'id': u'1', u'createdAt': datetime.now(), u'message': u'unable to bar'}
+
+    service = EcsService('foo', {u'deployments': [], u'events': [event_unable, event_older]})
+
+    assert list(service.get_warnings(since, until, events=[event_unable]).values()) == [u'unable to foo']
+    assert service.get_warnings(since, until, events=[]) == {}
+
+
+def test_ecs_service_deployment_timestamps_are_looked_up_once(service):
+    created_at = service.deployment_created_at
+    service[u'deployments'] = []
+
+    assert service.deployment_created_at == created_at
+
+
+def test_ecs_event_cursor_returns_only_new_events():
+    cursor = EcsEventCursor()
+    events = [{u'id': u'2', u'message': u'b'}, {u'id': u'1', u'message': u'a'}]
+
+    assert cursor.new_events(EcsService('foo', {u'events': events})) == events
+    assert cursor.new_events(EcsService('foo', {u'events': events})) == []
+
+    events.insert(0, {u'id': u'3', u'message': u'c'})
+
+    assert cursor.new_events(EcsService('foo', {u'events': events})) == [{u'id': u'3', u'message': u'c'}]
+    assert cursor.last_event_id == u'3'
+
+
+def test_ecs_event_cursor_since():
+    since = datetime(2016, 3, 11, 12, 0, 0, tzinfo=tzlocal())
+    cursor = EcsEventCursor(since=since)
+    events = [
+        {u'id': u'2', u'message': u'b', u'createdAt': since + timedelta(seconds=1)},
+        {u'id': u'1', u'message': u'a', u'createdAt': since - timedelta(seconds=1)},
+    ]
+
+    assert cursor.new_events(EcsService('foo', {u'events': events})) == events[:1]
+    assert cursor.last_event_id == u'2'
+
+
+def test_ecs_event_cursor_without_event_ids():
+    cursor = EcsEventCursor()
+    events = [{u'message': u'b'}, {u'message': u'a'}]
+
+    assert cursor.new_events(EcsService('foo', {u'events': events})) == events
+    assert cursor.new_events(EcsService('foo', {u'events': events})) == events
+    assert cursor.new_events(EcsService('foo', {})) == []
+
+
+def test_ecs_service_get_failed_deployment():
+    failed = {u'id': u'2', u'status': u'PRIMARY', u'taskDefinition': u'td:2', u'rolloutState': u'FAILED',
+              u'rolloutStateReason': u'ECS deployment circuit breaker: tasks failed to start.', u'failedTasks': 3}
+    service = EcsService('foo', {u'taskDefinition': u'td:2', u'deployments': [failed]})
+
+    assert service.get_failed_deployment().id == u'2'
+    assert service.get_failed_deployment().failure_reason == \
+        u'ECS deployment circuit breaker: tasks failed to start. [rolloutState=FAILED, failedTasks=3]'
+
+
+def test_ecs_service_get_failed_deployment_after_circuit_breaker_rollback():
+    rollback = {u'id': u'3', u'status': u'PRIMARY', u'taskDefinition': u'td:1', u'rolloutState': u'IN_PROGRESS'}
+    failed = {u'id': u'2', u'status': u'ACTIVE', u'taskDefinition': u'td:2', u'rolloutState': u'FAILED'}
+    service = EcsService('foo', {u'taskDefinition': u'td:1', u'deployments': [rollback, failed]})
+
+    assert service.get_failed_deployment() is None
+    assert service.get_failed_deployment(u'td:2').id == u'2'
+
+
+def test_ecs_service_without_failed_deployment(service):
+    assert service.get_failed_deployment() is None
+
+
+@pytest.mark.parametrize('task, failure', (
+    ({u'stopCode': u'EssentialContainerExited', u'stoppedReason': u'Essential container in task exited',
+      u'containers': [{u'exitCode': 0}, {u'exitCode': 137}]}, u'exit code 137'),
+    ({u'stopCode': u'EssentialContainerExited', u'stoppedReason': u'Essential container in task exited',
+      u'containers': [{u'exitCode': 0}]}, u'essential container exited'),
+    ({u'stopCode': u'TaskFailedToStart',
+      u'stoppedReason': u'CannotPullContainerError: pull image manifest has been retried 5 time(s)'},
+     u'image pull failed'),
+    ({u'stopCode': u'TaskFailedToStart', u'stoppedReason': u'ResourceInitializationError: unable to pull secrets'},
+     u'resource initialization failed'),
+    ({u'stopCode': u'EssentialContainerExited', u'stoppedReason': u'Essential container in task exited',
+      u'containers': [{u'exitCode': 137, u'reason': u'OutOfMemoryError: Container killed due to memory usage'}]},
+     u'out of memory'),
+    ({u'stopCode': u'ServiceSchedulerInitiated',
+      u'stoppedReason': u'Task failed ELB health checks in (target-group arn:aws:elasticloadbalancing:foo)'},
+     u'health check failed'),
+    ({u'stopCode': u'TaskFailedToStart', u'stoppedReason': u'Timeout waiting for network interface provisioning'},
+     u'failed to start'),
+    ({u'stopCode': u'ServiceSchedulerInitiated',
+      u'stoppedReason': u'Scaling activity initiated by (deployment ecs-svc/0000000000000000002)',
+      u'containers': [{u'exitCode': 143}]}, None),
+    ({u'stopCode': u'UserInitiated', u'stoppedReason': u'Task stopped by user', u'containers': [{u'exitCode': 1}]},
+     None),
+    ({u'stopCode': u'SpotInterruption', u'stoppedReason': u'Your Spot Task was interrupted.'}, None),
+))
+def test_ecs_stopped_task_failure(task, failure):
+    assert EcsStoppedTask(task).failure == failure
+
+
+def test_ecs_stopped_task_failure_message():
+    task = EcsStoppedTask({
+        u'taskArn': u'arn:aws:ecs:eu-central-1:123456789012:task/test-cluster/abc123',
+        u'stopCode': u'EssentialContainerExited',
+        u'stoppedReason': u'Essential container in task exited',
+        u'containers': [{u'exitCode': 1}],
+    })
+
+    assert task.failure_message == u'Task abc123 failed (exit code 1): Essential container in task exited'
+
+
+def _stopped_task(task_arn, task_definition_arn=TASK_DEFINITION_ARN_1, stopped_at=None, exit_code=1):
+    return {
+        u'taskArn': task_arn,
+        u'taskDefinitionArn': task_definition_arn,
+        u'stopCode': u'EssentialContainerExited',
+        u'stoppedReason': u'Essential container in task exited',
+        u'stoppedAt': stopped_at or datetime.now(tz=tzlocal()),
+        u'containers': [{u'exitCode': exit_code}],
+    }
+
+
+def test_ecs_stopped_task_monitor_describes_only_new_tasks(service):
+    client = Mock()
+    client.iter_task_arns.side_effect = lambda *args, **kwargs: iter([u'task-1', u'task-2'])
+    client.iter_tasks.side_effect = lambda cluster_name, task_arns: iter(_stopped_task(arn) for arn in task_arns)
+
+    monitor = EcsStoppedTaskMonitor(client, u'test-cluster', TASK_DEFINITION_ARN_1, max_failures=3)
+
+    assert [task.arn for task in monitor.new_failures(service)] == [u'task-1', u'task-2']
+    assert monitor.new_failures(service) == []
+    assert not monitor.failed
+
+    client.iter_task_arns.assert_called_with(
+        u'test-cluster', desired_status=u'STOPPED', started_by=u'ecs-svc/0000000000000000002'
+    )
+    client.iter_tasks.assert_called_with(u'test-cluster', [])
+
+
+def test_ecs_stopped_task_monitor_fails_after_max_failures(service):
+    client = Mock()
+    client.iter_task_arns.return_value = iter([u'task-1', u'task-2', u'task-3', u'task-4'])
+    client.iter_tasks.return_value = iter([
+        _stopped_task(u'task-1'),
+        _stopped_task(u'task-2', task_definition_arn=u'arn:aws:ecs:eu-central-1:123456789012:task-definition/foo:1'),
+        _stopped_task(u'task-3', stopped_at=datetime.now(tz=tzlocal()) - timedelta(hours=1)),
+        _stopped_task(u'task-4'),
+    ])
+
+    since = datetime.now(tz=tzlocal()) - timedelta(minutes=1)
+    monitor = EcsStoppedTaskMonitor(client, u'test-cluster', TASK_DEFINITION_ARN_1, max_failures=2, since=since)
+
+    assert [task.arn for task in monitor.new_failures(service)] == [u'task-1', u'task-4']
+    assert monitor.failed
+
+
+def test_ecs_stopped_task_monitor_without_deployment_lists_by_family(service):
+    client = Mock()
+    client.iter_task_arns.return_value = iter([])
+    client.iter_tasks.return_value = iter([])
+
+    monitor = EcsStoppedTaskMonitor(client, u'test-cluster', u'arn:aws:ecs:eu-central-1:123:task-definition/foo:2')
+    monitor.new_failures(service)
+
+    client.iter_task_arns.assert_called_once_with(u'test-cluster', desired_status=u'STOPPED', family=u'foo')
+
+
+def test_task_definition_content_hash(task_definition):
+    same = EcsTaskDefinition(**deepcopy(PAYLOAD_TASK_DEFINITION_1))
+    same.containers[0][u'environment'] = list(reversed(same.containers[0][u'environment']))
+    same.additional_properties[u'registeredAt'] = datetime.now()
+    same.tags = (same.tags or []) + [{u'key': u'ContentHash', u'value': u'outdated'}]
+
+    assert len(task_definition.content_hash) == 64
+    assert same.content_hash == task_definition.content_hash
+
+    same.set_images(u'latest')
+
+    assert same.content_hash != task_definition.content_hash
+
+
+@patch.object(EcsClient, '__init__')
+def test_find_task_definition_revision_of_unchanged_task_definition(client, task_definition):
+    task_definition.status = u'ACTIVE'
+    action = EcsAction(client, None, None)
+
+    assert action.find_task_definition_revision(task_definition) is task_definition
+    assert task_definition.reused
+    client.list_task_definition_revisions.assert_not_called()
+
+
+@patch.object(EcsClient, '__init__')
+def test_find_task_definition_revision_by_content_hash_tag(client, task_definition):
+    task_definition.set_images(u'latest')
+    client.list_task_definition_revisions.return_value = [TASK_DEFINITION_ARN_2, TASK_DEFINITION_ARN_1]
+    client.list_task_definition_arns_with_tag.return_value = [TASK_DEFINITION_ARN_2]
+    client.describe_task_definition.return_value = {
+        u'taskDefinition': deepcopy(PAYLOAD_TASK_DEFINITION_2),
+        u'tags': [{u'key': u'ContentHash', u'value': task_definition.content_hash}]
+    }
+
+    revision = EcsAction(client, None, None).find_task_definition_revision(task_definition)
+
+    assert revision.arn == TASK_DEFINITION_ARN_2
+    assert revision.reused
+    client.list_task_definition_revisions.assert_called_once_with(task_definition.family, 5)
+    client.list_task_definition_arns_with_tag.assert_called_once_with(u'ContentHash', task_definition.content_hash)
+    client.describe_task_definition.assert_called_once_with(task_definition_arn=TASK_DEFINITION_ARN_2)
+
+
+@patch.object(EcsClient, '__init__')
+def test_find_task_definition_revision_ignores_older_tagged_revisions(client, task_definition):
+    task_definition.set_images(u'latest')
+    client.list_task_definition_revisions.return_value = [TASK_DEFINITION_ARN_2]
+    client.list_task_definition_arns_with_tag.return_value = [TASK_DEFINITION_ARN_1]
+
+    assert EcsAction(client, None, None).find_task_definition_revision(task_definition) is None
+    client.describe_task_definition.assert_not_called()
+
+
+@patch.object(EcsClient, '__init__')
+def test_find_task_definition_revision_without_permission_to_get_resources(client, task_definition):
+    task_definition.set_images(u'latest')
+    client.list_task_definition_revisions.return_value = [TASK_DEFINITION_ARN_2]
+    client.list_task_definition_arns_with_tag.side_effect = ClientError(
+        {u'Error': {u'Code': u'AccessDeniedException', u'Message': u'Not authorized'}}, u'GetResources'
+    )
+
+    assert EcsAction(client, None, None).find_task_definition_revision(task_definition) is None
+
+
+def test_find_task_definition_revision_deregistered_after_caching(tmpdir):
+    simulator = Simulator()
+    arn = simulator.ecs.add_task_definition(u'web', tags=[{u'key': u'Team', u'value': u'web'}])
+    cache = TaskDefinitionCache(cache_dir=str(tmpdir))
+    client_factory = SimulatorClientFactory(simulator)
+    EcsClient(client_factory=client_factory, task_definition_cache=cache).describe_task_definition(arn)
+    simulator.ecs.deregister_task_definition(taskDefinition=arn)
+
+    action = EcsAction(EcsClient(client_factory=client_factory, task_definition_cache=cache), None, None)
+    task_definition = action.get_task_definition(arn)
+
+    assert cache.hits == 1
+    assert action.find_task_definition_revision(task_definition) is None
+
+
+def test_find_task_definition_revision_of_cached_revision(tmpdir):
+    simulator = Simulator()
+    arn = simulator.ecs.add_task_definition(u'web')
+    cache = TaskDefinitionCache(cache_dir=str(tmpdir))
+    EcsClient(client_factory=SimulatorClientFactory(simulator), task_definition_cache=cache).describe_task_definition(
+        arn
+    )
+    simulator.calls.clear()
+
+    action = EcsAction(
+        EcsClient(client_factory=SimulatorClientFactory(simulator), task_definition_cache=cache), None, None
+    )
+    task_definition = action.get_task_definition(arn)
+
+    assert action.find_task_definition_revision(task_definition) is task_definition
+    assert task_definition.reused
+    assert dict(simulator.calls) == {u'ecs:ListTaskDefinitions': 1}
+
+
+@patch.object(EcsClient, '__init__')
+def test_find_task_definition_revision_without_match(client, task_definition):
+    task_definition.set_images(u'latest')
+    client.list_task_definition_revisions.return_value = [TASK_DEFINITION_ARN_2]
+    client.list_task_definition_arns_with_tag.return_value = []
+
+    action = EcsAction(client, None, None)
+
+    assert action.find_task_definition_revision(task_definition) is None
+    assert action.find_task_definition_revision(task_definition, max_revisions=0) is None
+    client.list_task_definition_revisions.assert_called_once()
+
+
+@patch.object(EcsClient, '__init__')
+def test_update_task_definition_replaces_content_hash_tag(client, task_definition):
+    client.register_task_definition.return_value = RESPONSE_TASK_DEFINITION
+    task_definition.tags = [{'key': 'ContentHash', 'value': 'outdated'}, {'key': 'Team', 'value': 'foo'}]
+
+    EcsAction(client, None, None).update_task_definition(task_definition)
+
+    assert client.register_task_definition.call_args[1]['tags'] == [
+        {'key': 'Team', 'value': 'foo'}, {'key': 'ContentHash', 'value': task_definition.content_hash}
+    ]
+
+
+@patch.object(EcsClient, '__init__')
+def test_update_task_definition_without_content_hash_tag(client, task_definition):
+    client.register_task_definition.return_value = RESPONSE_TASK_DEFINITION
+    task_definition.tags = [{'key': 'ContentHash', 'value': 'outdated'}]
+
+    EcsAction(client, None, None).update_task_definition(task_definition, tag_content_hash=False)
+
+    assert client.register_task_definition.call_args[1]['tags'] == []
+
+
+@patch.object(EcsClient, '__init__')
+def test_update_task_definition_without_permission_to_tag(client, task_definition):
+    error_response = {u'Error': {u'Code': u'AccessDeniedException', u'Message': u'Not authorized to ecs:TagResource'}}
+    client.register_task_definition.side_effect = [
+        ClientError(error_response, u'RegisterTaskDefinition'), RESPONSE_TASK_DEFINITION
+    ]
+
+    new_task_definition = EcsAction(client, None, None).update_task_definition(task_definition)
+
+    assert new_task_definition.arn == TASK_DEFINITION_ARN_1
+    assert client.register_task_definition.call_count == 2
+    assert client.register_task_definition.call_args_list[0][1]['tags'][-1][u'key'] == u'ContentHash'
+    assert client.register_task_definition.call_args_list[1][1]['tags'] == []
+
+
+@patch.object(EcsClient, '__init__')
+def test_diff_action_iter_task_definitions_fetches_max_parallel_revisions_ahead(client):
+    fetched = []
+    client.describe_task_definition.side_effect = lambda task_definition_arn: fetched.append(task_definition_arn) or {
+        u'taskDefinition': deepcopy(PAYLOAD_TASK_DEFINITION_1), u'tags': []
+    }
+    task_definitions = DiffAction(client).iter_task_definitions(TASK_DEFINITION_FAMILY_1, range(1, 101), 3)
+
+    assert next(task_definitions)[0] == 1
+    time.sleep(0.05)
+
+    assert len(fetched) <= 4
+    assert [revision for revision, _ in task_definitions] == list(range(2, 101))
+    assert len(fetched) == 100
+
+
+@patch.object(EcsClient, '__init__')
+def test_diff_action_bisect_skips_missing_revisions(client):
+    def describe_task_definition(task_definition_arn):
+        revision = int(task_definition_arn.rsplit(':', 1)[1])
+        if 4 <= revision <= 6:
+            raise UnknownTaskDefinitionError(f'Unknown task definition arn: {task_definition_arn}')
+        payload = deepcopy(PAYLOAD_TASK_DEFINITION_1)
+        payload.update(revision=revision, taskRoleArn='arn:new' if revision >= 8 else 'arn:old')
+        return {u'taskDefinition': payload}
+
+    client.describe_task_definition.side_effect = describe_task_definition
+    action = DiffAction(client)
+
+    before, after = action.bisect(TASK_DEFINITION_FAMILY_1, 1, 10, 'role_arn')
+
+    assert (before.revision, after.revision) == (7, 8)
+    assert [revision for revision, td in action.iter_task_definitions(TASK_DEFINITION_FAMILY_1, range(3, 8)) if td] == [
+        3, 7
+    ]
+    assert action.bisect(TASK_DEFINITION_FAMILY_1, 1, 3, 'role_arn') is None
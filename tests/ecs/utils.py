@@ -7,14 +7,16 @@ from aws_deploy.ecs.helper import EcsConnectionError, UnknownTaskDefinitionError
 from tests.ecs.constants import (
     PAYLOAD_SERVICE_WITH_ERRORS, PAYLOAD_SERVICE, RESPONSE_TASK_DEFINITIONS, RESPONSE_LIST_TASKS_2,
     RESPONSE_LIST_TASKS_0, RESPONSE_DESCRIBE_TASKS, RESPONSE_TASK_DEFINITION_2, RESPONSE_TASK_DEFINITION,
-    RESPONSE_SERVICE_WITH_ERRORS, RESPONSE_SERVICE
+    RESPONSE_SERVICE_WITH_ERRORS, RESPONSE_SERVICE, SERVICE_NAME, PAYLOAD_TASK_1, TASK_ARN_1, TASK_DEFINITION_ARN_1
 )
 
+SERVICE_NAMES = [SERVICE_NAME, SERVICE_NAME + u'-2']
+
 
 class EcsTestClient(object):
     def __init__(self, aws_access_key_id=None, aws_secret_access_key=None, region_name=None,
                  profile_name=None, deployment_errors=False, client_errors=False,
-                 wait=0):
+                 wait=0, rollout_failed=False, task_failures=0):
         super(EcsTestClient, self).__init__()
         self.access_key_id = aws_access_key_id
         self.secret_access_key = aws_secret_access_key
@@ -23,6 +25,10 @@ class EcsTestClient(object):
         self.deployment_errors = deployment_errors
         self.client_errors = client_errors
         self.wait_until = datetime.now() + timedelta(seconds=wait)
+        self.rollout_failed = rollout_failed
+        self.stopped_task_arns = [u'%s-stopped-%d' % (TASK_ARN_1, i) for i in range(task_failures)]
+        # the stopped tasks belong to the first deployed task definition, so that a rollback succeeds
+        self.failing_task_definition_arn = None
 
     def describe_services(self, cluster_name, service_name):
         if not self.access_key_id or not self.secret_access_key:
@@ -30,18 +36,40 @@ class EcsTestClient(object):
         if cluster_name != u'test-cluster':
             error_response = {u'Error': {u'Code': u'ClusterNotFoundException', u'Message': u'Cluster not found.'}}
             raise ClientError(error_response, u'DescribeServices')
-        if service_name != u'test-service':
+        if service_name not in SERVICE_NAMES:
             return {u'services': []}
         if self.deployment_errors:
-            return {
-                u"services": [PAYLOAD_SERVICE_WITH_ERRORS],
-                u"failures": []
-            }
+            service = deepcopy(PAYLOAD_SERVICE_WITH_ERRORS)
+        else:
+            service = deepcopy(PAYLOAD_SERVICE)
+        service[u'serviceName'] = service_name
+        if self.wait_until > datetime.now():
+            service[u'deployments'][0][u'runningCount'] = 0
+            service[u'deployments'][0][u'pendingCount'] = service[u'desiredCount']
+        if self.rollout_failed:
+            service[u'deployments'][0][u'rolloutState'] = u'FAILED'
+            service[u'deployments'][0][u'rolloutStateReason'] = \
+                u'ECS deployment circuit breaker: tasks failed to start.'
+            service[u'deployments'][0][u'failedTasks'] = 3
         return {
-            u"services": [PAYLOAD_SERVICE],
+            u"services": [service],
             u"failures": []
         }
 
+    def list_services(self, cluster_name):
+        return iter(SERVICE_NAMES)
+
+    def describe_services_batch(self, cluster_name, service_names):
+        services, failures = [], []
+        for service_name in service_names:
+            response = self.describe_services(cluster_name, service_name)
+            if response[u'services']:
+                services.extend(response[u'services'])
+            else:
+                failures.append({u'arn': u'arn:aws:ecs:service/%s/%s' % (cluster_name, service_name),
+                                 u'reason': u'MISSING'})
+        return {u'services': services, u'failures': failures}
+
     def describe_task_definition(self, task_definition_arn):
         if not self.access_key_id or not self.secret_access_key:
             raise EcsConnectionError(u'Unable to locate credentials. Configure credentials by running "aws configure".')
@@ -49,6 +77,9 @@ class EcsTestClient(object):
             return deepcopy(RESPONSE_TASK_DEFINITIONS[task_definition_arn])
         raise UnknownTaskDefinitionError('Unknown task definition arn: %s' % task_definition_arn)
 
+    def list_task_definition_tags(self, task_definition_arn):
+        return []
+
     def list_tasks(self, cluster_name, service_name):
         if self.wait_until <= datetime.now():
             return deepcopy(RESPONSE_LIST_TASKS_2)
@@ -57,6 +88,41 @@ class EcsTestClient(object):
     def describe_tasks(self, cluster_name, task_arns):
         return deepcopy(RESPONSE_DESCRIBE_TASKS)
 
+    def iter_task_arns(self, cluster_name, service_name=None, desired_status=None, family=None, started_by=None):
+        if desired_status == u'STOPPED':
+            return iter(self.stopped_task_arns)
+        return iter(self.list_tasks(cluster_name, service_name)[u'taskArns'])
+
+    def iter_tasks(self, cluster_name, task_arns):
+        task_arns = list(task_arns)
+        if not task_arns:
+            return iter([])
+        if set(task_arns) <= set(self.stopped_task_arns):
+            return iter(self.describe_stopped_tasks(task_arns))
+        return iter(self.describe_tasks(cluster_name, task_arns)[u'tasks'])
+
+    def describe_stopped_tasks(self, task_arns):
+        tasks = []
+        for task_arn in task_arns:
+            task = deepcopy(PAYLOAD_TASK_1)
+            task.update({
+                u'taskArn': task_arn,
+                u'taskDefinitionArn': self.failing_task_definition_arn or TASK_DEFINITION_ARN_1,
+                u'lastStatus': u'STOPPED',
+                u'desiredStatus': u'STOPPED',
+                u'stopCode': u'EssentialContainerExited',
+                u'stoppedReason': u'Essential container in task exited',
+            })
+            task[u'containers'][0][u'exitCode'] = 1
+            tasks.append(task)
+        return tasks
+
+    def list_task_definition_revisions(self, family, max_results=5):
+        return []
+
+    def list_task_definition_arns_with_tag(self, key, value):
+        return []
+
     def register_task_definition(self, family, containers, volumes, role_arn,
                                  execution_role_arn, tags, additional_properties):
         if not self.access_key_id or not self.secret_access_key:
@@ -66,7 +132,10 @@ class EcsTestClient(object):
     def deregister_task_definition(self, task_definition_arn):
         return deepcopy(RESPONSE_TASK_DEFINITION)
 
-    def update_service(self, cluster, service, desired_count, task_definition):
+    def update_service(self, cluster, service, desired_count, task_definition, force_new_deployment=False):
+        self.force_new_deployment = force_new_deployment
+        if self.failing_task_definition_arn is None:
+            self.failing_task_definition_arn = task_definition
         if self.client_errors:
             error = dict(Error=dict(Code=123, Message="Something went wrong"))
             raise ClientError(error, 'fake_error')
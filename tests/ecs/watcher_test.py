@@ -0,0 +1,166 @@
+from datetime import datetime
+
+from botocore.exceptions import ClientError, EndpointConnectionError
+from dateutil.tz import tzlocal
+from mock import Mock
+
+from aws_deploy.common.polling import set_clock
+from aws_deploy.ecs.watcher import EcsDeploymentWatcher
+from aws_deploy.simulator import VirtualClock
+from tests.ecs.constants import CLUSTER_NAME, SERVICE_NAME, PAYLOAD_SERVICE, TASK_DEFINITION_ARN_1
+from tests.ecs.utils import EcsTestClient
+
+
+def test_watcher_batches_describe_services():
+    client = Mock()
+    service_names = [u'service-%d' % i for i in range(25)]
+    client.describe_services_batch.side_effect = lambda cluster_name, names: {
+        u'services': [dict(PAYLOAD_SERVICE, serviceName=name) for name in names],
+        u'failures': []
+    }
+
+    watcher = EcsDeploymentWatcher(client, [(CLUSTER_NAME, name) for name in service_names], sleep_time=0)
+    results = watcher.watch(timeout=10)
+
+    assert all(result.deployed for result in results)
+    assert client.describe_services_batch.call_count == 3
+    for call in client.describe_services_batch.call_args_list:
+        assert len(call[0][1]) <= 10
+
+
+def test_watcher_reports_each_finished_service():
+    finished = []
+    client = EcsTestClient(u'access_key', u'secret_key')
+
+    watcher = EcsDeploymentWatcher(
+        client, [(CLUSTER_NAME, SERVICE_NAME), (CLUSTER_NAME, u'unknown-service')], sleep_time=0,
+        on_finished=finished.append
+    )
+    results = watcher.watch(timeout=10)
+
+    assert sorted(str(result) for result in finished) == [u'test-cluster/test-service', u'test-cluster/unknown-service']
+    assert results[0].deployed
+    assert results[1].error == u'MISSING'
+
+
+def test_watcher_fails_on_warnings():
+    client = EcsTestClient(u'access_key', u'secret_key', deployment_errors=True)
+
+    results = EcsDeploymentWatcher(client, [(CLUSTER_NAME, SERVICE_NAME)], sleep_time=0).watch(timeout=10)
+
+    assert not results[0].deployed
+    assert results[0].error == u'Service was unable to Lorem Ipsum'
+
+
+def test_watcher_ignores_warnings():
+    client = EcsTestClient(u'access_key', u'secret_key', deployment_errors=True)
+
+    watcher = EcsDeploymentWatcher(client, [(CLUSTER_NAME, SERVICE_NAME)], ignore_warnings=True, sleep_time=0)
+    results = watcher.watch(timeout=10)
+
+    assert results[0].deployed
+
+
+def test_watcher_timeout():
+    client = EcsTestClient(u'access_key', u'secret_key', wait=2)
+
+    results = EcsDeploymentWatcher(client, [(CLUSTER_NAME, SERVICE_NAME)], sleep_time=0).watch(timeout=0.2)
+
+    assert not results[0].finished
+
+
+def test_watcher_fails_on_failed_rollout():
+    client = EcsTestClient(u'access_key', u'secret_key', rollout_failed=True)
+
+    results = EcsDeploymentWatcher(client, [(CLUSTER_NAME, SERVICE_NAME)], sleep_time=0).watch(timeout=10)
+
+    assert not results[0].deployed
+    assert results[0].error.startswith(u'ECS deployment circuit breaker: tasks failed to start.')
+
+
+def test_watcher_fails_after_max_task_failures():
+    client = EcsTestClient(u'access_key', u'secret_key', wait=10, task_failures=3)
+    targets = [(CLUSTER_NAME, SERVICE_NAME, TASK_DEFINITION_ARN_1)]
+
+    results = EcsDeploymentWatcher(client, targets, sleep_time=0, max_task_failures=3).watch(timeout=10)
+
+    assert not results[0].deployed
+    assert results[0].error.startswith(u'3 tasks failed, last: Task ')
+    assert results[0].error.endswith(u'failed (exit code 1): Essential container in task exited')
+
+
+def test_watcher_without_max_task_failures():
+    client = EcsTestClient(u'access_key', u'secret_key', task_failures=3)
+    targets = [(CLUSTER_NAME, SERVICE_NAME, TASK_DEFINITION_ARN_1)]
+
+    results = EcsDeploymentWatcher(client, targets, sleep_time=0).watch(timeout=10)
+
+    assert results[0].deployed
+
+
+def test_watcher_fails_only_the_services_of_a_failed_request():
+    client = Mock()
+
+    def describe_services_batch(cluster_name, names):
+        if cluster_name == u'broken-cluster':
+            raise EndpointConnectionError(endpoint_url=u'https://ecs.eu-central-1.amazonaws.com')
+        return {u'services': [dict(PAYLOAD_SERVICE, serviceName=name) for name in names], u'failures': []}
+
+    client.describe_services_batch.side_effect = describe_services_batch
+    targets = [(CLUSTER_NAME, SERVICE_NAME), (u'broken-cluster', SERVICE_NAME)]
+
+    results = EcsDeploymentWatcher(client, targets, sleep_time=0).watch(timeout=10)
+
+    assert results[0].deployed
+    assert results[1].error.startswith(u'Could not connect to the endpoint URL')
+
+
+def test_watcher_fails_only_the_service_whose_inspection_failed():
+    client = EcsTestClient(u'access_key', u'secret_key', wait=10, task_failures=3)
+    client.describe_services_batch = Mock(return_value={
+        u'services': [dict(PAYLOAD_SERVICE, serviceName=name) for name in (SERVICE_NAME, u'other-service')],
+        u'failures': []
+    })
+    error = ClientError({u'Error': {u'Code': u'AccessDeniedException', u'Message': u'Denied'}}, u'ListTasks')
+    client.iter_task_arns = Mock(side_effect=error)
+    targets = [(CLUSTER_NAME, SERVICE_NAME, TASK_DEFINITION_ARN_1), (CLUSTER_NAME, u'other-service')]
+
+    results = EcsDeploymentWatcher(client, targets, sleep_time=0, max_task_failures=3).watch(timeout=10)
+
+    assert u'AccessDeniedException' in results[0].error
+    assert results[1].deployed
+
+
+def test_watcher_ignores_events_from_before_the_deployment():
+    client = Mock()
+    event = {
+        u'id': u'old-error',
+        u'createdAt': datetime(2016, 3, 11, 11, 0, 0, tzinfo=tzlocal()),
+        u'message': u'Service was unable to Lorem Ipsum'
+    }
+    client.describe_services_batch.return_value = {
+        u'services': [dict(PAYLOAD_SERVICE, events=[event])], u'failures': []
+    }
+
+    results = EcsDeploymentWatcher(client, [(CLUSTER_NAME, SERVICE_NAME)], sleep_time=0).watch(timeout=10)
+
+    assert results[0].deployed
+    assert results[0].event_cursor.since == datetime(2016, 3, 11, 12, 0, 0, tzinfo=tzlocal())
+
+
+def test_watcher_backs_off_after_throttling():
+    client = Mock()
+    throttled = ClientError({u'Error': {u'Code': u'ThrottlingException', u'Message': u'Rate exceeded'}}, u'Describe')
+    client.describe_services_batch.side_effect = [
+        throttled, {u'services': [dict(PAYLOAD_SERVICE)], u'failures': []}
+    ]
+    clock = VirtualClock()
+    previous_clock = set_clock(clock)
+    try:
+        results = EcsDeploymentWatcher(client, [(CLUSTER_NAME, SERVICE_NAME)], sleep_time=1).watch(timeout=60)
+    finally:
+        set_clock(previous_clock)
+
+    assert results[0].deployed
+    # the throttled poll is repeated after 3 seconds (+/- jitter) instead of the 1 second of a regular poll
+    assert clock.now() >= 2.25
@@ -0,0 +1,30 @@
+from aws_deploy.simulator.benchmark import (
+    FLOW_BATCH_DEPLOY, FLOW_ECS_DEPLOY, format_report, peak_rss_mb, run_benchmark
+)
+
+
+def test_run_benchmark():
+    result = run_benchmark(FLOW_ECS_DEPLOY, services=2, tasks_per_service=2, api_latency=0.1)
+
+    assert result.failed_runs == 0
+    assert result.calls['ecs:UpdateService'] == 2
+    assert result.calls['ecs:RegisterTaskDefinition'] == 2
+    assert result.virtual_time > 0
+    assert result.to_dict()['api_calls'] == result.total_calls
+
+
+def test_run_benchmark_reports_the_peak_rss_of_its_own_run():
+    ballast = b'x' * (200 * 1024 * 1024)
+
+    result = run_benchmark(FLOW_BATCH_DEPLOY, services=1)
+
+    assert len(ballast) and result.peak_rss < peak_rss_mb() - 100
+
+
+def test_format_report():
+    result = run_benchmark(FLOW_BATCH_DEPLOY, services=3)
+
+    report = format_report([result])
+
+    assert 'batch-deploy' in report
+    assert 'batch:RegisterJobDefinition=3' in report
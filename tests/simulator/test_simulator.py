@@ -0,0 +1,431 @@
+import asyncio
+import json
+import threading
+
+import pytest
+from botocore.exceptions import ClientError, ParamValidationError
+from click.testing import CliRunner
+
+from aws_deploy.cli import cli
+from aws_deploy.common.polling import is_throttling_error, set_clock
+from aws_deploy.ecs.helper import EcsClient
+from aws_deploy.simulator import Simulator, SimulatorClientFactory, VirtualClock
+
+
+@pytest.fixture
+def clock():
+    clock = VirtualClock()
+    previous_clock = set_clock(clock)
+    yield clock
+    set_clock(previous_clock)
+
+
+@pytest.fixture
+def simulator(clock):
+    return Simulator(clock=clock, task_start_latency=5, deployment_duration=30)
+
+
+@pytest.fixture
+def runner():
+    # simulated task definitions must not end up in the local task definition cache
+    return CliRunner(env={'AWS_DEPLOY_NO_CACHE': '1'})
+
+
+def invoke(runner, simulator, args):
+    return runner.invoke(cli, args, obj={'CLIENT_FACTORY': SimulatorClientFactory(simulator)})
+
+
+def primary_deployment(ecs, cluster, service):
+    return ecs.describe_services(cluster=cluster, services=[service])['services'][0]['deployments'][0]
+
+
+def test_virtual_clock_advances_only_when_sleeping(clock):
+    start = clock.datetime()
+
+    clock.sleep(90)
+
+    assert clock.now() == 90
+    assert (clock.datetime() - start).total_seconds() == 90
+
+
+def test_virtual_clock_overlaps_concurrent_sleeps(clock):
+    woke_up_at = {}
+
+    def sleep(seconds):
+        clock.sleep(seconds)
+        woke_up_at[seconds] = clock.now()
+
+    threads = [threading.Thread(target=sleep, args=(seconds,)) for seconds in (5, 3, 5, 4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert clock.now() == 5
+    assert woke_up_at == {3: 3, 4: 4, 5: 5}
+
+
+def test_virtual_clock_overlaps_concurrent_async_sleeps(clock):
+    async def sleep_all():
+        await asyncio.gather(clock.sleep_async(5), clock.sleep_async(3), clock.sleep_async(5))
+
+    asyncio.run(sleep_all())
+
+    assert clock.now() == 5
+
+
+def test_api_calls_are_counted_and_take_virtual_time(simulator):
+    simulator.api_latency = 0.5
+    simulator.ecs.add_task_definition('web')
+    ecs = simulator.client('ecs')
+
+    ecs.describe_task_definition(taskDefinition='web')
+    ecs.describe_task_definition(taskDefinition='web:1')
+
+    assert simulator.calls['ecs:DescribeTaskDefinition'] == 2
+    assert simulator.clock.now() == 1
+
+
+def test_unknown_operation(simulator):
+    with pytest.raises(AttributeError):
+        simulator.client('ecs').create_cluster()
+
+
+def test_unknown_parameter(simulator):
+    with pytest.raises(ParamValidationError, match='Unknown parameter in input: "registeredAt"'):
+        simulator.client('ecs').register_task_definition(
+            family='web', containerDefinitions=[{'name': 'web', 'image': 'nginx'}], registeredAt='2020-01-01'
+        )
+
+    assert simulator.total_calls == 0
+
+
+def test_throttling(simulator):
+    simulator = Simulator(clock=simulator.clock, rate_limits={'ecs:DescribeTaskDefinition': (1, 2)}, max_attempts=1)
+    simulator.ecs.add_task_definition('web')
+    ecs = simulator.client('ecs')
+
+    ecs.describe_task_definition(taskDefinition='web')
+    ecs.describe_task_definition(taskDefinition='web')
+    with pytest.raises(ClientError) as error:
+        ecs.describe_task_definition(taskDefinition='web')
+
+    assert is_throttling_error(error.value)
+    assert simulator.throttled_calls['ecs:DescribeTaskDefinition'] == 1
+
+    simulator.clock.sleep(1)
+    ecs.describe_task_definition(taskDefinition='web')
+
+
+def test_throttled_calls_are_retried(simulator):
+    simulator = Simulator(clock=simulator.clock, rate_limits={'ecs:DescribeTaskDefinition': (1, 1)}, seed=1)
+    simulator.ecs.add_task_definition('web')
+    ecs = simulator.client('ecs')
+
+    for _ in range(3):
+        ecs.describe_task_definition(taskDefinition='web')
+
+    assert simulator.throttled_calls['ecs:DescribeTaskDefinition'] > 0
+    assert simulator.calls['ecs:DescribeTaskDefinition'] == 3 + simulator.throttled_calls['ecs:DescribeTaskDefinition']
+    assert simulator.clock.now() >= 2
+
+
+def test_list_services_is_paginated(simulator):
+    task_definition = simulator.ecs.add_task_definition('web')
+    for index in range(25):
+        simulator.ecs.add_service('prod', f'web-{index}', task_definition)
+
+    client = EcsClient(client_factory=SimulatorClientFactory(simulator))
+
+    assert len(list(client.list_services('prod'))) == 25
+    assert simulator.calls['ecs:ListServices'] == 3
+
+
+def test_describe_services_limit(simulator):
+    with pytest.raises(ClientError):
+        simulator.client('ecs').describe_services(cluster='prod', services=[f'web-{i}' for i in range(11)])
+
+
+def test_rolling_deployment_respects_minimum_healthy_and_maximum_percent(simulator, clock):
+    simulator.ecs.add_task_definition('web', image='nginx:1')
+    new_task_definition = simulator.ecs.add_task_definition('web', image='nginx:2')
+    simulator.ecs.add_service('prod', 'web', 'web:1', desired_count=4, minimum_healthy_percent=50, maximum_percent=100)
+    ecs = simulator.client('ecs')
+
+    ecs.update_service(cluster='prod', service='web', taskDefinition=new_task_definition)
+    service = ecs.describe_services(cluster='prod', services=['web'])['services'][0]
+
+    assert [(d['status'], d['runningCount'], d['pendingCount']) for d in service['deployments']] == [
+        ('PRIMARY', 0, 2), ('ACTIVE', 2, 0)
+    ]
+
+    clock.sleep(5)
+    service = ecs.describe_services(cluster='prod', services=['web'])['services'][0]
+
+    assert [(d['status'], d['runningCount'], d['pendingCount']) for d in service['deployments']] == [
+        ('PRIMARY', 2, 2), ('ACTIVE', 0, 0)
+    ]
+
+    clock.sleep(5)
+    deployment = primary_deployment(ecs, 'prod', 'web')
+
+    assert deployment['rolloutState'] == 'COMPLETED'
+    assert deployment['runningCount'] == 4
+    assert 'has reached a steady state' in ecs.describe_services(
+        cluster='prod', services=['web']
+    )['services'][0]['events'][0]['message']
+
+
+def test_circuit_breaker_fails_and_rolls_back(simulator, clock):
+    simulator.failing_images.add('nginx:broken')
+    simulator.ecs.add_task_definition('web', image='nginx:1')
+    simulator.ecs.add_task_definition('web', image='nginx:broken')
+    simulator.ecs.add_service('prod', 'web', 'web:1', desired_count=2, circuit_breaker=True, rollback=True)
+    ecs = simulator.client('ecs')
+
+    ecs.update_service(cluster='prod', service='web', taskDefinition='web:2')
+    clock.sleep(60)
+    service = ecs.describe_services(cluster='prod', services=['web'])['services'][0]
+
+    assert service['taskDefinition'].endswith('web:1')
+    assert service['deployments'][0]['rolloutState'] == 'COMPLETED'
+    stopped_tasks = ecs.list_tasks(cluster='prod', desiredStatus='STOPPED', family='web')['taskArns']
+    tasks = ecs.describe_tasks(cluster='prod', tasks=stopped_tasks)['tasks']
+    # the tasks fail two at a time, the threshold of 3 failed tasks is crossed with the second wave
+    assert len([task for task in tasks if task['containers'][0]['exitCode'] == 1]) == 4
+
+
+def test_ecs_deploy(simulator, runner):
+    simulator.ecs.add_task_definition('web', image='nginx:1.0.0')
+    for index in range(3):
+        simulator.ecs.add_service('prod', f'web-{index}', 'web', desired_count=3)
+
+    result = invoke(runner, simulator, ['ecs', 'deploy', 'prod', 'web-0', 'web-1', 'web-2', '--tag', '2.0.0'])
+
+    assert result.exit_code == 0, result.output
+    assert 'Deployment of 3 services successful' in result.output
+    for index in range(3):
+        deployment = primary_deployment(simulator.client('ecs'), 'prod', f'web-{index}')
+        assert deployment['taskDefinition'].endswith('web:2')
+        assert deployment['runningCount'] == 3
+
+
+def test_ecs_deploy_reusing_an_older_revision(simulator, runner):
+    simulator.ecs.add_task_definition('web', image='nginx:0.9.0')
+    simulator.ecs.add_service('prod', 'web', 'web:1')
+    for tag in ('1.0.0', '2.0.0'):
+        result = invoke(runner, simulator, ['ecs', 'deploy', 'prod', 'web', '--tag', tag, '--no-deregister'])
+        assert result.exit_code == 0, result.output
+    simulator.calls.clear()
+
+    result = invoke(runner, simulator, ['ecs', 'deploy', 'prod', 'web', '--tag', '1.0.0'])
+
+    assert result.exit_code == 0, result.output
+    assert 'Reusing revision with the same content: 2' in result.output
+    # the current and the reused revision are described, the other recent revisions are not
+    assert simulator.calls['ecs:DescribeTaskDefinition'] == 2
+    assert simulator.calls['resourcegroupstaggingapi:GetResources'] == 1
+    ecs = simulator.client('ecs')
+    assert primary_deployment(ecs, 'prod', 'web')['taskDefinition'].endswith('web:2')
+    assert ecs.describe_task_definition(taskDefinition='web:3')['taskDefinition']['status'] == 'INACTIVE'
+
+
+def test_ecs_deploy_without_reuse_does_not_tag_the_revision(simulator, runner):
+    simulator.ecs.add_task_definition('web', image='nginx:1.0.0')
+    simulator.ecs.add_service('prod', 'web', 'web:1')
+
+    result = invoke(runner, simulator, ['ecs', 'deploy', 'prod', 'web', '--tag', '2.0.0', '--no-reuse-revision'])
+
+    assert result.exit_code == 0, result.output
+    ecs = simulator.client('ecs')
+    task_definition_arn = primary_deployment(ecs, 'prod', 'web')['taskDefinition']
+    assert task_definition_arn.endswith('web:2')
+    assert ecs.list_tags_for_resource(resourceArn=task_definition_arn)['tags'] == []
+
+
+def test_ecs_deploy_with_failing_tasks(simulator, runner):
+    simulator.failing_images.add('nginx:broken')
+    simulator.ecs.add_task_definition('web', image='nginx:1.0.0')
+    simulator.ecs.add_service('prod', 'web', 'web', desired_count=2)
+
+    result = invoke(runner, simulator, ['ecs', 'deploy', 'prod', 'web', '--tag', 'broken', '--rollback'])
+
+    assert result.exit_code == 1
+    assert 'tasks of the new task definition failed' in result.output
+    assert 'Rollback successful' in result.output
+
+
+def test_ecs_scale(simulator, runner):
+    simulator.ecs.add_task_definition('web')
+    simulator.ecs.add_service('prod', 'web', 'web', desired_count=2)
+
+    result = invoke(runner, simulator, ['ecs', 'scale', 'prod', 'web', '5'])
+
+    assert result.exit_code == 0, result.output
+    assert 'Scaling successful' in result.output
+    assert primary_deployment(simulator.client('ecs'), 'prod', 'web')['runningCount'] == 5
+
+
+def test_ecs_cron(simulator, runner):
+    task_definition = simulator.ecs.add_task_definition('job', image='busybox:1.0.0')
+    simulator.events.add_rule('nightly', 'prod', task_definition)
+
+    result = invoke(runner, simulator, ['ecs', 'cron', 'prod', 'job', 'nightly', '--tag', '2.0.0'])
+
+    assert result.exit_code == 0, result.output
+    assert simulator.events.target('nightly')['EcsParameters']['TaskDefinitionArn'].endswith('job:2')
+
+
+def test_code_deploy_deploy(simulator, runner, clock):
+    simulator.ecs.add_task_definition('web', image='nginx:1.0.0')
+    simulator.ecs.add_task_definition('web', image='nginx:1.1.0')
+    simulator.ecs.add_service('prod', 'web', 'web:1', desired_count=2)
+    simulator.code_deploy.add_deployment_group('web', 'web-prod', 'prod', 'web')
+
+    result = invoke(runner, simulator, ['code-deploy', 'deploy', 'web', 'web-prod'])
+
+    assert result.exit_code == 0, result.output
+    assert 'Deployment successful' in result.output
+    assert clock.now() >= 30
+    service = simulator.client('ecs').describe_services(cluster='prod', services=['web'])['services'][0]
+    assert service['taskDefinition'].endswith('web:2')
+
+
+def test_code_deploy_deploy_registers_a_new_revision(simulator, runner):
+    simulator.ecs.add_task_definition('web', image='nginx:1.0.0', tags=[{'key': 'Team', 'value': 'web'}])
+    simulator.ecs.add_service('prod', 'web', 'web:1', desired_count=2)
+    simulator.code_deploy.add_deployment_group('web', 'web-prod', 'prod', 'web')
+
+    result = invoke(runner, simulator, ['code-deploy', 'deploy', 'web', 'web-prod', '--tag-only', '1.1.0'])
+
+    assert result.exit_code == 0, result.output
+    ecs = simulator.client('ecs')
+    service = ecs.describe_services(cluster='prod', services=['web'])['services'][0]
+    assert service['taskDefinition'].endswith('web:2')
+    tags = ecs.list_tags_for_resource(resourceArn=service['taskDefinition'])['tags']
+    assert {'key': 'Team', 'value': 'web'} in tags
+
+
+def test_code_deploy_deploy_failure(simulator, runner):
+    simulator.failing_images.add('nginx:broken')
+    simulator.ecs.add_task_definition('web', image='nginx:1.0.0')
+    simulator.ecs.add_service('prod', 'web', 'web', desired_count=2)
+    simulator.code_deploy.add_deployment_group('web', 'web-prod', 'prod', 'web')
+
+    result = invoke(runner, simulator, ['code-deploy', 'deploy', 'web', 'web-prod', '--tag-only', 'broken'])
+
+    assert result.exit_code == 1
+    assert 'ECS_UPDATE_ERROR' in result.output
+
+
+def test_batch_deploy(simulator, runner):
+    simulator.batch.add_job_definition('import', image='busybox:1.0.0')
+
+    result = invoke(runner, simulator, ['batch', 'deploy', 'import', '--tag', '2.0.0'])
+
+    assert result.exit_code == 0, result.output
+    job_definitions = simulator.client('batch').describe_job_definitions(jobDefinitionName='import', status='ACTIVE')
+    assert sorted(
+        (d['revision'], d['containerProperties']['image']) for d in job_definitions['jobDefinitions']
+    ) == [(1, 'busybox:1.0.0'), (2, 'busybox:2.0.0')]
+
+
+def add_revisions(simulator, family, environments):
+    for environment in environments:
+        # every revision has its own registeredAt, like real revisions
+        simulator.clock.advance(60)
+        simulator.ecs.add_task_definition(family, containers=[{
+            'name': 'web',
+            'image': 'nginx:1.0.0',
+            'environment': [{'name': name, 'value': value} for name, value in environment.items()],
+        }])
+
+
+@pytest.mark.parametrize('options', ([], ['--json-patch']))
+def test_ecs_diff(simulator, runner, options):
+    add_revisions(simulator, 'web', [{'FOO': 'a'}, {'FOO': 'b'}])
+
+    result = invoke(runner, simulator, ['ecs', 'diff', 'web', '1', '2'] + options)
+
+    assert result.exit_code == 0, result.output
+    assert 'registeredAt' not in result.output
+    assert 'FOO' in result.output
+
+
+def test_ecs_diff_range(simulator, runner):
+    add_revisions(simulator, 'web', [{'FOO': 'a'}, {'FOO': 'a'}, {'FOO': 'b'}, {'FOO': 'b', 'BAR': 'c'}])
+
+    result = invoke(runner, simulator, ['ecs', 'diff', 'web', '--range', '1..5'])
+
+    assert result.exit_code == 0, result.output
+    lines = result.output.splitlines()
+    assert lines[:3] == ['web:1 -> web:2', '    no changes', 'web:2 -> web:3']
+    assert 'change: containers.web.environment.FOO' in lines
+    assert lines[-3:] == ['add: containers.web.environment', '    + BAR: "c"', 'Revision web:5 not found, skipped']
+
+
+def test_ecs_diff_range_from_the_task_definition_cache(simulator, tmpdir):
+    add_revisions(simulator, 'web', [{'FOO': 'a'}, {'FOO': 'b'}, {'FOO': 'c'}])
+    runner = CliRunner(env={'AWS_DEPLOY_CACHE_DIR': str(tmpdir)})
+
+    first = invoke(runner, simulator, ['ecs', 'diff', 'web', '--range', '1..3'])
+    simulator.calls.clear()
+    second = invoke(runner, simulator, ['ecs', 'diff', 'web', '--range', '1..3'])
+
+    assert second.exit_code == 0, second.output
+    assert second.output == first.output
+    assert dict(simulator.calls) == {'sts:GetCallerIdentity': 1}
+
+
+def test_ecs_diff_range_json_patch(simulator, runner):
+    add_revisions(simulator, 'web', [{'FOO': 'a'}, {'FOO': 'b'}, {}])
+
+    result = invoke(runner, simulator, ['ecs', 'diff', 'web', '--range', '1..3', '--json-patch'])
+
+    assert result.exit_code == 0, result.output
+    assert [json.loads(line) for line in result.output.splitlines()] == [
+        {'from': 'web:1', 'to': 'web:2', 'patch': [
+            {'op': 'replace', 'path': '/containers/web/environment/FOO', 'value': 'b'}
+        ]},
+        {'from': 'web:2', 'to': 'web:3', 'patch': [{'op': 'remove', 'path': '/containers/web/environment/FOO'}]},
+    ]
+
+
+@pytest.mark.parametrize('options', ([], ['--json-patch'], ['--bisect', 'env.FOO']))
+def test_ecs_diff_range_of_real_revisions(simulator, runner, options):
+    # revisions registered and deregistered at different times, with the read-only metadata of real revisions
+    add_revisions(simulator, 'web', [{'FOO': 'a'}, {'FOO': 'a'}, {'FOO': 'b'}])
+    simulator.clock.advance(60)
+    simulator.ecs.deregister_task_definition(taskDefinition='web:1')
+
+    result = invoke(runner, simulator, ['ecs', 'diff', 'web', '--range', '1..3'] + options)
+
+    assert result.exit_code == 0, result.output
+    assert 'registeredAt' not in result.output
+    assert 'deregisteredAt' not in result.output
+    assert 'FOO' in result.output
+
+
+def test_ecs_diff_bisect(simulator, runner):
+    add_revisions(simulator, 'web', [{'FOO': 'a'}] * 40 + [{'FOO': 'b'}] * 24)
+    simulator.calls.clear()
+
+    result = invoke(runner, simulator, ['ecs', 'diff', 'web', '--range', '1..64', '--bisect', 'env.FOO'])
+
+    assert result.exit_code == 0, result.output
+    assert 'env.FOO changed in web:41' in result.output
+    assert '    - "a"' in result.output
+    assert simulator.calls['ecs:DescribeTaskDefinition'] <= 8
+
+
+@pytest.mark.parametrize('args, message', (
+    (['--range', '5..1'], '5..1 does not start before it ends'),
+    (['--range', '1-5'], '1-5 is not a range of revisions'),
+    (['1', '2', '--range', '1..2'], 'Pass either REVISION_A and REVISION_B or --range'),
+    (['1', '2', '--bisect', 'image'], '--bisect searches the revisions of a --range'),
+))
+def test_ecs_diff_invalid_options(simulator, runner, args, message):
+    result = invoke(runner, simulator, ['ecs', 'diff', 'web'] + args)
+
+    assert result.exit_code == 2
+    assert message in result.output
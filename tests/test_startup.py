@@ -0,0 +1,68 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules that take longer to import than the whole CLI and are only needed once an AWS command runs
+HEAVY_MODULES = {'boto3', 'botocore', 'requests', 'dictdiffer', 'yaml', 'distutils', 'setuptools', 'pkg_resources'}
+
+# import time budget of `aws_deploy.cli` in milliseconds, can be raised on slow machines
+IMPORT_TIME_BUDGET = int(os.environ.get('AWS_DEPLOY_IMPORT_TIME_BUDGET', 150))
+
+
+def run_python(*args):
+    return subprocess.run(
+        [sys.executable, *args], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+    )
+
+
+def imported_modules(code):
+    result = run_python('-c', f'{code}\nimport json, sys\nprint(json.dumps(sorted(sys.modules)))')
+    return set(json.loads(result.stdout.splitlines()[-1]))
+
+
+def imported_packages(code):
+    return {module.split('.')[0] for module in imported_modules(code)}
+
+
+def test_cli_import_does_not_load_heavy_modules():
+    packages = imported_packages('import aws_deploy.cli')
+
+    assert not packages & HEAVY_MODULES
+
+
+def test_cli_help_does_not_load_heavy_modules():
+    packages = imported_packages(
+        'from aws_deploy.cli import cli\n'
+        'try:\n'
+        '    cli(["--help"])\n'
+        'except SystemExit:\n'
+        '    pass'
+    )
+
+    assert not packages & HEAVY_MODULES
+
+
+def test_cli_only_loads_invoked_command():
+    modules = imported_modules(
+        'from aws_deploy.cli import cli\n'
+        'try:\n'
+        '    cli(["batch", "--help"])\n'
+        'except SystemExit:\n'
+        '    pass'
+    )
+
+    assert 'aws_deploy.batch.cli' in modules
+    assert 'aws_deploy.ecs' not in modules
+    assert 'aws_deploy.code_deploy' not in modules
+    assert 'boto3' not in modules
+
+
+def test_cli_import_time_budget():
+    result = run_python('-X', 'importtime', '-c', 'import aws_deploy.cli')
+    timings = [line.split('|') for line in result.stderr.splitlines() if line.startswith('import time:')]
+    cumulative = {name.strip(): int(total) for _, total, name in timings[1:]}
+
+    assert cumulative['aws_deploy.cli'] / 1000 < IMPORT_TIME_BUDGET